@@ -17,6 +17,7 @@
 
 import os
 import socket
+import time
 import uuid
 
 import eventlet
@@ -39,6 +40,7 @@ from quantum.openstack.common import importutils
 from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import loopingcall
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.openstack.common.rpc import proxy
 from quantum.openstack.common import service
 from quantum.openstack.common import uuidutils
@@ -52,6 +54,16 @@ METADATA_PORT = 80
 
 
 class DhcpAgent(manager.Manager):
+    """DHCP agent service manager.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - port_create_end accepts the 'ports' created in bulk.
+
+    """
+
+    RPC_API_VERSION = '1.1'
+
     OPTS = [
         cfg.IntOpt('resync_interval', default=5,
                    help=_("Interval to resync.")),
@@ -66,6 +78,16 @@ class DhcpAgent(manager.Manager):
                     help=_("Allows for serving metadata requests from a "
                            "dedicated network. Requires "
                            "enable_isolated_metadata = True")),
+        cfg.FloatOpt('reload_allocations_delay', default=0.5,
+                     help=_("Seconds to wait after a port event before "
+                            "reloading the DHCP allocations of its network, "
+                            "so that bursts of port events result in a "
+                            "single reload. 0 reloads immediately.")),
+        cfg.FloatOpt('lease_update_delay', default=1.0,
+                     help=_("Seconds during which the lease updates relayed "
+                            "by the DHCP servers are collected before being "
+                            "sent to Quantum in a single message. 0 sends "
+                            "every update immediately.")),
     ]
 
     def __init__(self, host=None):
@@ -73,6 +95,13 @@ class DhcpAgent(manager.Manager):
         self.needs_resync = False
         self.conf = cfg.CONF
         self.cache = NetworkCache()
+        # Ids of the networks with a reload of allocations scheduled
+        self._pending_reloads = set()
+        # Maps (network_id, ip_address) of the lease updates not sent yet
+        # to the lease time remaining and the time it was received
+        self._pending_leases = {}
+        # Cleared when the plugin does not support update_leases_expiration
+        self._bulk_leases_supported = True
         self.root_helper = config.get_root_helper(self.conf)
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
@@ -136,12 +165,59 @@ class DhcpAgent(manager.Manager):
             LOG.exception(_('Unable to %s dhcp.'), action)
 
     def update_lease(self, network_id, ip_address, time_remaining):
+        """Send the lease update to Quantum, batched with the updates
+        received within lease_update_delay seconds.
+        """
+        delay = self.conf.lease_update_delay
+        if delay <= 0 or not self._bulk_leases_supported:
+            try:
+                self.plugin_rpc.update_lease_expiration(network_id,
+                                                        ip_address,
+                                                        time_remaining)
+            except Exception:
+                self.needs_resync = True
+                LOG.exception(_('Unable to update lease'))
+            return
+        if not self._pending_leases:
+            eventlet.spawn_after(delay, self._send_leases)
+        self._pending_leases[(network_id, ip_address)] = (time_remaining,
+                                                          time.time())
+
+    def _send_leases(self):
+        pending, self._pending_leases = self._pending_leases, {}
+        now = time.time()
+        leases = [{'network_id': network_id,
+                   'ip_address': ip_address,
+                   'lease_remaining': max(0, int(remaining -
+                                                 (now - received)))}
+                  for (network_id, ip_address), (remaining, received)
+                  in pending.iteritems()]
+        if not leases:
+            return
         try:
-            self.plugin_rpc.update_lease_expiration(network_id, ip_address,
-                                                    time_remaining)
+            self.plugin_rpc.update_leases_expiration(leases)
+        except rpc_common.RemoteError as e:
+            if e.exc_type not in ('UnsupportedRpcVersion', 'AttributeError'):
+                self.needs_resync = True
+                LOG.exception(_('Unable to update leases'))
+                return
+            LOG.warn(_('Plugin does not support update_leases_expiration, '
+                       'updating leases one by one.'))
+            self._bulk_leases_supported = False
+            self._send_leases_one_by_one(leases)
         except Exception:
             self.needs_resync = True
-            LOG.exception(_('Unable to update lease'))
+            LOG.exception(_('Unable to update leases'))
+
+    def _send_leases_one_by_one(self, leases):
+        for lease in leases:
+            try:
+                self.plugin_rpc.update_lease_expiration(
+                    lease['network_id'], lease['ip_address'],
+                    lease['lease_remaining'])
+            except Exception:
+                self.needs_resync = True
+                LOG.exception(_('Unable to update lease'))
 
     def sync_state(self):
         """Sync the local DHCP state with Quantum."""
@@ -272,12 +348,22 @@ class DhcpAgent(manager.Manager):
 
     @utils.synchronized('dhcp-agent')
     def port_update_end(self, context, payload):
-        """Handle the port.update.end notification event."""
-        port = DictModel(payload['port'])
-        network = self.cache.get_network_by_id(port.network_id)
+        """Handle the port.update.end notification event.
+
+        Ports created in bulk are notified at once as a 'ports' list of
+        ports of the same network.
+        """
+        if 'ports' in payload:
+            ports = [DictModel(port) for port in payload['ports']]
+        else:
+            ports = [DictModel(payload['port'])]
+        if not ports:
+            return
+        network = self.cache.get_network_by_id(ports[0].network_id)
         if network:
-            self.cache.put_port(port)
-            self.call_driver('reload_allocations', network)
+            for port in ports:
+                self.cache.put_port(port)
+            self.schedule_reload_allocations(network)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -289,6 +375,27 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
+            self.schedule_reload_allocations(network)
+
+    def schedule_reload_allocations(self, network):
+        """Reload the allocations of a network once its port events settle.
+
+        Port events received for the network within reload_allocations_delay
+        seconds are applied to the cache and served by a single reload.
+        """
+        delay = self.conf.reload_allocations_delay
+        if delay <= 0:
+            self.call_driver('reload_allocations', network)
+        elif network.id not in self._pending_reloads:
+            self._pending_reloads.add(network.id)
+            eventlet.spawn_after(delay, self._reload_allocations, network.id)
+
+    @utils.synchronized('dhcp-agent')
+    def _reload_allocations(self, network_id):
+        self._pending_reloads.discard(network_id)
+        # The network may have been disabled in the meantime
+        network = self.cache.get_network_by_id(network_id)
+        if network:
             self.call_driver('reload_allocations', network)
 
     def enable_isolated_metadata_proxy(self, network):
@@ -348,10 +455,13 @@ class DhcpPluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.4 - Added update_leases_expiration. 1.1 to 1.3 are taken by
+              the other agent APIs the plugin callbacks serve.
 
     """
 
     BASE_RPC_API_VERSION = '1.0'
+    BULK_LEASES_VERSION = '1.4'
 
     def __init__(self, topic, context):
         super(DhcpPluginApi, self).__init__(
@@ -411,6 +521,19 @@ class DhcpPluginApi(proxy.RpcProxy):
                                 host=self.host),
                   topic=self.topic)
 
+    def update_leases_expiration(self, leases):
+        """Make a remote process call to update several ip leases at once.
+
+        :param leases: a list of dicts with network_id, ip_address and
+                       lease_remaining keys.
+        """
+        return self.call(self.context,
+                         self.make_msg('update_leases_expiration',
+                                       leases=leases,
+                                       host=self.host),
+                         topic=self.topic,
+                         version=self.BULK_LEASES_VERSION)
+
 
 class NetworkCache(object):
     """Agent cache of the current network state."""
@@ -739,7 +862,8 @@ class DhcpAgentWithStateReport(DhcpAgent):
             'configurations': {
                 'dhcp_driver': cfg.CONF.dhcp_driver,
                 'use_namespaces': cfg.CONF.use_namespaces,
-                'dhcp_lease_time': cfg.CONF.dhcp_lease_time},
+                'dhcp_lease_time': cfg.CONF.dhcp_lease_time,
+                'rpc_api_version': self.RPC_API_VERSION},
             'start_flag': True,
             'agent_type': constants.AGENT_TYPE_DHCP}
         report_interval = cfg.CONF.AGENT.report_interval
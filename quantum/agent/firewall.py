@@ -97,6 +97,23 @@ class FirewallDriver(object):
         """Returns filtered ports."""
         pass
 
+    @property
+    def handles_remote_groups(self):
+        """Whether the driver matches the members of remote groups itself.
+
+        Such drivers get the rules with a remote_group_id unexpanded, and
+        the members of the remote groups with update_security_group_members.
+        """
+        return False
+
+    def update_security_group_members(self, sg_id, member_ips):
+        """Update the members of a remote group.
+
+        :param member_ips: dict of the IP addresses of the members,
+                           by ethertype
+        """
+        raise NotImplementedError()
+
     @contextlib.contextmanager
     def defer_apply(self):
         """Defer apply context."""
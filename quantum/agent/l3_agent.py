@@ -17,7 +17,11 @@
 # @author: Dan Wendlandt, Nicira, Inc
 #
 
+import itertools
+import time
+
 import eventlet
+from eventlet import queue
 from eventlet import semaphore
 import netaddr
 from oslo.config import cfg
@@ -48,6 +52,9 @@ LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
+# Priorities of router updates, lower values are processed first
+PRIORITY_RPC = 0
+PRIORITY_SYNC = 1
 
 
 class L3PluginApi(proxy.RpcProxy):
@@ -139,7 +146,98 @@ class RouterInfo(object):
             self._snat_action = None
 
 
+class RouterUpdate(object):
+    """A pending change to a router.
+
+    If resync is set, the router is fetched from the server. Otherwise it
+    is removed from the agent if router is None, else it is (re)configured
+    with the given router data. delta_keys, if set, are the only router
+    keys whose data changed since the router was last configured.
+    """
+
+    def __init__(self, router_id, priority, router=None, delta_keys=None,
+                 resync=False):
+        self.router_id = router_id
+        self.priority = priority
+        self.router = router
+        self.delta_keys = delta_keys
+        self.resync = resync
+
+
+class RouterUpdateQueue(object):
+    """Queue of router updates, ordered by priority.
+
+    Only the latest update of a router is kept: it replaces any update of
+    the router still waiting in the queue, keeping the highest priority of
+    both. A router is handed out to a single consumer at a time, updates
+    queued in the meantime are handed out once done() is called for it.
+    """
+
+    def __init__(self):
+        self._queue = queue.PriorityQueue()
+        self._pending = {}
+        self._in_progress = set()
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def pending(self, router_id):
+        """Return the update of the router waiting to be handed out."""
+        return self._pending.get(router_id)
+
+    def put(self, update):
+        queued = self._pending.get(update.router_id)
+        if queued:
+            priority = min(update.priority, queued.priority)
+        else:
+            priority = update.priority
+        update.priority = priority
+        self._pending[update.router_id] = update
+        if update.router_id in self._in_progress:
+            # done() will queue it
+            return
+        if not queued or priority < queued.priority:
+            self._push(update)
+
+    def _push(self, update):
+        self._queue.put((update.priority, next(self._counter),
+                         update.router_id))
+
+    def get(self, block=True):
+        """Return the next update to process.
+
+        Raises eventlet.queue.Empty if block is False and there is no
+        update to process.
+        """
+        while True:
+            priority, _count, router_id = self._queue.get(block=block)
+            update = self._pending.get(router_id)
+            # Skip entries superseded by an entry of higher priority or
+            # routers being processed
+            if (update and update.priority == priority and
+                    router_id not in self._in_progress):
+                del self._pending[router_id]
+                self._in_progress.add(router_id)
+                return update
+
+    def done(self, router_id):
+        """Mark the processing of the router's last update as finished."""
+        self._in_progress.discard(router_id)
+        update = self._pending.get(router_id)
+        if update:
+            self._push(update)
+
+
 class L3NATAgent(manager.Manager):
+    """Manager for the L3 agent.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Added router_delta.
+    """
+
+    RPC_API_VERSION = '1.1'
 
     OPTS = [
         cfg.StrOpt('external_network_bridge', default='br-ex',
@@ -171,6 +269,8 @@ class L3NATAgent(manager.Manager):
                           "by the agents.")),
         cfg.BoolOpt('enable_metadata_proxy', default=True,
                     help=_("Allow running metadata proxy.")),
+        cfg.IntOpt('router_processing_workers', default=8,
+                   help=_("Number of routers configured in parallel.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -195,6 +295,8 @@ class L3NATAgent(manager.Manager):
         self.plugin_rpc = L3PluginApi(topics.PLUGIN, host)
         self.fullsync = True
         self.sync_sem = semaphore.Semaphore(1)
+        self._queue = RouterUpdateQueue()
+        self._pool = eventlet.GreenPool(self.conf.router_processing_workers)
         if self.conf.use_namespaces:
             self._destroy_router_namespaces(self.conf.router_id)
         super(L3NATAgent, self).__init__(host=self.conf.host)
@@ -579,14 +681,51 @@ class L3NATAgent(manager.Manager):
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
         with self.sync_sem:
-            if router_id in self.router_info:
-                try:
-                    self._router_removed(router_id)
-                except Exception:
-                    msg = _("Failed dealing with router "
-                            "'%s' deletion RPC message")
-                    LOG.debug(msg, router_id)
-                    self.fullsync = True
+            self._queue.put(RouterUpdate(router_id, PRIORITY_RPC))
+
+    def router_delta(self, context, router_id, delta):
+        """Deal with the change of part of a router RPC message.
+
+        The delta applies to the router data of the previous revision, if
+        the agent does not know it the whole router is fetched instead.
+        """
+        with self.sync_sem:
+            pending = self._queue.pending(router_id)
+            if pending:
+                router = pending.router
+            else:
+                ri = self.router_info.get(router_id)
+                router = ri and ri.router
+            revision = router and router.get('revision')
+            if revision is not None and delta['revision'] <= revision:
+                LOG.debug(_("Ignoring outdated delta of router %s"),
+                          router_id)
+                return
+            if revision is None or delta['revision'] != revision + 1:
+                self._queue.put(RouterUpdate(router_id, PRIORITY_RPC,
+                                             resync=True))
+                return
+            if pending and pending.delta_keys is None:
+                delta_keys = None
+            else:
+                delta_keys = set(delta['updated']) | set(delta['removed'])
+                if pending:
+                    delta_keys |= pending.delta_keys
+            self._queue.put(RouterUpdate(router_id, PRIORITY_RPC,
+                                         router=self._apply_delta(router,
+                                                                  delta),
+                                         delta_keys=delta_keys))
+
+    def _apply_delta(self, router, delta):
+        router = dict(router, revision=delta['revision'])
+        for key, items in delta['updated'].iteritems():
+            ids = set(item['id'] for item in items)
+            router[key] = [item for item in router.get(key, [])
+                           if item['id'] not in ids] + items
+        for key, ids in delta['removed'].iteritems():
+            router[key] = [item for item in router.get(key, [])
+                           if item['id'] not in ids]
+        return router
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
@@ -606,6 +745,52 @@ class L3NATAgent(manager.Manager):
     def router_added_to_agent(self, context, payload):
         self.routers_updated(context, payload)
 
+    def _process_router_update(self, update):
+        start = time.time()
+        try:
+            if update.resync:
+                self._resync_router(update.router_id)
+            elif update.router is None:
+                if update.router_id in self.router_info:
+                    self._router_removed(update.router_id)
+            elif (update.delta_keys == set([l3_constants.FLOATINGIP_KEY])
+                  and update.router_id in self.router_info):
+                # Only the floating IPs changed
+                ri = self.router_info[update.router_id]
+                ri.router = update.router
+                if ri.ex_gw_port:
+                    self.process_router_floating_ips(ri, ri.ex_gw_port)
+            else:
+                if update.router_id not in self.router_info:
+                    self._router_added(update.router_id, update.router)
+                ri = self.router_info[update.router_id]
+                ri.router = update.router
+                self.process_router(ri)
+        except Exception:
+            LOG.exception(_("Failed processing router %s"), update.router_id)
+            self.fullsync = True
+        finally:
+            self._queue.done(update.router_id)
+        LOG.debug(_("Processed router %(router_id)s in %(time).3f seconds, "
+                    "%(pending)d router updates pending"),
+                  {'router_id': update.router_id,
+                   'time': time.time() - start,
+                   'pending': len(self._queue)})
+
+    def _resync_router(self, router_id):
+        routers = self.plugin_rpc.get_routers(self.context,
+                                              router_id=router_id)
+        if routers:
+            self.routers_updated(self.context, routers)
+        else:
+            self.router_deleted(self.context, router_id)
+
+    def _process_router_updates(self):
+        """Dispatch queued router updates to the pool of workers."""
+        while True:
+            update = self._queue.get()
+            self._pool.spawn_n(self._process_router_update, update)
+
     def _process_routers(self, routers, all_routers=False):
         if (self.conf.external_network_bridge and
             not ip_lib.device_exists(self.conf.external_network_bridge)):
@@ -624,6 +809,7 @@ class L3NATAgent(manager.Manager):
         else:
             prev_router_ids = set(self.router_info) & set(
                 [router['id'] for router in routers])
+        priority = PRIORITY_SYNC if all_routers else PRIORITY_RPC
         cur_router_ids = set()
         for r in routers:
             if not r['admin_state_up']:
@@ -640,14 +826,10 @@ class L3NATAgent(manager.Manager):
             if ex_net_id and ex_net_id != target_ex_net_id:
                 continue
             cur_router_ids.add(r['id'])
-            if r['id'] not in self.router_info:
-                self._router_added(r['id'], r)
-            ri = self.router_info[r['id']]
-            ri.router = r
-            self.process_router(ri)
+            self._queue.put(RouterUpdate(r['id'], priority, router=r))
         # identify and remove routers that no longer exist
         for router_id in prev_router_ids - cur_router_ids:
-            self._router_removed(router_id)
+            self._queue.put(RouterUpdate(router_id, priority))
 
     @periodic_task.periodic_task
     def _sync_routers_task(self, context):
@@ -660,7 +842,7 @@ class L3NATAgent(manager.Manager):
                     else:
                         router_id = None
                     routers = self.plugin_rpc.get_routers(
-                        context, router_id)
+                        context, router_id=router_id)
                     self._process_routers(routers, all_routers=True)
                     self.fullsync = False
                 except Exception:
@@ -668,6 +850,7 @@ class L3NATAgent(manager.Manager):
                     self.fullsync = True
 
     def after_start(self):
+        eventlet.spawn_n(self._process_router_updates)
         LOG.info(_("L3 agent started"))
 
     def _update_routing_table(self, ri, operation, route):
@@ -0,0 +1,182 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import shlex
+
+import eventlet
+import eventlet.event
+import eventlet.queue
+from eventlet.green import subprocess
+
+from quantum.common import utils
+from quantum.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class AsyncProcessException(Exception):
+    pass
+
+
+class AsyncProcess(object):
+    """Manages a long-running process without blocking the caller.
+
+    The output of the process is read line by line by green threads.
+    Lines written to stdout are queued and can be consumed with
+    iter_stdout() or read_stdout(); lines written to stderr are logged.
+
+    If respawn_interval is set to a non-negative value, the process is
+    restarted that many seconds after it exits or fails.
+    """
+
+    def __init__(self, cmd, root_helper=None, respawn_interval=None):
+        self.cmd = cmd
+        self.root_helper = root_helper
+        if respawn_interval is not None and respawn_interval < 0:
+            raise ValueError(_('respawn_interval must be >= 0 if provided.'))
+        self.respawn_interval = respawn_interval
+        self._process = None
+        self._kill_event = None
+        self._stdout_lines = eventlet.queue.LightQueue()
+        self._watchers = []
+
+    @property
+    def is_active(self):
+        """Whether the process is running and its output is being read."""
+        return (self._process is not None and
+                self._kill_event is not None and
+                not self._kill_event.ready())
+
+    def start(self):
+        """Launch the process and start reading its output."""
+        if self._kill_event:
+            raise AsyncProcessException(_('Process is already started'))
+        LOG.debug(_('Launching async process [%s].'), self.cmd)
+        self._spawn()
+
+    def stop(self):
+        """Halt the process and stop reading its output."""
+        if not self._kill_event:
+            raise AsyncProcessException(_('Process is not running.'))
+        LOG.debug(_('Halting async process [%s].'), self.cmd)
+        self._kill()
+
+    def _spawn(self):
+        cmd = self.cmd
+        if self.root_helper:
+            cmd = shlex.split(self.root_helper) + cmd
+        self._kill_event = eventlet.event.Event()
+        self._process = utils.subprocess_popen(map(str, cmd), shell=False,
+                                               stdin=subprocess.PIPE,
+                                               stdout=subprocess.PIPE,
+                                               stderr=subprocess.PIPE)
+        # Only the stdout watcher handles the death of the process, to
+        # avoid respawning it twice.
+        self._watchers = [
+            eventlet.spawn(self._watch_process, self._read_stdout,
+                           self._kill_event, True),
+            eventlet.spawn(self._watch_process, self._read_stderr,
+                           self._kill_event, False),
+        ]
+
+    def _kill(self, respawning=False):
+        kill_event = self._kill_event
+        if kill_event is None:
+            return
+        if not respawning:
+            self._kill_event = None
+        if not kill_event.ready():
+            kill_event.send()
+        process = self._process
+        self._process = None
+        if process is not None and process.poll() is None:
+            try:
+                process.kill()
+            except OSError:
+                # The process is owned by the root helper, it will exit on
+                # its own once it fails to write to the closed pipes.
+                LOG.debug(_('Unable to kill async process [%s].'), self.cmd)
+            for stream in (process.stdin, process.stdout, process.stderr):
+                try:
+                    stream.close()
+                except (IOError, OSError):
+                    pass
+
+    def _handle_process_error(self):
+        """Kill the process and respawn it if configured to do so."""
+        LOG.debug(_('Halting async process [%s] in response to an error.'),
+                  self.cmd)
+        respawning = self.respawn_interval is not None
+        self._kill(respawning=respawning)
+        if respawning:
+            eventlet.sleep(self.respawn_interval)
+            if self._kill_event is not None:
+                LOG.debug(_('Respawning async process [%s].'), self.cmd)
+                self._spawn()
+
+    def _watch_process(self, callback, kill_event, handle_errors):
+        while not kill_event.ready():
+            try:
+                if not callback():
+                    break
+            except Exception:
+                LOG.exception(_('An error occured while reading output of '
+                                'async process [%s].'), self.cmd)
+                break
+            # Give other green threads a chance to run
+            eventlet.sleep()
+        if handle_errors and not kill_event.ready():
+            self._handle_process_error()
+
+    def _read(self, stream):
+        process = self._process
+        if process is None:
+            return
+        return getattr(process, stream).readline()
+
+    def _read_stdout(self):
+        data = self._read('stdout')
+        if data:
+            self._stdout_lines.put(data.strip())
+        return data
+
+    def _read_stderr(self):
+        data = self._read('stderr')
+        if data:
+            LOG.warn(_('Async process [%(cmd)s] reported: %(data)s'),
+                     {'cmd': self.cmd, 'data': data.strip()})
+        return data
+
+    def iter_stdout(self):
+        """Iterate over the lines of stdout read so far without blocking."""
+        while True:
+            try:
+                yield self._stdout_lines.get(block=False)
+            except eventlet.queue.Empty:
+                break
+
+    def read_stdout(self, timeout=None):
+        """Return the next line of stdout.
+
+        Blocks for at most timeout seconds and returns None if no line was
+        output in the meantime.
+        """
+        try:
+            return self._stdout_lines.get(timeout=timeout)
+        except eventlet.queue.Empty:
+            return None
@@ -330,8 +330,18 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
-        self._output_hosts_file()
-        self._output_opts_file()
+        # dnsmasq re-reads the whole hosts and options files on SIGHUP, which
+        # is costly for networks with many ports: leave it alone if the
+        # configuration built from the cached network did not change.
+        hosts_changed = self._replace_conf_file('host',
+                                                self._build_hosts_file())
+        opts_changed = self._replace_conf_file('opts',
+                                               self._build_opts_file())
+        if not (hosts_changed or opts_changed):
+            LOG.debug(_('Allocations unchanged for network: %s'),
+                      self.network.id)
+            return
+
         if self.active:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
@@ -339,25 +349,66 @@ class Dnsmasq(DhcpLocalProcess):
             LOG.debug(_('Pid %d is stale, relaunching dnsmasq'), self.pid)
         LOG.debug(_('Reloading allocations for network: %s'), self.network.id)
 
+    def _replace_conf_file(self, kind, data):
+        """Write a config file unless it already holds the given data.
+
+        Returns whether the file was written.
+        """
+        name = self.get_conf_file_name(kind)
+        try:
+            with open(name, 'r') as f:
+                if f.read() == data:
+                    return False
+        except IOError:
+            pass
+        utils.replace_file(name, data)
+        return True
+
     def _output_hosts_file(self):
         """Writes a dnsmasq compatible hosts file."""
+        name = self.get_conf_file_name('host')
+        utils.replace_file(name, self._build_hosts_file())
+        return name
+
+    def _build_hosts_file(self):
+        """Return the content of the dnsmasq hosts file.
+
+        The lines of each port are kept on the network along with the port
+        they were built from. The agent replaces the ports of its cached
+        network when they change, so only new and updated ports are
+        formatted again on reload.
+        """
+        cached = getattr(self.network, '_dnsmasq_hosts', {})
+        port_hosts = {}
+        for port in self.network.ports:
+            port_host = cached.get(port.id)
+            if port_host is None or port_host[0] is not port:
+                port_host = (port, self._build_port_hosts(port))
+            port_hosts[port.id] = port_host
+        self.network._dnsmasq_hosts = port_hosts
+        return ''.join(port_hosts[port.id][1] for port in self.network.ports)
+
+    def _build_port_hosts(self, port):
+        """Return the lines of the dnsmasq hosts file for a port."""
         r = re.compile('[:.]')
         buf = StringIO.StringIO()
 
-        for port in self.network.ports:
-            for alloc in port.fixed_ips:
-                name = '%s.%s' % (r.sub('-', alloc.ip_address),
-                                  self.conf.dhcp_domain)
-                buf.write('%s,%s,%s\n' %
-                          (port.mac_address, name, alloc.ip_address))
+        for alloc in port.fixed_ips:
+            name = '%s.%s' % (r.sub('-', alloc.ip_address),
+                              self.conf.dhcp_domain)
+            buf.write('%s,%s,%s\n' %
+                      (port.mac_address, name, alloc.ip_address))
 
-        name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
-        return name
+        return buf.getvalue()
 
     def _output_opts_file(self):
         """Write a dnsmasq compatible options file."""
+        name = self.get_conf_file_name('opts')
+        utils.replace_file(name, self._build_opts_file())
+        return name
 
+    def _build_opts_file(self):
+        """Return the content of the dnsmasq options file."""
         if self.conf.enable_isolated_metadata:
             subnet_to_interface_ip = self._make_subnet_interface_ip_map()
 
@@ -397,9 +448,7 @@ class Dnsmasq(DhcpLocalProcess):
                 else:
                     options.append(self._format_option(i, 'router'))
 
-        name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
-        return name
+        return '\n'.join(options)
 
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(
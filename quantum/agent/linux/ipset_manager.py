@@ -0,0 +1,92 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Manages kernel ipsets of IP addresses using the ipset utility."""
+
+from quantum.agent.linux import utils as linux_utils
+from quantum.common import constants
+from quantum.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+# A set name must be less than or equal to 31 characters.
+MAX_SET_NAME_LEN = 31
+SET_FAMILY = {constants.IPv4: 'inet',
+              constants.IPv6: 'inet6'}
+
+
+def get_set_name(id, ethertype):
+    """Return the name of the set of the given ethertype for an id."""
+    return (ethertype + id)[:MAX_SET_NAME_LEN]
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    The members of the sets created by this manager are tracked, so that
+    updating a set only adds and deletes the addresses which changed, all
+    in a single ipset restore. Sets left over by a previous run are
+    flushed when first used.
+    """
+
+    def __init__(self, _execute=None, root_helper=None):
+        self.execute = _execute or linux_utils.execute
+        self.root_helper = root_helper
+        # Maps set names to the set of their members
+        self.sets = {}
+
+    def _ipset(self, args, check_exit_code=True, process_input=None):
+        return self.execute(['ipset'] + args,
+                            root_helper=self.root_helper,
+                            check_exit_code=check_exit_code,
+                            process_input=process_input)
+
+    def set_exists(self, name):
+        return name in self.sets
+
+    def set_members(self, name, ethertype, member_ips):
+        """Make the members of the set name be member_ips.
+
+        The set is created if it does not exist yet.
+        """
+        members = set(member_ips)
+        commands = []
+        if name not in self.sets:
+            LOG.debug(_("Creating ipset %s"), name)
+            commands.append('create %s hash:ip family %s' %
+                            (name, SET_FAMILY[ethertype]))
+            commands.append('flush %s' % name)
+            current = set()
+        else:
+            current = self.sets[name]
+        commands.extend('add %s %s' % (name, ip)
+                        for ip in sorted(members - current))
+        commands.extend('del %s %s' % (name, ip)
+                        for ip in sorted(current - members))
+        if commands:
+            self._ipset(['restore', '-exist'],
+                        process_input='\n'.join(commands) + '\n')
+        self.sets[name] = members
+
+    def destroy_set(self, name):
+        """Destroy the set name, which must not be referenced anymore."""
+        if self.sets.pop(name, None) is None:
+            return
+        LOG.debug(_("Destroying ipset %s"), name)
+        try:
+            self._ipset(['destroy', name])
+        except RuntimeError:
+            LOG.exception(_("Unable to destroy ipset %s"), name)
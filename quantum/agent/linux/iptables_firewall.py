@@ -19,6 +19,7 @@ import netaddr
 from oslo.config import cfg
 
 from quantum.agent import firewall
+from quantum.agent.linux import ipset_manager
 from quantum.agent.linux import iptables_manager
 from quantum.common import constants
 from quantum.openstack.common import log as logging
@@ -29,11 +30,24 @@ SG_CHAIN = 'sg-chain'
 INGRESS_DIRECTION = 'ingress'
 EGRESS_DIRECTION = 'egress'
 IP_SPOOF_FILTER = 'ip-spoof-filter'
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
 CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      IP_SPOOF_FILTER: 's'}
 LINUX_DEV_LEN = 14
 
+iptables_firewall_opts = [
+    cfg.BoolOpt('iptables_incremental', default=False,
+                help=_("Only rewrite the iptables chains changed since the "
+                       "last update, instead of the whole tables")),
+    cfg.BoolOpt('enable_ipset', default=False,
+                help=_("Match the members of remote security groups with "
+                       "ipsets, updated in place when the members change, "
+                       "instead of with one iptables rule per member")),
+]
+cfg.CONF.register_opts(iptables_firewall_opts, 'SECURITYGROUP')
+
 
 class IptablesFirewallDriver(firewall.FirewallDriver):
     """Driver which enforces security groups through iptables rules."""
@@ -43,22 +57,41 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def __init__(self):
         self.iptables = iptables_manager.IptablesManager(
             root_helper=cfg.CONF.AGENT.root_helper,
-            use_ipv6=True)
+            use_ipv6=True,
+            incremental=cfg.CONF.SECURITYGROUP.iptables_incremental)
         # list of port which has security group
         self.filtered_ports = {}
+        self.ipset = None
+        if cfg.CONF.SECURITYGROUP.enable_ipset:
+            self.ipset = ipset_manager.IpsetManager(
+                root_helper=cfg.CONF.AGENT.root_helper)
+        # members of the remote groups, by ethertype
+        self.sg_members = {}
+        self._defer_apply = False
         self._add_fallback_chain_v4v6()
 
     @property
     def ports(self):
         return self.filtered_ports
 
+    @property
+    def handles_remote_groups(self):
+        return self.ipset is not None
+
+    def update_security_group_members(self, sg_id, member_ips):
+        LOG.debug(_("Updating members of remote group %s"), sg_id)
+        self.sg_members[sg_id] = member_ips
+        for ethertype, ips in member_ips.iteritems():
+            self.ipset.set_members(
+                ipset_manager.get_set_name(sg_id, ethertype), ethertype, ips)
+
     def prepare_port_filter(self, port):
         LOG.debug(_("Preparing device (%s) filter"), port['device'])
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         # each security group has it own chains
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def update_port_filter(self, port):
         LOG.debug(_("Updating device (%s) filter"), port['device'])
@@ -69,7 +102,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def remove_port_filter(self, port):
         LOG.debug(_("Removing device (%s) filter"), port['device'])
@@ -80,7 +113,30 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports.pop(port['device'], None)
         self._setup_chains()
+        self._apply()
+
+    def _apply(self):
         self.iptables.apply()
+        if not self._defer_apply:
+            self._remove_unused_ipsets()
+
+    def _remove_unused_ipsets(self):
+        """Destroy the ipsets not referenced by the port filters anymore.
+
+        This must be done once the iptables rules referencing them are
+        removed.
+        """
+        if not self.ipset:
+            return
+        remote_group_ids = set()
+        for port in self.filtered_ports.values():
+            for rule in port.get('security_group_rules', []):
+                if self._is_remote_group_rule(rule):
+                    remote_group_ids.add(rule['remote_group_id'])
+        for sg_id in set(self.sg_members) - remote_group_ids:
+            for ethertype in self.sg_members.pop(sg_id):
+                self.ipset.destroy_set(
+                    ipset_manager.get_set_name(sg_id, ethertype))
 
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
@@ -166,7 +222,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                 ipv4_sg_rules.append(rule)
             elif rule.get('ethertype') == constants.IPv6:
                 if rule.get('protocol') == 'icmp':
-                    rule['protocol'] = 'icmpv6'
+                    rule = dict(rule, protocol='icmpv6')
                 ipv6_sg_rules.append(rule)
         return ipv4_sg_rules, ipv6_sg_rules
 
@@ -254,6 +310,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                         rule.get('source_ip_prefix'))
             args += self._ip_prefix_arg('d',
                                         rule.get('dest_ip_prefix'))
+            args += self._remote_group_arg(rule)
             iptables_rules += [' '.join(args)]
 
         iptables_rules += ['-j $sg-fallback']
@@ -293,15 +350,38 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             return ['-%s' % direction, ip_prefix]
         return []
 
+    def _is_remote_group_rule(self, rule):
+        # Rules of remote groups are expanded into rules for each member
+        # unless the driver handles them with ipsets
+        return bool(self.ipset and rule.get('remote_group_id') and
+                    not rule.get('source_ip_prefix') and
+                    not rule.get('dest_ip_prefix'))
+
+    def _remote_group_arg(self, rule):
+        if not self._is_remote_group_rule(rule):
+            return []
+        remote_group_id = rule['remote_group_id']
+        ethertype = rule['ethertype']
+        name = ipset_manager.get_set_name(remote_group_id, ethertype)
+        if not self.ipset.set_exists(name):
+            # iptables-restore fails if a referenced set does not exist
+            members = self.sg_members.setdefault(remote_group_id, {})
+            self.ipset.set_members(name, ethertype,
+                                   members.setdefault(ethertype, []))
+        return ['-m set --match-set', name, IPSET_DIRECTION[rule['direction']]]
+
     def _port_chain_name(self, port, direction):
         return iptables_manager.get_chain_name(
             '%s%s' % (CHAIN_NAME_PREFIX[direction], port['device'][3:]))
 
     def filter_defer_apply_on(self):
+        self._defer_apply = True
         self.iptables.defer_apply_on()
 
     def filter_defer_apply_off(self):
+        self._defer_apply = False
         self.iptables.defer_apply_off()
+        self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
@@ -47,6 +47,21 @@ def get_chain_name(chain_name, wrap=True):
         return chain_name[:MAX_CHAIN_LEN_NOWRAP]
 
 
+def _weed_out_duplicates(lines):
+    """Remove duplicate lines, letting the *last* occurrence take
+    precedence.
+    """
+    seen_lines = set()
+    result = []
+    for line in reversed(lines):
+        stripped = line.strip()
+        if stripped not in seen_lines:
+            seen_lines.add(stripped)
+            result.append(line)
+    result.reverse()
+    return result
+
+
 class IptablesRule(object):
     """An iptables rule.
 
@@ -85,6 +100,8 @@ class IptablesTable(object):
         self.rules = []
         self.chains = set()
         self.unwrapped_chains = set()
+        # (chain, wrap) pairs modified since the table was last applied
+        self.dirty_chains = set()
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -103,6 +120,7 @@ class IptablesTable(object):
             self.chains.add(name)
         else:
             self.unwrapped_chains.add(name)
+        self.dirty_chains.add((name, wrap))
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -141,13 +159,19 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
-        self.rules = filter(lambda r: r.chain != name, self.rules)
+        self.dirty_chains.add((name, wrap))
         if wrap:
             jump_snippet = '-j %s-%s' % (binary_name, name)
         else:
             jump_snippet = '-j %s' % (name,)
 
-        self.rules = filter(lambda r: jump_snippet not in r.rule, self.rules)
+        rules = []
+        for rule in self.rules:
+            if rule.chain == name or jump_snippet in rule.rule:
+                self.dirty_chains.add((rule.chain, rule.wrap))
+            else:
+                rules.append(rule)
+        self.rules = rules
 
     def add_rule(self, chain, rule, wrap=True, top=False):
         """Add a rule to the table.
@@ -168,6 +192,7 @@ class IptablesTable(object):
             rule = ' '.join(map(self._wrap_target_chain, rule.split(' ')))
 
         self.rules.append(IptablesRule(chain, rule, wrap, top))
+        self.dirty_chains.add((chain, wrap))
 
     def _wrap_target_chain(self, s):
         if s.startswith('$'):
@@ -185,6 +210,7 @@ class IptablesTable(object):
         chain = get_chain_name(chain, wrap)
         try:
             self.rules.remove(IptablesRule(chain, rule, wrap, top))
+            self.dirty_chains.add((chain, wrap))
         except ValueError:
             LOG.warn(_('Tried to remove rule that was not there:'
                        ' %(chain)r %(rule)r %(wrap)r %(top)r'),
@@ -198,6 +224,32 @@ class IptablesTable(object):
                          if rule.chain == chain and rule.wrap == wrap]
         for rule in chained_rules:
             self.rules.remove(rule)
+        self.dirty_chains.add((chain, wrap))
+
+    def get_chain_rules(self, keys=None):
+        """Return the rules of the table grouped by chain.
+
+        The result maps (chain, wrap) pairs to the list of rule strings of
+        that chain, in the order they will be applied. Chains which do not
+        exist are left out. If keys is given, only these chains are
+        returned.
+        """
+        chain_rules = {}
+        for name in self.chains:
+            chain_rules[(name, True)] = []
+        for name in self.unwrapped_chains:
+            chain_rules[(name, False)] = []
+        for rule in self.rules:
+            key = (rule.chain, rule.wrap)
+            if keys is None or key in keys:
+                chain_rules.setdefault(key, []).append(str(rule))
+        if keys is not None:
+            chain_rules = dict((key, rules)
+                               for key, rules in chain_rules.iteritems()
+                               if key in keys)
+        for key, rules in chain_rules.iteritems():
+            chain_rules[key] = _weed_out_duplicates(rules)
+        return chain_rules
 
 
 class IptablesManager(object):
@@ -221,10 +273,17 @@ class IptablesManager(object):
     wrapped in the same was as the built-in filter chains. Additionally,
     there's a snat chain that is applied after the POSTROUTING chain.
 
+    In incremental mode, the rules applied to each table are remembered and
+    subsequent applies only rewrite the wrapped chains whose rules changed
+    since, using iptables-restore --noflush. The table is rebuilt from
+    iptables-save as above the first time, when a shared (unwrapped) chain
+    changed, or when an incremental update is rejected.
+
     """
 
     def __init__(self, _execute=None, state_less=False,
-                 root_helper=None, use_ipv6=False, namespace=None):
+                 root_helper=None, use_ipv6=False, namespace=None,
+                 incremental=False):
         if _execute:
             self.execute = _execute
         else:
@@ -233,7 +292,10 @@ class IptablesManager(object):
         self.use_ipv6 = use_ipv6
         self.root_helper = root_helper
         self.namespace = namespace
+        self.incremental = incremental
         self.iptables_apply_deferred = False
+        # (cmd, table name) -> rules by chain, as last applied
+        self._applied = {}
 
         self.ipv4 = {'filter': IptablesTable()}
         self.ipv6 = {'filter': IptablesTable()}
@@ -322,22 +384,88 @@ class IptablesManager(object):
 
         for cmd, tables in s:
             for table in tables:
-                args = ['%s-save' % cmd, '-t', table]
-                if self.namespace:
-                    args = ['ip', 'netns', 'exec', self.namespace] + args
-                current_table = (self.execute(args,
-                                 root_helper=self.root_helper))
-                current_lines = current_table.split('\n')
-                new_filter = self._modify_rules(current_lines,
-                                                tables[table])
-                args = ['%s-restore' % (cmd)]
-                if self.namespace:
-                    args = ['ip', 'netns', 'exec', self.namespace] + args
-                self.execute(args,
-                             process_input='\n'.join(new_filter),
-                             root_helper=self.root_helper)
+                if not (self.incremental and
+                        self._apply_incremental(cmd, table, tables[table])):
+                    self._apply_full(cmd, table, tables[table])
+                tables[table].dirty_chains.clear()
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _apply_full(self, cmd, table_name, table):
+        args = ['%s-save' % cmd, '-t', table_name]
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        current_table = (self.execute(args,
+                         root_helper=self.root_helper))
+        current_lines = current_table.split('\n')
+        new_filter = self._modify_rules(current_lines, table)
+        args = ['%s-restore' % (cmd)]
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        self.execute(args,
+                     process_input='\n'.join(new_filter),
+                     root_helper=self.root_helper)
+        if self.incremental:
+            self._applied[(cmd, table_name)] = table.get_chain_rules()
+
+    def _apply_incremental(self, cmd, table_name, table):
+        """Rewrite only the wrapped chains changed since the last apply.
+
+        :returns: False if the table has to be applied in full instead.
+        """
+        applied = self._applied.get((cmd, table_name))
+        if applied is None:
+            return False
+        if not table.dirty_chains:
+            return True
+
+        current = table.get_chain_rules(table.dirty_chains)
+        changed = []
+        removed = []
+        for key in table.dirty_chains:
+            if applied.get(key) == current.get(key):
+                continue
+            name, wrap = key
+            if not wrap:
+                # Unwrapped chains may hold rules of other components and
+                # cannot be flushed
+                return False
+            if key in current:
+                changed.append(name)
+            else:
+                removed.append(name)
+        if not (changed or removed):
+            return True
+
+        changed.sort()
+        removed.sort()
+        lines = ['*%s' % table_name]
+        # Declaring an existing chain with --noflush empties it
+        lines += [':%s-%s - [0:0]' % (binary_name, chain)
+                  for chain in changed + removed]
+        for chain in changed:
+            lines += current[(chain, True)]
+        lines += ['-X %s-%s' % (binary_name, chain) for chain in removed]
+        lines += ['COMMIT', '']
+
+        args = ['%s-restore' % cmd, '--noflush']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args,
+                         process_input='\n'.join(lines),
+                         root_helper=self.root_helper)
+        except RuntimeError:
+            LOG.warn(_("Incremental update of %(cmd)s table %(table)s "
+                       "failed, applying the full table"),
+                     {'cmd': cmd, 'table': table_name})
+            return False
+
+        for name in changed:
+            applied[(name, True)] = current[(name, True)]
+        for name in removed:
+            del applied[(name, True)]
+        return True
+
     def _modify_rules(self, current_lines, table, binary=None):
         unwrapped_chains = table.unwrapped_chains
         chains = table.chains
@@ -357,16 +485,15 @@ class IptablesManager(object):
                 if not rule.startswith(':'):
                     break
 
-        our_rules = []
-        for rule in rules:
-            rule_str = str(rule)
-            if rule.top:
-                # rule.top == True means we want this rule to be at the top.
-                # Further down, we weed out duplicates from the bottom of the
-                # list, so here we remove the dupes ahead of time.
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                                    new_filter)
-            our_rules += [rule_str]
+        our_rules = [str(rule) for rule in rules]
+        # rule.top == True means we want this rule to be at the top.
+        # Further down, we weed out duplicates from the bottom of the
+        # list, so here we remove the dupes ahead of time.
+        top_rules = set(rule_str.strip() for rule, rule_str
+                        in zip(rules, our_rules) if rule.top)
+        if top_rules:
+            new_filter = [line for line in new_filter
+                          if line.strip() not in top_rules]
 
         new_filter[rules_index:rules_index] = our_rules
 
@@ -376,19 +503,6 @@ class IptablesManager(object):
                                                (binary_name, name)
                                                for name in chains]
 
-        seen_lines = set()
-
-        def _weed_out_duplicates(line):
-            line = line.strip()
-            if line in seen_lines:
-                return False
-            else:
-                seen_lines.add(line)
-                return True
-
         # We filter duplicates, letting the *last* occurrence take
         # precedence.
-        new_filter.reverse()
-        new_filter = filter(_weed_out_duplicates, new_filter)
-        new_filter.reverse()
-        return new_filter
+        return _weed_out_duplicates(new_filter)
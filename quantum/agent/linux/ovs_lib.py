@@ -18,6 +18,7 @@
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 # @author: Dave Lapsley, Nicira Networks, Inc.
 
+import contextlib
 import re
 
 from quantum.agent.linux import ip_lib
@@ -27,6 +28,15 @@ from quantum.plugins.openvswitch.common import constants
 
 LOG = logging.getLogger(__name__)
 
+# ovs-ofctl commands reading a list of flows from a file, by the command
+# changing a single flow
+FLOW_BATCH_CMDS = {'add-flow': 'add-flows',
+                   'del-flows': 'del-flows'}
+# Seconds ovs-vsctl waits for ovsdb-server, per started chunk of
+# VSCTL_TIMEOUT_CHUNK commands of a transaction
+VSCTL_TIMEOUT = 2
+VSCTL_TIMEOUT_CHUNK = 100
+
 
 class VifPort:
     def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
@@ -48,6 +58,10 @@ class OVSBridge:
         self.br_name = br_name
         self.root_helper = root_helper
         self.re_id = self.re_compile_id()
+        # Nesting depth of deferred() blocks and the changes they queued
+        self._deferred = 0
+        self._pending_flows = []
+        self._pending_vsctl = []
 
     def re_compile_id(self):
         external = 'external_ids\s*'
@@ -62,13 +76,116 @@ class OVSBridge:
                                                'port': port})
         return re.compile(_re, re.M | re.X)
 
+    @contextlib.contextmanager
+    def deferred(self):
+        """Batch the changes made to the bridge until the end of the block.
+
+        Flows added or deleted in the block are sent to ovs-ofctl through
+        stdin, one call per run of additions or deletions, and ovsdb
+        modifications are applied in a single ovs-vsctl transaction. The
+        order of the changes is preserved: pending changes are applied
+        before any other command is run against the bridge. Blocks can be
+        nested, the changes are applied when the outermost one exits.
+
+        As ovsdb rolls back a whole transaction when one of its commands
+        fails, the ovsdb modifications are applied one by one when the
+        transaction fails, and RuntimeError is raised if any of them
+        still fails so that the caller can retry.
+        """
+        self._deferred += 1
+        try:
+            yield self
+        finally:
+            self._deferred -= 1
+            if not self._deferred:
+                self.apply_deferred()
+
+    def apply_deferred(self):
+        """Apply the changes queued by deferred()."""
+        try:
+            self._apply_pending_vsctl()
+        finally:
+            self._apply_pending_flows()
+
+    def _apply_pending_vsctl(self):
+        pending, self._pending_vsctl = self._pending_vsctl, []
+        if not pending:
+            return
+        args = []
+        for command in pending:
+            if command[0] == "--":
+                command = command[1:]
+            args += ["--"] + command
+        chunks = (len(pending) - 1) // VSCTL_TIMEOUT_CHUNK + 1
+        try:
+            self._execute_vsctl(args, timeout=VSCTL_TIMEOUT * chunks)
+            return
+        except Exception as e:
+            if len(pending) == 1:
+                raise
+            LOG.warn(_("Unable to apply %(count)d ovsdb changes to bridge "
+                       "%(bridge)s in a single transaction, applying them "
+                       "one by one. Exception: %(exception)s"),
+                     {'count': len(pending), 'bridge': self.br_name,
+                      'exception': e})
+
+        failed = 0
+        for command in pending:
+            try:
+                self._execute_vsctl(command)
+            except Exception as e:
+                failed += 1
+                LOG.error(_("Unable to apply ovsdb change %(cmd)s. "
+                            "Exception: %(exception)s"),
+                          {'cmd': command, 'exception': e})
+        if failed:
+            raise RuntimeError(_("Unable to apply %(failed)d of %(count)d "
+                                 "ovsdb changes to bridge %(bridge)s") %
+                               {'failed': failed, 'count': len(pending),
+                                'bridge': self.br_name})
+
+    def _apply_pending_flows(self):
+        pending, self._pending_flows = self._pending_flows, []
+        # Group consecutive flows with the same action so that additions
+        # and deletions keep their relative order
+        while pending:
+            cmd = pending[0][0]
+            count = 1
+            while count < len(pending) and pending[count][0] == cmd:
+                count += 1
+            flows = [flow for _cmd, flow in pending[:count]]
+            pending = pending[count:]
+            self._run_ofctl(FLOW_BATCH_CMDS[cmd], ["-"],
+                            process_input="\n".join(flows) + "\n")
+
+    def _defer_vsctl(self, args):
+        if self._deferred:
+            self._pending_vsctl.append(args)
+        else:
+            self.run_vsctl(args)
+
+    def _defer_flow(self, cmd, flow_str):
+        # Deleting all the flows can't be expressed in a batch
+        if self._deferred and flow_str:
+            self._pending_flows.append((cmd, flow_str))
+        else:
+            self.run_ofctl(cmd, [flow_str])
+
     def run_vsctl(self, args):
-        full_args = ["ovs-vsctl", "--timeout=2"] + args
+        # Commands may depend on the ovsdb changes queued so far
+        self._apply_pending_vsctl()
+        return self._run_vsctl(args)
+
+    def _run_vsctl(self, args):
         try:
-            return utils.execute(full_args, root_helper=self.root_helper)
+            return self._execute_vsctl(args)
         except Exception as e:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
-                      {'cmd': full_args, 'exception': e})
+                      {'cmd': ["ovs-vsctl"] + args, 'exception': e})
+
+    def _execute_vsctl(self, args, timeout=VSCTL_TIMEOUT):
+        full_args = ["ovs-vsctl", "--timeout=%d" % timeout] + args
+        return utils.execute(full_args, root_helper=self.root_helper)
 
     def reset_bridge(self):
         self.run_vsctl(["--", "--if-exists", "del-br", self.br_name])
@@ -80,21 +197,28 @@ class OVSBridge:
         return self.get_port_ofport(port_name)
 
     def delete_port(self, port_name):
-        self.run_vsctl(["--", "--if-exists", "del-port", self.br_name,
-                        port_name])
+        self._defer_vsctl(["--", "--if-exists", "del-port", self.br_name,
+                           port_name])
 
     def set_db_attribute(self, table_name, record, column, value):
         args = ["set", table_name, record, "%s=%s" % (column, value)]
-        self.run_vsctl(args)
+        self._defer_vsctl(args)
 
     def clear_db_attribute(self, table_name, record, column):
         args = ["clear", table_name, record, column]
-        self.run_vsctl(args)
+        self._defer_vsctl(args)
 
     def run_ofctl(self, cmd, args):
+        # Flows and ports changes must be applied before the command runs
+        self._apply_pending_vsctl()
+        self._apply_pending_flows()
+        return self._run_ofctl(cmd, args)
+
+    def _run_ofctl(self, cmd, args, **kwargs):
         full_args = ["ovs-ofctl", cmd, self.br_name] + args
         try:
-            return utils.execute(full_args, root_helper=self.root_helper)
+            return utils.execute(full_args, root_helper=self.root_helper,
+                                 **kwargs)
         except Exception as e:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': full_args, 'exception': e})
@@ -154,7 +278,7 @@ class OVSBridge:
         flow_expr_arr = self._build_flow_expr_arr(**kwargs)
         flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("add-flow", [flow_str])
+        self._defer_flow("add-flow", flow_str)
 
     def delete_flows(self, **kwargs):
         kwargs['delete'] = True
@@ -162,12 +286,19 @@ class OVSBridge:
         if "actions" in kwargs:
             flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("del-flows", [flow_str])
+        self._defer_flow("del-flows", flow_str)
 
     def add_tunnel_port(self, port_name, remote_ip,
                         tunnel_type=constants.TYPE_GRE,
                         vxlan_udp_port=constants.VXLAN_UDP_PORT):
-        self.run_vsctl(["add-port", self.br_name, port_name])
+        with self.deferred():
+            self._add_tunnel_port(port_name, remote_ip, tunnel_type,
+                                  vxlan_udp_port)
+        return self.get_port_ofport(port_name)
+
+    def _add_tunnel_port(self, port_name, remote_ip, tunnel_type,
+                         vxlan_udp_port):
+        self._defer_vsctl(["add-port", self.br_name, port_name])
         self.set_db_attribute("Interface", port_name, "type", tunnel_type)
         if tunnel_type == constants.TYPE_VXLAN:
             # Only set the VXLAN UDP port if it's not the default
@@ -180,13 +311,13 @@ class OVSBridge:
         self.set_db_attribute("Interface", port_name, "options:in_key", "flow")
         self.set_db_attribute("Interface", port_name, "options:out_key",
                               "flow")
-        return self.get_port_ofport(port_name)
 
     def add_patch_port(self, local_name, remote_name):
-        self.run_vsctl(["add-port", self.br_name, local_name])
-        self.set_db_attribute("Interface", local_name, "type", "patch")
-        self.set_db_attribute("Interface", local_name, "options:peer",
-                              remote_name)
+        with self.deferred():
+            self._defer_vsctl(["add-port", self.br_name, local_name])
+            self.set_db_attribute("Interface", local_name, "type", "patch")
+            self.set_db_attribute("Interface", local_name, "options:peer",
+                                  remote_name)
         return self.get_port_ofport(local_name)
 
     def db_get_map(self, table, record, column):
@@ -284,6 +415,36 @@ class OVSBridge:
             LOG.info(_("Unable to parse regex results. Exception: %s"), e)
             return
 
+    def get_vif_ports_by_ids(self, port_ids):
+        """Return a dict mapping the given iface-ids to their VifPorts.
+
+        All the interfaces are listed with a single ovs-vsctl call, ids of
+        ports that are not found are left out of the result.
+        """
+        port_ids = set(port_ids)
+        vif_ports = {}
+        if not port_ids:
+            return vif_ports
+        args = ['--', '--columns=external_ids,name,ofport',
+                'find', 'Interface']
+        result = self.run_vsctl(args)
+        if not result:
+            return vif_ports
+        for record in result.split('\n\n'):
+            match = self.re_id.search(record)
+            if not match or match.group('vif_id') not in port_ids:
+                continue
+            try:
+                vif_id = match.group('vif_id')
+                vif_ports[vif_id] = VifPort(match.group('port_name'),
+                                            int(match.group('ofport')),
+                                            vif_id,
+                                            match.group('vif_mac'),
+                                            self)
+            except Exception as e:
+                LOG.info(_("Unable to parse regex results. Exception: %s"), e)
+        return vif_ports
+
     def delete_ports(self, all_ports=False):
         if all_ports:
             port_names = self.get_port_name_list()
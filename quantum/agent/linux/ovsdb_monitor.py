@@ -0,0 +1,142 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from quantum.agent.linux import async_process
+from quantum.openstack.common import jsonutils
+from quantum.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class OvsdbMonitor(async_process.AsyncProcess):
+    """Manages an invocation of 'ovsdb-client monitor'."""
+
+    def __init__(self, table_name, columns=None, format=None,
+                 root_helper=None, respawn_interval=None):
+
+        cmd = ['ovsdb-client', 'monitor', table_name]
+        if columns:
+            cmd.append(','.join(columns))
+        if format:
+            cmd.append('--format=%s' % format)
+        super(OvsdbMonitor, self).__init__(cmd,
+                                           root_helper=root_helper,
+                                           respawn_interval=respawn_interval)
+
+
+class SimpleInterfaceMonitor(OvsdbMonitor):
+    """Monitors the Interface table of the local host's ovsdb for changes.
+
+    Reports the VIF ports (interfaces with both an iface-id and an
+    attached-mac external id, as returned by OVSBridge.get_vif_port_set)
+    that were added or removed since the last call to get_events().
+    """
+
+    def __init__(self, root_helper=None, respawn_interval=None):
+        super(SimpleInterfaceMonitor, self).__init__(
+            'Interface',
+            columns=['name', 'external_ids'],
+            format='json',
+            root_helper=root_helper,
+            respawn_interval=respawn_interval,
+        )
+        # Maps ovsdb row uuids to the iface-id of the VIF port
+        self._iface_ids = {}
+        self._added = set()
+        self._removed = set()
+
+    @property
+    def has_updates(self):
+        self._process_output()
+        return bool(self._added or self._removed)
+
+    def get_events(self):
+        """Return the VIF ports added and removed since the last call."""
+        self._process_output()
+        events = {'added': self._added, 'removed': self._removed}
+        self._added = set()
+        self._removed = set()
+        return events
+
+    def wait_for_events(self, timeout):
+        """Block until a VIF port change is reported or timeout expires.
+
+        :returns: whether there are events pending.
+        """
+        line = self.read_stdout(timeout=timeout)
+        if line:
+            self._process_update(line)
+        return self.has_updates
+
+    def _process_output(self):
+        for line in self.iter_stdout():
+            self._process_update(line)
+
+    def _add(self, iface_id):
+        self._removed.discard(iface_id)
+        self._added.add(iface_id)
+
+    def _remove(self, iface_id):
+        self._added.discard(iface_id)
+        self._removed.add(iface_id)
+
+    def _process_update(self, line):
+        try:
+            update = jsonutils.loads(line)
+            headings = update['headings']
+            rows = [dict(zip(headings, row)) for row in update['data']]
+        except (ValueError, KeyError, TypeError):
+            LOG.warn(_('Unable to parse ovsdb monitor output: %s'), line)
+            return
+
+        if any(row['action'] == 'initial' for row in rows):
+            # The initial dump lists every interface: anything that was
+            # known before the monitor was (re)started but is not listed
+            # anymore is gone.
+            listed = set(row['row'] for row in rows)
+            for uuid in set(self._iface_ids) - listed:
+                self._remove(self._iface_ids.pop(uuid))
+
+        for row in rows:
+            uuid = row['row']
+            action = row['action']
+            iface_id = self._get_iface_id(row.get('external_ids'))
+            if action == 'delete':
+                iface_id = self._iface_ids.pop(uuid, iface_id)
+                if iface_id:
+                    self._remove(iface_id)
+            elif action in ('initial', 'insert', 'new'):
+                known_id = self._iface_ids.get(uuid)
+                if iface_id == known_id:
+                    continue
+                if known_id:
+                    self._remove(self._iface_ids.pop(uuid))
+                if iface_id:
+                    self._iface_ids[uuid] = iface_id
+                    self._add(iface_id)
+            # 'old' rows only carry the previous values of modified
+            # columns, the matching 'new' row has the current ones.
+
+    @staticmethod
+    def _get_iface_id(external_ids):
+        # Maps are encoded as ["map", [[key, value], ...]]
+        if not isinstance(external_ids, list) or len(external_ids) != 2:
+            return
+        external_ids = dict(external_ids[1])
+        if 'attached-mac' in external_ids:
+            return external_ids.get('iface-id')
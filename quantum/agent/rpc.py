@@ -19,6 +19,7 @@ from quantum.common import topics
 
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import rpc
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.openstack.common.rpc import proxy
 from quantum.openstack.common import timeutils
 
@@ -66,14 +67,18 @@ class PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.2 - Added get_devices_details_list and update_devices_down.
 
     '''
 
     BASE_RPC_API_VERSION = '1.0'
+    DEVICES_LIST_VERSION = '1.2'
 
     def __init__(self, topic):
         super(PluginApi, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
+        # Cleared when the plugin does not support the device list calls
+        self.devices_list_supported = True
 
     def get_device_details(self, context, device, agent_id):
         return self.call(context,
@@ -87,6 +92,40 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def get_devices_details_list(self, context, devices, agent_id):
+        return self._call_for_devices(context, 'get_devices_details_list',
+                                      self.get_device_details, devices,
+                                      agent_id)
+
+    def update_devices_down(self, context, devices, agent_id):
+        return self._call_for_devices(context, 'update_devices_down',
+                                      self.update_device_down, devices,
+                                      agent_id)
+
+    def _call_for_devices(self, context, method, device_call, devices,
+                          agent_id):
+        """Call method for all the devices at once.
+
+        device_call is called for each device instead if the plugin does
+        not support method, from then on.
+        """
+        if self.devices_list_supported:
+            try:
+                return self.call(context,
+                                 self.make_msg(method, devices=devices,
+                                               agent_id=agent_id),
+                                 topic=self.topic,
+                                 version=self.DEVICES_LIST_VERSION)
+            except rpc_common.RemoteError as e:
+                if e.exc_type not in ('UnsupportedRpcVersion',
+                                      'AttributeError'):
+                    raise
+                LOG.warn(_("Plugin does not support %s, falling back to "
+                           "calls for each device"), method)
+                self.devices_list_supported = False
+        return [device_call(context, device, agent_id)
+                for device in devices]
+
     def update_device_up(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_up', device=device,
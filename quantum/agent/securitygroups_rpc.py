@@ -18,12 +18,22 @@
 
 from oslo.config import cfg
 
+from quantum.common import constants as q_const
 from quantum.common import topics
 from quantum.openstack.common import importutils
 from quantum.openstack.common import log as logging
+from quantum.openstack.common.rpc import common as rpc_common
 
 LOG = logging.getLogger(__name__)
 SG_RPC_VERSION = "1.1"
+# Version of the plugin rpc supporting security_group_info_for_devices
+SG_INFO_RPC_VERSION = "1.3"
+
+IP_MASK = {q_const.IPv4: 32,
+           q_const.IPv6: 128}
+
+DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
+                       'egress': 'dest_ip_prefix'}
 
 security_group_opts = [
     cfg.StrOpt(
@@ -56,6 +66,15 @@ class SecurityGroupServerRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
+    def security_group_info_for_devices(self, context, devices):
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices',
+                                       devices=devices),
+                         version=SG_INFO_RPC_VERSION,
+                         topic=self.topic)
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -95,17 +114,85 @@ class SecurityGroupAgentRpcMixin(object):
     support in agent implementations.
     """
 
+    # Set to False once the server turns out not to support
+    # security_group_info_for_devices
+    use_security_group_info = True
+
     def init_firewall(self):
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
         LOG.debug(_("Init firewall settings (driver=%s)"), firewall_driver)
         self.firewall = importutils.import_object(firewall_driver)
 
+    def _get_devices_rules(self, device_ids):
+        """Return the devices with their security group rules.
+
+        The rules of each security group and the members of each remote
+        group are only sent once by the server, and expanded here into
+        the rules of each device, unless the firewall driver matches the
+        members of remote groups itself. Falls back to the rules computed
+        by the server for each device if it does not support this.
+        """
+        if self.use_security_group_info:
+            try:
+                info = self.plugin_rpc.security_group_info_for_devices(
+                    self.context, list(device_ids))
+                if self.firewall.handles_remote_groups:
+                    for sg_id, member_ips in info['sg_member_ips'].items():
+                        self.firewall.update_security_group_members(
+                            sg_id, member_ips)
+                    return self._expand_security_group_info(
+                        info, expand_remote_groups=False)
+                return self._expand_security_group_info(info)
+            except rpc_common.RemoteError as e:
+                if e.exc_type not in ('UnsupportedRpcVersion',
+                                      'AttributeError'):
+                    raise
+                LOG.info(_("Security group information for devices is not "
+                           "supported by the server, falling back to "
+                           "security_group_rules_for_devices"))
+                self.use_security_group_info = False
+        return self.plugin_rpc.security_group_rules_for_devices(
+            self.context, list(device_ids))
+
+    def _expand_security_group_info(self, info, expand_remote_groups=True):
+        devices = info['devices']
+        rules_by_group = info['security_groups']
+        member_ips = info['sg_member_ips']
+        for device in devices.values():
+            rules = []
+            for sg_id in device.get('security_groups', []):
+                for rule in rules_by_group.get(sg_id, []):
+                    if expand_remote_groups:
+                        rules.extend(
+                            self._expand_rule(device, rule, member_ips))
+                    else:
+                        rules.append(rule)
+            # The provider rules of the device were added by the server
+            rules.extend(device.get('security_group_rules', []))
+            device['security_group_rules'] = rules
+        return devices
+
+    def _expand_rule(self, device, rule, member_ips):
+        remote_group_id = rule.get('remote_group_id')
+        if not remote_group_id:
+            return [rule]
+        ethertype = rule['ethertype']
+        direction_ip_prefix = DIRECTION_IP_PREFIX[rule['direction']]
+        fixed_ips = device.get('fixed_ips', [])
+        rules = []
+        for ip in member_ips.get(remote_group_id, {}).get(ethertype, []):
+            if ip in fixed_ips:
+                continue
+            ip_rule = rule.copy()
+            ip_rule[direction_ip_prefix] = "%s/%s" % (ip, IP_MASK[ethertype])
+            rules.append(ip_rule)
+        return rules
+
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._get_devices_rules(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
@@ -153,10 +240,14 @@ class SecurityGroupAgentRpcMixin(object):
         device_ids = self.firewall.ports.keys()
         if not device_ids:
             return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        devices = self._get_devices_rules(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
+                if (self.firewall.handles_remote_groups and
+                    self.firewall.ports.get(device['device']) == device):
+                    # The members of the remote groups of the device were
+                    # updated in place, its filter did not change
+                    continue
                 LOG.debug(_("Update port filter for %s"), device)
                 self.firewall.update_port_filter(device)
 
@@ -18,6 +18,7 @@ from quantum.common import topics
 from quantum.common import utils
 from quantum import manager
 from quantum.openstack.common import log as logging
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.openstack.common.rpc import proxy
 
 
@@ -25,10 +26,20 @@ LOG = logging.getLogger(__name__)
 
 
 class DhcpAgentNotifyAPI(proxy.RpcProxy):
-    """API for plugin to notify DHCP agent."""
+    """API for plugin to notify DHCP agent.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - port_create_end accepts the 'ports' created in bulk.
+
+    """
     BASE_RPC_API_VERSION = '1.0'
-    # It seems dhcp agent does not support bulk operation
+    BULK_PORTS_VERSION = '1.1'
     VALID_RESOURCES = ['network', 'subnet', 'port']
+    # Bulk created ports are notified with one message per network to the
+    # agents supporting it, one message per port to the others. The other
+    # bulk operations are not supported by the dhcp agent
+    VALID_BULK_RESOURCES = ['ports']
     VALID_METHOD_NAMES = ['network.create.end',
                           'network.update.end',
                           'network.delete.end',
@@ -47,9 +58,35 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
         plugin = manager.QuantumManager.get_plugin()
         dhcp_agents = plugin.get_dhcp_agents_hosting_networks(
             context, [network_id], active=True)
-        return [(dhcp_agent.host, dhcp_agent.topic) for
+        return [(dhcp_agent.host, dhcp_agent.topic,
+                 self._supports_bulk_ports(plugin, dhcp_agent)) for
                 dhcp_agent in dhcp_agents]
 
+    def _supports_bulk_ports(self, plugin, dhcp_agent):
+        # Agents report the version of their API since it supports them
+        version = plugin.get_configuration_dict(dhcp_agent).get(
+            'rpc_api_version', self.BASE_RPC_API_VERSION)
+        return rpc_common.version_is_compatible(version,
+                                                self.BULK_PORTS_VERSION)
+
+    def _make_msgs(self, method, payload, bulk_ports_supported):
+        """Return the messages notifying payload and their versions."""
+        if 'ports' not in payload:
+            return [(self.make_msg(method, payload=payload), None)]
+        if bulk_ports_supported:
+            return [(self.make_msg(method, payload=payload),
+                     self.BULK_PORTS_VERSION)]
+        return [(self.make_msg(method, payload={'port': port}), None)
+                for port in payload['ports']]
+
+    def _cast_msgs(self, context, msgs, topic, fanout=False):
+        cast = self.fanout_cast if fanout else self.cast
+        for msg, version in msgs:
+            if version:
+                cast(context, msg, topic=topic, version=version)
+            else:
+                cast(context, msg, topic=topic)
+
     def _notification_host(self, context, method, payload, host):
         """Notify the agent on host."""
         self.cast(
@@ -76,10 +113,11 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
                             context, 'network_create_end',
                             {'network': {'id': network_id}},
                             agent['host'])
-            for (host, topic) in self._get_dhcp_agents(context, network_id):
-                self.cast(
-                    context, self.make_msg(method,
-                                           payload=payload),
+            for (host, topic, bulk_ports_supported) in self._get_dhcp_agents(
+                    context, network_id):
+                self._cast_msgs(
+                    context,
+                    self._make_msgs(method, payload, bulk_ports_supported),
                     topic='%s.%s' % (topic, host))
         else:
             # besides the non-agentscheduler plugin,
@@ -89,10 +127,9 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
 
     def _notification_fanout(self, context, method, payload):
         """Fanout the payload to all dhcp agents."""
-        self.fanout_cast(
-            context, self.make_msg(method,
-                                   payload=payload),
-            topic=topics.DHCP_AGENT)
+        # The version of the agents is unknown
+        self._cast_msgs(context, self._make_msgs(method, payload, False),
+                        topic=topics.DHCP_AGENT, fanout=True)
 
     def network_removed_from_agent(self, context, network_id, host):
         self._notification_host(context, 'network_delete_end',
@@ -112,6 +149,9 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
         if methodname not in self.VALID_METHOD_NAMES:
             return
         obj_type = data.keys()[0]
+        if obj_type in self.VALID_BULK_RESOURCES:
+            self._notify_bulk(context, obj_type, data[obj_type], methodname)
+            return
         if obj_type not in self.VALID_RESOURCES:
             return
         obj_value = data[obj_type]
@@ -130,3 +170,16 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
                                    network_id)
         else:
             self._notification(context, methodname, data, network_id)
+
+    def _notify_bulk(self, context, collection, items, methodname):
+        """Notify the items of a bulk operation grouped by network."""
+        if not methodname.endswith('.create.end'):
+            return
+        by_network = {}
+        for item in items:
+            if 'network_id' in item:
+                by_network.setdefault(item['network_id'], []).append(item)
+        methodname = methodname.replace(".", "_")
+        for network_id, network_items in by_network.iteritems():
+            self._notification(context, methodname,
+                               {collection: network_items}, network_id)
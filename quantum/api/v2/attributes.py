@@ -29,6 +29,8 @@ LOG = logging.getLogger(__name__)
 ATTR_NOT_SPECIFIED = object()
 # Defining a constant to avoid repeating string literal in several modules
 SHARED = 'shared'
+# Filter holding alternative sets of filters, any of which items must match
+POLICY_FILTERS = 'policy_filters'
 
 
 def _verify_dict_keys(expected_keys, target_dict, strict=True):
@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
+
 import netaddr
 import webob.exc
 
@@ -202,6 +204,49 @@ class Controller(object):
             return api_common.SortingEmulatedHelper(request, self._attr_info)
         return api_common.NoSortingHelper(request, self._attr_info)
 
+    def _apply_policy_filters(self, context, filters):
+        """Push the policy for showing items down into the list filters.
+
+        The policy is translated into alternative constraints on the
+        attributes of the items, see policy.get_query_filters, and those
+        which can not be met by the items matching the filters are
+        dropped. If a single alternative is left, its constraints are
+        added to the filters so that the plugin does not even fetch the
+        items which would be discarded. Several alternatives are passed
+        as a list of sets of filters under POLICY_FILTERS, which plugins
+        built on QuantumDbPluginV2 OR together in the query.
+
+        :returns: the alternatives left, or None if the policy can not be
+                  translated.
+        """
+        alternatives = policy.get_query_filters(
+            context, self._plugin_handlers[self.SHOW])
+        if alternatives is None:
+            return None
+        matching = []
+        for alternative in alternatives:
+            if any(value not in filters.get(field, [value])
+                   for field, value in alternative.iteritems()):
+                continue
+            # Constraints met by all the items matching the filters
+            alternative = dict((field, value) for field, value
+                               in alternative.iteritems()
+                               if filters.get(field) != [value])
+            if not alternative:
+                return [{}]
+            matching.append(alternative)
+        if not all(field in self._attr_info
+                   for alternative in matching for field in alternative):
+            return matching
+        if len(matching) == 1:
+            for field, value in matching[0].iteritems():
+                filters[field] = [value]
+        elif matching:
+            filters[attributes.POLICY_FILTERS] = [
+                dict((field, [value]) for field, value in match.iteritems())
+                for match in matching]
+        return matching
+
     def _items(self, request, do_authz=False, parent_id=None):
         """Retrieves and formats a list of elements of the requested entity."""
         # NOTE(salvatore-orlando): The following ensures that fields which
@@ -209,9 +254,11 @@ class Controller(object):
         # plugin before returning.
         original_fields, fields_to_add = self._do_field_list(
             api_common.list_args(request, 'fields'))
+        # The policy filters are reserved to _apply_policy_filters()
         filters = api_common.get_filters(request, self._attr_info,
                                          ['fields', 'sort_key', 'sort_dir',
-                                          'limit', 'marker', 'page_reverse'])
+                                          'limit', 'marker', 'page_reverse',
+                                          attributes.POLICY_FILTERS])
         kwargs = {'filters': filters,
                   'fields': original_fields}
         sorting_helper = self._get_sorting_helper(request)
@@ -222,24 +269,43 @@ class Controller(object):
         pagination_helper.update_fields(original_fields, fields_to_add)
         if parent_id:
             kwargs[self._parent_id_name] = parent_id
-        obj_getter = getattr(self._plugin, self._plugin_handlers[self.LIST])
-        obj_list = obj_getter(request.context, **kwargs)
-        obj_list = sorting_helper.sort(obj_list)
-        obj_list = pagination_helper.paginate(obj_list)
+        if do_authz:
+            alternatives = self._apply_policy_filters(request.context,
+                                                      filters)
+            # Items need no check if the policy allows them all
+            do_authz = alternatives != [{}]
+        if do_authz and alternatives == []:
+            obj_list = []
+        else:
+            obj_getter = getattr(self._plugin,
+                                 self._plugin_handlers[self.LIST])
+            obj_list = obj_getter(request.context, **kwargs)
         # Check authz
         if do_authz:
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
-            # Omit items from list that should not be visible
+            # Omit items from list that should not be visible, before the
+            # emulated pagination so that pages are not shortened
             obj_list = [obj for obj in obj_list
                         if policy.check(request.context,
                                         self._plugin_handlers[self.SHOW],
                                         obj,
                                         plugin=self._plugin)]
-        collection = {self._collection:
-                      [self._view(request.context, obj,
+        obj_list = sorting_helper.sort(obj_list)
+        obj_list = pagination_helper.paginate(obj_list)
+        # The first view is built before the response is started, so that
+        # failures, e.g. with the policy, turn into an error status. The
+        # others are built while the response is serialized, so that they
+        # are not all held at once.
+        first_views = [self._view(request.context, obj,
+                                  fields_to_strip=fields_to_add)
+                       for obj in obj_list[:1]]
+        other_views = (self._view(request.context, obj,
                                   fields_to_strip=fields_to_add)
-                       for obj in obj_list]}
+                       for obj in itertools.islice(obj_list, 1, None))
+        collection = {self._collection:
+                      (view for view in itertools.chain(first_views,
+                                                        other_views))}
         pagination_links = pagination_helper.get_links(obj_list)
         if pagination_links:
             collection[self._collection + "_links"] = pagination_links
@@ -342,11 +408,11 @@ class Controller(object):
         if self._collection in body:
             # Have to account for bulk create
             items = body[self._collection]
-            deltas = {}
-            bulk = True
         else:
             items = [body]
-            bulk = False
+        # Resources are counted once per tenant
+        counts = {}
+        deltas = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
                                                     item[self._resource])
@@ -355,15 +421,13 @@ class Controller(object):
                            item[self._resource])
             try:
                 tenant_id = item[self._resource]['tenant_id']
-                count = quota.QUOTAS.count(request.context, self._resource,
-                                           self._plugin, self._collection,
-                                           tenant_id)
-                if bulk:
-                    delta = deltas.get(tenant_id, 0) + 1
-                    deltas[tenant_id] = delta
-                else:
-                    delta = 1
-                kwargs = {self._resource: count + delta}
+                if tenant_id not in counts:
+                    counts[tenant_id] = quota.QUOTAS.count(
+                        request.context, self._resource, self._plugin,
+                        self._collection, tenant_id)
+                deltas[tenant_id] = deltas.get(tenant_id, 0) + 1
+                kwargs = {self._resource:
+                          counts[tenant_id] + deltas[tenant_id]}
             except exceptions.QuotaResourceUnknown as e:
                 # We don't want to quota this resource
                 LOG.debug(e)
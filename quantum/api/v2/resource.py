@@ -105,12 +105,17 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             raise webob.exc.HTTPInternalServerError(**kwargs)
 
         status = action_status.get(action, 200)
-        body = serializer.serialize(result)
         # NOTE(jkoelker) Comply with RFC2616 section 9.7
         if status == 204:
-            content_type = ''
-            body = None
-
+            return webob.Response(request=request, status=status,
+                                  content_type='', body=None)
+        if (wsgi.is_streamed(result) and
+                hasattr(serializer, 'serialize_iter')):
+            # Large collections are serialized while the response is sent
+            return webob.Response(request=request, status=status,
+                                  content_type=content_type,
+                                  app_iter=serializer.serialize_iter(result))
+        body = serializer.serialize(result)
         return webob.Response(request=request, status=status,
                               content_type=content_type,
                               body=body)
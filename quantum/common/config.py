@@ -72,6 +72,14 @@ core_opts = [
                help=_("Maximum number of fixed ips per port")),
     cfg.IntOpt('dhcp_lease_duration', default=120,
                help=_("DHCP lease duration")),
+    cfg.IntOpt('ip_recycle_interval', default=30,
+               help=_("Seconds between runs of the server task returning "
+                      "the IP addresses of expired DHCP leases to their "
+                      "pools. 0 recycles them while serving requests "
+                      "instead")),
+    cfg.IntOpt('ip_recycle_batch_size', default=500,
+               help=_("Maximum number of expired IP addresses recycled in "
+                      "a single transaction")),
     cfg.BoolOpt('dhcp_agent_notification', default=True,
                 help=_("Allow sending resource operation"
                        " notification to DHCP agent")),
@@ -215,6 +215,12 @@ class IpAddressGenerationFailure(Conflict):
     message = _("No more IP addresses available on network %(net_id)s.")
 
 
+class IpAllocationConflict(Conflict):
+    message = _("Unable to update the IP availability of subnet "
+                "%(subnet_id)s after %(attempts)s attempts because of "
+                "concurrent requests.")
+
+
 class BridgeDoesNotExist(QuantumException):
     message = _("Bridge %(bridge)s does not exist.")
 
@@ -17,10 +17,47 @@
 
 from quantum import context
 from quantum.openstack.common import log as logging
+from quantum.openstack.common import rpc
 from quantum.openstack.common.rpc import dispatcher
 
 
 LOG = logging.getLogger(__name__)
+# Connection pools inherited from the parent process, see
+# reset_connection_pool()
+_INHERITED_POOLS = []
+
+
+def reset_connection_pool():
+    """Make a forked worker process open its own message bus connections.
+
+    The pooled connections of the rpc backend inherited from the parent
+    process are abandoned rather than closed, as closing them would close
+    them for the parent process too.
+    """
+    connection_cls = getattr(rpc._get_impl(), 'Connection', None)
+    pool = getattr(connection_cls, 'pool', None)
+    if pool:
+        _INHERITED_POOLS.append(pool)
+        connection_cls.pool = None
+
+
+class RpcListenerGroup(object):
+    """Handle the green threads consuming several RPC topics as one.
+
+    Plugins delegating to several plugins return it from
+    start_rpc_listener.
+    """
+
+    def __init__(self, listeners):
+        self.listeners = listeners
+
+    def wait(self):
+        for listener in self.listeners:
+            listener.wait()
+
+    def kill(self):
+        for listener in self.listeners:
+            listener.kill()
 
 
 class PluginRpcDispatcher(dispatcher.RpcDispatcher):
@@ -56,6 +56,9 @@ class ContextBase(common_context.RequestContext):
         self.timestamp = timestamp
         self._session = None
         self.roles = roles or []
+        # Results of the policy checks done for this context, see
+        # quantum.policy.check()
+        self._policy_cache = {}
         if self.is_admin is None:
             self.is_admin = policy.check_is_admin(self)
         elif self.is_admin:
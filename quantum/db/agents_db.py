@@ -19,18 +19,28 @@ from oslo.config import cfg
 import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
+from quantum import context as quantum_context
 from quantum.db import model_base
 from quantum.db import models_v2
 from quantum.extensions import agent as ext_agent
 from quantum import manager
 from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
+from quantum.openstack.common import loopingcall
 from quantum.openstack.common import timeutils
+from quantum.openstack.common import uuidutils
 
 LOG = logging.getLogger(__name__)
 cfg.CONF.register_opt(
     cfg.IntOpt('agent_down_time', default=5,
                help=_("Seconds to regard the agent is down.")))
+cfg.CONF.register_opt(
+    cfg.IntOpt('agent_heartbeat_flush_interval', default=0,
+               help=_("Seconds the heartbeats of known agents are buffered "
+                      "before being written to the database in a batch, "
+                      "by a timer of the process receiving the reports. "
+                      "Agents are regarded as down once agent_down_time "
+                      "plus this delay has passed since their heartbeat.")))
 
 
 class Agent(model_base.BASEV2, models_v2.HasId):
@@ -57,9 +67,37 @@ class Agent(model_base.BASEV2, models_v2.HasId):
     configurations = sa.Column(sa.String(4095), nullable=False)
 
 
+class HeartbeatBuffer(object):
+    """Heartbeats of known agents waiting to be written to the database."""
+
+    def __init__(self):
+        # Maps (agent_type, host) to the id and configurations of the
+        # agents whose last full report was written
+        self.agents = {}
+        # Maps agent ids to their last heartbeat not written yet
+        self.pending = {}
+        # Periodically writes the pending heartbeats, started by the first
+        # heartbeat buffered
+        self.flusher = None
+
+    def forget(self, agent_id):
+        self.pending.pop(agent_id, None)
+        for key, (known_id, configurations) in self.agents.items():
+            if known_id == agent_id:
+                del self.agents[key]
+
+
 class AgentDbMixin(ext_agent.AgentPluginBase):
     """Mixin class to add agent extension to db_plugin_base_v2."""
 
+    @property
+    def heartbeat_buffer(self):
+        try:
+            return self._heartbeat_buffer
+        except AttributeError:
+            self._heartbeat_buffer = HeartbeatBuffer()
+            return self._heartbeat_buffer
+
     def _get_agent(self, context, id):
         try:
             agent = self._get_by_id(context, Agent, id)
@@ -69,8 +107,11 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
 
     @classmethod
     def is_agent_down(cls, heart_beat_time):
-        return timeutils.is_older_than(heart_beat_time,
-                                       cfg.CONF.agent_down_time)
+        # The heartbeat stored in the database may lag behind the last one
+        # received by up to agent_heartbeat_flush_interval seconds
+        down_time = (cfg.CONF.agent_down_time +
+                     max(cfg.CONF.agent_heartbeat_flush_interval, 0))
+        return timeutils.is_older_than(heart_beat_time, down_time)
 
     def get_configuration_dict(self, agent_db):
         try:
@@ -97,6 +138,7 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         with context.session.begin(subtransactions=True):
             agent = self._get_agent(context, id)
             context.session.delete(agent)
+        self.heartbeat_buffer.forget(id)
 
     def update_agent(self, context, id, agent):
         agent_data = agent['agent']
@@ -152,8 +194,78 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
                 res['started_at'] = current_time
                 res['heartbeat_timestamp'] = current_time
                 res['admin_state_up'] = True
+                res['id'] = uuidutils.generate_uuid()
                 agent_db = Agent(**res)
                 context.session.add(agent_db)
+        buf = self.heartbeat_buffer
+        buf.pending.pop(agent_db.id, None)
+        buf.agents[(agent['agent_type'], agent['host'])] = (
+            agent_db.id, configurations_dict)
+
+    def report_agent_state(self, context, agent):
+        """Record a state report of an agent.
+
+        Reports of unknown agents, of agents which were restarted or whose
+        configurations changed are written by create_or_update_agent.
+        Otherwise only the heartbeat of the agent is buffered, to be written
+        along with the others every agent_heartbeat_flush_interval seconds
+        by a timer of the process receiving the reports.
+        """
+        buf = self.heartbeat_buffer
+        known = buf.agents.get((agent['agent_type'], agent['host']))
+        if (not known or agent.get('start_flag') or
+                known[1] != agent.get('configurations', {})):
+            self.create_or_update_agent(context, agent)
+            return
+        buf.pending[known[0]] = timeutils.utcnow()
+        interval = cfg.CONF.agent_heartbeat_flush_interval
+        if interval <= 0:
+            self.flush_agent_heartbeats(context)
+        elif not buf.flusher:
+            buf.flusher = loopingcall.FixedIntervalLoopingCall(
+                self._flush_buffered_heartbeats)
+            buf.flusher.start(interval=interval, initial_delay=interval)
+
+    def _flush_buffered_heartbeats(self):
+        try:
+            self.flush_agent_heartbeats(quantum_context.get_admin_context())
+        except Exception:
+            LOG.exception(_("Unable to flush agent heartbeats"))
+
+    def flush_agent_heartbeats(self, context):
+        """Write the buffered heartbeats with a single batched UPDATE.
+
+        The heartbeats of agents deleted in the meantime are dropped, their
+        next report creates them again. A heartbeat older than the stored
+        one, written by another server process, is ignored.
+        """
+        buf = self.heartbeat_buffer
+        pending, buf.pending = buf.pending, {}
+        if not pending:
+            return
+        try:
+            with context.session.begin(subtransactions=True):
+                query = context.session.query(Agent.id)
+                existing = set(agent_id for agent_id, in
+                               query.filter(Agent.id.in_(pending)))
+                if existing:
+                    update = Agent.__table__.update().where(sa.and_(
+                        Agent.id == sa.bindparam('agent_id'),
+                        Agent.heartbeat_timestamp <
+                        sa.bindparam('timestamp'))).values(
+                            heartbeat_timestamp=sa.bindparam('timestamp'))
+                    context.session.execute(
+                        update, [{'agent_id': agent_id,
+                                  'timestamp': pending[agent_id]}
+                                 for agent_id in existing])
+        except Exception:
+            # Keep the heartbeats for the next flush, unless newer ones were
+            # received in the meantime
+            for agent_id, timestamp in pending.iteritems():
+                buf.pending.setdefault(agent_id, timestamp)
+            raise
+        for agent_id in set(pending) - existing:
+            buf.forget(agent_id)
 
 
 class AgentExtRpcCallback(object):
@@ -171,4 +283,4 @@ class AgentExtRpcCallback(object):
             return
         agent_state = kwargs['agent_state']['agent_state']
         plugin = manager.QuantumManager.get_plugin()
-        plugin.create_or_update_agent(context, agent_state)
+        plugin.report_agent_state(context, agent_state)
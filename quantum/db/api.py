@@ -81,6 +81,8 @@ cfg.CONF.register_opts(database_opts, "DATABASE")
 
 _ENGINE = None
 _MAKER = None
+# Connection pools inherited from the parent process, see reset_engine()
+_INHERITED_POOLS = []
 BASE = model_base.BASEV2
 
 
@@ -198,6 +200,19 @@ def clear_db(base=BASE):
     _ENGINE = None
 
 
+def reset_engine():
+    """Make a forked worker process open its own database connections.
+
+    The connections of the engine inherited from the parent process are
+    abandoned rather than closed, as closing them would close them for
+    the parent process too. The worker uses a new, empty pool.
+    """
+    if not _ENGINE:
+        return
+    _INHERITED_POOLS.append(_ENGINE.pool)
+    _ENGINE.pool = _ENGINE.pool.recreate()
+
+
 def get_session(autocommit=True, expire_on_commit=False):
     """Helper method to grab session."""
     global _MAKER, _ENGINE
@@ -22,12 +22,15 @@ import netaddr
 from oslo.config import cfg
 from sqlalchemy import orm
 from sqlalchemy.orm import exc
+from sqlalchemy import sql
 
 from quantum.api.v2 import attributes
 from quantum.common import constants
 from quantum.common import exceptions as q_exc
 from quantum.db import api as db
+from quantum.db import ipam
 from quantum.db import models_v2
+from quantum.db import quota_db
 from quantum.db import sqlalchemyutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import timeutils
@@ -132,12 +135,33 @@ class CommonDbMixin(object):
         query = self._model_query(context, model)
         return query.filter(model.id == id).one()
 
+    def _apply_alternative_filters(self, query, model, alternatives):
+        """Filter the query on any of the alternative sets of filters.
+
+        The filters are not applied if one of them is not a column of the
+        model, in which case the caller has to check the items.
+        """
+        conditions = []
+        for alternative in alternatives:
+            clauses = []
+            for key, value in alternative.iteritems():
+                column = getattr(model, key, None)
+                if column is None:
+                    return query
+                clauses.append(column.in_(value))
+            conditions.append(sql.and_(*clauses))
+        return query.filter(sql.or_(*conditions))
+
     def _apply_filters_to_query(self, query, model, filters):
         if filters:
             for key, value in filters.iteritems():
                 column = getattr(model, key, None)
                 if column:
                     query = query.filter(column.in_(value))
+            alternatives = filters.get(attributes.POLICY_FILTERS)
+            if alternatives:
+                query = self._apply_alternative_filters(query, model,
+                                                        alternatives)
             for _name, hooks in self._model_query_hooks.get(model,
                                                             {}).iteritems():
                 result_filter = hooks.get('result_filters', None)
@@ -258,16 +282,20 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
         return context.session.query(models_v2.Subnet).all()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id):
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
+            mac_address = QuantumDbPluginV2._random_mac()
             if QuantumDbPluginV2._check_unique_mac(context, network_id,
                                                    mac_address):
                 LOG.debug(_("Generated mac for network %(network_id)s "
@@ -294,6 +322,70 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
             return True
         return False
 
+    @staticmethod
+    def _generate_macs(context, network_id, mac_addresses):
+        """Return mac_addresses with unique generated MAC addresses in place
+        of the unspecified ones.
+
+        Requested and generated addresses are checked against the ports of
+        the network with one query per round rather than one per address.
+        """
+        macs = list(mac_addresses)
+        requested = [mac for mac in macs
+                     if mac is not attributes.ATTR_NOT_SPECIFIED]
+        taken = set()
+        for mac_address in requested:
+            if mac_address in taken:
+                raise q_exc.MacAddressInUse(net_id=network_id,
+                                            mac=mac_address)
+            taken.add(mac_address)
+        in_use = QuantumDbPluginV2._get_macs_in_use(context, network_id,
+                                                    requested)
+        if in_use:
+            raise q_exc.MacAddressInUse(net_id=network_id,
+                                        mac=in_use.pop())
+
+        missing = [i for i, mac in enumerate(macs)
+                   if mac is attributes.ATTR_NOT_SPECIFIED]
+        max_retries = cfg.CONF.mac_generation_retries
+        for attempt in range(max_retries):
+            if not missing:
+                break
+            candidates = {}
+            for i in missing:
+                mac_address = QuantumDbPluginV2._random_mac()
+                if mac_address not in taken and mac_address not in candidates:
+                    candidates[mac_address] = i
+            in_use = QuantumDbPluginV2._get_macs_in_use(context, network_id,
+                                                        candidates.keys())
+            for mac_address, i in candidates.iteritems():
+                if mac_address not in in_use:
+                    macs[i] = mac_address
+                    taken.add(mac_address)
+            missing = [i for i in missing
+                       if macs[i] is attributes.ATTR_NOT_SPECIFIED]
+            LOG.debug(_("Generated %(count)s macs for network %(network_id)s"
+                        ", %(missing)s remaining"),
+                      {'count': len(candidates) - len(in_use),
+                       'network_id': network_id,
+                       'missing': len(missing)})
+        if missing:
+            LOG.error(_("Unable to generate mac address after %s attempts"),
+                      max_retries)
+            raise q_exc.MacAddressGenerationFailure(net_id=network_id)
+        return macs
+
+    @staticmethod
+    def _get_macs_in_use(context, network_id, mac_addresses):
+        """Return the subset of mac_addresses used by ports of the network."""
+        if not mac_addresses:
+            return set()
+        mac_qry = context.session.query(models_v2.Port.mac_address)
+        mac_qry = mac_qry.filter(
+            models_v2.Port.network_id == network_id,
+            models_v2.Port.mac_address.in_(mac_addresses))
+        return set(row[0] for row in mac_qry)
+
     @staticmethod
     def _hold_ip(context, network_id, subnet_id, port_id, ip_address):
         alloc_qry = context.session.query(
@@ -320,9 +412,12 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
 
     @staticmethod
     def _recycle_expired_ip_allocations(context, network_id):
-        """Return held ip allocations with expired leases back to the pool."""
+        """Return held ip allocations with expired leases back to the pool.
+
+        :returns: the number of recycled allocations.
+        """
         if network_id in getattr(context, '_recycled_networks', set()):
-            return
+            return 0
 
         expired_qry = context.session.query(
             models_v2.IPAllocation).with_lockmode('update')
@@ -331,97 +426,71 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
         expired_qry = expired_qry.filter(
             models_v2.IPAllocation.expiration <= timeutils.utcnow())
 
+        recycled = 0
         for expired in expired_qry:
             QuantumDbPluginV2._recycle_ip(context,
                                           network_id,
                                           expired['subnet_id'],
                                           expired['ip_address'])
+            recycled += 1
 
         if hasattr(context, '_recycled_networks'):
             context._recycled_networks.add(network_id)
         else:
             context._recycled_networks = set([network_id])
+        return recycled
+
+    @staticmethod
+    def _recycle_in_request(context, network_id):
+        """Recycle the expired allocations of the network unless the
+        periodic recycling task takes care of it.
+        """
+        if cfg.CONF.ip_recycle_interval <= 0:
+            QuantumDbPluginV2._recycle_expired_ip_allocations(context,
+                                                              network_id)
+
+    def recycle_expired_ip_allocations(self, context):
+        """Return the held ip allocations of all networks with expired
+        leases back to their pools.
+
+        The allocations are recycled in transactions of at most
+        ip_recycle_batch_size allocations, the oldest first.
+
+        :returns: the number of recycled allocations.
+        """
+        batch_size = cfg.CONF.ip_recycle_batch_size
+        IPAllocation = models_v2.IPAllocation
+        backend = ipam.get_backend()
+        recycled = 0
+        while True:
+            with context.session.begin(subtransactions=True):
+                expired_qry = context.session.query(
+                    IPAllocation).with_lockmode('update')
+                expired_qry = expired_qry.filter_by(port_id=None)
+                expired_qry = expired_qry.filter(
+                    IPAllocation.expiration <= timeutils.utcnow())
+                expired = expired_qry.order_by(
+                    IPAllocation.expiration).limit(batch_size).all()
+                subnet_ips = {}
+                for allocation in expired:
+                    subnet_ips.setdefault(allocation['subnet_id'], []).append(
+                        allocation['ip_address'])
+                    context.session.delete(allocation)
+                for subnet_id, ip_addresses in subnet_ips.iteritems():
+                    backend.release_ips(context, subnet_id, ip_addresses)
+            recycled += len(expired)
+            if len(expired) < batch_size:
+                break
+        if recycled:
+            LOG.debug(_("Recycled %s expired IP allocations"), recycled)
+        return recycled
 
     @staticmethod
     def _recycle_ip(context, network_id, subnet_id, ip_address):
         """Return an IP address to the pool of free IP's on the network
         subnet.
         """
-        # Grab all allocation pools for the subnet
-        pool_qry = context.session.query(
-            models_v2.IPAllocationPool).with_lockmode('update')
-        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
-        # Find the allocation pool for the IP to recycle
-        pool_id = None
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
-                break
-        if not pool_id:
-            error_message = _("No allocation pool found for "
-                              "ip address:%s") % ip_address
-            raise q_exc.InvalidInput(error_message=error_message)
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).with_lockmode('update')
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
+        ipam.get_backend().release_ip(context, subnet_id, ip_address)
         QuantumDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
                                                 ip_address)
 
@@ -432,22 +501,40 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
 
     def update_fixed_ip_lease_expiration(self, context, network_id,
                                          ip_address, lease_remaining):
+        self.update_fixed_ip_lease_expirations(
+            context, [{'network_id': network_id,
+                       'ip_address': ip_address,
+                       'lease_remaining': lease_remaining}])
 
-        expiration = (timeutils.utcnow() +
-                      datetime.timedelta(seconds=lease_remaining))
+    def update_fixed_ip_lease_expirations(self, context, leases):
+        """Update the expiration of several fixed IPs at once.
 
-        query = context.session.query(models_v2.IPAllocation)
-        query = query.filter_by(network_id=network_id, ip_address=ip_address)
+        :param leases: a list of dicts with network_id, ip_address and
+                       lease_remaining keys.
+        """
+        now = timeutils.utcnow()
+        expirations = {}
+        for lease in leases:
+            expirations.setdefault(lease['network_id'], {})[
+                lease['ip_address']] = now + datetime.timedelta(
+                    seconds=lease['lease_remaining'])
 
-        try:
-            with context.session.begin(subtransactions=True):
-                fixed_ip = query.one()
-                fixed_ip.expiration = expiration
-        except exc.NoResultFound:
-            LOG.debug(_("No fixed IP found that matches the network "
-                        "%(network_id)s and ip address %(ip_address)s."),
-                      {'network_id': network_id,
-                       'ip_address': ip_address})
+        IPAllocation = models_v2.IPAllocation
+        with context.session.begin(subtransactions=True):
+            for network_id, ip_expirations in expirations.iteritems():
+                query = context.session.query(IPAllocation)
+                query = query.filter(
+                    IPAllocation.network_id == network_id,
+                    IPAllocation.ip_address.in_(ip_expirations.keys()))
+                for fixed_ip in query:
+                    fixed_ip.expiration = ip_expirations.pop(
+                        fixed_ip.ip_address)
+                for ip_address in ip_expirations:
+                    LOG.debug(_("No fixed IP found that matches the network "
+                                "%(network_id)s and ip address "
+                                "%(ip_address)s."),
+                              {'network_id': network_id,
+                               'ip_address': ip_address})
 
     @staticmethod
     def _delete_ip_allocation(context, network_id, subnet_id, ip_address):
@@ -469,68 +556,37 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
         """Generate an IP address.
 
         The IP address will be generated from one of the subnets defined on
-        the network.
+        the network. If they are exhausted, the expired allocations of the
+        network are recycled without waiting for the periodic task.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
-                            "allocated"),
-                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
-                continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
-        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+        try:
+            return ipam.get_backend().generate_ip(context, subnets)
+        except q_exc.IpAddressGenerationFailure:
+            if not QuantumDbPluginV2._recycle_expired_ip_allocations(
+                    context, subnets[0]['network_id']):
+                raise
+        return ipam.get_backend().generate_ip(context, subnets)
+
+    @staticmethod
+    def _generate_ips(context, subnets, count):
+        """Generate count IP addresses.
+
+        As for _generate_ip, the expired allocations of the network are
+        recycled when the subnets are exhausted.
+        """
+        try:
+            return ipam.get_backend().generate_ips(context, subnets, count)
+        except q_exc.IpAddressGenerationFailure:
+            if not QuantumDbPluginV2._recycle_expired_ip_allocations(
+                    context, subnets[0]['network_id']):
+                raise
+        return ipam.get_backend().generate_ips(context, subnets, count)
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange,
-            models_v2.IPAllocationPool).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        results = range_qry.filter_by(subnet_id=subnet_id)
-        for (range, pool) in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=pool['id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        ipam.get_backend().allocate_specific_ip(context, subnet_id,
+                                                ip_address)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -739,6 +795,55 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
                                 'subnet_id': result['subnet_id']})
         return ips
 
+    def _allocate_ips_for_ports(self, context, network, ports):
+        """Allocate IP addresses for ports of the same network.
+
+        Ports without fixed_ips get theirs from the backend in one batch per
+        IP version; the others are handled as by _allocate_ips_for_port.
+        None of the IP addresses are stored yet, so those taken by earlier
+        ports of the batch are checked here.
+
+        :returns: the list of the IP addresses of each port.
+        :raises: IpAddressInUse
+        """
+        port_ips = [[] for p in ports]
+        auto = []
+        claimed = set()
+        for i, p in enumerate(ports):
+            if p['fixed_ips'] is attributes.ATTR_NOT_SPECIFIED:
+                auto.append(i)
+                continue
+            configured_ips = self._test_fixed_ips_for_port(context,
+                                                           p['network_id'],
+                                                           p['fixed_ips'])
+            for fixed in configured_ips:
+                if (fixed['subnet_id'],
+                        fixed.get('ip_address')) in claimed:
+                    raise q_exc.IpAddressInUse(
+                        net_id=network['id'],
+                        ip_address=fixed['ip_address'])
+            port_ips[i] = self._allocate_fixed_ips(context, network,
+                                                   configured_ips)
+            claimed.update((ip['subnet_id'], ip['ip_address'])
+                           for ip in port_ips[i])
+        if not auto:
+            return port_ips
+
+        filter = {'network_id': [network['id']]}
+        subnets = self.get_subnets(context, filters=filter)
+        for version in (4, 6):
+            version_subnets = [subnet for subnet in subnets
+                               if subnet['ip_version'] == version]
+            if not version_subnets:
+                continue
+            results = QuantumDbPluginV2._generate_ips(context,
+                                                      version_subnets,
+                                                      len(auto))
+            for i, result in zip(auto, results):
+                port_ips[i].append({'ip_address': result['ip_address'],
+                                    'subnet_id': result['subnet_id']})
+        return port_ips
+
     def _validate_subnet_cidr(self, context, network, new_subnet_cidr):
         """Validate the CIDR for a subnet.
 
@@ -894,7 +999,8 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
             tenant_ids.pop() != original.tenant_id):
             raise q_exc.InvalidSharedSetting(network=original.name)
 
-    def _make_network_dict(self, network, fields=None):
+    def _make_network_dict(self, network, fields=None,
+                           process_extensions=True):
         res = {'id': network['id'],
                'name': network['name'],
                'tenant_id': network['tenant_id'],
@@ -903,7 +1009,11 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
                'shared': network['shared'],
                'subnets': [subnet['id']
                            for subnet in network['subnets']]}
-
+        # Call auxiliary extend functions, if any
+        if process_extensions:
+            for func in self._dict_extend_functions.get(attributes.NETWORKS,
+                                                        []):
+                func(self, res, network)
         return self._fields(res, fields)
 
     def _make_subnet_dict(self, subnet, fields=None):
@@ -1024,9 +1134,11 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
             for port in ports:
                 self._delete_port(context, port['id'])
 
-            # clean up subnets
+            # clean up subnets, one by one so that the quota usage of the
+            # tenant is maintained
             subnets_qry = context.session.query(models_v2.Subnet)
-            subnets_qry.filter_by(network_id=id).delete()
+            for subnet in subnets_qry.filter_by(network_id=id):
+                context.session.delete(subnet)
             context.session.delete(network)
 
     def get_network(self, context, id, fields=None):
@@ -1306,7 +1418,87 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
                                           filters=filters)
 
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        if (getattr(self.create_port, 'im_func', None) is not
+                QuantumDbPluginV2.create_port.im_func):
+            # The plugin does more than storing the port, let it create
+            # them one by one
+            return self._create_bulk('port', context, ports)
+        return self._create_ports(context, [item['port']
+                                            for item in ports['ports']])
+
+    def _process_port_create(self, context, port_data, port):
+        """Process the plugin specific attributes of a new port.
+
+        Called by create_port and _create_ports for every port, within the
+        transaction creating it. port_data holds the attributes of the
+        request, port the dict of the created port, which can be extended.
+        """
+        pass
+
+    def _process_ports_created(self, context, ports):
+        """Notify the creation of ports, once their transaction is done."""
+        pass
+
+    def _create_ports(self, context, ports):
+        """Create the ports within a single transaction.
+
+        MAC and IP addresses are allocated for all the ports of a network
+        at once, and the rows of all the ports are flushed together.
+        Plugins which do their port processing in _process_port_create and
+        _process_ports_created can override create_port_bulk to call it.
+        """
+        port_ids = [p.get('id') or uuidutils.generate_uuid() for p in ports]
+        # NOTE(jkoelker) Get the tenant_id outside of the session to avoid
+        #                unneeded db action if the operation raises
+        tenant_ids = [self._get_tenant_id_for_create(context, p)
+                      for p in ports]
+        by_network = {}
+        for i, p in enumerate(ports):
+            by_network.setdefault(p['network_id'], []).append(i)
+
+        macs = [None] * len(ports)
+        port_ips = [None] * len(ports)
+        with context.session.begin(subtransactions=True):
+            for network_id, indexes in by_network.iteritems():
+                self._recycle_in_request(context, network_id)
+                network = self._get_network(context, network_id)
+                network_macs = QuantumDbPluginV2._generate_macs(
+                    context, network_id,
+                    [ports[i]['mac_address'] for i in indexes])
+                network_ips = self._allocate_ips_for_ports(
+                    context, network, [ports[i] for i in indexes])
+                for i, mac_address, ips in zip(indexes, network_macs,
+                                               network_ips):
+                    macs[i] = mac_address
+                    port_ips[i] = ips
+
+            results = []
+            for i, p in enumerate(ports):
+                port = {'tenant_id': tenant_ids[i],
+                        'name': p['name'],
+                        'id': port_ids[i],
+                        'network_id': p['network_id'],
+                        'mac_address': macs[i],
+                        'admin_state_up': p['admin_state_up'],
+                        'status': p.get('status',
+                                        constants.PORT_STATUS_ACTIVE),
+                        'device_id': p['device_id'],
+                        'device_owner': p['device_owner']}
+                context.session.add(models_v2.Port(**port))
+                expiration = self._default_allocation_expiration()
+                for ip in port_ips[i]:
+                    context.session.add(models_v2.IPAllocation(
+                        network_id=p['network_id'],
+                        port_id=port_ids[i],
+                        ip_address=ip['ip_address'],
+                        subnet_id=ip['subnet_id'],
+                        expiration=expiration))
+                port['fixed_ips'] = port_ips[i]
+                result = self._make_port_dict(port, process_extensions=False)
+                self._process_port_create(context, p, result)
+                results.append(result)
+        self._process_ports_created(context, results)
+        return results
 
     def create_port(self, context, port):
         p = port['port']
@@ -1318,7 +1510,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
         tenant_id = self._get_tenant_id_for_create(context, p)
 
         with context.session.begin(subtransactions=True):
-            self._recycle_expired_ip_allocations(context, network_id)
+            self._recycle_in_request(context, network_id)
             network = self._get_network(context, network_id)
 
             # Ensure that a MAC address is defined and it is unique on the
@@ -1373,7 +1565,12 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
                     )
                     context.session.add(allocated)
 
-        return self._make_port_dict(port, process_extensions=False)
+            # Load the IP allocations of the port into its dict
+            context.session.flush()
+            result = self._make_port_dict(port, process_extensions=False)
+            self._process_port_create(context, p, result)
+        self._process_ports_created(context, [result])
+        return result
 
     def update_port(self, context, id, port):
         p = port['port']
@@ -1384,8 +1581,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
             # Check if the IPs need to be updated
             if 'fixed_ips' in p:
                 changed_ips = True
-                self._recycle_expired_ip_allocations(context,
-                                                     port['network_id'])
+                self._recycle_in_request(context, port['network_id'])
                 original = self._make_port_dict(port, process_extensions=False)
                 added_ips, prev_ips = self._update_ips_for_port(
                     context, port["network_id"], id, original["fixed_ips"],
@@ -1490,3 +1686,10 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2,
 
     def get_ports_count(self, context, filters=None):
         return self._get_ports_query(context, filters).count()
+
+
+# The usage of the core resources is tracked in the database
+quota_db.register_tracked_resources(QuantumDbPluginV2,
+                                    {'network': models_v2.Network,
+                                     'subnet': models_v2.Subnet,
+                                     'port': models_v2.Port})
@@ -191,3 +191,14 @@ class DhcpRpcCallbackMixin(object):
 
         plugin.update_fixed_ip_lease_expiration(context, network_id,
                                                 ip_address, lease_remaining)
+
+    def update_leases_expiration(self, context, **kwargs):
+        """Update the expiration of several fixed_ips at once."""
+        host = kwargs.get('host')
+        leases = kwargs.get('leases', [])
+
+        LOG.debug(_('Updating %(count)s lease expirations from %(host)s.'),
+                  {'count': len(leases), 'host': host})
+        plugin = manager.QuantumManager.get_plugin()
+
+        plugin.update_fixed_ip_lease_expirations(context, leases)
@@ -0,0 +1,726 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+IP address management backends for QuantumDbPluginV2.
+
+A backend owns the IPAvailabilityRange rows of every allocation pool and is
+responsible for taking addresses out of them and putting them back.
+"""
+
+import bisect
+import random
+
+import netaddr
+from oslo.config import cfg
+from sqlalchemy import sql
+from sqlalchemy.orm import exc
+
+from quantum.common import exceptions as q_exc
+from quantum.db import models_v2
+from quantum.openstack.common import importutils
+from quantum.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+ipam_opts = [
+    cfg.StrOpt('ipam_driver',
+               default='quantum.db.ipam.LockingIpamBackend',
+               help=_("The IPAM backend used to allocate and recycle "
+                      "fixed IP addresses")),
+    cfg.IntOpt('ipam_cas_retries', default=10,
+               help=_("Number of times the optimistic IPAM backend retries "
+                      "an allocation that lost a race with a concurrent "
+                      "request")),
+]
+cfg.CONF.register_opts(ipam_opts)
+
+_BACKENDS = {}
+
+
+def get_backend():
+    """Return the IPAM backend selected by the ipam_driver option."""
+    driver = cfg.CONF.ipam_driver
+    if driver not in _BACKENDS:
+        _BACKENDS[driver] = importutils.import_object(driver)
+    return _BACKENDS[driver]
+
+
+class IPRangeSet(object):
+    """Ordered set of disjoint, inclusive integer IP intervals.
+
+    Intervals are kept in two parallel sorted lists so that finding the
+    interval holding an address, or the neighbours of a recycled address,
+    is a binary search rather than a walk over every range of the pool.
+    """
+
+    def __init__(self, version, ranges=()):
+        self.version = version
+        ranges = sorted(ranges)
+        self._firsts = [first for first, last in ranges]
+        self._lasts = [last for first, last in ranges]
+
+    def __len__(self):
+        return len(self._firsts)
+
+    def __iter__(self):
+        return iter(zip(self._firsts, self._lasts))
+
+    def __contains__(self, ip):
+        return self.find(ip) is not None
+
+    def find(self, ip):
+        """Return the (first, last) interval containing ip, or None."""
+        idx = bisect.bisect_right(self._firsts, ip) - 1
+        if idx >= 0 and self._lasts[idx] >= ip:
+            return self._firsts[idx], self._lasts[idx]
+
+    def remove(self, ip):
+        """Take ip out of the set.
+
+        :returns: a tuple of the interval that held ip and the list of
+                  intervals replacing it (empty, one or two items), or None
+                  if ip was not in the set.
+        """
+        idx = bisect.bisect_right(self._firsts, ip) - 1
+        if idx < 0 or self._lasts[idx] < ip:
+            return
+        first, last = self._firsts[idx], self._lasts[idx]
+        new = []
+        if first < ip:
+            new.append((first, ip - 1))
+        if ip < last:
+            new.append((ip + 1, last))
+        self._firsts[idx:idx + 1] = [f for f, l in new]
+        self._lasts[idx:idx + 1] = [l for f, l in new]
+        return (first, last), new
+
+    def add(self, ip):
+        """Put ip back into the set, merging it with adjacent intervals.
+
+        :returns: a tuple of the list of intervals that were absorbed and
+                  the resulting interval, or None if ip was already held.
+        """
+        idx = bisect.bisect_right(self._firsts, ip)
+        if idx > 0 and self._lasts[idx - 1] >= ip:
+            return
+        merged = []
+        lo = hi = idx
+        first = last = ip
+        if idx > 0 and self._lasts[idx - 1] == ip - 1:
+            lo = idx - 1
+            first = self._firsts[lo]
+            merged.append((first, self._lasts[lo]))
+        if idx < len(self._firsts) and self._firsts[idx] == ip + 1:
+            hi = idx + 1
+            last = self._lasts[idx]
+            merged.append((self._firsts[idx], last))
+        self._firsts[lo:hi] = [first]
+        self._lasts[lo:hi] = [last]
+        return merged, (first, last)
+
+    def size(self):
+        """Return the number of addresses held by the set."""
+        return sum(last - first + 1
+                   for first, last in zip(self._firsts, self._lasts))
+
+    def first(self):
+        """Return the lowest address held by the set, or None."""
+        if self._firsts:
+            return self._firsts[0]
+
+    def choice(self):
+        """Return the first address of a randomly picked interval."""
+        if self._firsts:
+            return random.choice(self._firsts)
+
+    def to_str(self, ip):
+        return str(netaddr.IPAddress(ip, self.version))
+
+
+class IpamBackend(object):
+    """Base class for IPAM backends.
+
+    All methods are called within the caller's transaction.
+    """
+
+    def generate_ip(self, context, subnets):
+        """Allocate any free address from one of the given subnets.
+
+        :returns: a dict with 'ip_address' and 'subnet_id' keys.
+        :raises: IpAddressGenerationFailure when the subnets are exhausted.
+        """
+        raise NotImplementedError()
+
+    def generate_ips(self, context, subnets, count):
+        """Allocate count free addresses from the given subnets.
+
+        :returns: a list of dicts with 'ip_address' and 'subnet_id' keys.
+        :raises: IpAddressGenerationFailure when the subnets are exhausted,
+                 in which case no address is taken.
+        """
+        ips = []
+        try:
+            for i in range(count):
+                ips.append(self.generate_ip(context, subnets))
+        except q_exc.IpAddressGenerationFailure:
+            self._release_generated(context, ips)
+            raise
+        return ips
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Remove ip_address from the free ranges of the subnet, if there."""
+        raise NotImplementedError()
+
+    def release_ip(self, context, subnet_id, ip_address):
+        """Return ip_address to the free ranges of its allocation pool.
+
+        :raises: InvalidInput when no pool of the subnet holds ip_address.
+        """
+        raise NotImplementedError()
+
+    def release_ips(self, context, subnet_id, ip_addresses):
+        """Return several addresses of a subnet to their allocation pools.
+
+        Addresses out of the pools of the subnet are skipped.
+        """
+        for ip_address in ip_addresses:
+            try:
+                self.release_ip(context, subnet_id, ip_address)
+            except q_exc.InvalidInput:
+                LOG.debug(_("IP %(ip_address)s of subnet %(subnet_id)s is "
+                            "not recycled"),
+                          {'ip_address': ip_address, 'subnet_id': subnet_id})
+
+    def _release_generated(self, context, ips):
+        """Give back the addresses taken by a failed generate_ips."""
+        subnet_ips = {}
+        for ip in ips:
+            subnet_ips.setdefault(ip['subnet_id'], []).append(
+                ip['ip_address'])
+        for subnet_id, ip_addresses in subnet_ips.iteritems():
+            self.release_ips(context, subnet_id, ip_addresses)
+
+    @staticmethod
+    def _no_pool_found(ip_address):
+        error_message = _("No allocation pool found for "
+                          "ip address:%s") % ip_address
+        raise q_exc.InvalidInput(error_message=error_message)
+
+
+class LockingIpamBackend(IpamBackend):
+    """Serialize allocations with SELECT ... FOR UPDATE on the range rows."""
+
+    def generate_ip(self, context, subnets):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        for subnet in subnets:
+            range = range_qry.filter_by(subnet_id=subnet['id']).first()
+            if not range:
+                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                            "allocated"),
+                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+                continue
+            ip_address = range['first_ip']
+            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
+                        "to %(last_ip)s"),
+                      {'ip_address': ip_address,
+                       'first_ip': range['first_ip'],
+                       'last_ip': range['last_ip']})
+            if range['first_ip'] == range['last_ip']:
+                # No more free indices on subnet => delete
+                LOG.debug(_("No more free IP's in slice. Deleting allocation "
+                            "pool."))
+                context.session.delete(range)
+            else:
+                # increment the first free
+                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def generate_ips(self, context, subnets, count):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        subnet_ranges = []
+        free = 0
+        for subnet in subnets:
+            ranges = sorted(range_qry.filter_by(subnet_id=subnet['id']),
+                            key=lambda r: netaddr.IPAddress(r['first_ip']))
+            subnet_ranges.append((subnet, ranges))
+            free += sum(int(netaddr.IPAddress(r['last_ip'])) -
+                        int(netaddr.IPAddress(r['first_ip'])) + 1
+                        for r in ranges)
+        if free < count:
+            # Fail before touching any range
+            raise q_exc.IpAddressGenerationFailure(
+                net_id=subnets[0]['network_id'])
+
+        ips = []
+        for subnet, ranges in subnet_ranges:
+            for ip_range in ranges:
+                # Take as many consecutive addresses as needed from the
+                # start of the range
+                first_ip = netaddr.IPAddress(ip_range['first_ip'])
+                last_ip = netaddr.IPAddress(ip_range['last_ip'])
+                taken = min(count - len(ips),
+                            int(last_ip) - int(first_ip) + 1)
+                ips.extend({'ip_address': str(first_ip + i),
+                            'subnet_id': subnet['id']}
+                           for i in range(taken))
+                LOG.debug(_("Allocated %(count)s IPs from %(first_ip)s to "
+                            "%(last_ip)s"),
+                          {'count': taken,
+                           'first_ip': ip_range['first_ip'],
+                           'last_ip': ip_range['last_ip']})
+                if first_ip + taken > last_ip:
+                    context.session.delete(ip_range)
+                else:
+                    ip_range['first_ip'] = str(first_ip + taken)
+                if len(ips) == count:
+                    return ips
+            LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                        "allocated"),
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange,
+            models_v2.IPAllocationPool).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        results = range_qry.filter_by(subnet_id=subnet_id)
+        for (range, pool) in results:
+            first = int(netaddr.IPAddress(range['first_ip']))
+            last = int(netaddr.IPAddress(range['last_ip']))
+            if first <= ip <= last:
+                if first == last:
+                    context.session.delete(range)
+                    return
+                elif first == ip:
+                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+                    return
+                elif last == ip:
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    return
+                else:
+                    # Split into two ranges
+                    new_first = str(netaddr.IPAddress(ip_address) + 1)
+                    new_last = range['last_ip']
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    ip_range = models_v2.IPAvailabilityRange(
+                        allocation_pool_id=pool['id'],
+                        first_ip=new_first,
+                        last_ip=new_last)
+                    context.session.add(ip_range)
+                    return
+
+    def release_ip(self, context, subnet_id, ip_address):
+        # Grab all allocation pools for the subnet
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool).with_lockmode('update')
+        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
+        # Find the allocation pool for the IP to recycle
+        pool_id = None
+        for allocation_pool in allocation_pools:
+            allocation_pool_range = netaddr.IPRange(
+                allocation_pool['first_ip'],
+                allocation_pool['last_ip'])
+            if netaddr.IPAddress(ip_address) in allocation_pool_range:
+                pool_id = allocation_pool['id']
+                break
+        if not pool_id:
+            self._no_pool_found(ip_address)
+        # Two requests will be done on the database. The first will be to
+        # search if an entry starts with ip_address + 1 (r1). The second
+        # will be to see if an entry ends with ip_address -1 (r2).
+        # If 1 of the above holds true then the specific entry will be
+        # modified. If both hold true then the two ranges will be merged.
+        # If there are no entries then a single entry will be added.
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        ip_first = str(netaddr.IPAddress(ip_address) + 1)
+        ip_last = str(netaddr.IPAddress(ip_address) - 1)
+        LOG.debug(_("Recycle %s"), ip_address)
+        try:
+            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     first_ip=ip_first).one()
+            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        except exc.NoResultFound:
+            r1 = []
+        try:
+            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     last_ip=ip_last).one()
+            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        except exc.NoResultFound:
+            r2 = []
+
+        if r1 and r2:
+            # Merge the two ranges
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=r2['first_ip'],
+                last_ip=r1['last_ip'])
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
+                        "%(first_ip2)s-%(last_ip2)s"),
+                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
+                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
+            context.session.delete(r1)
+            context.session.delete(r2)
+        elif r1:
+            # Update the range with matched first IP
+            r1['first_ip'] = ip_address
+            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        elif r2:
+            # Update the range with matched last IP
+            r2['last_ip'] = ip_address
+            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        else:
+            # Create a new range
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=ip_address,
+                last_ip=ip_address)
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': ip_address, 'last_ip': ip_address})
+
+
+class OptimisticIpamBackend(IpamBackend):
+    """Lock-free IPAM using compare-and-swap on the availability ranges.
+
+    The free ranges of a subnet are read without any row lock and loaded
+    into an IPRangeSet per allocation pool. The change is then committed
+    by deleting the exact (pool, first_ip, last_ip) row that was read and
+    inserting its replacements; a delete matching no row means another
+    request got there first, so the ranges are read again and the
+    operation retried.
+
+    A single address is taken from one free range of the subnet picked at
+    random, which spreads concurrent requests on the same subnet over
+    distinct rows; only that range is read. Likewise, recycling an address
+    only reads the ranges it merges with, and allocating a specific
+    address only locks the range holding it.
+
+    The retries run within the caller's transaction, where a plain read
+    may keep returning the snapshot taken by its first read (REPEATABLE
+    READ). They therefore read the ranges with SELECT ... FOR UPDATE,
+    which returns the latest committed rows under any isolation level;
+    row locks are only taken once a conflict has been seen.
+    """
+
+    def _get_pools(self, context, subnet_id):
+        IPAllocationPool = models_v2.IPAllocationPool
+        pool_qry = context.session.query(IPAllocationPool.id,
+                                         IPAllocationPool.first_ip,
+                                         IPAllocationPool.last_ip)
+        return pool_qry.filter(IPAllocationPool.subnet_id == subnet_id).all()
+
+    def _get_pool_id(self, context, subnet_id, ip):
+        """Return the id of the allocation pool holding ip, or None."""
+        for pool in self._get_pools(context, subnet_id):
+            if ip in netaddr.IPRange(pool.first_ip, pool.last_ip):
+                return pool.id
+
+    def _get_range_sets(self, context, pool_ids, lock=False, criterion=None):
+        """Build an IPRangeSet holding the free ranges of each pool.
+
+        :param lock: read the current rows with SELECT ... FOR UPDATE.
+        :param criterion: only read the ranges matching this clause.
+        """
+        if not pool_ids:
+            return {}
+        ranges = dict((pool_id, []) for pool_id in pool_ids)
+        IPAvailabilityRange = models_v2.IPAvailabilityRange
+        range_qry = context.session.query(
+            IPAvailabilityRange.allocation_pool_id,
+            IPAvailabilityRange.first_ip,
+            IPAvailabilityRange.last_ip)
+        range_qry = range_qry.filter(
+            IPAvailabilityRange.allocation_pool_id.in_(pool_ids))
+        if criterion is not None:
+            range_qry = range_qry.filter(criterion)
+        if lock:
+            range_qry = range_qry.with_lockmode('update')
+        version = None
+        for pool_id, first_ip, last_ip in range_qry:
+            first = netaddr.IPAddress(first_ip)
+            version = first.version
+            ranges[pool_id].append((int(first),
+                                    int(netaddr.IPAddress(last_ip))))
+        return dict((pool_id, IPRangeSet(version, pool_ranges))
+                    for pool_id, pool_ranges in ranges.iteritems()
+                    if pool_ranges)
+
+    def _get_neighbours(self, context, pool_id, ips, lock=False):
+        """Build an IPRangeSet of the free ranges of a pool adjacent to ips.
+
+        As in LockingIpamBackend.release_ip, these are the ranges starting
+        right after or ending right before one of the addresses.
+        """
+        IPAvailabilityRange = models_v2.IPAvailabilityRange
+        criterion = sql.or_(
+            IPAvailabilityRange.first_ip.in_([str(ip + 1) for ip in ips]),
+            IPAvailabilityRange.last_ip.in_([str(ip - 1) for ip in ips]))
+        return self._get_range_sets(
+            context, [pool_id], lock=lock, criterion=criterion).get(
+                pool_id, IPRangeSet(ips[0].version))
+
+    def _get_holder(self, context, pool_id, ip, lock=False):
+        """Build an IPRangeSet of the free range of a pool holding ip.
+
+        Addresses are stored as strings, which the database cannot compare
+        as addresses, so the range is found by a plain read of the ranges
+        of the pool. With lock, only that range is then read again with
+        SELECT ... FOR UPDATE; the ranges of the whole pool are locked only
+        if it changed since the plain read, whose snapshot may be stale.
+
+        :returns: an IPRangeSet holding the range, or None if ip is not free.
+        """
+        range_set = self._get_range_sets(context, [pool_id]).get(pool_id)
+        held = range_set and range_set.find(int(ip))
+        if lock and held:
+            IPAvailabilityRange = models_v2.IPAvailabilityRange
+            criterion = sql.and_(
+                IPAvailabilityRange.first_ip == range_set.to_str(held[0]),
+                IPAvailabilityRange.last_ip == range_set.to_str(held[1]))
+            if not self._get_range_sets(context, [pool_id], lock=True,
+                                        criterion=criterion):
+                held = None
+        if lock and not held:
+            range_set = self._get_range_sets(
+                context, [pool_id], lock=True).get(pool_id)
+            held = range_set and range_set.find(int(ip))
+        if held:
+            return IPRangeSet(ip.version, [held])
+
+    def _pick_range(self, context, subnet_id, lock=False):
+        """Read one free range of the subnet, picked at random.
+
+        :param lock: read the current row with SELECT ... FOR UPDATE.
+        :returns: a tuple of the allocation pool id and an IPRangeSet
+                  holding the range, or None if the subnet is exhausted.
+        """
+        IPAvailabilityRange = models_v2.IPAvailabilityRange
+        IPAllocationPool = models_v2.IPAllocationPool
+        range_qry = context.session.query(
+            IPAvailabilityRange.allocation_pool_id,
+            IPAvailabilityRange.first_ip,
+            IPAvailabilityRange.last_ip)
+        range_qry = range_qry.join(
+            IPAllocationPool,
+            IPAllocationPool.id == IPAvailabilityRange.allocation_pool_id)
+        range_qry = range_qry.filter(IPAllocationPool.subnet_id == subnet_id)
+        count = range_qry.count()
+        if not count:
+            return
+        if lock:
+            range_qry = range_qry.with_lockmode('update')
+        # The ranges may have changed since they were counted
+        row = (range_qry.offset(random.randrange(count)).first() or
+               range_qry.first())
+        if not row:
+            return
+        pool_id, first_ip, last_ip = row
+        first = netaddr.IPAddress(first_ip)
+        return pool_id, IPRangeSet(first.version,
+                                   [(int(first),
+                                     int(netaddr.IPAddress(last_ip)))])
+
+    def _swap(self, context, pool_id, range_set, old, new):
+        """Replace the free ranges old by new if old are still current.
+
+        :returns: False if another transaction changed one of the rows.
+        """
+        range_qry = context.session.query(models_v2.IPAvailabilityRange)
+        deleted = []
+        for first, last in old:
+            row = {'allocation_pool_id': pool_id,
+                   'first_ip': range_set.to_str(first),
+                   'last_ip': range_set.to_str(last)}
+            if not range_qry.filter_by(**row).delete():
+                LOG.debug(_("Range %(first_ip)s-%(last_ip)s of pool "
+                            "%(allocation_pool_id)s changed concurrently"),
+                          row)
+                # Put back what this attempt already took so that the
+                # next read sees the ranges as other transactions do
+                for row in deleted:
+                    context.session.add(models_v2.IPAvailabilityRange(**row))
+                context.session.flush()
+                return False
+            deleted.append(row)
+        for first, last in new:
+            context.session.add(models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=range_set.to_str(first),
+                last_ip=range_set.to_str(last)))
+        context.session.flush()
+        return True
+
+    def generate_ip(self, context, subnets):
+        for attempt in range(cfg.CONF.ipam_cas_retries):
+            for subnet in subnets:
+                picked = self._pick_range(context, subnet['id'],
+                                          lock=bool(attempt))
+                if not picked:
+                    LOG.debug(_("All IP's from subnet %(subnet_id)s "
+                                "(%(cidr)s) allocated"),
+                              {'subnet_id': subnet['id'],
+                               'cidr': subnet['cidr']})
+                    continue
+                pool_id, range_set = picked
+                ip = range_set.first()
+                old, new = range_set.remove(ip)
+                if self._swap(context, pool_id, range_set, [old], new):
+                    ip_address = range_set.to_str(ip)
+                    LOG.debug(_("Allocated IP - %(ip_address)s from "
+                                "%(first_ip)s to %(last_ip)s"),
+                              {'ip_address': ip_address,
+                               'first_ip': range_set.to_str(old[0]),
+                               'last_ip': range_set.to_str(old[1])})
+                    return {'ip_address': ip_address,
+                            'subnet_id': subnet['id']}
+                break
+            else:
+                raise q_exc.IpAddressGenerationFailure(
+                    net_id=subnets[0]['network_id'])
+        raise q_exc.IpAllocationConflict(
+            subnet_id=subnets[0]['id'], attempts=cfg.CONF.ipam_cas_retries)
+
+    def generate_ips(self, context, subnets, count):
+        ips = []
+        for attempt in range(cfg.CONF.ipam_cas_retries):
+            conflict = False
+            subnet_range_sets = []
+            for subnet in subnets:
+                pools = self._get_pools(context, subnet['id'])
+                subnet_range_sets.append(
+                    (subnet, self._get_range_sets(context,
+                                                  [p.id for p in pools],
+                                                  lock=bool(attempt))))
+            free = sum(range_set.size()
+                       for subnet, range_sets in subnet_range_sets
+                       for range_set in range_sets.itervalues())
+            if free < count - len(ips):
+                # Give back what earlier attempts took, so that the
+                # caller may recycle addresses and try again
+                self._release_generated(context, ips)
+                raise q_exc.IpAddressGenerationFailure(
+                    net_id=subnets[0]['network_id'])
+            for subnet, range_sets in subnet_range_sets:
+                pool_ids = range_sets.keys()
+                random.shuffle(pool_ids)
+                for pool_id in pool_ids:
+                    range_set = range_sets[pool_id]
+                    # Take the addresses out of the in-memory set, starting
+                    # from random ranges, then swap the ranges that changed
+                    # all at once
+                    old = set(range_set)
+                    taken = []
+                    while range_set and len(ips) + len(taken) < count:
+                        ip = range_set.choice()
+                        range_set.remove(ip)
+                        taken.append(ip)
+                    new = set(range_set)
+                    if not self._swap(context, pool_id, range_set,
+                                      sorted(old - new), sorted(new - old)):
+                        conflict = True
+                        break
+                    ips.extend({'ip_address': range_set.to_str(ip),
+                                'subnet_id': subnet['id']} for ip in taken)
+                    if len(ips) == count:
+                        return ips
+                if conflict:
+                    break
+            else:
+                raise q_exc.IpAddressGenerationFailure(
+                    net_id=subnets[0]['network_id'])
+        raise q_exc.IpAllocationConflict(
+            subnet_id=subnets[0]['id'], attempts=cfg.CONF.ipam_cas_retries)
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = netaddr.IPAddress(ip_address)
+        pool_id = self._get_pool_id(context, subnet_id, ip)
+        if not pool_id:
+            return
+        for attempt in range(cfg.CONF.ipam_cas_retries):
+            range_set = self._get_holder(context, pool_id, ip,
+                                         lock=bool(attempt))
+            if not range_set:
+                return
+            old, new = range_set.remove(int(ip))
+            if self._swap(context, pool_id, range_set, [old], new):
+                return
+        raise q_exc.IpAllocationConflict(
+            subnet_id=subnet_id, attempts=cfg.CONF.ipam_cas_retries)
+
+    def release_ip(self, context, subnet_id, ip_address):
+        ip = netaddr.IPAddress(ip_address)
+        pool_id = self._get_pool_id(context, subnet_id, ip)
+        if not pool_id:
+            self._no_pool_found(ip_address)
+        for attempt in range(cfg.CONF.ipam_cas_retries):
+            range_set = self._get_neighbours(context, pool_id, [ip],
+                                             lock=bool(attempt))
+            merged, new = range_set.add(int(ip))
+            LOG.debug(_("Recycle %(ip_address)s into %(first_ip)s-"
+                        "%(last_ip)s"),
+                      {'ip_address': ip_address,
+                       'first_ip': range_set.to_str(new[0]),
+                       'last_ip': range_set.to_str(new[1])})
+            if self._swap(context, pool_id, range_set, merged, [new]):
+                return
+        raise q_exc.IpAllocationConflict(
+            subnet_id=subnet_id, attempts=cfg.CONF.ipam_cas_retries)
+
+    def release_ips(self, context, subnet_id, ip_addresses):
+        pools = self._get_pools(context, subnet_id)
+        pool_ips = {}
+        for ip_address in ip_addresses:
+            ip = netaddr.IPAddress(ip_address)
+            for pool in pools:
+                if ip in netaddr.IPRange(pool.first_ip, pool.last_ip):
+                    pool_ips.setdefault(pool.id, []).append(ip)
+                    break
+            else:
+                LOG.debug(_("IP %(ip_address)s of subnet %(subnet_id)s is "
+                            "not recycled"),
+                          {'ip_address': ip_address, 'subnet_id': subnet_id})
+        for pool_id, ips in pool_ips.iteritems():
+            for attempt in range(cfg.CONF.ipam_cas_retries):
+                range_set = self._get_neighbours(context, pool_id, ips,
+                                                 lock=bool(attempt))
+                old = set(range_set)
+                for ip in ips:
+                    range_set.add(int(ip))
+                new = set(range_set)
+                LOG.debug(_("Recycle %(count)s IPs into pool %(pool_id)s"),
+                          {'count': len(ips), 'pool_id': pool_id})
+                if self._swap(context, pool_id, range_set,
+                              sorted(old - new), sorted(new - old)):
+                    break
+            else:
+                raise q_exc.IpAllocationConflict(
+                    subnet_id=subnet_id, attempts=cfg.CONF.ipam_cas_retries)
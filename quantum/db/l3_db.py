@@ -57,12 +57,20 @@ class Router(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     admin_state_up = sa.Column(sa.Boolean)
     gw_port_id = sa.Column(sa.String(36), sa.ForeignKey('ports.id'))
     gw_port = orm.relationship(models_v2.Port)
+    # Incremented on each change of the router notified to the l3 agents
+    revision = sa.Column(sa.Integer, nullable=False, default=0)
 
 
 class ExternalNetwork(model_base.BASEV2):
     network_id = sa.Column(sa.String(36),
                            sa.ForeignKey('networks.id', ondelete="CASCADE"),
                            primary_key=True)
+    # Add a relationship to the Network model in order to instruct
+    # SQLAlchemy to eagerly load the external flag of networks
+    network = orm.relationship(
+        models_v2.Network,
+        backref=orm.backref("external", lazy='joined',
+                            uselist=False, cascade='delete'))
 
 
 class FloatingIP(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
@@ -124,6 +132,33 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             raise l3.RouterNotFound(router_id=id)
         return router
 
+    def _bump_router_revision(self, context, router_id):
+        """Increment the revision of a router and return the new one."""
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(Router).filter_by(id=router_id)
+            query.update({'revision': Router.revision + 1},
+                         synchronize_session=False)
+            return context.session.query(Router.revision).filter_by(
+                id=router_id).scalar()
+
+    def _notify_router_delta(self, context, router_id, updated=None,
+                             removed=None, operation=None, data=None):
+        """Notify the l3 agents of a change of part of a router.
+
+        updated maps router keys (interfaces, floating IPs) to the items
+        which were added or modified, removed maps them to the ids of the
+        items which were removed. The whole router is sent instead if no
+        agent hosts it yet, so that it gets scheduled.
+        """
+        delta = {'revision': self._bump_router_revision(context, router_id),
+                 'updated': updated or {},
+                 'removed': removed or {}}
+        if not l3_rpc_agent_api.L3AgentNotify.router_delta(
+                context, router_id, delta):
+            routers = self.get_sync_data(context.elevated(), [router_id])
+            l3_rpc_agent_api.L3AgentNotify.routers_updated(
+                context, routers, operation, data)
+
     def _make_router_dict(self, router, fields=None,
                           process_extensions=True):
         res = {'id': router['id'],
@@ -176,6 +211,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             # Ensure we actually have something to update
             if r.keys():
                 router_db.update(r)
+            self._bump_router_revision(context, id)
         routers = self.get_sync_data(context.elevated(),
                                      [router_db['id']])
         l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
@@ -374,11 +410,13 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                  'device_owner': DEVICE_OWNER_ROUTER_INTF,
                  'name': ''}})
 
-        routers = self.get_sync_data(context.elevated(), [router_id])
-        l3_rpc_agent_api.L3AgentNotify.routers_updated(
-            context, routers, 'add_router_interface',
-            {'network_id': port['network_id'],
-             'subnet_id': subnet_id})
+        self._notify_router_delta(
+            context, router_id,
+            updated={l3_constants.INTERFACE_KEY:
+                     [self._get_sync_interface(context, port['id'])]},
+            operation='add_router_interface',
+            data={'network_id': port['network_id'],
+                  'subnet_id': subnet_id})
         info = {'id': router_id,
                 'tenant_id': subnet['tenant_id'],
                 'port_id': port['id'],
@@ -451,11 +489,12 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             if not found:
                 raise l3.RouterInterfaceNotFoundForSubnet(router_id=router_id,
                                                           subnet_id=subnet_id)
-        routers = self.get_sync_data(context.elevated(), [router_id])
-        l3_rpc_agent_api.L3AgentNotify.routers_updated(
-            context, routers, 'remove_router_interface',
-            {'network_id': _network_id,
-             'subnet_id': subnet_id})
+        self._notify_router_delta(
+            context, router_id,
+            removed={l3_constants.INTERFACE_KEY: [port_id]},
+            operation='remove_router_interface',
+            data={'network_id': _network_id,
+                  'subnet_id': subnet_id})
         info = {'id': router_id,
                 'tenant_id': subnet['tenant_id'],
                 'port_id': port_id,
@@ -665,12 +704,14 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                                    floatingip_db, external_port)
             context.session.add(floatingip_db)
 
+        floatingip = self._make_floatingip_dict(floatingip_db)
         router_id = floatingip_db['router_id']
         if router_id:
-            routers = self.get_sync_data(context.elevated(), [router_id])
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers,
-                                                           'create_floatingip')
-        return self._make_floatingip_dict(floatingip_db)
+            self._notify_router_delta(
+                context, router_id,
+                updated={l3_constants.FLOATINGIP_KEY: [floatingip]},
+                operation='create_floatingip')
+        return floatingip
 
     def update_floatingip(self, context, id, floatingip):
         fip = floatingip['floatingip']
@@ -683,17 +724,19 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             self._update_fip_assoc(context, fip, floatingip_db,
                                    self.get_port(context.elevated(),
                                                  fip_port_id))
-        router_ids = []
-        if before_router_id:
-            router_ids.append(before_router_id)
+        floatingip = self._make_floatingip_dict(floatingip_db)
         router_id = floatingip_db['router_id']
-        if router_id and router_id != before_router_id:
-            router_ids.append(router_id)
-        if router_ids:
-            routers = self.get_sync_data(context.elevated(), router_ids)
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers,
-                                                           'update_floatingip')
-        return self._make_floatingip_dict(floatingip_db)
+        if before_router_id and before_router_id != router_id:
+            self._notify_router_delta(
+                context, before_router_id,
+                removed={l3_constants.FLOATINGIP_KEY: [id]},
+                operation='update_floatingip')
+        if router_id:
+            self._notify_router_delta(
+                context, router_id,
+                updated={l3_constants.FLOATINGIP_KEY: [floatingip]},
+                operation='update_floatingip')
+        return floatingip
 
     def delete_floatingip(self, context, id):
         floatingip = self._get_floatingip(context, id)
@@ -704,9 +747,10 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                              floatingip['floating_port_id'],
                              l3_port_check=False)
         if router_id:
-            routers = self.get_sync_data(context.elevated(), [router_id])
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers,
-                                                           'delete_floatingip')
+            self._notify_router_delta(
+                context, router_id,
+                removed={l3_constants.FLOATINGIP_KEY: [id]},
+                operation='delete_floatingip')
 
     def get_floatingip(self, context, id, fields=None):
         floatingip = self._get_floatingip(context, id)
@@ -765,6 +809,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 fip_qry = context.session.query(FloatingIP)
                 floating_ip = fip_qry.filter_by(fixed_port_id=port_id).one()
                 router_id = floating_ip['router_id']
+                floatingip_id = floating_ip['id']
                 floating_ip.update({'fixed_port_id': None,
                                     'fixed_ip_address': None,
                                     'router_id': None})
@@ -775,8 +820,9 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 raise Exception(_('Multiple floating IPs found for port %s')
                                 % port_id)
         if router_id:
-            routers = self.get_sync_data(context.elevated(), [router_id])
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+            self._notify_router_delta(
+                context, router_id,
+                removed={l3_constants.FLOATINGIP_KEY: [floatingip_id]})
 
     def _network_is_external(self, context, net_id):
         try:
@@ -790,6 +836,16 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         network[l3.EXTERNAL] = self._network_is_external(
             context, network['id'])
 
+    def _extend_network_dict_l3_db(self, network_res, network_db):
+        # The external flag is loaded together with the network, so this
+        # does not cause an extra query.
+        if isinstance(self, L3_NAT_db_mixin):
+            network_res[l3.EXTERNAL] = network_db.external is not None
+
+    # Register dict extend functions for networks
+    db_base_plugin_v2.QuantumDbPluginV2.register_dict_extend_funcs(
+        attributes.NETWORKS, [_extend_network_dict_l3_db])
+
     def _process_l3_create(self, context, net_data, net_id):
         external = net_data.get(l3.EXTERNAL)
         external_set = attributes.is_attr_set(external)
@@ -875,6 +931,13 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         gw_ports = []
         if gw_port_ids:
             gw_ports = self.get_sync_gw_ports(context, gw_port_ids)
+        # The agents use the revision to check that router deltas apply
+        # to the state they know
+        query = context.session.query(Router.id, Router.revision)
+        revisions = dict(query.filter(
+            Router.id.in_([r['id'] for r in router_dicts])))
+        for router_dict in router_dicts:
+            router_dict['revision'] = revisions.get(router_dict['id'], 0)
         return self._build_routers_list(router_dicts, gw_ports)
 
     def _get_sync_floating_ips(self, context, router_ids):
@@ -904,6 +967,12 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             self._populate_subnet_for_ports(context, interfaces)
         return interfaces
 
+    def _get_sync_interface(self, context, port_id):
+        """Query a router interface in the format used by the l3 agents."""
+        interfaces = self.get_ports(context.elevated(), {'id': [port_id]})
+        self._populate_subnet_for_ports(context.elevated(), interfaces)
+        return interfaces[0]
+
     def _populate_subnet_for_ports(self, context, ports):
         """Populate ports with subnet.
 
@@ -33,11 +33,14 @@ class L3RpcCallbackMixin(object):
         """Sync routers according to filters to a specific agent.
 
         @param context: contain user information
-        @param kwargs: host, or router_id
+        @param kwargs: host, and router_id or router_ids
         @return: a list of routers
                  with their interfaces and floating_ips
         """
         router_id = kwargs.get('router_id')
+        # The agent asks for a list, of at most one router
+        if not router_id and kwargs.get('router_ids'):
+            router_id = kwargs['router_ids'][0]
         host = kwargs.get('host')
         context = quantum_context.get_admin_context()
         plugin = manager.QuantumManager.get_plugin()
@@ -48,7 +51,8 @@ class L3RpcCallbackMixin(object):
             routers = plugin.list_active_sync_routers_on_active_l3_agent(
                 context, host, router_id)
         else:
-            routers = plugin.get_sync_data(context, router_id)
+            routers = plugin.get_sync_data(context,
+                                           router_id and [router_id])
         LOG.debug(_("Routers returned to l3 agent:\n %s"),
                   jsonutils.dumps(routers, indent=5))
         return routers
@@ -466,6 +466,44 @@ class LoadBalancerPluginDb(LoadBalancerPluginBase,
             self.assert_modification_allowed(pool_db)
             pool_db.stats = self._create_pool_stats(context, pool_id, data)
 
+    def _update_pools_stats(self, context, pools_data):
+        """Update the stats of several pools in a single transaction.
+
+        pools_data maps pool ids to their new stats. The stats of pools
+        which do not exist anymore are ignored.
+        """
+        # Building the model objects validates the values
+        stats = dict((pool_id, self._create_pool_stats(context, pool_id, data))
+                     for pool_id, data in pools_data.iteritems())
+        if not stats:
+            return
+        with context.session.begin(subtransactions=True):
+            pool_ids = set(pool_id for pool_id, in
+                           context.session.query(Pool.id).filter(
+                               Pool.id.in_(stats.keys())))
+            stats_ids = set(pool_id for pool_id, in
+                            context.session.query(
+                                PoolStatistics.pool_id).filter(
+                                    PoolStatistics.pool_id.in_(pool_ids)))
+            if stats_ids:
+                update = PoolStatistics.__table__.update().where(
+                    PoolStatistics.pool_id == sa.bindparam('p_pool_id')
+                ).values(
+                    bytes_in=sa.bindparam('p_bytes_in'),
+                    bytes_out=sa.bindparam('p_bytes_out'),
+                    active_connections=sa.bindparam('p_active_connections'),
+                    total_connections=sa.bindparam('p_total_connections'))
+                context.session.execute(update, [
+                    {'p_pool_id': pool_id,
+                     'p_bytes_in': stats[pool_id].bytes_in,
+                     'p_bytes_out': stats[pool_id].bytes_out,
+                     'p_active_connections':
+                     stats[pool_id].active_connections,
+                     'p_total_connections': stats[pool_id].total_connections}
+                    for pool_id in stats_ids])
+            for pool_id in pool_ids - stats_ids:
+                context.session.add(stats[pool_id])
+
     def _create_pool_stats(self, context, pool_id, data=None):
         # This is internal method to add pool statistics. It won't
         # be exposed to API
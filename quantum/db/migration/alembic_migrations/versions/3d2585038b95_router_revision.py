@@ -0,0 +1,66 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add revision to routers
+
+Revision ID: 3d2585038b95
+Revises: 5918cbddab04
+Create Date: 2013-07-02 10:12:41.315625
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3d2585038b95'
+down_revision = '5918cbddab04'
+
+# Change to ['*'] if this migration applies to all plugins
+
+migration_for_plugins = [
+    'quantum.plugins.bigswitch.plugin.QuantumRestProxyV2',
+    'quantum.plugins.brocade.QuantumPlugin.BrocadePluginV2',
+    'quantum.plugins.hyperv.hyperv_quantum_plugin.HyperVQuantumPlugin',
+    'quantum.plugins.linuxbridge.lb_quantum_plugin.LinuxBridgePluginV2',
+    'quantum.plugins.metaplugin.meta_quantum_plugin.MetaPluginV2',
+    'quantum.plugins.midonet.plugin.MidonetPluginV2',
+    'quantum.plugins.ml2.plugin.Ml2Plugin',
+    'quantum.plugins.mlnx.mlnx_plugin.MellanoxEswitchPlugin',
+    'quantum.plugins.nec.nec_plugin.NECPluginV2',
+    'quantum.plugins.nicira.QuantumPlugin.NvpPluginV2',
+    'quantum.plugins.openvswitch.ovs_quantum_plugin.OVSQuantumPluginV2',
+    'quantum.plugins.ryu.ryu_quantum_plugin.RyuQuantumPluginV2'
+]
+
+from alembic import op
+import sqlalchemy as sa
+
+
+from quantum.db import migration
+
+
+def upgrade(active_plugin=None, options=None):
+    if not migration.should_run(active_plugin, migration_for_plugins):
+        return
+
+    op.add_column('routers', sa.Column('revision', sa.Integer(),
+                                       nullable=False, server_default='0'))
+
+
+def downgrade(active_plugin=None, options=None):
+    if not migration.should_run(active_plugin, migration_for_plugins):
+        return
+
+    op.drop_column('routers', 'revision')
@@ -15,11 +15,31 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import weakref
+
+from oslo.config import cfg
 import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import orm
 
 from quantum.common import exceptions
 from quantum.db import model_base
 from quantum.db import models_v2
+from quantum.openstack.common import log as logging
+from quantum.openstack.common import timeutils
+from quantum import quota
+
+
+LOG = logging.getLogger(__name__)
+# Maps the models whose usage is tracked to the name of their resource
+_TRACKED_MODELS = {}
+# Maps sessions to the usage changes of their transaction by tenant and
+# resource, see _apply_usage_deltas()
+_USAGE_DELTAS = weakref.WeakKeyDictionary()
+# Maps sessions to the usages to mark dirty with their next commit, as
+# changes were rolled back after their usage changes were recorded
+_DIRTY_USAGES = weakref.WeakKeyDictionary()
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -33,6 +53,176 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2):
+    """Represent the number of resources of a kind used by a tenant.
+
+    The usage is maintained when the resources are created and deleted.
+    It is counted again when marked dirty, as it might be wrong, and when
+    it has not been counted for a while.
+    """
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0)
+    dirty = sa.Column(sa.Boolean, nullable=False, default=False)
+    synced_at = sa.Column(sa.DateTime, nullable=False)
+
+
+def _update_usage(resource, delta):
+    def update_usage(mapper, connection, target):
+        deltas = _USAGE_DELTAS.setdefault(orm.object_session(target), {})
+        key = (target.tenant_id, resource)
+        deltas[key] = deltas.get(key, 0) + delta
+    return update_usage
+
+
+def _apply_usage_deltas(session):
+    """Update the usages changed by the transaction about to commit.
+
+    The updates are part of the transaction creating or deleting the
+    resources, but run last so that the usage rows are not locked while
+    the rest of the transaction runs, e.g. calls to a backend. Usages not
+    counted yet will be when first needed.
+    """
+    # The pending changes are flushed first to include their usage. There
+    # are none when the commit ends a flush.
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    deltas = _USAGE_DELTAS.pop(session, {})
+    dirty = _DIRTY_USAGES.pop(session, set())
+    if not (deltas or dirty):
+        return
+    usages = QuotaUsage.__table__
+    # The rows are always locked in the same order to avoid deadlocks
+    for tenant_id, resource in sorted(set(deltas) | dirty):
+        values = {}
+        if deltas.get((tenant_id, resource)):
+            values['in_use'] = (usages.c.in_use +
+                                deltas[(tenant_id, resource)])
+        if (tenant_id, resource) in dirty:
+            values['dirty'] = True
+        if values:
+            session.execute(
+                usages.update().
+                where(usages.c.tenant_id == tenant_id).
+                where(usages.c.resource == resource).
+                values(**values))
+
+
+def _discard_usage_deltas(session):
+    deltas = _USAGE_DELTAS.pop(session, None)
+    if deltas:
+        # The rollback of a savepoint discards the changes of the enclosing
+        # transaction too, their usages are counted again
+        _DIRTY_USAGES.setdefault(session, set()).update(deltas)
+
+
+def _mark_usages_dirty(session, query, query_context, result):
+    # The tenants of the resources deleted in bulk are unknown, tracked
+    # resources should rather be deleted one by one
+    model = query.column_descriptions[0]['type']
+    resource = _TRACKED_MODELS.get(model)
+    if resource and result.rowcount:
+        session.execute(QuotaUsage.__table__.update().
+                        where(QuotaUsage.resource == resource).
+                        values(dirty=True))
+
+
+def _listen_to_sessions():
+    # The listeners must be in place before a commit starts, while the
+    # changes of the session are only flushed during the commit. They do
+    # nothing for the sessions which do not change tracked resources.
+    event.listen(orm.Session, 'before_commit', _apply_usage_deltas)
+    event.listen(orm.Session, 'after_rollback', _discard_usage_deltas)
+    event.listen(orm.Session, 'after_bulk_delete', _mark_usages_dirty)
+
+
+def track_usage(resource, model):
+    """Maintain the usage of resource when instances of model change.
+
+    The instances have to be inserted and deleted through the session for
+    their usage to be maintained. The usages of the instances deleted in
+    bulk with a query are marked dirty, and counted again.
+    """
+    if model in _TRACKED_MODELS:
+        return
+    if not _TRACKED_MODELS:
+        _listen_to_sessions()
+    _TRACKED_MODELS[model] = resource
+    event.listen(model, 'after_insert', _update_usage(resource, 1))
+    event.listen(model, 'after_delete', _update_usage(resource, -1))
+
+
+def register_tracked_resources(plugin_class, models):
+    """Track the usage of the resources stored by a plugin.
+
+    :param plugin_class: The class of the plugins storing the resources.
+    :param models: A dictionary from the names of the resources to their
+                   model.
+    """
+    for resource, model in models.iteritems():
+        track_usage(resource, model)
+        quota.register_usage_tracker(
+            resource, _get_usage_tracker(plugin_class, resource, model))
+
+
+def _get_usage_tracker(plugin_class, resource, model):
+    def get_tracked_usage(context, plugin, tenant_id):
+        # Other plugins might not store the resources with model
+        if isinstance(plugin, plugin_class):
+            return get_usage(
+                context, resource, model, tenant_id,
+                resync_interval=cfg.CONF.QUOTAS.quota_usage_resync_interval)
+    return get_tracked_usage
+
+
+def _is_usage_valid(usage, resync_interval):
+    return (usage is not None and not usage.dirty and
+            not (resync_interval > 0 and
+                 timeutils.is_older_than(usage.synced_at, resync_interval)))
+
+
+def get_usage(context, resource, model, tenant_id, resync_interval=0):
+    """Return the number of resources of a tenant in use.
+
+    The tracked usage is returned, unless it has to be counted again
+    because it is dirty or older than resync_interval seconds.
+    """
+    query = context.session.query(QuotaUsage).filter_by(
+        tenant_id=tenant_id, resource=resource)
+    # The usage might have changed since the session loaded it
+    usage = query.populate_existing().first()
+    if _is_usage_valid(usage, resync_interval):
+        return usage.in_use
+    try:
+        with context.session.begin(subtransactions=True):
+            # Resources created or deleted concurrently update the usage
+            # once it is counted
+            usage = query.with_lockmode('update').populate_existing().first()
+            if _is_usage_valid(usage, resync_interval):
+                return usage.in_use
+            in_use = context.session.query(model).filter_by(
+                tenant_id=tenant_id).count()
+            # The count includes the changes of the current transaction
+            _USAGE_DELTAS.get(context.session, {}).pop(
+                (tenant_id, resource), None)
+            _DIRTY_USAGES.get(context.session, set()).discard(
+                (tenant_id, resource))
+            if usage is None:
+                usage = QuotaUsage(tenant_id=tenant_id, resource=resource)
+                context.session.add(usage)
+            usage.update({'in_use': in_use, 'dirty': False,
+                          'synced_at': timeutils.utcnow()})
+    except sa_exc.IntegrityError:
+        # The usage was added concurrently
+        return get_usage(context, resource, model, tenant_id,
+                         resync_interval)
+    LOG.debug(_("Counted %(in_use)s %(resource)s resources in use by tenant "
+                "%(tenant_id)s"),
+              {'in_use': in_use, 'resource': resource,
+               'tenant_id': tenant_id})
+    return in_use
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
@@ -86,8 +276,8 @@ class DbQuotaDriver(object):
 
         all_tenant_quotas = {}
 
-        for quota in context.session.query(Quota):
-            tenant_id = quota['tenant_id']
+        for tenant_limit in context.session.query(Quota):
+            tenant_id = tenant_limit['tenant_id']
 
             # avoid setdefault() because only want to copy when actually req'd
             tenant_quota = all_tenant_quotas.get(tenant_id)
@@ -96,7 +286,7 @@ class DbQuotaDriver(object):
                 tenant_quota['tenant_id'] = tenant_id
                 all_tenant_quotas[tenant_id] = tenant_quota
 
-            tenant_quota[quota['resource']] = quota['limit']
+            tenant_quota[tenant_limit['resource']] = tenant_limit['limit']
 
         return all_tenant_quotas.values()
 
@@ -35,6 +35,37 @@ DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
                        'egress': 'dest_ip_prefix'}
 
 
+class SecurityGroupRulesCache(object):
+    """Rules of security groups in the format sent to the agents.
+
+    Security group rules can only be created and deleted, so the rules
+    cached for a group are valid as long as the ids of the rules of the
+    group did not change. This is checked on each lookup, which keeps the
+    cache consistent with changes made by other server processes. Groups
+    are also invalidated when their rules are changed by this process.
+    """
+
+    def __init__(self):
+        # Maps security group ids to (rule ids, rules) tuples
+        self._rules = {}
+
+    def get(self, security_group_id, rule_ids):
+        """Return the cached rules of the group if they are up to date."""
+        cached = self._rules.get(security_group_id)
+        if cached and cached[0] == rule_ids:
+            return cached[1]
+
+    def set(self, security_group_id, rule_ids, rules):
+        self._rules[security_group_id] = (rule_ids, rules)
+
+    def invalidate(self, security_group_ids):
+        for security_group_id in security_group_ids:
+            self._rules.pop(security_group_id, None)
+
+
+_rules_cache = SecurityGroupRulesCache()
+
+
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
     def create_security_group_rule(self, context, security_group_rule):
@@ -42,6 +73,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.create_security_group_rule_bulk_native(context,
                                                            bulk_rule)[0]
         sgids = [rule['security_group_id']]
+        _rules_cache.invalidate(sgids)
         self.notifier.security_groups_rule_updated(context, sgids)
         return rule
 
@@ -51,6 +83,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                       self).create_security_group_rule_bulk_native(
                           context, security_group_rule)
         sgids = set([r['security_group_id'] for r in rules])
+        _rules_cache.invalidate(sgids)
         self.notifier.security_groups_rule_updated(context, list(sgids))
         return rules
 
@@ -58,6 +91,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.get_security_group_rule(context, sgrid)
         super(SecurityGroupServerRpcMixin,
               self).delete_security_group_rule(context, sgrid)
+        _rules_cache.invalidate([rule['security_group_id']])
         self.notifier.security_groups_rule_updated(context,
                                                    [rule['security_group_id']])
 
@@ -120,6 +154,25 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             self.notifier.security_groups_member_updated(
                 context, port.get(ext_sg.SECURITYGROUPS))
 
+    def notify_security_groups_member_updated_bulk(self, context, ports):
+        """Notify the update of the members of the groups of many ports.
+
+        The agents are notified once for all the ports, with the union of
+        their security groups.
+        """
+        provider_updated = False
+        security_groups = set()
+        for port in ports:
+            if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
+                provider_updated = True
+            else:
+                security_groups.update(port.get(ext_sg.SECURITYGROUPS) or [])
+        if provider_updated:
+            self.notifier.security_groups_provider_updated(context)
+        if security_groups:
+            self.notifier.security_groups_member_updated(
+                context, list(security_groups))
+
 
 class SecurityGroupServerRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent support in plugin
@@ -135,8 +188,55 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :params devices: list of devices
         :returns: port correspond to the devices with security group rules
         """
-        devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(kwargs.get('devices'))
+        return self._security_group_rules_for_ports(context, ports)
+
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return security group information for each port.
+
+        Unlike security_group_rules_for_devices, the rules of a security
+        group and the members of a remote group are returned once, rather
+        than being expanded into the rules of each port.
 
+        :params devices: list of devices
+        :returns: a dict with
+            devices: the ports corresponding to the devices, with their
+                     security_groups and security_group_source_groups,
+                     and the provider rules in security_group_rules
+            security_groups: the rules of each security group of the ports
+            sg_member_ips: the IP addresses of the members of each remote
+                           group, by ethertype
+        """
+        ports = self._get_ports_for_devices(kwargs.get('devices'))
+        sg_ids = set()
+        for port in ports.values():
+            sg_ids.update(port.get(ext_sg.SECURITYGROUPS, []))
+        rules_by_group = self._select_rules_for_groups(context, sg_ids)
+        remote_group_ids = set()
+        for port in ports.values():
+            source_groups = set()
+            for sg_id in port.get(ext_sg.SECURITYGROUPS, []):
+                source_groups.update(rule['remote_group_id']
+                                     for rule in rules_by_group[sg_id]
+                                     if rule.get('remote_group_id'))
+            port['security_group_source_groups'] = list(source_groups)
+            remote_group_ids |= source_groups
+        self._apply_provider_rule(context, ports)
+
+        ips = self._select_ips_for_remote_group(context,
+                                                list(remote_group_ids))
+        member_ips = {}
+        for remote_group_id, group_ips in ips.iteritems():
+            member_ips[remote_group_id] = dict(
+                (ethertype, []) for ethertype in IP_MASK)
+            for ip in group_ips:
+                ethertype = 'IPv%s' % netaddr.IPAddress(ip).version
+                member_ips[remote_group_id][ethertype].append(ip)
+        return {'devices': ports,
+                'security_groups': rules_by_group,
+                'sg_member_ips': member_ips}
+
+    def _get_ports_for_devices(self, devices):
         ports = {}
         for device in devices:
             port = self.get_port_from_device(device)
@@ -145,7 +245,41 @@ class SecurityGroupServerRpcCallbackMixin(object):
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
+
+    def _select_rules_for_groups(self, context, security_group_ids):
+        """Return the rules of the security groups, by group.
+
+        Only the rules of the groups changed since they were last cached
+        are loaded.
+        """
+        rule_ids = dict((sg_id, set()) for sg_id in security_group_ids)
+        if not rule_ids:
+            return {}
+        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+        query = context.session.query(sgr_sgid, sg_db.SecurityGroupRule.id)
+        for sg_id, rule_id in query.filter(sgr_sgid.in_(rule_ids.keys())):
+            rule_ids[sg_id].add(rule_id)
+
+        rules_by_group = {}
+        for sg_id, ids in rule_ids.iteritems():
+            rules = _rules_cache.get(sg_id, ids)
+            if rules is not None:
+                rules_by_group[sg_id] = rules
+        stale_ids = [sg_id for sg_id in rule_ids
+                     if sg_id not in rules_by_group]
+        if stale_ids:
+            query = context.session.query(sg_db.SecurityGroupRule)
+            for sg_id in stale_ids:
+                rules_by_group[sg_id] = []
+            rules_in_db = query.filter(sgr_sgid.in_(stale_ids)).all()
+            for rule_in_db in rules_in_db:
+                rules_by_group[rule_in_db['security_group_id']].append(
+                    self._make_rule_dict(rule_in_db))
+            for sg_id in stale_ids:
+                _rules_cache.set(sg_id, rule_ids[sg_id],
+                                 rules_by_group[sg_id])
+        return rules_by_group
 
     def _select_rules_for_ports(self, context, ports):
         if not ports:
@@ -283,20 +417,24 @@ class SecurityGroupServerRpcCallbackMixin(object):
         for (binding, rule_in_db) in rules_in_db:
             port_id = binding['port_id']
             port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
+            port['security_group_rules'].append(
+                self._make_rule_dict(rule_in_db))
         self._apply_provider_rule(context, ports)
         return self._convert_remote_group_id_to_ip_prefix(context, ports)
+
+    def _make_rule_dict(self, rule_in_db):
+        direction = rule_in_db['direction']
+        rule_dict = {
+            'security_group_id': rule_in_db['security_group_id'],
+            'direction': direction,
+            'ethertype': rule_in_db['ethertype'],
+        }
+        for key in ('protocol', 'port_range_min', 'port_range_max',
+                    'remote_ip_prefix', 'remote_group_id'):
+            if rule_in_db.get(key):
+                if key == 'remote_ip_prefix':
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                    rule_dict[direction_ip_prefix] = rule_in_db[key]
+                    continue
+                rule_dict[key] = rule_in_db[key]
+        return rule_dict
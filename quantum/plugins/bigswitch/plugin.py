@@ -46,12 +46,16 @@ on port-attach) on an additional PUT to do a bulk dump of all persistent data.
 
 import base64
 import copy
+import errno
+import hashlib
 import httplib
 import json
 import os
 import socket
 
+import eventlet.semaphore
 from oslo.config import cfg
+from sqlalchemy import orm
 
 from quantum.api.rpc.agentnotifiers import dhcp_rpc_agent_api
 from quantum.common import constants as const
@@ -64,6 +68,7 @@ from quantum.db import api as db
 from quantum.db import db_base_plugin_v2
 from quantum.db import dhcp_rpc_base
 from quantum.db import l3_db
+from quantum.db import models_v2
 from quantum.extensions import l3
 from quantum.extensions import portbindings
 from quantum.openstack.common import log as logging
@@ -95,9 +100,20 @@ restproxy_opts = [
                        "Floodlight controller.")),
     cfg.BoolOpt('sync_data', default=False,
                 help=_("Sync data on connect")),
+    cfg.IntOpt('sync_chunk_size', default=100,
+               help=_("Maximum number of networks, or routers, sent to the "
+                      "server in each request of a data sync. The sync is "
+                      "skipped if the topology hash stored by the server "
+                      "matches. If 0, the whole topology is sent in a "
+                      "single request, for servers which do not support "
+                      "chunks.")),
     cfg.IntOpt('server_timeout', default=10,
                help=_("Maximum number of seconds to wait for proxy request "
                       "to connect and complete.")),
+    cfg.IntOpt('server_connections', default=4,
+               help=_("Maximum number of concurrent requests to each "
+                      "BigSwitch or Floodlight server. As many connections "
+                      "to the server are kept alive to be reused.")),
     cfg.StrOpt('quantum_id', default='Quantum-' + utils.get_hostname(),
                help=_("User defined identifier for this Quantum deployment")),
     cfg.BoolOpt('add_meta_server_route', default=True,
@@ -140,6 +156,12 @@ PORTS_PATH = "/tenants/%s/networks/%s/ports/%s"
 ATTACHMENT_PATH = "/tenants/%s/networks/%s/ports/%s/attachment"
 ROUTERS_PATH = "/tenants/%s/routers/%s"
 ROUTER_INTF_PATH = "/tenants/%s/routers/%s/interfaces/%s"
+TOPOLOGY_PATH = "/topology"
+TOPOLOGY_HASH_PATH = "/topology/hash"
+TOPOLOGY_CHUNK_PATH = "/topology/chunks/%d"
+# Number of networks, or routers, read at once to hash the topology when
+# it is sent in a single request
+HASH_CHUNK_SIZE = 100
 SUCCESS_CODES = range(200, 207)
 FAILURE_CODES = [0, 301, 302, 303, 400, 401, 403, 404, 500, 501, 502, 503,
                  504, 505]
@@ -160,10 +182,15 @@ class RemoteRestError(exceptions.QuantumException):
 
 
 class ServerProxy(object):
-    """REST server proxy to a network controller."""
+    """REST server proxy to a network controller.
+
+    Up to max_connections requests are sent concurrently to the controller,
+    further requests wait for one of them to complete. The connections are
+    kept alive to be reused by the following requests.
+    """
 
     def __init__(self, server, port, ssl, auth, quantum_id, timeout,
-                 base_uri, name):
+                 base_uri, name, max_connections=1):
         self.server = server
         self.port = port
         self.ssl = ssl
@@ -175,8 +202,60 @@ class ServerProxy(object):
         self.quantum_id = quantum_id
         if auth:
             self.auth = 'Basic ' + base64.encodestring(auth).strip()
+        self._semaphore = eventlet.semaphore.Semaphore(max_connections)
+        # Connections kept alive by the server after a request, along with
+        # the pid of the process which opened them
+        self._idle_connections = []
+
+    def _connect(self):
+        if self.ssl:
+            return httplib.HTTPSConnection(
+                self.server, self.port, timeout=self.timeout)
+        return httplib.HTTPConnection(
+            self.server, self.port, timeout=self.timeout)
+
+    def _send(self, conn, action, uri, body, headers):
+        conn.request(action, uri, body, headers)
+        return conn.getresponse()
+
+    def _read(self, conn, response):
+        respstr = response.read()
+        if response.will_close:
+            conn.close()
+        else:
+            self._idle_connections.append((os.getpid(), conn))
+        return respstr
+
+    @staticmethod
+    def _not_processed(exc):
+        """Whether a failed request cannot have reached the server.
+
+        This is the case when a kept-alive connection turns out to be
+        closed: the server either hung up without a status line, or reset
+        the connection, before any response. A timeout proves nothing.
+        """
+        if isinstance(exc, httplib.BadStatusLine):
+            return True
+        return (isinstance(exc, socket.error) and
+                not isinstance(exc, socket.timeout) and
+                exc.errno in (errno.ECONNRESET, errno.EPIPE))
+
+    def _get_idle_connection(self):
+        pid = os.getpid()
+        while self._idle_connections:
+            owner, conn = self._idle_connections.pop()
+            if owner == pid:
+                return conn
+            # Inherited from the parent process, which may still use the
+            # socket, e.g. the connection of the initial sync in the api
+            # workers. Only the copy of this process is closed.
+            conn.close()
+
+    def close(self):
+        """Close the connections kept alive."""
+        while self._idle_connections:
+            self._idle_connections.pop()[1].close()
 
-    @utils.synchronized('bsn-rest-call', external=True)
     def rest_call(self, action, resource, data, headers):
         uri = self.base_uri + resource
         body = json.dumps(data)
@@ -198,39 +277,39 @@ class ServerProxy(object):
                     "headers=%(headers)r"),
                   {'resource': resource, 'data': data, 'headers': headers})
 
-        conn = None
-        if self.ssl:
-            conn = httplib.HTTPSConnection(
-                self.server, self.port, timeout=self.timeout)
-            if conn is None:
-                LOG.error(_('ServerProxy: Could not establish HTTPS '
-                            'connection'))
-                return 0, None, None, None
-        else:
-            conn = httplib.HTTPConnection(
-                self.server, self.port, timeout=self.timeout)
-            if conn is None:
-                LOG.error(_('ServerProxy: Could not establish HTTP '
-                            'connection'))
-                return 0, None, None, None
-
-        try:
-            conn.request(action, uri, body, headers)
-            response = conn.getresponse()
-            respstr = response.read()
-            respdata = respstr
-            if response.status in self.success_codes:
+        with self._semaphore:
+            conn = self._get_idle_connection()
+            reused = conn is not None
+            if not reused:
+                conn = self._connect()
+            try:
                 try:
-                    respdata = json.loads(respstr)
-                except ValueError:
-                    # response was not JSON, ignore the exception
-                    pass
-            ret = (response.status, response.reason, respstr, respdata)
-        except (socket.timeout, socket.error) as e:
-            LOG.error(_('ServerProxy: %(action)s failure, %(e)r'),
-                      {'action': action, 'e': e})
-            ret = 0, None, None, None
-        conn.close()
+                    response = self._send(conn, action, uri, body, headers)
+                except (socket.error, httplib.HTTPException) as e:
+                    conn.close()
+                    if not (reused and self._not_processed(e)):
+                        raise
+                    # The server closed the idle connection in the
+                    # meantime, send the request on a new one
+                    LOG.debug(_("ServerProxy: kept-alive connection to "
+                                "%(server)s:%(port)d lost, reconnecting"),
+                              {'server': self.server, 'port': self.port})
+                    conn = self._connect()
+                    response = self._send(conn, action, uri, body, headers)
+                respstr = self._read(conn, response)
+                respdata = respstr
+                if response.status in self.success_codes:
+                    try:
+                        respdata = json.loads(respstr)
+                    except ValueError:
+                        # response was not JSON, ignore the exception
+                        pass
+                ret = (response.status, response.reason, respstr, respdata)
+            except (socket.error, httplib.HTTPException) as e:
+                conn.close()
+                LOG.error(_('ServerProxy: %(action)s failure, %(e)r'),
+                          {'action': action, 'e': e})
+                ret = 0, None, None, None
         LOG.debug(_("ServerProxy: status=%(status)d, reason=%(reason)r, "
                     "ret=%(ret)s, data=%(data)r"), {'status': ret[0],
                                                     'reason': ret[1],
@@ -242,20 +321,23 @@ class ServerProxy(object):
 class ServerPool(object):
 
     def __init__(self, servers, ssl, auth, quantum_id, timeout=10,
-                 base_uri='/quantum/v1.0', name='QuantumRestProxy'):
+                 base_uri='/quantum/v1.0', name='QuantumRestProxy',
+                 max_connections=1):
         self.base_uri = base_uri
         self.timeout = timeout
         self.name = name
         self.auth = auth
         self.ssl = ssl
         self.quantum_id = quantum_id
+        self.max_connections = max_connections
         self.servers = []
         for server_port in servers:
             self.servers.append(self.server_proxy_for(*server_port))
 
     def server_proxy_for(self, server, port):
         return ServerProxy(server, port, self.ssl, self.auth, self.quantum_id,
-                           self.timeout, self.base_uri, self.name)
+                           self.timeout, self.base_uri, self.name,
+                           self.max_connections)
 
     def server_failure(self, resp):
         """Define failure codes as required.
@@ -273,12 +355,17 @@ class ServerPool(object):
         return resp[0] in SUCCESS_CODES
 
     def rest_call(self, action, resource, data, headers):
+        # Other calls may be in progress, so the list of servers is only
+        # reordered, never emptied while trying them
         failed_servers = []
-        while self.servers:
-            active_server = self.servers[0]
+        for active_server in list(self.servers):
             ret = active_server.rest_call(action, resource, data, headers)
             if not self.server_failure(ret):
-                self.servers.extend(failed_servers)
+                # Keep using this server until it fails
+                for server in failed_servers:
+                    if server in self.servers:
+                        self.servers.remove(server)
+                        self.servers.append(server)
                 return ret
             else:
                 LOG.error(_('ServerProxy: %(action)s failure for servers: '
@@ -286,15 +373,14 @@ class ServerPool(object):
                           {'action': action,
                            'server': (active_server.server,
                                       active_server.port)})
-                failed_servers.append(self.servers.pop(0))
+                failed_servers.append(active_server)
 
-        # All servers failed, reset server list and try again next time
+        # All servers failed, try them again in the same order next time
         LOG.error(_('ServerProxy: %(action)s failure for all servers: '
                     '%(server)r'),
                   {'action': action,
                    'server': tuple((s.server,
                                     s.port) for s in failed_servers)})
-        self.servers.extend(failed_servers)
         return (0, None, None, None)
 
     def get(self, resource, data='', headers=None):
@@ -312,7 +398,9 @@ class ServerPool(object):
 
 class RpcProxy(dhcp_rpc_base.DhcpRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.0'
+    # history
+    #   1.4 Support update_leases_expiration (DhcpPluginApi version)
+    RPC_API_VERSION = '1.4'
 
     def create_rpc_dispatcher(self):
         return q_rpc.PluginRpcDispatcher([self])
@@ -338,6 +426,7 @@ class QuantumRestProxyV2(db_base_plugin_v2.QuantumDbPluginV2,
         server_ssl = cfg.CONF.RESTPROXY.server_ssl
         sync_data = cfg.CONF.RESTPROXY.sync_data
         timeout = cfg.CONF.RESTPROXY.server_timeout
+        max_connections = cfg.CONF.RESTPROXY.server_connections
         quantum_id = cfg.CONF.RESTPROXY.quantum_id
         self.add_meta_server_route = cfg.CONF.RESTPROXY.add_meta_server_route
 
@@ -349,7 +438,8 @@ class QuantumRestProxyV2(db_base_plugin_v2.QuantumDbPluginV2,
 
         # init network ctrl connections
         self.servers = ServerPool(servers, server_ssl, server_auth, quantum_id,
-                                  timeout, BASE_URI)
+                                  timeout, BASE_URI,
+                                  max_connections=max_connections)
 
         # init dhcp support
         self.topic = topics.PLUGIN
@@ -1141,71 +1231,201 @@ class QuantumRestProxyV2(db_base_plugin_v2.QuantumDbPluginV2,
 
         This gives the controller an option to re-sync it's persistent store
         with quantum's current view of that data.
+
+        The topology is sent in chunks of sync_chunk_size networks or
+        routers to TOPOLOGY_CHUNK_PATH, the last one carrying the hash of
+        the topology. Nothing is sent if the hash stored by the controller
+        matches. With sync_chunk_size set to 0, the topology is sent in a
+        single request to TOPOLOGY_PATH.
         """
         admin_context = qcontext.get_admin_context()
-        networks = []
-        routers = []
-
-        all_networks = super(QuantumRestProxyV2,
-                             self).get_networks(admin_context) or []
-        for net in all_networks:
-            mapped_network = self._get_mapped_network_with_subnets(net)
-            net_fl_ips = self._get_network_with_floatingips(mapped_network)
+        chunk_size = cfg.CONF.RESTPROXY.sync_chunk_size
+        try:
+            # The topology is read in chunks both times, and each chunk is
+            # dropped once hashed or sent
+            topology_hash = hashlib.sha1()
+            for chunk in self._get_topology_chunks(
+                    admin_context, chunk_size or HASH_CHUNK_SIZE):
+                self._update_topology_hash(topology_hash, chunk)
+            ret = self.servers.get(TOPOLOGY_HASH_PATH)
+            if (self.servers.action_success(ret) and
+                    isinstance(ret[3], dict) and
+                    ret[3].get('hash') == topology_hash.hexdigest()):
+                LOG.debug(_("QuantumRestProxy: remote topology is in sync"))
+                return ret
 
-            ports = []
-            net_filter = {'network_id': [net.get('id')]}
-            net_ports = super(QuantumRestProxyV2,
-                              self).get_ports(admin_context,
-                                              filters=net_filter) or []
-            for port in net_ports:
-                mapped_port = self._map_state_and_status(port)
-                mapped_port['attachment'] = {
-                    'id': port.get('device_id'),
-                    'mac': port.get('mac_address'),
-                }
-                ports.append(mapped_port)
-            net_fl_ips['ports'] = ports
-
-            networks.append(net_fl_ips)
-
-        all_routers = super(QuantumRestProxyV2,
-                            self).get_routers(admin_context) or []
-        for router in all_routers:
-            interfaces = []
-            mapped_router = self._map_state_and_status(router)
-            router_filter = {
-                'device_owner': ["network:router_interface"],
-                'device_id': [router.get('id')]
-            }
-            router_ports = super(QuantumRestProxyV2,
-                                 self).get_ports(admin_context,
-                                                 filters=router_filter) or []
-            for port in router_ports:
-                net_id = port.get('network_id')
-                subnet_id = port['fixed_ips'][0]['subnet_id']
-                intf_details = self._get_router_intf_details(admin_context,
-                                                             net_id,
-                                                             subnet_id)
-                interfaces.append(intf_details)
-            mapped_router['interfaces'] = interfaces
-
-            routers.append(mapped_router)
+            # The hash sent is the one of the data sent, the topology may
+            # have changed since it was computed
+            topology_hash = hashlib.sha1()
+            if chunk_size <= 0:
+                data = {'networks': [], 'routers': []}
+                for chunk in self._get_topology_chunks(admin_context, None):
+                    self._update_topology_hash(topology_hash, chunk)
+                    data['networks'].extend(chunk['networks'])
+                    data['routers'].extend(chunk['routers'])
+                data['hash'] = topology_hash.hexdigest()
+                ret = self.servers.put(TOPOLOGY_PATH, data)
+                if not self.servers.action_success(ret):
+                    raise RemoteRestError(ret[2])
+                return ret
 
-        try:
-            resource = '/topology'
-            data = {
-                'networks': networks,
-                'routers': routers,
-            }
-            ret = self.servers.put(resource, data)
-            if not self.servers.action_success(ret):
-                raise RemoteRestError(ret[2])
+            chunks = self._get_topology_chunks(admin_context, chunk_size)
+            chunk = next(chunks, {'networks': [], 'routers': []})
+            index = 0
+            while chunk is not None:
+                next_chunk = next(chunks, None)
+                self._update_topology_hash(topology_hash, chunk)
+                data = dict(chunk, index=index, last=next_chunk is None)
+                if next_chunk is None:
+                    data['hash'] = topology_hash.hexdigest()
+                ret = self.servers.put(TOPOLOGY_CHUNK_PATH % index, data)
+                if not self.servers.action_success(ret):
+                    raise RemoteRestError(ret[2])
+                chunk = next_chunk
+                index += 1
             return ret
         except RemoteRestError as e:
             LOG.error(_('QuantumRestProxy: Unable to update remote '
                         'topology: %s'), e.message)
             raise
 
+    @staticmethod
+    def _update_topology_hash(topology_hash, chunk):
+        # Hashed resource by resource, so that the hash does not depend on
+        # the size of the chunks
+        for resource in chunk['networks'] + chunk['routers']:
+            topology_hash.update(json.dumps(resource, sort_keys=True))
+
+    def _get_topology_chunks(self, context, chunk_size):
+        """Yield the topology in chunks of at most chunk_size resources.
+
+        The networks come first, then the routers, each loaded along with
+        their related resources by a few queries per chunk.
+        """
+        query = self._model_query(context, models_v2.Network)
+        for networks in self._get_chunks(query, models_v2.Network,
+                                         chunk_size):
+            yield {'networks': self._map_networks(context, networks),
+                   'routers': []}
+        query = self._model_query(context, l3_db.Router).options(
+            orm.joinedload('gw_port'))
+        for routers in self._get_chunks(query, l3_db.Router, chunk_size):
+            yield {'networks': [],
+                   'routers': self._map_routers(context, routers)}
+
+    @staticmethod
+    def _get_chunks(query, model, chunk_size):
+        query = query.order_by(model.id)
+        if not chunk_size:
+            rows = query.all()
+            if rows:
+                yield rows
+            return
+        last_id = None
+        while True:
+            chunk_query = query
+            if last_id:
+                chunk_query = chunk_query.filter(model.id > last_id)
+            rows = chunk_query.limit(chunk_size).all()
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1].id
+
+    def _get_mapped_networks(self, context, networks):
+        """Map networks as _get_mapped_network_with_subnets does."""
+        network_ids = [network['id'] for network in networks]
+        subnets = {}
+        if network_ids:
+            query = context.session.query(models_v2.Subnet).options(
+                orm.subqueryload('dns_nameservers'),
+                orm.subqueryload('routes'))
+            query = query.filter(
+                models_v2.Subnet.network_id.in_(network_ids)).order_by(
+                    models_v2.Subnet.id)
+            for subnet in query:
+                subnets.setdefault(subnet['network_id'], []).append(
+                    self._map_state_and_status(
+                        self._make_subnet_dict(subnet)))
+        mapped_networks = {}
+        for network in networks:
+            mapped = self._map_state_and_status(
+                self._make_network_dict(network))
+            mapped['subnets'] = subnets.get(network['id'], [])
+            # FIX: For backward compatibility with wire protocol
+            mapped['gateway'] = ''
+            for subnet in mapped['subnets']:
+                if subnet['gateway_ip']:
+                    mapped['gateway'] = subnet['gateway_ip']
+                    break
+            mapped_networks[network['id']] = mapped
+        return mapped_networks
+
+    def _map_networks(self, context, networks):
+        network_ids = [network['id'] for network in networks]
+        mapped_networks = self._get_mapped_networks(context, networks)
+        for mapped in mapped_networks.itervalues():
+            mapped['floatingips'] = []
+            mapped['ports'] = []
+        query = context.session.query(l3_db.FloatingIP).filter(
+            l3_db.FloatingIP.floating_network_id.in_(network_ids))
+        for fip in query.order_by(l3_db.FloatingIP.id):
+            mapped_networks[fip['floating_network_id']][
+                'floatingips'].append(self._make_floatingip_dict(fip))
+        query = context.session.query(models_v2.Port).filter(
+            models_v2.Port.network_id.in_(network_ids))
+        for port in query.order_by(models_v2.Port.id):
+            mapped_port = self._map_state_and_status(
+                self._make_port_dict(port))
+            mapped_port['attachment'] = {
+                'id': port['device_id'],
+                'mac': port['mac_address'],
+            }
+            mapped_networks[port['network_id']]['ports'].append(mapped_port)
+        return [mapped_networks[network_id] for network_id in network_ids]
+
+    def _map_routers(self, context, routers):
+        router_ids = [router['id'] for router in routers]
+        mapped_routers = {}
+        for router in routers:
+            mapped = self._map_state_and_status(
+                self._make_router_dict(router))
+            mapped['router_rules'] = []
+            mapped['interfaces'] = []
+            mapped_routers[router['id']] = mapped
+        query = context.session.query(routerrule_db.RouterRule).options(
+            orm.subqueryload('nexthops')).filter(
+                routerrule_db.RouterRule.router_id.in_(router_ids))
+        for rule in query.order_by(routerrule_db.RouterRule.id):
+            mapped_routers[rule['router_id']]['router_rules'].extend(
+                self._make_router_rule_list([rule]))
+
+        query = context.session.query(models_v2.Port).filter(
+            models_v2.Port.device_owner == l3_db.DEVICE_OWNER_ROUTER_INTF,
+            models_v2.Port.device_id.in_(router_ids))
+        ports = query.order_by(models_v2.Port.id).all()
+        network_ids = set(port['network_id'] for port in ports)
+        networks = []
+        if network_ids:
+            networks = self._model_query(context, models_v2.Network).filter(
+                models_v2.Network.id.in_(network_ids)).all()
+        mapped_networks = self._get_mapped_networks(context, networks)
+        subnets = {}
+        for network in mapped_networks.itervalues():
+            for subnet in network['subnets']:
+                subnets[subnet['id']] = subnet
+        for port in ports:
+            # we use the network id as interface's id
+            net_id = port['network_id']
+            subnet_id = port['fixed_ips'][0]['subnet_id']
+            mapped_routers[port['device_id']]['interfaces'].append({
+                'id': net_id,
+                'network': mapped_networks[net_id],
+                'subnet': subnets[subnet_id],
+            })
+        return [mapped_routers[router_id] for router_id in router_ids]
+
     def _add_host_route(self, context, destination, port):
         subnet = {}
         for fixed_ip in port['fixed_ips']:
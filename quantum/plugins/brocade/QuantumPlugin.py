@@ -77,10 +77,13 @@ class BridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                          sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
     """Agent callback."""
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.4'
     # Device names start with "tap"
     # history
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list and update_devices_down
+    #   1.3 Support security_group_info_for_devices
+    #   1.4 Support update_leases_expiration
     TAP_PREFIX_LEN = 3
 
     def create_rpc_dispatcher(self):
@@ -156,6 +159,20 @@ class BridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of a list of devices."""
+        agent_id = kwargs.get('agent_id')
+        return [self.get_device_details(rpc_context, device=device,
+                                        agent_id=agent_id)
+                for device in kwargs.get('devices') or []]
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
+        agent_id = kwargs.get('agent_id')
+        return [self.update_device_down(rpc_context, device=device,
+                                        agent_id=agent_id)
+                for device in kwargs.get('devices') or []]
+
 
 class AgentNotifierApi(proxy.RpcProxy,
                        sg_rpc.SecurityGroupAgentRpcApiMixin):
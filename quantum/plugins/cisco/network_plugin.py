@@ -46,7 +46,8 @@ class PluginV2(db_base_plugin_v2.QuantumDbPluginV2):
                             'update_port', 'get_port', 'get_ports',
                             'create_subnet',
                             'delete_subnet', 'update_subnet',
-                            'get_subnet', 'get_subnets', ]
+                            'get_subnet', 'get_subnets',
+                            'start_rpc_listener', 'rpc_workers_supported', ]
     _master = True
 
     CISCO_FAULT_MAP = {
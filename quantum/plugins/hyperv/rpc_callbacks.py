@@ -31,8 +31,9 @@ class HyperVRpcCallbacks(
         dhcp_rpc_base.DhcpRpcCallbackMixin,
         l3_rpc_base.L3RpcCallbackMixin):
 
-    # Set RPC API version to 1.0 by default.
-    RPC_API_VERSION = '1.0'
+    # history
+    #   1.4 Support update_leases_expiration (DhcpPluginApi version)
+    RPC_API_VERSION = '1.4'
 
     def __init__(self, notifier):
         self.notifier = notifier
@@ -15,6 +15,7 @@
 
 
 from sqlalchemy.orm import exc
+from sqlalchemy import sql
 
 from quantum.common import exceptions as q_exc
 import quantum.db.api as db
@@ -229,6 +230,30 @@ def get_port_from_device(device):
     return port_dict
 
 
+def get_ports_and_bindings_from_devices(session, devices):
+    """Get the ports matching the device id prefixes in a single query.
+
+    :param devices: the port id prefixes used as device names by the agent.
+    :returns: a dict mapping each device found to a tuple of its port and
+              the network binding of its network.
+    """
+    if not devices:
+        return {}
+    query = session.query(models_v2.Port, l2network_models_v2.NetworkBinding)
+    query = query.outerjoin(
+        l2network_models_v2.NetworkBinding,
+        (models_v2.Port.network_id ==
+         l2network_models_v2.NetworkBinding.network_id))
+    query = query.filter(sql.or_(*[models_v2.Port.id.startswith(device)
+                                   for device in devices]))
+    result = {}
+    for port, binding in query:
+        for device in devices:
+            if port.id.startswith(device):
+                result[device] = (port, binding)
+    return result
+
+
 def set_port_status(port_id, status):
     """Set the port status."""
     LOG.debug(_("set_port_status as %s called"), status)
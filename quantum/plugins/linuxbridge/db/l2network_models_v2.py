@@ -14,8 +14,10 @@
 # limitations under the License.
 
 import sqlalchemy as sa
+from sqlalchemy import orm
 
 from quantum.db import model_base
+from quantum.db import models_v2
 
 
 class NetworkState(model_base.BASEV2):
@@ -47,6 +49,12 @@ class NetworkBinding(model_base.BASEV2):
                            primary_key=True)
     physical_network = sa.Column(sa.String(64))
     vlan_id = sa.Column(sa.Integer, nullable=False)
+    # Eagerly loaded with the networks to extend them with provider
+    # attributes without extra queries
+    network = orm.relationship(
+        models_v2.Network,
+        backref=orm.backref('lb_binding', lazy='joined',
+                            uselist=False, cascade='delete'))
 
     def __init__(self, network_id, physical_network, vlan_id):
         self.network_id = network_id
@@ -58,7 +58,10 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
 
     # history
     #   1.1 Support Security Group RPC
-    RPC_API_VERSION = '1.1'
+    #   1.2 Support get_devices_details_list and update_devices_down
+    #   1.3 Support security_group_info_for_devices
+    #   1.4 Support update_leases_expiration
+    RPC_API_VERSION = '1.4'
     # Device names start with "tap"
     TAP_PREFIX_LEN = 3
 
@@ -80,53 +83,79 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
 
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
+        kwargs['devices'] = [kwargs.pop('device', None)]
+        return self.get_devices_details_list(rpc_context, **kwargs)[0]
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of a list of devices."""
         agent_id = kwargs.get('agent_id')
-        device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s details requested from %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = self.get_port_from_device(device)
-        if port:
-            binding = db.get_network_binding(db_api.get_session(),
-                                             port['network_id'])
-            (network_type,
-             segmentation_id) = constants.interpret_vlan_id(binding.vlan_id)
-            entry = {'device': device,
-                     'network_type': network_type,
-                     'physical_network': binding.physical_network,
-                     'segmentation_id': segmentation_id,
-                     'network_id': port['network_id'],
-                     'port_id': port['id'],
-                     'admin_state_up': port['admin_state_up']}
-            if cfg.CONF.AGENT.rpc_support_old_agents:
-                entry['vlan_id'] = binding.vlan_id
-            new_status = (q_const.PORT_STATUS_ACTIVE if port['admin_state_up']
-                          else q_const.PORT_STATUS_DOWN)
-            if port['status'] != new_status:
-                db.set_port_status(port['id'], new_status)
-        else:
-            entry = {'device': device}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+        devices = kwargs.get('devices') or []
+        LOG.debug(_("Devices %(devices)s details requested from "
+                    "%(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        entries = []
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = db.get_ports_and_bindings_from_devices(
+                session, [device[self.TAP_PREFIX_LEN:] for device in devices])
+            for device in devices:
+                port, binding = ports.get(device[self.TAP_PREFIX_LEN:],
+                                          (None, None))
+                if not (port and binding):
+                    entries.append({'device': device})
+                    LOG.debug(_("%s can not be found in database"), device)
+                    continue
+                (network_type,
+                 segmentation_id) = constants.interpret_vlan_id(
+                     binding.vlan_id)
+                entry = {'device': device,
+                         'network_type': network_type,
+                         'physical_network': binding.physical_network,
+                         'segmentation_id': segmentation_id,
+                         'network_id': port['network_id'],
+                         'port_id': port['id'],
+                         'admin_state_up': port['admin_state_up']}
+                if cfg.CONF.AGENT.rpc_support_old_agents:
+                    entry['vlan_id'] = binding.vlan_id
+                entries.append(entry)
+                new_status = (q_const.PORT_STATUS_ACTIVE
+                              if port['admin_state_up']
+                              else q_const.PORT_STATUS_DOWN)
+                if port['status'] != new_status:
+                    port['status'] = new_status
+        return entries
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
+        kwargs['devices'] = [kwargs.pop('device', None)]
+        return self.update_devices_down(rpc_context, **kwargs)[0]
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
         # TODO(garyk) - live migration and port status
         agent_id = kwargs.get('agent_id')
-        device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s no longer exists on %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = self.get_port_from_device(device)
-        if port:
-            entry = {'device': device,
-                     'exists': True}
-            if port['status'] != q_const.PORT_STATUS_DOWN:
-                # Set port status to DOWN
-                db.set_port_status(port['id'], q_const.PORT_STATUS_DOWN)
-        else:
-            entry = {'device': device,
-                     'exists': False}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+        devices = kwargs.get('devices') or []
+        LOG.debug(_("Devices %(devices)s no longer exist on %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        entries = []
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = db.get_ports_and_bindings_from_devices(
+                session, [device[self.TAP_PREFIX_LEN:] for device in devices])
+            for device in devices:
+                port, binding = ports.get(device[self.TAP_PREFIX_LEN:],
+                                          (None, None))
+                if port:
+                    entries.append({'device': device,
+                                    'exists': True})
+                    if port['status'] != q_const.PORT_STATUS_DOWN:
+                        # Set port status to DOWN
+                        port['status'] = q_const.PORT_STATUS_DOWN
+                else:
+                    entries.append({'device': device,
+                                    'exists': False})
+                    LOG.debug(_("%s can not be found in database"), device)
+        return entries
 
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent."""
@@ -252,17 +281,19 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
     def _setup_rpc(self):
         # RPC support
         self.topic = topics.PLUGIN
-        self.conn = rpc.create_connection(new=True)
         self.callbacks = LinuxBridgeRpcCallbacks()
         self.dispatcher = self.callbacks.create_rpc_dispatcher()
-        self.conn.create_consumer(self.topic, self.dispatcher,
-                                  fanout=False)
-        # Consume from all consumers in a thread
-        self.conn.consume_in_thread()
         self.notifier = AgentNotifierApi(topics.AGENT)
         self.dhcp_agent_notifier = dhcp_rpc_agent_api.DhcpAgentNotifyAPI()
         self.l3_agent_notifier = l3_rpc_agent_api.L3AgentNotify
 
+    def start_rpc_listener(self):
+        self.conn = rpc.create_connection(new=True)
+        self.conn.create_consumer(self.topic, self.dispatcher,
+                                  fanout=False)
+        # Consume from all consumers in a thread
+        return self.conn.consume_in_thread()
+
     def _parse_network_vlan_ranges(self):
         try:
             self.network_vlan_ranges = plugin_utils.parse_network_vlan_ranges(
@@ -280,8 +311,9 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         if physical_network not in self.network_vlan_ranges:
             self.network_vlan_ranges[physical_network] = []
 
-    def _extend_network_dict_provider(self, context, network):
-        binding = db.get_network_binding(context.session, network['id'])
+    def _extend_network_dict_provider(self, context, network, binding=None):
+        if binding is None:
+            binding = db.get_network_binding(context.session, network['id'])
         if binding.vlan_id == constants.FLAT_VLAN_ID:
             network[provider.NETWORK_TYPE] = constants.TYPE_FLAT
             network[provider.PHYSICAL_NETWORK] = binding.physical_network
@@ -295,6 +327,19 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             network[provider.PHYSICAL_NETWORK] = binding.physical_network
             network[provider.SEGMENTATION_ID] = binding.vlan_id
 
+    def _extend_network_dict_provider_db(self, network_res, network_db):
+        # The binding is loaded together with the network, so this does
+        # not cause an extra query. It does not exist yet while the network
+        # is being created.
+        if (isinstance(self, LinuxBridgePluginV2) and
+                network_db.lb_binding is not None):
+            self._extend_network_dict_provider(None, network_res,
+                                               network_db.lb_binding)
+
+    # Register dict extend functions for networks
+    db_base_plugin_v2.QuantumDbPluginV2.register_dict_extend_funcs(
+        attributes.NETWORKS, [_extend_network_dict_provider_db])
+
     def _process_provider_create(self, context, attrs):
         network_type = attrs.get(provider.NETWORK_TYPE)
         physical_network = attrs.get(provider.PHYSICAL_NETWORK)
@@ -446,35 +491,36 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
 
     def get_networks(self, context, filters=None, fields=None,
                      sorts=None, limit=None, marker=None, page_reverse=False):
-        session = context.session
-        with session.begin(subtransactions=True):
-            nets = super(LinuxBridgePluginV2,
-                         self).get_networks(context, filters, None, sorts,
-                                            limit, marker, page_reverse)
-            for net in nets:
-                self._extend_network_dict_provider(context, net)
-                self._extend_network_dict_l3(context, net)
-
-        return [self._fields(net, fields) for net in nets]
+        # The provider and l3 attributes are eagerly loaded and added to
+        # the networks by their dict extend functions
+        return super(LinuxBridgePluginV2,
+                     self).get_networks(context, filters, fields, sorts,
+                                        limit, marker, page_reverse)
 
     def create_port(self, context, port):
-        session = context.session
-        port_data = port['port']
-        with session.begin(subtransactions=True):
-            self._ensure_default_security_group_on_port(context, port)
-            sgids = self._get_security_groups_on_port(context, port)
-            # Set port status as 'DOWN'. This will be updated by agent
-            port['port']['status'] = q_const.PORT_STATUS_DOWN
-
-            port = super(LinuxBridgePluginV2,
-                         self).create_port(context, port)
-            self._process_portbindings_create_and_update(context,
-                                                         port_data,
-                                                         port)
-            self._process_port_create_security_group(
-                context, port, sgids)
-        self.notify_security_groups_member_updated(context, port)
-        return port
+        # Set port status as 'DOWN'. This will be updated by agent
+        port['port']['status'] = q_const.PORT_STATUS_DOWN
+        return super(LinuxBridgePluginV2, self).create_port(context, port)
+
+    def create_port_bulk(self, context, ports):
+        ports = [item['port'] for item in ports['ports']]
+        for port in ports:
+            port['status'] = q_const.PORT_STATUS_DOWN
+        return self._create_ports(context, ports)
+
+    def _process_port_create(self, context, port_data, port):
+        self._ensure_default_security_group_on_port(context,
+                                                    {'port': port_data})
+        sgids = self._get_security_groups_on_port(context,
+                                                  {'port': port_data})
+        self._process_portbindings_create_and_update(context,
+                                                     port_data,
+                                                     port)
+        self._process_port_create_security_group(
+            context, port, sgids)
+
+    def _process_ports_created(self, context, ports):
+        self.notify_security_groups_member_updated_bulk(context, ports)
 
     def update_port(self, context, id, port):
         original_port = self.get_port(context, id)
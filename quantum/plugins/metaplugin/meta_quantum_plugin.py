@@ -18,6 +18,7 @@
 from oslo.config import cfg
 
 from quantum.common import exceptions as exc
+from quantum.common import rpc as q_rpc
 from quantum.db import api as db
 from quantum.db import db_base_plugin_v2
 from quantum.db import extraroute_db
@@ -115,6 +116,23 @@ class MetaPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         plugin_klass = importutils.import_class(plugin_provider)
         return plugin_klass()
 
+    def _get_rpc_plugins(self):
+        """Return the plugins which let the server consume their topics."""
+        plugins = []
+        for plugin in self.plugins.values() + self.l3_plugins.values():
+            if plugin not in plugins and plugin.rpc_workers_supported():
+                plugins.append(plugin)
+        return plugins
+
+    def start_rpc_listener(self):
+        return q_rpc.RpcListenerGroup(
+            [plugin.start_rpc_listener()
+             for plugin in self._get_rpc_plugins()])
+
+    def rpc_workers_supported(self):
+        # The other plugins consume their topics when created
+        return bool(self._get_rpc_plugins())
+
     def _get_plugin(self, flavor):
         if flavor not in self.plugins:
             raise FlavorNotFound(flavor=flavor)
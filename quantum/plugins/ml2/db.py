@@ -14,6 +14,7 @@
 #    under the License.
 
 from sqlalchemy.orm import exc
+from sqlalchemy import sql
 
 from quantum.db import api as db_api
 from quantum.db import models_v2
@@ -48,14 +49,17 @@ def add_network_segment(session, network_id, segment):
               'network_id': record.network_id})
 
 
+def make_segment_dict(record):
+    return {api.NETWORK_TYPE: record.network_type,
+            api.PHYSICAL_NETWORK: record.physical_network,
+            api.SEGMENTATION_ID: record.segmentation_id}
+
+
 def get_network_segments(session, network_id):
     with session.begin(subtransactions=True):
         records = (session.query(models.NetworkSegment).
                    filter_by(network_id=network_id))
-        return [{api.NETWORK_TYPE: record.network_type,
-                 api.PHYSICAL_NETWORK: record.physical_network,
-                 api.SEGMENTATION_ID: record.segmentation_id}
-                for record in records]
+        return [make_segment_dict(record) for record in records]
 
 
 def get_port(session, port_id):
@@ -75,6 +79,44 @@ def get_port(session, port_id):
             return
 
 
+def get_ports_and_segments(session, port_ids):
+    """Get the ports and the segments of their networks in a single query.
+
+    :param port_ids: port ids, or prefixes of port ids.
+    :returns: a dict mapping each port id found to a tuple of the port
+              record and the list of segments of its network.
+    """
+    result = {}
+    if not port_ids:
+        return result
+    ambiguous = set()
+    with session.begin(subtransactions=True):
+        query = session.query(models_v2.Port, models.NetworkSegment)
+        query = query.outerjoin(
+            models.NetworkSegment,
+            models_v2.Port.network_id == models.NetworkSegment.network_id)
+        query = query.filter(sql.or_(*[models_v2.Port.id.startswith(port_id)
+                                       for port_id in port_ids]))
+        for port, record in query:
+            for port_id in port_ids:
+                if not port.id.startswith(port_id):
+                    continue
+                if port_id not in result:
+                    result[port_id] = (port, [])
+                elif result[port_id][0].id != port.id:
+                    ambiguous.add(port_id)
+                    continue
+                if record:
+                    result[port_id][1].append(
+                        {api.NETWORK_TYPE: record.network_type,
+                         api.PHYSICAL_NETWORK: record.physical_network,
+                         api.SEGMENTATION_ID: record.segmentation_id})
+    for port_id in ambiguous:
+        LOG.error(_("Multiple ports have port_id starting with %s"), port_id)
+        del result[port_id]
+    return result
+
+
 def get_port_and_sgs(port_id):
     """Get port from database with security group info."""
 
@@ -14,6 +14,7 @@
 #    under the License.
 
 import sqlalchemy as sa
+from sqlalchemy import orm
 
 from quantum.db import model_base
 from quantum.db import models_v2
@@ -35,3 +36,8 @@ class NetworkSegment(model_base.BASEV2, models_v2.HasId):
     network_type = sa.Column(sa.String(32), nullable=False)
     physical_network = sa.Column(sa.String(64))
     segmentation_id = sa.Column(sa.Integer)
+    # Eagerly loaded with the networks to extend them with provider
+    # attributes without extra queries
+    network = orm.relationship(
+        models_v2.Network,
+        backref=orm.backref('segments', lazy='joined', cascade='delete'))
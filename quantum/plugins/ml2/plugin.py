@@ -104,11 +104,13 @@ class Ml2Plugin(db_base_plugin_v2.QuantumDbPluginV2,
         self.l3_agent_notifier = l3_rpc_agent_api.L3AgentNotify
         self.callbacks = rpc.RpcCallbacks(self.notifier)
         self.topic = topics.PLUGIN
-        self.conn = c_rpc.create_connection(new=True)
         self.dispatcher = self.callbacks.create_rpc_dispatcher()
+
+    def start_rpc_listener(self):
+        self.conn = c_rpc.create_connection(new=True)
         self.conn.create_consumer(self.topic, self.dispatcher,
                                   fanout=False)
-        self.conn.consume_in_thread()
+        return self.conn.consume_in_thread()
 
     def _process_provider_create(self, context, attrs):
         network_type = self._get_attribute(attrs, provider.NETWORK_TYPE)
@@ -141,9 +143,10 @@ class Ml2Plugin(db_base_plugin_v2.QuantumDbPluginV2,
             msg = _("Plugin does not support updating provider attributes")
             raise exc.InvalidInput(error_message=msg)
 
-    def _extend_network_dict_provider(self, context, network):
+    def _extend_network_dict_provider(self, context, network, segments=None):
         id = network['id']
-        segments = db.get_network_segments(context.session, id)
+        if segments is None:
+            segments = db.get_network_segments(context.session, id)
         if not segments:
             LOG.error(_("Network %s has no segments"), id)
             network[provider.NETWORK_TYPE] = None
@@ -159,6 +162,19 @@ class Ml2Plugin(db_base_plugin_v2.QuantumDbPluginV2,
             network[provider.PHYSICAL_NETWORK] = segment[api.PHYSICAL_NETWORK]
             network[provider.SEGMENTATION_ID] = segment[api.SEGMENTATION_ID]
 
+    def _extend_network_dict_provider_db(self, network_res, network_db):
+        # The segments are loaded together with the network, so this does
+        # not cause an extra query. They do not exist yet while the network
+        # is being created.
+        if isinstance(self, Ml2Plugin) and network_db.segments:
+            segments = [db.make_segment_dict(record)
+                        for record in network_db.segments]
+            self._extend_network_dict_provider(None, network_res, segments)
+
+    # Register dict extend functions for networks
+    db_base_plugin_v2.QuantumDbPluginV2.register_dict_extend_funcs(
+        attributes.NETWORKS, [_extend_network_dict_provider_db])
+
     def _filter_nets_provider(self, context, nets, filters):
         # TODO(rkukura): Implement filtering.
         return nets
@@ -239,13 +255,11 @@ class Ml2Plugin(db_base_plugin_v2.QuantumDbPluginV2,
                      sorts=None, limit=None, marker=None, page_reverse=False):
         session = context.session
         with session.begin(subtransactions=True):
+            # The provider and l3 attributes are eagerly loaded and added to
+            # the networks by their dict extend functions
             nets = super(Ml2Plugin,
                          self).get_networks(context, filters, None, sorts,
                                             limit, marker, page_reverse)
-            for net in nets:
-                self._extend_network_dict_provider(context, net)
-                self._extend_network_dict_l3(context, net)
-
             nets = self._filter_nets_provider(context, nets, filters)
             nets = self._filter_nets_l3(context, nets, filters)
 
@@ -266,19 +280,24 @@ class Ml2Plugin(db_base_plugin_v2.QuantumDbPluginV2,
     def create_port(self, context, port):
         attrs = port['port']
         attrs['status'] = const.PORT_STATUS_DOWN
-
-        session = context.session
-        with session.begin(subtransactions=True):
-            self._ensure_default_security_group_on_port(context, port)
-            sgids = self._get_security_groups_on_port(context, port)
-            result = super(Ml2Plugin, self).create_port(context, port)
-            self._process_portbindings_create_and_update(context, attrs,
-                                                         result)
-            self._process_port_create_security_group(context, result, sgids)
-            self._extend_port_dict_binding(context, result)
-
-        self.notify_security_groups_member_updated(context, result)
-        return result
+        return super(Ml2Plugin, self).create_port(context, port)
+
+    def create_port_bulk(self, context, ports):
+        ports = [item['port'] for item in ports['ports']]
+        for attrs in ports:
+            attrs['status'] = const.PORT_STATUS_DOWN
+        return self._create_ports(context, ports)
+
+    def _process_port_create(self, context, attrs, result):
+        self._ensure_default_security_group_on_port(context, {'port': attrs})
+        sgids = self._get_security_groups_on_port(context, {'port': attrs})
+        self._process_portbindings_create_and_update(context, attrs,
+                                                     result)
+        self._process_port_create_security_group(context, result, sgids)
+        self._extend_port_dict_binding(context, result)
+
+    def _process_ports_created(self, context, ports):
+        self.notify_security_groups_member_updated_bulk(context, ports)
 
     def update_port(self, context, id, port):
         attrs = port['port']
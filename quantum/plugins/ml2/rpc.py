@@ -37,10 +37,13 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                    l3_rpc_base.L3RpcCallbackMixin,
                    sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.4'
     # history
     #   1.0 Initial version (from openvswitch/linuxbridge)
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list and update_devices_down
+    #   1.3 Support security_group_info_for_devices
+    #   1.4 Support update_leases_expiration
 
     def __init__(self, notifier):
         self.notifier = notifier
@@ -74,69 +77,92 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
 
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
+        kwargs['devices'] = [kwargs.pop('device', None)]
+        return self.get_devices_details_list(rpc_context, **kwargs)[0]
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of a list of devices."""
         agent_id = kwargs.get('agent_id')
-        device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s details requested by agent "
+        devices = kwargs.get('devices') or []
+        LOG.debug(_("Devices %(devices)s details requested by agent "
                     "%(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port_id = self._device_to_port_id(device)
-
+                  {'devices': devices, 'agent_id': agent_id})
+        entries = []
         session = db_api.get_session()
         with session.begin(subtransactions=True):
-            port = db.get_port(session, port_id)
-            if not port:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s not found in database"),
-                            {'device': device, 'agent_id': agent_id})
-                return {'device': device}
-            segments = db.get_network_segments(session, port.network_id)
-            if not segments:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s has network %(network_id) with "
-                              "no segments"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id})
-                return {'device': device}
-            #TODO(rkukura): Use/create port binding
-            segment = segments[0]
-            new_status = (q_const.PORT_STATUS_ACTIVE if port.admin_state_up
-                          else q_const.PORT_STATUS_DOWN)
-            if port.status != new_status:
-                port.status = new_status
-            entry = {'device': device,
-                     'network_id': port.network_id,
-                     'port_id': port.id,
-                     'admin_state_up': port.admin_state_up,
-                     'network_type': segment[api.NETWORK_TYPE],
-                     'segmentation_id': segment[api.SEGMENTATION_ID],
-                     'physical_network': segment[api.PHYSICAL_NETWORK]}
-            LOG.debug(_("Returning: %s"), entry)
-            return entry
+            ports = db.get_ports_and_segments(
+                session, [self._device_to_port_id(device)
+                          for device in devices])
+            for device in devices:
+                port, segments = ports.get(self._device_to_port_id(device),
+                                           (None, None))
+                if not port:
+                    LOG.warning(_("Device %(device)s requested by agent "
+                                  "%(agent_id)s not found in database"),
+                                {'device': device, 'agent_id': agent_id})
+                    entries.append({'device': device})
+                    continue
+                if not segments:
+                    LOG.warning(_("Device %(device)s requested by agent "
+                                  "%(agent_id)s has network %(network_id)s "
+                                  "with no segments"),
+                                {'device': device,
+                                 'agent_id': agent_id,
+                                 'network_id': port.network_id})
+                    entries.append({'device': device})
+                    continue
+                #TODO(rkukura): Use/create port binding
+                segment = segments[0]
+                new_status = (q_const.PORT_STATUS_ACTIVE
+                              if port.admin_state_up
+                              else q_const.PORT_STATUS_DOWN)
+                if port.status != new_status:
+                    port.status = new_status
+                entry = {'device': device,
+                         'network_id': port.network_id,
+                         'port_id': port.id,
+                         'admin_state_up': port.admin_state_up,
+                         'network_type': segment[api.NETWORK_TYPE],
+                         'segmentation_id': segment[api.SEGMENTATION_ID],
+                         'physical_network': segment[api.PHYSICAL_NETWORK]}
+                LOG.debug(_("Returning: %s"), entry)
+                entries.append(entry)
+        return entries
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
+        kwargs['devices'] = [kwargs.pop('device', None)]
+        return self.update_devices_down(rpc_context, **kwargs)[0]
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
         # TODO(garyk) - live migration and port status
         agent_id = kwargs.get('agent_id')
-        device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s no longer exists at agent "
+        devices = kwargs.get('devices') or []
+        LOG.debug(_("Devices %(devices)s no longer exist at agent "
                     "%(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port_id = self._device_to_port_id(device)
-
+                  {'devices': devices, 'agent_id': agent_id})
+        entries = []
         session = db_api.get_session()
         with session.begin(subtransactions=True):
-            port = db.get_port(session, port_id)
-            if not port:
-                LOG.warning(_("Device %(device)s updated down by agent "
-                              "%(agent_id)s not found in database"),
-                            {'device': device, 'agent_id': agent_id})
-                return {'device': device,
-                        'exists': False}
-            if port.status != q_const.PORT_STATUS_DOWN:
-                port.status = q_const.PORT_STATUS_DOWN
-            return {'device': device,
-                    'exists': True}
+            ports = db.get_ports_and_segments(
+                session, [self._device_to_port_id(device)
+                          for device in devices])
+            for device in devices:
+                port, segments = ports.get(self._device_to_port_id(device),
+                                           (None, None))
+                if not port:
+                    LOG.warning(_("Device %(device)s updated down by agent "
+                                  "%(agent_id)s not found in database"),
+                                {'device': device, 'agent_id': agent_id})
+                    entries.append({'device': device,
+                                    'exists': False})
+                    continue
+                if port.status != q_const.PORT_STATUS_DOWN:
+                    port.status = q_const.PORT_STATUS_DOWN
+                entries.append({'device': device,
+                                'exists': True})
+        return entries
 
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent."""
@@ -33,7 +33,8 @@ class MlnxRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                        sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
     # History
     #  1.1 Support Security Group RPC
-    RPC_API_VERSION = '1.1'
+    #  1.4 Support update_leases_expiration (DhcpPluginApi version)
+    RPC_API_VERSION = '1.4'
 
     #to be compatible with Linux Bridge Agent on Network Node
     TAP_PREFIX_LEN = 3
@@ -57,6 +57,7 @@ from quantum.plugins.nicira.common import config  # noqa
 from quantum.plugins.nicira.common import exceptions as nvp_exc
 from quantum.plugins.nicira.common import metadata_access as nvp_meta
 from quantum.plugins.nicira.common import securitygroups as nvp_sec
+from quantum.plugins.nicira.common import sync
 from quantum.plugins.nicira.dbexts import maclearning as mac_db
 from quantum.plugins.nicira.extensions import maclearning as mac_ext
 from quantum.plugins.nicira.extensions import nvp_networkgw as networkgw
@@ -110,8 +111,9 @@ def create_nvp_cluster(cluster_opts, concurrent_connections,
 
 class NVPRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin):
 
-    # Set RPC API version to 1.0 by default.
-    RPC_API_VERSION = '1.0'
+    # history
+    #   1.4 Support update_leases_expiration (DhcpPluginApi version)
+    RPC_API_VERSION = '1.4'
 
     def create_rpc_dispatcher(self):
         '''Get the rpc dispatcher for this manager.
@@ -196,6 +198,11 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                                           self.nvp_opts.nvp_gen_timeout)
 
         db.configure_db()
+        # Keep the status of the resources stored in the db in sync with NVP
+        self._synchronizer = sync.NvpSynchronizer(
+            self.cluster, self.nvp_opts.state_sync_interval,
+            self.nvp_opts.max_status_age)
+        self._synchronizer.start()
         # Extend the fault map
         self._extend_fault_map()
         # Set up RPC interface for DHCP agent
@@ -906,8 +913,10 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         with context.session.begin(subtransactions=True):
             # goto to the plugin DB and fetch the network
             network = self._get_network(context, id)
-            # if the network is external, do not go to NVP
-            if not self._network_is_external(context, id):
+            # if the network is external, do not go to NVP, neither if
+            # its status was synchronized recently enough
+            if not (self._synchronizer.is_status_fresh() or
+                    self._network_is_external(context, id)):
                 # verify the fabric status of the corresponding
                 # logical switch(es) in nvp
                 try:
@@ -948,19 +957,10 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._extend_network_qos_queue(context, net_result)
         return self._fields(net_result, fields)
 
-    def get_networks(self, context, filters=None, fields=None):
+    def _set_networks_status_from_nvp(self, context, quantum_lswitches,
+                                      filters):
         nvp_lswitches = {}
-        filters = filters or {}
-        with context.session.begin(subtransactions=True):
-            quantum_lswitches = (
-                super(NvpPluginV2, self).get_networks(context, filters))
-            for net in quantum_lswitches:
-                self._extend_network_dict_provider(context, net)
-                self._extend_network_port_security_dict(context, net)
-                self._extend_network_dict_l3(context, net)
-                self._extend_network_qos_queue(context, net)
-
-            tenant_ids = filters and filters.get('tenant_id') or None
+        tenant_ids = filters.get('tenant_id')
         filter_fmt = "&tag=%s&tag_scope=os_tid"
         if context.is_admin and not tenant_ids:
             tenant_filter = ""
@@ -1019,19 +1019,22 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                         "to Quantum networks. Quantum and NVP are "
                         "potentially out of sync"), len(nvp_lswitches))
 
-        LOG.debug(_("get_networks() completed for tenant %s"),
-                  context.tenant_id)
-
-        if fields:
-            ret_fields = []
-            for quantum_lswitch in quantum_lswitches:
-                row = {}
-                for field in fields:
-                    row[field] = quantum_lswitch[field]
-                ret_fields.append(row)
-            return ret_fields
-
-        return quantum_lswitches
+    def get_networks(self, context, filters=None, fields=None):
+        filters = filters or {}
+        with context.session.begin(subtransactions=True):
+            networks = super(NvpPluginV2, self).get_networks(context,
+                                                             filters)
+            for net in networks:
+                self._extend_network_dict_provider(context, net)
+                self._extend_network_port_security_dict(context, net)
+                self._extend_network_dict_l3(context, net)
+                self._extend_network_qos_queue(context, net)
+        # The status of the networks is kept in sync with NVP by the
+        # synchronizer, only go to NVP if it is not recent enough, e.g.
+        # when the synchronizer is disabled
+        if not self._synchronizer.is_status_fresh():
+            self._set_networks_status_from_nvp(context, networks, filters)
+        return [self._fields(net, fields) for net in networks]
 
     def update_network(self, context, id, network):
         if network["network"].get("admin_state_up"):
@@ -1055,17 +1058,11 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._extend_network_qos_queue(context, net)
         return net
 
-    def get_ports(self, context, filters=None, fields=None):
-        with context.session.begin(subtransactions=True):
-            quantum_lports = super(NvpPluginV2, self).get_ports(
-                context, filters)
-            for quantum_lport in quantum_lports:
-                self._extend_port_port_security_dict(context, quantum_lport)
-                self._extend_port_mac_learning_state(context, quantum_lport)
-        if (filters.get('network_id') and len(filters.get('network_id')) and
+    def _set_ports_status_from_nvp(self, context, quantum_lports, filters):
+        if (filters.get('network_id') and
             self._network_is_external(context, filters['network_id'][0])):
             # Do not perform check on NVP platform
-            return quantum_lports
+            return
 
         vm_filter = ""
         tenant_filter = ""
@@ -1077,17 +1074,13 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         else:
             lswitch = "*"
 
-        if filters.get("device_id"):
-            for vm_id in filters.get("device_id"):
-                vm_filter = ("%stag_scope=vm_id&tag=%s&" % (vm_filter,
-                             hashlib.sha1(vm_id).hexdigest()))
-        else:
-            vm_id = ""
+        for vm_id in filters.get("device_id", []):
+            vm_filter = ("%stag_scope=vm_id&tag=%s&" % (vm_filter,
+                         hashlib.sha1(vm_id).hexdigest()))
 
-        if filters.get("tenant_id"):
-            for tenant in filters.get("tenant_id"):
-                tenant_filter = ("%stag_scope=os_tid&tag=%s&" %
-                                 (tenant_filter, tenant))
+        for tenant in filters.get("tenant_id", []):
+            tenant_filter = ("%stag_scope=os_tid&tag=%s&" %
+                             (tenant_filter, tenant))
 
         nvp_lports = {}
 
@@ -1116,13 +1109,11 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             LOG.exception(err_msg)
             raise nvp_exc.NvpPluginException(err_msg=err_msg)
 
-        lports = []
         for quantum_lport in quantum_lports:
             # if a quantum port is not found in NVP, this migth be because
             # such port is not mapped to a logical switch - ie: floating ip
             if quantum_lport['device_owner'] in (l3_db.DEVICE_OWNER_FLOATINGIP,
                                                  l3_db.DEVICE_OWNER_ROUTER_GW):
-                lports.append(quantum_lport)
                 continue
             try:
                 quantum_lport["admin_state_up"] = (
@@ -1142,7 +1133,6 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                 LOG.debug(_("Quantum logical port %s was not found on NVP"),
                           quantum_lport['id'])
 
-            lports.append(quantum_lport)
         # do not make the case in which ports are found in NVP
         # but not in Quantum catastrophic.
         if nvp_lports:
@@ -1150,15 +1140,19 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                           "to Quantum ports. Quantum and NVP are "
                           "potentially out of sync"), len(nvp_lports))
 
-        if fields:
-            ret_fields = []
-            for lport in lports:
-                row = {}
-                for field in fields:
-                    row[field] = lport[field]
-                ret_fields.append(row)
-            return ret_fields
-        return lports
+    def get_ports(self, context, filters=None, fields=None):
+        filters = filters or {}
+        with context.session.begin(subtransactions=True):
+            ports = super(NvpPluginV2, self).get_ports(context, filters)
+            for port in ports:
+                self._extend_port_port_security_dict(context, port)
+                self._extend_port_mac_learning_state(context, port)
+        # The status of the ports is kept in sync with NVP by the
+        # synchronizer, only go to NVP if it is not recent enough, e.g.
+        # when the synchronizer is disabled
+        if not self._synchronizer.is_status_fresh():
+            self._set_ports_status_from_nvp(context, ports, filters)
+        return [self._fields(port, fields) for port in ports]
 
     def create_port(self, context, port):
         # If PORTSECURITY is not the default value ATTR_NOT_SPECIFIED
@@ -1389,8 +1383,11 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._extend_port_qos_queue(context, quantum_db_port)
             self._extend_port_mac_learning_state(context, quantum_db_port)
 
-            if self._network_is_external(context,
-                                         quantum_db_port['network_id']):
+            # Do not go to NVP if the status of the port was synchronized
+            # recently enough
+            if (self._synchronizer.is_status_fresh() or
+                self._network_is_external(context,
+                                          quantum_db_port['network_id'])):
                 return quantum_db_port
             nvp_id = self._nvp_get_port_id(context, self.cluster,
                                            quantum_db_port)
@@ -1421,6 +1418,9 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                             constants.PORT_STATUS_ERROR)
             else:
                 quantum_db_port["status"] = constants.PORT_STATUS_ERROR
+            # Store the status read from NVP for the following list calls
+            port_db = self._get_port(context, id)
+            port_db.status = quantum_db_port["status"]
         return quantum_db_port
 
     def create_router(self, context, router):
@@ -1535,6 +1535,10 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
 
     def get_router(self, context, id, fields=None):
         router = self._get_router(context, id)
+        # Do not go to NVP if the status of the router was synchronized
+        # recently enough
+        if self._synchronizer.is_status_fresh():
+            return self._make_router_dict(router, fields)
         try:
             try:
                 lrouter = nvplib.get_lrouter(self.cluster, id)
@@ -1565,6 +1569,13 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         return self._make_router_dict(router, fields)
 
     def get_routers(self, context, filters=None, fields=None):
+        # The status of the routers is kept in sync with NVP by the
+        # synchronizer, only go to NVP if it is not recent enough, e.g.
+        # when the synchronizer is disabled
+        if self._synchronizer.is_status_fresh():
+            return super(NvpPluginV2, self).get_routers(context, filters,
+                                                        fields)
+        filters = filters or {}
         router_query = self._apply_filters_to_query(
             self._model_query(context, l3_db.Router),
             l3_db.Router, filters)
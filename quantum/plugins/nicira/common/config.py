@@ -44,6 +44,15 @@ nvp_opts = [
     cfg.StrOpt('default_transport_type', default='stt',
                help=_("The default network tranport type to use (stt, gre, "
                       "bridge, ipsec_gre, or ipsec_stt)")),
+    cfg.IntOpt('state_sync_interval', default=120,
+               help=_("Interval in seconds between the synchronizations of "
+                      "the status of networks, ports and routers with NVP. "
+                      "Set to 0 to disable it, operations then read the "
+                      "status from NVP.")),
+    cfg.IntOpt('max_status_age', default=300,
+               help=_("Maximum age in seconds of the last synchronization "
+                      "with NVP before showing or listing networks, ports "
+                      "and routers reads their status from NVP")),
 ]
 
 connection_opts = [
@@ -0,0 +1,202 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sqlalchemy as sa
+
+from quantum.common import constants
+from quantum import context as q_context
+from quantum.db import l3_db
+from quantum.db import models_v2
+from quantum.openstack.common import log as logging
+from quantum.openstack.common import loopingcall
+from quantum.openstack.common import timeutils
+from quantum.plugins.nicira import nicira_db
+from quantum.plugins.nicira import nvplib
+
+LOG = logging.getLogger(__name__)
+# Number of ids in the IN clause of a single status update
+UPDATE_CHUNK_SIZE = 500
+
+
+def _get_lswitch_status(lswitch):
+    status = lswitch['_relations']['LogicalSwitchStatus']
+    if status['fabric_status']:
+        return constants.NET_STATUS_ACTIVE
+    return constants.NET_STATUS_DOWN
+
+
+def _get_lport_status(lport):
+    status = lport['_relations']['LogicalPortStatus']
+    if status['fabric_status_up']:
+        return constants.PORT_STATUS_ACTIVE
+    return constants.PORT_STATUS_DOWN
+
+
+def _get_lrouter_status(lrouter):
+    status = lrouter['_relations']['LogicalRouterStatus']
+    if status['fabric_status']:
+        return constants.NET_STATUS_ACTIVE
+    return constants.NET_STATUS_DOWN
+
+
+def _get_tag(resource, scope):
+    for tag in resource.get('tags', []):
+        if tag['scope'] == scope:
+            return tag['tag']
+
+
+class NvpSynchronizer(object):
+    """Keeps the status of Quantum resources in sync with NVP.
+
+    The status of every logical switch, switch port and router is fetched
+    in bulk from the NVP controller every interval seconds and stored in
+    the Quantum database, from which operations are served. They only read
+    the status from NVP when the last successful synchronization is older
+    than max_status_age seconds, which is always the case when disabled.
+
+    The synchronization runs in the process which started the plugin, and
+    its time is stored in the database for the API workers it forks.
+    """
+
+    def __init__(self, cluster, interval, max_status_age):
+        self._cluster = cluster
+        self._interval = interval
+        self._max_status_age = max_status_age
+        self._synced_at = None
+        self._loop = None
+
+    def start(self):
+        """Run the synchronization every interval seconds, if positive."""
+        if self._interval <= 0 or self._loop:
+            return
+        self._loop = loopingcall.FixedIntervalLoopingCall(self._run)
+        self._loop.start(interval=self._interval)
+
+    def stop(self):
+        if self._loop:
+            self._loop.stop()
+            self._loop = None
+
+    def is_status_fresh(self):
+        """Whether the stored status of the resources can be returned."""
+        if self._interval > 0 and not self._is_fresh(self._synced_at):
+            # The last synchronization may have run in another process
+            self._synced_at = (nicira_db.get_last_sync(None) or
+                               self._synced_at)
+        return self._is_fresh(self._synced_at)
+
+    def _is_fresh(self, synced_at):
+        return (synced_at is not None and
+                not timeutils.is_older_than(synced_at,
+                                            self._max_status_age))
+
+    def _run(self):
+        try:
+            self.synchronize(q_context.get_admin_context())
+        except Exception:
+            LOG.exception(_("Unable to synchronize the status of Quantum "
+                            "resources with NVP"))
+
+    def synchronize(self, context):
+        """Update the status of all the resources stored in the database.
+
+        The resources are listed before querying NVP, so that resources
+        created in the meantime are not reported as missing from NVP.
+        """
+        started_at = timeutils.utcnow()
+        network_ids = self._get_nvp_network_ids(context)
+        port_ids = self._get_nvp_port_ids(context)
+        router_ids = [router_id for router_id, in
+                      context.session.query(l3_db.Router.id)]
+
+        lswitches = nvplib.get_all_query_pages(
+            nvplib._build_uri_path(nvplib.LSWITCH_RESOURCE,
+                                   fields='uuid,tags',
+                                   relations='LogicalSwitchStatus'),
+            self._cluster)
+        lports = nvplib.get_all_query_pages(
+            nvplib._build_uri_path(nvplib.LSWITCHPORT_RESOURCE,
+                                   parent_resource_id='*',
+                                   fields='uuid,tags',
+                                   relations='LogicalPortStatus',
+                                   filters={'tag_scope': 'q_port_id'}),
+            self._cluster)
+        lrouters = nvplib.get_lrouters(self._cluster, None)
+
+        network_status = {}
+        for lswitch in lswitches:
+            # Extra logical switches of a network are tagged with its id
+            network_id = (_get_tag(lswitch, 'quantum_net_id') or
+                          lswitch['uuid'])
+            # The network is down as soon as one of its switches is
+            if (network_status.get(network_id) !=
+                    constants.NET_STATUS_DOWN):
+                network_status[network_id] = _get_lswitch_status(lswitch)
+        port_status = dict((_get_tag(lport, 'q_port_id'),
+                            _get_lport_status(lport)) for lport in lports)
+        router_status = dict((lrouter['uuid'], _get_lrouter_status(lrouter))
+                             for lrouter in lrouters)
+
+        self._update_status(context, models_v2.Network, network_ids,
+                            network_status, constants.NET_STATUS_ERROR)
+        self._update_status(context, models_v2.Port, port_ids,
+                            port_status, constants.PORT_STATUS_ERROR)
+        self._update_status(context, l3_db.Router, router_ids,
+                            router_status, constants.NET_STATUS_ERROR)
+        nicira_db.set_last_sync(context.session, started_at)
+        self._synced_at = started_at
+        LOG.debug(_("Synchronized the status of %(networks)d networks, "
+                    "%(ports)d ports and %(routers)d routers with NVP"),
+                  {'networks': len(network_ids), 'ports': len(port_ids),
+                   'routers': len(router_ids)})
+
+    def _get_nvp_network_ids(self, context):
+        # External networks do not exist in NVP
+        query = context.session.query(models_v2.Network.id).outerjoin(
+            l3_db.ExternalNetwork).filter(
+                l3_db.ExternalNetwork.network_id == None)
+        return [network_id for network_id, in query]
+
+    def _get_nvp_port_ids(self, context):
+        # Neither do floating IP and router gateway ports, nor the ports of
+        # external networks
+        query = context.session.query(models_v2.Port.id).outerjoin(
+            l3_db.ExternalNetwork,
+            l3_db.ExternalNetwork.network_id == models_v2.Port.network_id)
+        query = query.filter(
+            l3_db.ExternalNetwork.network_id == None,
+            ~models_v2.Port.device_owner.in_(
+                [l3_db.DEVICE_OWNER_FLOATINGIP,
+                 l3_db.DEVICE_OWNER_ROUTER_GW]))
+        return [port_id for port_id, in query]
+
+    def _update_status(self, context, model, ids, nvp_status,
+                       missing_status):
+        ids_by_status = {}
+        for resource_id in ids:
+            status = nvp_status.get(resource_id, missing_status)
+            ids_by_status.setdefault(status, []).append(resource_id)
+        with context.session.begin(subtransactions=True):
+            for status, status_ids in ids_by_status.iteritems():
+                for i in xrange(0, len(status_ids), UPDATE_CHUNK_SIZE):
+                    chunk = status_ids[i:i + UPDATE_CHUNK_SIZE]
+                    query = context.session.query(model).filter(
+                        model.id.in_(chunk),
+                        sa.or_(model.status == None,
+                               model.status != status))
+                    query.update({'status': status},
+                                 synchronize_session=False)
@@ -23,6 +23,8 @@ from quantum.plugins.nicira import nicira_models
 from quantum.plugins.nicira import nicira_networkgw_db
 
 LOG = logging.getLogger(__name__)
+# Id of the single row of the nvp_sync_status table
+SYNC_STATUS_ID = 1
 
 
 def get_network_binding(session, network_id):
@@ -84,6 +86,25 @@ def get_nvp_port_id(session, quantum_id):
         return
 
 
+def get_last_sync(session):
+    session = session or db.get_session()
+    sync_status = (session.query(nicira_models.NvpSyncStatus).
+                   filter_by(id=SYNC_STATUS_ID).first())
+    if sync_status:
+        return sync_status['synced_at']
+
+
+def set_last_sync(session, synced_at):
+    with session.begin(subtransactions=True):
+        sync_status = (session.query(nicira_models.NvpSyncStatus).
+                       filter_by(id=SYNC_STATUS_ID).first())
+        if sync_status:
+            sync_status['synced_at'] = synced_at
+        else:
+            session.add(nicira_models.NvpSyncStatus(SYNC_STATUS_ID,
+                                                    synced_at))
+
+
 def unset_default_network_gateways(session):
     with session.begin(subtransactions=True):
         session.query(nicira_networkgw_db.NetworkGateway).update(
@@ -16,7 +16,7 @@
 #    under the License.
 
 
-from sqlalchemy import Column, Enum, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, String
 
 from quantum.db.models_v2 import model_base
 
@@ -64,3 +64,19 @@ class QuantumNvpPortMapping(model_base.BASEV2):
     def __init__(self, quantum_id, nvp_id):
         self.quantum_id = quantum_id
         self.nvp_id = nvp_id
+
+
+class NvpSyncStatus(model_base.BASEV2):
+    """Represents the last synchronization of the resource status with NVP.
+
+    A single row is shared by the process running the synchronization and
+    the API workers, which read the status it stored.
+    """
+
+    __tablename__ = 'nvp_sync_status'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    synced_at = Column(DateTime, nullable=False)
+
+    def __init__(self, id, synced_at):
+        self.id = id
+        self.synced_at = synced_at
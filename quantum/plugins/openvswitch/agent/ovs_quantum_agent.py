@@ -22,6 +22,7 @@
 # @author: Seetharama Ayyadevara, Freescale Semiconductor, Inc.
 # @author: Kyle Mestery, Cisco Systems, Inc.
 
+import contextlib
 import distutils.version as dist_version
 import sys
 import time
@@ -31,6 +32,7 @@ from oslo.config import cfg
 
 from quantum.agent.linux import ip_lib
 from quantum.agent.linux import ovs_lib
+from quantum.agent.linux import ovsdb_monitor
 from quantum.agent import rpc as agent_rpc
 from quantum.agent import securitygroups_rpc as sg_rpc
 from quantum.common import config as logging_config
@@ -149,7 +151,9 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
 
     def __init__(self, integ_br, tun_br, local_ip,
                  bridge_mappings, root_helper,
-                 polling_interval, tunnel_type=constants.TYPE_NONE):
+                 polling_interval, tunnel_type=constants.TYPE_NONE,
+                 minimize_polling=False, ovsdb_monitor_respawn_interval=30,
+                 full_scan_interval=60):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -160,6 +164,14 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         :param polling_interval: interval (secs) to poll DB.
         :param tunnel_type: Either gre or vxlan. If set, will automatically
                set enable_tunneling to True.
+        :param minimize_polling: Optional, whether to monitor ovsdb for
+               interface changes instead of polling the integration bridge.
+        :param ovsdb_monitor_respawn_interval: Optional, when using
+               polling minimization, the number of seconds to wait before
+               respawning the ovsdb monitor.
+        :param full_scan_interval: Optional, when using polling
+               minimization, the number of seconds between full scans of
+               the integration bridge ports.
         '''
         self.root_helper = root_helper
         self.available_local_vlans = set(xrange(q_const.MIN_VLAN_TAG,
@@ -169,6 +181,13 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         self.local_vlan_map = {}
 
         self.polling_interval = polling_interval
+        self.full_scan_interval = full_scan_interval
+        if minimize_polling:
+            self.interface_monitor = ovsdb_monitor.SimpleInterfaceMonitor(
+                root_helper=root_helper,
+                respawn_interval=ovsdb_monitor_respawn_interval)
+        else:
+            self.interface_monitor = None
 
         if tunnel_type in constants.TUNNEL_NETWORK_TYPES:
             self.enable_tunneling = True
@@ -614,6 +633,21 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 'added': added,
                 'removed': removed}
 
+    def update_ports_from_events(self, registered_ports):
+        """Compute the port deltas reported by the ovsdb monitor."""
+        events = self.interface_monitor.get_events()
+        added = events['added'] - registered_ports
+        removed = events['removed'] & registered_ports
+        if not (added or removed):
+            return
+        return {'current': (registered_ports | added) - removed,
+                'added': added,
+                'removed': removed}
+
+    def _monitor_is_active(self):
+        return (self.interface_monitor is not None and
+                self.interface_monitor.is_active)
+
     def treat_vif_port(self, vif_port, port_id, network_id, network_type,
                        physical_network, segmentation_id, admin_state_up):
         if vif_port:
@@ -626,21 +660,22 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             LOG.debug(_("No VIF port for port %s defined on agent."), port_id)
 
     def treat_devices_added(self, devices):
-        resync = False
         self.sg_agent.prepare_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details_list = self.plugin_rpc.get_devices_details_list(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        vif_ports = self.int_br.get_vif_ports_by_ids(
+            details['device'] for details in devices_details_list)
+        for details in devices_details_list:
+            device = details['device']
             LOG.info(_("Port %s added"), device)
-            try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-            port = self.int_br.get_vif_port_by_id(details['device'])
+            port = vif_ports.get(device)
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
                          {'device': device, 'details': details})
@@ -654,29 +689,29 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 if (port and int(port.ofport) != -1):
                     self.port_dead(port)
-        return resync
+        return False
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
         for device in devices:
             LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        try:
+            devices_details_list = self.plugin_rpc.update_devices_down(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details_list:
+            device = details['device']
             if details['exists']:
                 LOG.info(_("Port %s updated."), device)
                 # Nothing to do regarding local networking
             else:
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 self.port_unbound(device)
-        return resync
+        return False
 
     def process_network_ports(self, port_info):
         resync_a = False
@@ -705,14 +740,31 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             resync = True
         return resync
 
+    def deferred_bridges(self):
+        """Batch the changes made to the bridges of the agent.
+
+        The flows and ovsdb changes are applied when the returned context
+        manager exits.
+        """
+        bridges = [self.int_br] + self.phys_brs.values()
+        if self.enable_tunneling:
+            bridges.append(self.tun_br)
+        return contextlib.nested(*[br.deferred() for br in bridges])
+
     def rpc_loop(self):
         sync = True
         ports = set()
         tunnel_sync = True
+        last_full_scan = None
 
         while True:
             try:
                 start = time.time()
+                # Without an active ovsdb monitor, or when the monitor might
+                # have missed changes, fall back to scanning the bridge.
+                full_scan = (sync or not self._monitor_is_active() or
+                             last_full_scan is None or
+                             start - last_full_scan >= self.full_scan_interval)
                 if sync:
                     LOG.info(_("Agent out of sync with plugin!"))
                     ports.clear()
@@ -723,13 +775,21 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                     LOG.info(_("Agent tunnel out of sync with plugin!"))
                     tunnel_sync = self.tunnel_sync()
 
-                port_info = self.update_ports(ports)
+                if full_scan:
+                    if self._monitor_is_active():
+                        # Pending events are covered by the scan
+                        self.interface_monitor.get_events()
+                    port_info = self.update_ports(ports)
+                    last_full_scan = start
+                else:
+                    port_info = self.update_ports_from_events(ports)
 
                 # notify plugin about port deltas
                 if port_info:
                     LOG.debug(_("Agent loop has new devices!"))
                     # If treat devices fails - must resync with plugin
-                    sync = self.process_network_ports(port_info)
+                    with self.deferred_bridges():
+                        sync = self.process_network_ports(port_info)
                     ports = port_info['current']
 
             except Exception:
@@ -740,7 +800,12 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             # sleep till end of polling interval
             elapsed = (time.time() - start)
             if (elapsed < self.polling_interval):
-                time.sleep(self.polling_interval - elapsed)
+                if self._monitor_is_active():
+                    # Wake up as soon as an interface changes
+                    self.interface_monitor.wait_for_events(
+                        self.polling_interval - elapsed)
+                else:
+                    time.sleep(self.polling_interval - elapsed)
             else:
                 LOG.debug(_("Loop iteration exceeded interval "
                             "(%(polling_interval)s vs. %(elapsed)s)!"),
@@ -748,7 +813,13 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                            'elapsed': elapsed})
 
     def daemon_loop(self):
-        self.rpc_loop()
+        if self.interface_monitor:
+            self.interface_monitor.start()
+        try:
+            self.rpc_loop()
+        finally:
+            if self.interface_monitor:
+                self.interface_monitor.stop()
 
 
 def check_ovs_version(min_required_version, root_helper):
@@ -808,6 +879,10 @@ def create_agent_config_map(config):
         root_helper=config.AGENT.root_helper,
         polling_interval=config.AGENT.polling_interval,
         tunnel_type=config.AGENT.tunnel_type,
+        minimize_polling=config.AGENT.minimize_polling,
+        ovsdb_monitor_respawn_interval=(
+            config.AGENT.ovsdb_monitor_respawn_interval),
+        full_scan_interval=config.AGENT.full_scan_interval,
     )
 
     if kwargs['tunnel_type'] in constants.TUNNEL_NETWORK_TYPES:
@@ -64,6 +64,16 @@ agent_opts = [
                       "(gre or vxlan)")),
     cfg.IntOpt('vxlan_udp_port', default=constants.VXLAN_UDP_PORT,
                help=_("The UDP port to use for VXLAN tunnels.")),
+    cfg.BoolOpt('minimize_polling', default=False,
+                help=_("Minimize polling by monitoring ovsdb for interface "
+                       "changes.")),
+    cfg.IntOpt('ovsdb_monitor_respawn_interval', default=30,
+               help=_("The number of seconds to wait before respawning the "
+                      "ovsdb monitor after losing communication with it.")),
+    cfg.IntOpt('full_scan_interval', default=60,
+               help=_("The number of seconds between full scans of the "
+                      "integration bridge ports when minimize_polling is "
+                      "enabled.")),
 ]
 
 
@@ -316,6 +316,22 @@ def get_port(port_id):
     return port
 
 
+def get_ports_and_bindings(session, port_ids):
+    """Get the ports and their network bindings in a single query.
+
+    :returns: a dict mapping the id of each port found to a tuple of the
+              port and the network binding of its network.
+    """
+    if not port_ids:
+        return {}
+    query = session.query(models_v2.Port, ovs_models_v2.NetworkBinding)
+    query = query.outerjoin(
+        ovs_models_v2.NetworkBinding,
+        models_v2.Port.network_id == ovs_models_v2.NetworkBinding.network_id)
+    query = query.filter(models_v2.Port.id.in_(port_ids))
+    return dict((port.id, (port, binding)) for port, binding in query)
+
+
 def get_port_from_device(port_id):
     """Get port from database."""
     LOG.debug(_("get_port_with_securitygroups() called:port_id=%s"), port_id)
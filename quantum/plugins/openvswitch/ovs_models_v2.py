@@ -18,7 +18,9 @@
 
 
 from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import orm
 
+from quantum.db import models_v2
 from quantum.db.models_v2 import model_base
 
 
@@ -68,6 +70,12 @@ class NetworkBinding(model_base.BASEV2):
     network_type = Column(String(32), nullable=False)
     physical_network = Column(String(64))
     segmentation_id = Column(Integer)  # tunnel_id or vlan_id
+    # Eagerly loaded with the networks to extend them with provider
+    # attributes without extra queries
+    network = orm.relationship(
+        models_v2.Network,
+        backref=orm.backref('ovs_binding', lazy='joined',
+                            uselist=False, cascade='delete'))
 
     def __init__(self, network_id, network_type, physical_network,
                  segmentation_id):
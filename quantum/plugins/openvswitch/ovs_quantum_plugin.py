@@ -36,6 +36,7 @@ from quantum.common import topics
 from quantum.common import utils
 from quantum.db import agents_db
 from quantum.db import agentschedulers_db
+from quantum.db import api as db_api
 from quantum.db import db_base_plugin_v2
 from quantum.db import dhcp_rpc_base
 from quantum.db import extraroute_db
@@ -66,8 +67,11 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
     # history
     #   1.0 Initial version
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list and update_devices_down
+    #   1.3 Support security_group_info_for_devices
+    #   1.4 Support update_leases_expiration
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.4'
 
     def __init__(self, notifier):
         self.notifier = notifier
@@ -90,48 +94,69 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
 
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
+        kwargs['devices'] = [kwargs.pop('device', None)]
+        return self.get_devices_details_list(rpc_context, **kwargs)[0]
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of a list of devices."""
         agent_id = kwargs.get('agent_id')
-        device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s details requested from %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = ovs_db_v2.get_port(device)
-        if port:
-            binding = ovs_db_v2.get_network_binding(None, port['network_id'])
-            entry = {'device': device,
-                     'network_id': port['network_id'],
-                     'port_id': port['id'],
-                     'admin_state_up': port['admin_state_up'],
-                     'network_type': binding.network_type,
-                     'segmentation_id': binding.segmentation_id,
-                     'physical_network': binding.physical_network}
-            new_status = (q_const.PORT_STATUS_ACTIVE if port['admin_state_up']
-                          else q_const.PORT_STATUS_DOWN)
-            if port['status'] != new_status:
-                ovs_db_v2.set_port_status(port['id'], new_status)
-        else:
-            entry = {'device': device}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+        devices = kwargs.get('devices') or []
+        LOG.debug(_("Devices %(devices)s details requested from "
+                    "%(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        entries = []
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = ovs_db_v2.get_ports_and_bindings(session, devices)
+            for device in devices:
+                port, binding = ports.get(device, (None, None))
+                if not (port and binding):
+                    entries.append({'device': device})
+                    LOG.debug(_("%s can not be found in database"), device)
+                    continue
+                entries.append({'device': device,
+                                'network_id': port['network_id'],
+                                'port_id': port['id'],
+                                'admin_state_up': port['admin_state_up'],
+                                'network_type': binding.network_type,
+                                'segmentation_id': binding.segmentation_id,
+                                'physical_network': binding.physical_network})
+                new_status = (q_const.PORT_STATUS_ACTIVE
+                              if port['admin_state_up']
+                              else q_const.PORT_STATUS_DOWN)
+                if port['status'] != new_status:
+                    port['status'] = new_status
+        return entries
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
+        kwargs['devices'] = [kwargs.pop('device', None)]
+        return self.update_devices_down(rpc_context, **kwargs)[0]
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
         # TODO(garyk) - live migration and port status
         agent_id = kwargs.get('agent_id')
-        device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s no longer exists on %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = ovs_db_v2.get_port(device)
-        if port:
-            entry = {'device': device,
-                     'exists': True}
-            if port['status'] != q_const.PORT_STATUS_DOWN:
-                # Set port status to DOWN
-                ovs_db_v2.set_port_status(port['id'], q_const.PORT_STATUS_DOWN)
-        else:
-            entry = {'device': device,
-                     'exists': False}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+        devices = kwargs.get('devices') or []
+        LOG.debug(_("Devices %(devices)s no longer exist on %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        entries = []
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = ovs_db_v2.get_ports_and_bindings(session, devices)
+            for device in devices:
+                port, binding = ports.get(device, (None, None))
+                if port:
+                    entries.append({'device': device,
+                                    'exists': True})
+                    if port['status'] != q_const.PORT_STATUS_DOWN:
+                        # Set port status to DOWN
+                        port['status'] = q_const.PORT_STATUS_DOWN
+                else:
+                    entries.append({'device': device,
+                                    'exists': False})
+                    LOG.debug(_("%s can not be found in database"), device)
+        return entries
 
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent."""
@@ -294,16 +319,18 @@ class OVSQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
     def setup_rpc(self):
         # RPC support
         self.topic = topics.PLUGIN
-        self.conn = rpc.create_connection(new=True)
         self.notifier = AgentNotifierApi(topics.AGENT)
         self.dhcp_agent_notifier = dhcp_rpc_agent_api.DhcpAgentNotifyAPI()
         self.l3_agent_notifier = l3_rpc_agent_api.L3AgentNotify
         self.callbacks = OVSRpcCallbacks(self.notifier)
         self.dispatcher = self.callbacks.create_rpc_dispatcher()
+
+    def start_rpc_listener(self):
+        self.conn = rpc.create_connection(new=True)
         self.conn.create_consumer(self.topic, self.dispatcher,
                                   fanout=False)
         # Consume from all consumers in a thread
-        self.conn.consume_in_thread()
+        return self.conn.consume_in_thread()
 
     def _parse_network_vlan_ranges(self):
         try:
@@ -327,9 +354,10 @@ class OVSQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                 sys.exit(1)
         LOG.info(_("Tunnel ID ranges: %s"), self.tunnel_id_ranges)
 
-    def _extend_network_dict_provider(self, context, network):
-        binding = ovs_db_v2.get_network_binding(context.session,
-                                                network['id'])
+    def _extend_network_dict_provider(self, context, network, binding=None):
+        if binding is None:
+            binding = ovs_db_v2.get_network_binding(context.session,
+                                                    network['id'])
         network[provider.NETWORK_TYPE] = binding.network_type
         if binding.network_type in constants.TUNNEL_NETWORK_TYPES:
             network[provider.PHYSICAL_NETWORK] = None
@@ -344,6 +372,19 @@ class OVSQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             network[provider.PHYSICAL_NETWORK] = None
             network[provider.SEGMENTATION_ID] = None
 
+    def _extend_network_dict_provider_db(self, network_res, network_db):
+        # The binding is loaded together with the network, so this does
+        # not cause an extra query. It does not exist yet while the network
+        # is being created.
+        if (isinstance(self, OVSQuantumPluginV2) and
+                network_db.ovs_binding is not None):
+            self._extend_network_dict_provider(None, network_res,
+                                               network_db.ovs_binding)
+
+    # Register dict extend functions for networks
+    db_base_plugin_v2.QuantumDbPluginV2.register_dict_extend_funcs(
+        attributes.NETWORKS, [_extend_network_dict_provider_db])
+
     def _process_provider_create(self, context, attrs):
         network_type = attrs.get(provider.NETWORK_TYPE)
         physical_network = attrs.get(provider.PHYSICAL_NETWORK)
@@ -520,31 +561,34 @@ class OVSQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
     def get_networks(self, context, filters=None, fields=None,
                      sorts=None,
                      limit=None, marker=None, page_reverse=False):
-        session = context.session
-        with session.begin(subtransactions=True):
-            nets = super(OVSQuantumPluginV2,
-                         self).get_networks(context, filters, None, sorts,
-                                            limit, marker, page_reverse)
-            for net in nets:
-                self._extend_network_dict_provider(context, net)
-                self._extend_network_dict_l3(context, net)
-
-        return [self._fields(net, fields) for net in nets]
+        # The provider and l3 attributes are eagerly loaded and added to
+        # the networks by their dict extend functions
+        return super(OVSQuantumPluginV2,
+                     self).get_networks(context, filters, fields, sorts,
+                                        limit, marker, page_reverse)
 
     def create_port(self, context, port):
         # Set port status as 'DOWN'. This will be updated by agent
         port['port']['status'] = q_const.PORT_STATUS_DOWN
-        port_data = port['port']
-        session = context.session
-        with session.begin(subtransactions=True):
-            self._ensure_default_security_group_on_port(context, port)
-            sgids = self._get_security_groups_on_port(context, port)
-            port = super(OVSQuantumPluginV2, self).create_port(context, port)
-            self._process_portbindings_create_and_update(context,
-                                                         port_data, port)
-            self._process_port_create_security_group(context, port, sgids)
-        self.notify_security_groups_member_updated(context, port)
-        return port
+        return super(OVSQuantumPluginV2, self).create_port(context, port)
+
+    def create_port_bulk(self, context, ports):
+        ports = [item['port'] for item in ports['ports']]
+        for port in ports:
+            port['status'] = q_const.PORT_STATUS_DOWN
+        return self._create_ports(context, ports)
+
+    def _process_port_create(self, context, port_data, port):
+        self._ensure_default_security_group_on_port(context,
+                                                    {'port': port_data})
+        sgids = self._get_security_groups_on_port(context,
+                                                  {'port': port_data})
+        self._process_portbindings_create_and_update(context,
+                                                     port_data, port)
+        self._process_port_create_security_group(context, port, sgids)
+
+    def _process_ports_created(self, context, ports):
+        self.notify_security_groups_member_updated_bulk(context, ports)
 
     def update_port(self, context, id, port):
         session = context.session
@@ -47,7 +47,10 @@ class RyuRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                       l3_rpc_base.L3RpcCallbackMixin,
                       sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    # history
+    #   1.1 Support Security Group RPC
+    #   1.4 Support update_leases_expiration (DhcpPluginApi version)
+    RPC_API_VERSION = '1.4'
 
     def __init__(self, ofp_rest_api_addr):
         self.ofp_rest_api_addr = ofp_rest_api_addr
@@ -35,6 +35,13 @@ from quantum.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# Match rules built by _build_match_rule, keyed by action and by the
+# attributes with an enforced policy explicitly set in the target
+_MATCH_RULES = {}
+# Matches the target fields referenced by the match of a generic check
+_TARGET_FIELD_RE = re.compile(r'%\(([^)]+)\)s')
+# Matches generic checks comparing a single target field to a credential
+_SINGLE_TARGET_FIELD_RE = re.compile(r'^%\(([^)]+)\)s$')
 ADMIN_CTX_POLICY = 'context_is_admin'
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
@@ -61,6 +68,7 @@ def reset():
     global _POLICY_CACHE
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _MATCH_RULES.clear()
     policy.reset()
 
 
@@ -116,6 +124,7 @@ def _set_rules(data):
                             "deprecated policy %s. The policy will "
                             "not be enforced"), pol)
     policy.set_rules(policies)
+    _MATCH_RULES.clear()
 
 
 def _is_attribute_explicitly_set(attribute_name, resource, target):
@@ -126,6 +135,27 @@ def _is_attribute_explicitly_set(attribute_name, resource, target):
             target[attribute_name] != resource[attribute_name]['default'])
 
 
+def _get_enforced_attributes(action, target):
+    """Return the attributes whose policy is enforced for action on target.
+
+    These are the attributes explicitly set in the target which are marked
+    with enforce_policy in the resource attribute map.
+    """
+    resource, is_write = get_resource_and_action(action)
+    # Attribute-based checks shall not be enforced on GETs
+    if not is_write:
+        return ()
+    # assigning to variable with short name for improving readability
+    res_map = attributes.RESOURCE_ATTRIBUTE_MAP
+    if resource not in res_map:
+        return ()
+    return tuple(attribute_name for attribute_name in res_map[resource]
+                 if ('enforce_policy' in res_map[resource][attribute_name] and
+                     _is_attribute_explicitly_set(attribute_name,
+                                                  res_map[resource],
+                                                  target)))
+
+
 def _build_match_rule(action, target):
     """Create the rule to match for a given action.
 
@@ -135,26 +165,67 @@ def _build_match_rule(action, target):
     3) add an entry for attributes of a resource for which the action
        is being executed (e.g.: create_network:shared)
 
+    Rules are built once for each action and set of enforced attributes,
+    and reused until the policies are reloaded.
     """
+    enforced_attributes = _get_enforced_attributes(action, target)
+    key = (action, enforced_attributes)
+    match_rule = _MATCH_RULES.get(key)
+    if match_rule is None:
+        match_rule = policy.RuleCheck('rule', action)
+        for attribute_name in enforced_attributes:
+            attr_rule = policy.RuleCheck('rule', '%s:%s' %
+                                         (action, attribute_name))
+            match_rule = policy.AndCheck([match_rule, attr_rule])
+        _MATCH_RULES[key] = match_rule
+    return match_rule
 
-    match_rule = policy.RuleCheck('rule', action)
-    resource, is_write = get_resource_and_action(action)
-    # Attribute-based checks shall not be enforced on GETs
-    if is_write:
-        # assigning to variable with short name for improving readability
-        res_map = attributes.RESOURCE_ATTRIBUTE_MAP
-        if resource in res_map:
-            for attribute_name in res_map[resource]:
-                if _is_attribute_explicitly_set(attribute_name,
-                                                res_map[resource],
-                                                target):
-                    attribute = res_map[resource][attribute_name]
-                    if 'enforce_policy' in attribute:
-                        attr_rule = policy.RuleCheck('rule', '%s:%s' %
-                                                     (action, attribute_name))
-                        match_rule = policy.AndCheck([match_rule, attr_rule])
 
-    return match_rule
+def _collect_target_fields(rule, fields, seen_rules):
+    """Add the target fields the result of rule depends on to fields.
+
+    :returns: False if the result of the rule might also depend on
+              anything else than these fields and the credentials.
+    """
+    if isinstance(rule, policy.RuleCheck):
+        if rule.match in seen_rules:
+            return True
+        seen_rules.add(rule.match)
+        try:
+            # Missing rules fall back to the default rule
+            sub_rule = policy._rules[rule.match]
+        except (KeyError, TypeError):
+            # A missing rule fails closed whatever the target
+            return True
+        return _collect_target_fields(sub_rule, fields, seen_rules)
+    elif isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        return all(_collect_target_fields(sub_rule, fields, seen_rules)
+                   for sub_rule in rule.rules)
+    elif isinstance(rule, policy.NotCheck):
+        return _collect_target_fields(rule.rule, fields, seen_rules)
+    elif isinstance(rule, (policy.TrueCheck, policy.FalseCheck,
+                           policy.RoleCheck)):
+        return True
+    elif isinstance(rule, FieldCheck):
+        fields.add(rule.field)
+        return True
+    elif isinstance(rule, OwnerCheck):
+        fields.add(rule.target_field)
+        # The owner of a parent resource is loaded using its foreign key
+        for separator in (':', '_'):
+            if separator in rule.target_field:
+                parent_res = rule.target_field.split(separator, 1)[0]
+                parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
+                    "%ss" % parent_res)
+                if parent_foreign_key:
+                    fields.add(parent_foreign_key)
+                break
+        return True
+    elif type(rule) is policy.GenericCheck:
+        fields.update(_TARGET_FIELD_RE.findall(rule.match))
+        return True
+    # e.g. http checks, which might depend on the whole target
+    return False
 
 
 # This check is registered as 'tenant_id' so that it can override
@@ -290,6 +361,51 @@ def _prepare_check(context, action, target):
     return match_rule, target, credentials
 
 
+def _check_cached(context, action, target):
+    """Check the action on the target, reusing earlier results.
+
+    The results are remembered for the lifetime of the context, that is
+    for the request, keyed by the action, the credentials and the values
+    of the target fields the rule depends on. Checking the items of a
+    list thus evaluates the rules once per distinct owner, not per item.
+    """
+    cache = getattr(context, '_policy_cache', None)
+    if cache is None:
+        return policy.check(*(_prepare_check(context, action, target)))
+    if target is None:
+        target = {}
+    rule_key = (action, _get_enforced_attributes(action, target))
+    entry = cache.get(rule_key)
+    if entry is None:
+        init()
+        match_rule = _build_match_rule(action, target)
+        fields = set()
+        if _collect_target_fields(match_rule, fields, set()):
+            fields = tuple(sorted(fields))
+        else:
+            fields = None
+        entry = cache[rule_key] = (match_rule, fields, {})
+    match_rule, fields, results = entry
+
+    key = None
+    if fields is not None:
+        key = ((context.user_id, context.tenant_id, context.is_admin,
+                tuple(context.roles)),
+               tuple(target.get(field) for field in fields))
+        try:
+            return results[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable values
+            key = None
+    init()
+    result = policy.check(match_rule, target, context.to_dict())
+    if key is not None:
+        results[key] = result
+    return result
+
+
 def check(context, action, target, plugin=None):
     """Verifies that the action is valid on the target in this context.
 
@@ -304,7 +420,7 @@ def check(context, action, target, plugin=None):
 
     :return: Returns True if access is permitted else False.
     """
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check_cached(context, action, target)
 
 
 def check_if_exists(context, action, target):
@@ -320,7 +436,7 @@ def check_if_exists(context, action, target):
     # Raise if there's no match for requested action in the policy engine
     if not policy._rules or action not in policy._rules:
         raise exceptions.PolicyRuleNotFound(rule=action)
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check_cached(context, action, target)
 
 
 def enforce(context, action, target, plugin=None):
@@ -344,6 +460,121 @@ def enforce(context, action, target, plugin=None):
                         exc=exceptions.PolicyNotAuthorized, action=action)
 
 
+def _merge_constraints(constraints1, constraints2):
+    """Return the constraints satisfying both, or None if they conflict."""
+    merged = dict(constraints1)
+    for field, value in constraints2.iteritems():
+        if field in merged and merged[field] != value:
+            return None
+        merged[field] = value
+    return merged
+
+
+def _simplify_alternatives(alternatives):
+    if {} in alternatives:
+        return [{}]
+    simplified = []
+    for alternative in alternatives:
+        if alternative not in simplified:
+            simplified.append(alternative)
+    return simplified
+
+
+def _partial_check(rule, resource, credentials, seen_rules):
+    """Evaluate the parts of rule which only depend on the credentials.
+
+    :returns: the alternative constraints the target must satisfy for the
+              rule to pass, as dicts mapping attributes of resource to the
+              value they must have, or None if the rule can not be
+              expressed this way.
+    """
+    if isinstance(rule, policy.RuleCheck):
+        if rule.match in seen_rules:
+            return None
+        try:
+            # Missing rules fall back to the default rule
+            sub_rule = policy._rules[rule.match]
+        except (KeyError, TypeError):
+            # A missing rule fails closed whatever the target
+            return []
+        return _partial_check(sub_rule, resource, credentials,
+                              seen_rules | set([rule.match]))
+    elif isinstance(rule, policy.OrCheck):
+        alternatives = []
+        for sub_rule in rule.rules:
+            sub_alternatives = _partial_check(sub_rule, resource,
+                                              credentials, seen_rules)
+            if sub_alternatives is None:
+                return None
+            alternatives.extend(sub_alternatives)
+        return _simplify_alternatives(alternatives)
+    elif isinstance(rule, policy.AndCheck):
+        alternatives = [{}]
+        for sub_rule in rule.rules:
+            sub_alternatives = _partial_check(sub_rule, resource,
+                                              credentials, seen_rules)
+            if sub_alternatives is None:
+                return None
+            alternatives = [_merge_constraints(alternative, sub_alternative)
+                            for alternative in alternatives
+                            for sub_alternative in sub_alternatives]
+            alternatives = [alternative for alternative in alternatives
+                            if alternative is not None]
+        return _simplify_alternatives(alternatives)
+    elif isinstance(rule, policy.NotCheck):
+        sub_alternatives = _partial_check(rule.rule, resource, credentials,
+                                          seen_rules)
+        if sub_alternatives == []:
+            return [{}]
+        elif sub_alternatives == [{}]:
+            return []
+        return None
+    elif isinstance(rule, (policy.TrueCheck, policy.FalseCheck,
+                           policy.RoleCheck)):
+        return rule({}, credentials) and [{}] or []
+
+    res_map = attributes.RESOURCE_ATTRIBUTE_MAP.get(resource, {})
+    if isinstance(rule, FieldCheck):
+        if rule.field not in res_map:
+            return None
+        return [{rule.field: rule.value}]
+    elif isinstance(rule, OwnerCheck) or type(rule) is policy.GenericCheck:
+        if rule.kind not in credentials:
+            return []
+        if not _TARGET_FIELD_RE.search(rule.match):
+            return (rule.match == unicode(credentials[rule.kind]) and
+                    [{}] or [])
+        fields = _SINGLE_TARGET_FIELD_RE.findall(rule.match)
+        # The owner of a parent resource can not be checked on the target
+        if not fields or fields[0] not in res_map:
+            return None
+        return [{fields[0]: unicode(credentials[rule.kind])}]
+    # e.g. http checks, which might depend on the whole target
+    return None
+
+
+def get_query_filters(context, action):
+    """Translate the policy for a read action into constraints on targets.
+
+    The checks of the rule which only depend on the credentials, such as
+    role checks, are evaluated, whereas ownership and field checks on the
+    attributes of the target are turned into constraints on their value.
+
+    :param context: quantum context
+    :param action: the read action, e.g. ``get_network``
+
+    :return: a list of alternatives, each a dict mapping attributes to the
+        value they must have for the action to be allowed. [{}] if the
+        action is allowed on any target and [] if it is allowed on none.
+        None if the rule can not be translated, e.g. when it depends on
+        the owner of a parent resource.
+    """
+    init()
+    resource = get_resource_and_action(action)[0]
+    match_rule = _build_match_rule(action, {})
+    return _partial_check(match_rule, resource, context.to_dict(), set())
+
+
 def check_is_admin(context):
     """Verify context has admin rights according to policy settings."""
     init()
@@ -326,3 +326,22 @@ class QuantumPluginBaseV2(object):
         :param id: UUID representing the port to delete.
         """
         pass
+
+    def start_rpc_listener(self):
+        """Start consuming the RPC topics of the plugin.
+
+        Plugins implementing this method do not consume their topics when
+        they are created: the server calls it, either in its own process or
+        in each of the separate processes configured with rpc_workers.
+
+        :returns: the green thread consuming the topics.
+
+        .. note:: this method is optional, as it was not part of the originally
+                  defined plugin API.
+        """
+        raise exceptions.NotImplementedError()
+
+    def rpc_workers_supported(self):
+        """Return whether the plugin implements start_rpc_listener."""
+        return (self.__class__.start_rpc_listener !=
+                QuantumPluginBaseV2.start_rpc_listener)
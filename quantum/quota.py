@@ -48,6 +48,16 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='quantum.quota.ConfDriver',
                help=_('Default driver to use for quota checks')),
+    cfg.BoolOpt('track_quota_usage',
+                default=True,
+                help=_('Keep track of the number of networks, subnets and '
+                       'ports in use by each tenant in the database, '
+                       'instead of counting them for every quota check')),
+    cfg.IntOpt('quota_usage_resync_interval',
+               default=600,
+               help=_('Number of seconds after which the tracked usage of '
+                      'a resource is counted again, 0 to only count it '
+                      'again when it might be wrong')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -199,6 +209,37 @@ class CountableResource(BaseResource):
         self.count = count
 
 
+class TrackedResource(CountableResource):
+    """Describe a resource whose usage may be tracked.
+
+    The drivers storing the resource can maintain the number in use by
+    each tenant, so that checking a quota does not count the resources.
+    They register a function returning that usage with
+    register_usage_tracker(). The resources are counted when no function
+    is registered, or when it does not know the usage with this plugin.
+    """
+
+    def __init__(self, name, flag=None):
+        """Initializes a TrackedResource.
+
+        :param name: The name of the resource, i.e., "instances".
+        :param flag: The name of the flag or configuration option
+                     which specifies the default value of the quota
+                     for this resource.
+        """
+
+        super(TrackedResource, self).__init__(name, self._count_usage,
+                                              flag=flag)
+
+    def _count_usage(self, context, plugin, resources, tenant_id):
+        get_usage = _USAGE_TRACKERS.get(self.name)
+        if cfg.CONF.QUOTAS.track_quota_usage and get_usage:
+            usage = get_usage(context, plugin, tenant_id)
+            if usage is not None:
+                return usage
+        return _count_resource(context, plugin, resources, tenant_id)
+
+
 class QuotaEngine(object):
     """Represent the set of recognized quotas."""
 
@@ -304,11 +345,26 @@ def _count_resource(context, plugin, resources, tenant_id):
         return len(obj_list) if obj_list else 0
 
 
+# Functions returning the usage of the tracked resources by name
+_USAGE_TRACKERS = {}
+
+
+def register_usage_tracker(resource, get_usage):
+    """Register the function returning the tracked usage of a resource.
+
+    :param resource: The name of the resource, i.e., "network".
+    :param get_usage: A callable which returns the number of resources in
+                      use by a tenant, or None if unknown. It is passed the
+                      context, the plugin and the tenant id.
+    """
+    _USAGE_TRACKERS[resource] = get_usage
+
+
 def register_resources_from_config():
     resources = []
     for resource_item in cfg.CONF.QUOTAS.quota_items:
-        resources.append(CountableResource(resource_item, _count_resource,
-                                           'quota_' + resource_item))
+        resources.append(TrackedResource(resource_item,
+                                         'quota_' + resource_item))
     QUOTAS.register_resources(resources)
 
 
@@ -21,6 +21,7 @@
 
 import sys
 
+import eventlet
 from oslo.config import cfg
 
 from quantum.common import config
@@ -36,7 +37,14 @@ def main():
                    " the '--config-file' option!"))
     try:
         quantum_service = service.serve_wsgi(service.QuantumApiService)
-        quantum_service.wait()
+        rpc_launcher = service.serve_rpc(quantum_service.launcher)
+        service.serve_ip_recycler()
+        if rpc_launcher:
+            # The API is served by a green thread of this process
+            eventlet.spawn(quantum_service.wait)
+            rpc_launcher.wait()
+        else:
+            quantum_service.wait()
     except RuntimeError as e:
         sys.exit(_("ERROR: %s") % e)
 
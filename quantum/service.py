@@ -23,11 +23,15 @@ import random
 from oslo.config import cfg
 
 from quantum.common import config
+from quantum.common import rpc as q_rpc
 from quantum import context
+from quantum.db import api as db_api
+from quantum import manager
 from quantum.openstack.common import importutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import loopingcall
 from quantum.openstack.common.rpc import service
+from quantum.openstack.common import service as common_service
 from quantum import wsgi
 
 
@@ -42,6 +46,15 @@ service_opts = [
                help=_('range of seconds to randomly delay when starting the'
                       ' periodic task scheduler to reduce stampeding.'
                       ' (Disable by setting to 0)')),
+    cfg.IntOpt('api_workers',
+               default=0,
+               help=_('Number of separate worker processes serving the API. '
+                      'By default the API is served by the main process.')),
+    cfg.IntOpt('rpc_workers',
+               default=0,
+               help=_('Number of separate worker processes consuming the '
+                      'RPC topics of the plugin. By default they are '
+                      'consumed by the main process.')),
 ]
 CONF = cfg.CONF
 CONF.register_opts(service_opts)
@@ -68,6 +81,42 @@ class WsgiService(object):
     def wait(self):
         self.wsgi_app.wait()
 
+    @property
+    def launcher(self):
+        """The ProcessLauncher of the API worker processes, if any."""
+        return self.wsgi_app.launcher if self.wsgi_app else None
+
+
+def _reset_worker_connections():
+    """Make a forked worker process open its own connections.
+
+    The database and message bus connections inherited from the parent
+    process must not be shared with it.
+    """
+    db_api.reset_engine()
+    q_rpc.reset_connection_pool()
+
+
+class RpcWorker(object):
+    """Consumes the RPC topics of a plugin in a forked worker process."""
+
+    def __init__(self, plugin):
+        self._plugin = plugin
+        self._server = None
+
+    def start(self):
+        _reset_worker_connections()
+        self._server = self._plugin.start_rpc_listener()
+
+    def wait(self):
+        if self._server is not None:
+            self._server.wait()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.kill()
+            self._server = None
+
 
 class QuantumApiService(WsgiService):
     """Class for quantum-api service."""
@@ -101,13 +150,74 @@ def serve_wsgi(cls):
     return service
 
 
+def serve_rpc(launcher=None):
+    """Start consuming the RPC topics of the core plugin.
+
+    With rpc_workers set, the topics are consumed by that many worker
+    processes. They are launched by launcher, the launcher of the API
+    workers, if given, as a process can only run a single launcher.
+
+    :returns: the launcher of the RPC workers if one had to be created,
+              None otherwise.
+    """
+    plugin = manager.QuantumManager.get_plugin()
+    if not plugin.rpc_workers_supported():
+        # The plugin consumes its topics on its own, if it has any
+        if cfg.CONF.rpc_workers > 0:
+            LOG.error(_("The %s plugin does not support rpc_workers, its "
+                        "RPC topics are consumed by the main process"),
+                      plugin.__class__.__name__)
+        return
+
+    if cfg.CONF.rpc_workers < 1:
+        plugin.start_rpc_listener()
+        return
+
+    rpc_worker = RpcWorker(plugin)
+    rpc_launcher = None
+    if not launcher:
+        launcher = rpc_launcher = common_service.ProcessLauncher()
+    launcher.launch_service(rpc_worker, workers=cfg.CONF.rpc_workers)
+    LOG.info(_("Quantum RPC topics consumed by %d worker processes"),
+             cfg.CONF.rpc_workers)
+    return rpc_launcher
+
+
+def _recycle_ip_allocations(plugin):
+    try:
+        plugin.recycle_expired_ip_allocations(context.get_admin_context())
+    except Exception:
+        LOG.exception(_("Unable to recycle expired IP allocations"))
+
+
+def serve_ip_recycler():
+    """Periodically return the IP addresses of expired leases to their pools.
+
+    The task runs in the calling process only, so that port creations do
+    not have to recycle the expired allocations of their network.
+
+    :returns: the looping call running the task, None if disabled.
+    """
+    plugin = manager.QuantumManager.get_plugin()
+    interval = cfg.CONF.ip_recycle_interval
+    if (interval <= 0 or
+            not hasattr(plugin, 'recycle_expired_ip_allocations')):
+        return
+    recycler = loopingcall.FixedIntervalLoopingCall(_recycle_ip_allocations,
+                                                    plugin)
+    recycler.start(interval=interval, initial_delay=interval)
+    return recycler
+
+
 def _run_wsgi(app_name):
     app = config.load_paste_app(app_name)
     if not app:
         LOG.error(_('No known API applications configured.'))
         return
     server = wsgi.Server("Quantum")
-    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host)
+    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host,
+                 workers=cfg.CONF.api_workers,
+                 on_worker_start=_reset_worker_connections)
     # Dump all option values here after all options are parsed
     cfg.CONF.log_opt_values(LOG, std_logging.DEBUG)
     LOG.info(_("Quantum service started, listening on %(host)s:%(port)s"),
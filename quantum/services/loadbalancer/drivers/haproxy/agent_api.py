@@ -79,3 +79,11 @@ class LbaasAgentApi(proxy.RpcProxy):
             ),
             topic=self.topic
         )
+
+    def update_pools_stats(self, stats):
+        return self.call(
+            self.context,
+            self.make_msg('update_pools_stats', stats=stats, host=self.host),
+            topic=self.topic,
+            version='1.1'
+        )
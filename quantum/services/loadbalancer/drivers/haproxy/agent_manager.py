@@ -18,6 +18,7 @@
 
 import weakref
 
+import eventlet
 from oslo.config import cfg
 
 from quantum.agent.common import config
@@ -25,6 +26,7 @@ from quantum import context
 from quantum.openstack.common import importutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import periodic_task
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.services.loadbalancer.drivers.haproxy import (
     agent_api,
     plugin_driver
@@ -54,6 +56,11 @@ OPTS = [
         default='nogroup',
         help=_('The user group'),
     ),
+    cfg.IntOpt(
+        'stats_workers',
+        default=8,
+        help=_('Number of devices whose statistics are read in parallel'),
+    ),
 ]
 
 
@@ -139,6 +146,11 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):
         )
         self.needs_resync = False
         self.cache = LogicalDeviceCache()
+        # Maps pool ids to the statistics last reported to the plugin
+        self.reported_stats = {}
+        # Cleared when the plugin does not support update_pools_stats
+        self.bulk_stats_supported = True
+        self.stats_pool = eventlet.GreenPool(conf.stats_workers)
 
     def initialize_service_hook(self, started_by):
         self.sync_state()
@@ -151,15 +163,55 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):
 
     @periodic_task.periodic_task(spacing=6)
     def collect_stats(self, context):
-        for pool_id in self.cache.get_pool_ids():
+        pool_ids = self.cache.get_pool_ids()
+        changed_stats = {}
+        for pool_id, stats in zip(pool_ids,
+                                  self.stats_pool.imap(self._get_stats,
+                                                       pool_ids)):
+            if stats and stats != self.reported_stats.get(pool_id):
+                changed_stats[pool_id] = stats
+
+        # Forget the pools which are not hosted anymore
+        for pool_id in set(self.reported_stats) - set(pool_ids):
+            del self.reported_stats[pool_id]
+
+        if not changed_stats:
+            return
+        if not self.bulk_stats_supported:
+            self._report_stats_one_by_one(changed_stats)
+            return
+        try:
+            self.plugin_rpc.update_pools_stats(changed_stats)
+            self.reported_stats.update(changed_stats)
+        except rpc_common.RemoteError as e:
+            if e.exc_type not in ('UnsupportedRpcVersion', 'AttributeError'):
+                LOG.exception(_('Error updating stats'))
+                self.needs_resync = True
+                return
+            LOG.warn(_('Plugin does not support update_pools_stats, '
+                       'updating stats pool by pool.'))
+            self.bulk_stats_supported = False
+            self._report_stats_one_by_one(changed_stats)
+        except Exception:
+            LOG.exception(_('Error updating stats'))
+            self.needs_resync = True
+
+    def _report_stats_one_by_one(self, changed_stats):
+        for pool_id, stats in changed_stats.iteritems():
             try:
-                stats = self.driver.get_stats(pool_id)
-                if stats:
-                    self.plugin_rpc.update_pool_stats(pool_id, stats)
+                self.plugin_rpc.update_pool_stats(pool_id, stats)
+                self.reported_stats[pool_id] = stats
             except Exception:
-                LOG.exception(_('Error upating stats'))
+                LOG.exception(_('Error updating stats'))
                 self.needs_resync = True
 
+    def _get_stats(self, pool_id):
+        try:
+            return self.driver.get_stats(pool_id)
+        except Exception:
+            LOG.exception(_('Error reading stats for pool: %s'), pool_id)
+            self.needs_resync = True
+
     def _vip_plug_callback(self, action, port):
         if action == 'plug':
             self.plugin_rpc.plug_vip_port(port['id'])
@@ -17,6 +17,7 @@
 # @author: Mark McClain, DreamHost
 
 import itertools
+import os
 
 from oslo.config import cfg
 
@@ -54,12 +55,68 @@ ACTIVE = qconstants.ACTIVE
 
 def save_config(conf_path, logical_config, socket_path=None):
     """Convert a logical configuration to the HAProxy version."""
+    utils.replace_file(conf_path, build_config(logical_config, socket_path))
+
+
+def build_config(logical_config, socket_path=None):
+    """Return the HAProxy configuration of a logical configuration."""
     data = []
     data.extend(_build_global(logical_config, socket_path=socket_path))
     data.extend(_build_defaults(logical_config))
     data.extend(_build_frontend(logical_config))
     data.extend(_build_backend(logical_config))
-    utils.replace_file(conf_path, '\n'.join(data))
+    return '\n'.join(data)
+
+
+def get_runtime_commands(old_conf, new_conf):
+    """Return the stats socket commands turning old_conf into new_conf.
+
+    Only the weight and the administrative state of the servers can be
+    changed at runtime: None is returned when the configurations differ
+    in any other way.
+    """
+    old_lines = old_conf.splitlines()
+    new_lines = new_conf.splitlines()
+    if len(old_lines) != len(new_lines):
+        return None
+
+    commands = []
+    backend = None
+    for old_line, new_line in zip(old_lines, new_lines):
+        if new_line.startswith('backend '):
+            backend = new_line.split()[1]
+        old_server = _parse_server(old_line)
+        new_server = _parse_server(new_line)
+        if not (old_server and new_server):
+            if old_line != new_line:
+                return None
+            continue
+
+        old_words, old_weight, old_disabled = old_server
+        new_words, new_weight, new_disabled = new_server
+        if old_words != new_words:
+            return None
+        server = '%s/%s' % (backend, new_words[1])
+        if old_weight != new_weight:
+            commands.append('set weight %s %s' % (server, new_weight))
+        if old_disabled != new_disabled:
+            action = 'disable' if new_disabled else 'enable'
+            commands.append('%s server %s' % (action, server))
+    return commands
+
+
+def _parse_server(line):
+    """Split a server line in its static part, weight and disabled flag."""
+    words = line.split()
+    if not words or words[0] != 'server':
+        return
+    index = words.index('weight')
+    weight = words[index + 1]
+    del words[index:index + 2]
+    disabled = 'disabled' in words
+    if disabled:
+        words.remove('disabled')
+    return words, weight, disabled
 
 
 def _build_global(config, socket_path=None):
@@ -72,7 +129,10 @@ def _build_global(config, socket_path=None):
     ]
 
     if socket_path:
-        opts.append('stats socket %s mode 0666 level user' % socket_path)
+        # The admin level socket changes the servers at runtime: only the
+        # user of the agent may connect to it
+        opts.append('stats socket %s mode 0600 uid %d level admin' %
+                    (socket_path, os.geteuid()))
 
     return itertools.chain(['global'], ('\t' + o for o in opts))
 
@@ -135,13 +195,16 @@ def _build_backend(config):
     persist_opts = _get_session_persistence(config)
     opts.extend(persist_opts)
 
-    # add the members
+    # add the members, the administratively down ones are disabled so that
+    # they can be enabled at runtime
     for member in config['members']:
-        if member['status'] == ACTIVE and member['admin_state_up']:
+        if member['status'] == ACTIVE:
             server = (('server %(id)s %(address)s:%(protocol_port)s '
                        'weight %(weight)s') % member) + server_addon
             if _has_http_cookie_persistence(config):
                 server += ' cookie %d' % config['members'].index(member)
+            if not member['admin_state_up']:
+                server += ' disabled'
             opts.append(server)
 
     return itertools.chain(
@@ -29,6 +29,7 @@ from quantum.services.loadbalancer.drivers.haproxy import cfg as hacfg
 
 LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qlbaas-'
+STATS_CHUNK_SIZE = 4096
 
 
 class HaproxyNSDriver(object):
@@ -44,11 +45,36 @@ class HaproxyNSDriver(object):
         namespace = get_ns_name(pool_id)
 
         self._plug(namespace, logical_config['vip']['port'])
+
+        # remember the pool<>port mapping
+        self.pool_to_port_id[pool_id] = logical_config['vip']['port']['id']
         self._spawn(logical_config)
 
     def update(self, logical_config):
         pool_id = logical_config['pool']['id']
+        conf_path = self._get_state_file_path(pool_id, 'conf')
         pid_path = self._get_state_file_path(pool_id, 'pid')
+        sock_path = self._get_state_file_path(pool_id, 'sock')
+
+        # remember the pool<>port mapping
+        self.pool_to_port_id[pool_id] = logical_config['vip']['port']['id']
+
+        new_conf = hacfg.build_config(logical_config, sock_path)
+        try:
+            with open(conf_path, 'r') as conf_file:
+                old_conf = conf_file.read()
+        except IOError:
+            old_conf = None
+
+        if old_conf == new_conf:
+            LOG.debug(_('Configuration of pool %s is unchanged'), pool_id)
+            return
+        if old_conf is not None:
+            commands = hacfg.get_runtime_commands(old_conf, new_conf)
+            if (commands is not None and
+                    self._update_at_runtime(pool_id, sock_path, commands)):
+                utils.replace_file(conf_path, new_conf)
+                return
 
         extra_args = ['-sf']
         extra_args.extend(p.strip() for p in open(pid_path, 'r'))
@@ -68,8 +94,23 @@ class HaproxyNSDriver(object):
         ns = ip_lib.IPWrapper(self.root_helper, namespace)
         ns.netns.execute(cmd)
 
-        # remember the pool<>port mapping
-        self.pool_to_port_id[pool_id] = logical_config['vip']['port']['id']
+    def _update_at_runtime(self, pool_id, socket_path, commands):
+        """Return whether commands were run through the stats socket."""
+        if not commands:
+            return True
+        try:
+            output = self._run_socket_command(socket_path, ';'.join(commands))
+        except socket.error as e:
+            LOG.warn(_('Error while connecting to stats socket: %s') % e)
+            return False
+        # haproxy only reports the errors
+        if output.strip():
+            LOG.warn(_('Unable to update pool %(pool_id)s at runtime: '
+                       '%(output)s'), {'pool_id': pool_id, 'output': output})
+            return False
+        LOG.debug(_('Updated pool %(pool_id)s at runtime: %(commands)s'),
+                  {'pool_id': pool_id, 'commands': commands})
+        return True
 
     def destroy(self, pool_id):
         namespace = get_ns_name(pool_id)
@@ -107,17 +148,8 @@ class HaproxyNSDriver(object):
         socket_path = self._get_state_file_path(pool_id, 'sock')
         if os.path.exists(socket_path):
             try:
-                s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-                s.connect(socket_path)
-                s.send('show stat -1 2 -1\n')
-                raw_stats = ''
-                chunk_size = 1024
-                while True:
-                    chunk = s.recv(chunk_size)
-                    raw_stats += chunk
-                    if len(chunk) < chunk_size:
-                        break
-
+                raw_stats = self._run_socket_command(socket_path,
+                                                     'show stat -1 2 -1')
                 return self._parse_stats(raw_stats)
             except socket.error as e:
                 LOG.warn(_('Error while connecting to stats socket: %s') % e)
@@ -126,6 +158,22 @@ class HaproxyNSDriver(object):
             LOG.warn(_('Stats socket not found for pool %s') % pool_id)
             return {}
 
+    def _run_socket_command(self, socket_path, command):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(socket_path)
+            s.sendall(command + '\n')
+            # haproxy closes the connection once the whole output of a
+            # non interactive command is sent
+            chunks = []
+            chunk = s.recv(STATS_CHUNK_SIZE)
+            while chunk:
+                chunks.append(chunk)
+                chunk = s.recv(STATS_CHUNK_SIZE)
+            return ''.join(chunks)
+        finally:
+            s.close()
+
     def _parse_stats(self, raw_stats):
         stat_lines = raw_stats.splitlines()
         if len(stat_lines) < 2:
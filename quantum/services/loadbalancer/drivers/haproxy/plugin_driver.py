@@ -27,6 +27,7 @@ from quantum.openstack.common import log as logging
 from quantum.openstack.common import rpc
 from quantum.openstack.common.rpc import proxy
 from quantum.plugins.common import constants
+from quantum.services.loadbalancer import constants as lb_const
 from quantum.services.loadbalancer.drivers import abstract_driver
 
 LOG = logging.getLogger(__name__)
@@ -42,8 +43,25 @@ TOPIC_PROCESS_ON_HOST = 'q-lbaas-process-on-host'
 TOPIC_LOADBALANCER_AGENT = 'lbaas_process_on_host_agent'
 
 
+# statistics reported by the agent stored with each pool
+STATS_MAP = {
+    'bytes_in': lb_const.STATS_IN_BYTES,
+    'bytes_out': lb_const.STATS_OUT_BYTES,
+    'active_connections': lb_const.STATS_CURRENT_SESSIONS,
+    'total_connections': lb_const.STATS_TOTAL_SESSIONS
+}
+
+
 class LoadBalancerCallbacks(object):
-    RPC_API_VERSION = '1.0'
+    """Plugin side of the agent to plugin RPC API.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Added update_pools_stats.
+
+    """
+
+    RPC_API_VERSION = '1.1'
 
     def __init__(self, plugin):
         self.plugin = plugin
@@ -179,8 +197,21 @@ class LoadBalancerCallbacks(object):
             LOG.debug(msg, port_id)
 
     def update_pool_stats(self, context, pool_id=None, stats=None, host=None):
-        # TODO(markmcclain): add stats collection
-        pass
+        self.update_pools_stats(context, stats={pool_id: stats}, host=host)
+
+    def update_pools_stats(self, context, stats=None, host=None):
+        """Store the stats reported by an agent for several pools."""
+        pools_data = {}
+        for pool_id, pool_stats in (stats or {}).iteritems():
+            try:
+                pools_data[pool_id] = dict(
+                    (key, int(pool_stats.get(stat) or 0))
+                    for key, stat in STATS_MAP.iteritems())
+            except ValueError:
+                LOG.warn(_('Invalid stats reported for pool %(pool_id)s: '
+                           '%(stats)s'),
+                         {'pool_id': pool_id, 'stats': pool_stats})
+        self.plugin._update_pools_stats(context, pools_data)
 
 
 class LoadBalancerAgentApi(proxy.RpcProxy):
@@ -15,14 +15,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import errno
+import httplib
 import os
+import socket
 
+import mock
 from mock import patch
 from oslo.config import cfg
 
 import quantum.common.test_lib as test_lib
 from quantum.extensions import portbindings
 from quantum.manager import QuantumManager
+from quantum.plugins.bigswitch import plugin
+from quantum.tests import base
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 import quantum.tests.unit.test_db_plugin as test_plugin
 
@@ -33,6 +39,7 @@ RESTPROXY_PKG_PATH = 'quantum.plugins.bigswitch.plugin'
 class HTTPResponseMock():
     status = 200
     reason = 'OK'
+    will_close = False
 
     def __init__(self, sock, debuglevel=0, strict=0, method=None,
                  buffering=False):
@@ -124,3 +131,123 @@ class TestBigSwitchProxySync(BigSwitchProxyPluginV2TestCase):
         plugin_obj = QuantumManager.get_plugin()
         result = plugin_obj._send_all_data()
         self.assertEqual(result[0], 200)
+
+
+class TestServerProxy(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestServerProxy, self).setUp()
+        connection = patch('httplib.HTTPConnection')
+        self.connection = connection.start()
+        self.addCleanup(connection.stop)
+        self.connection.return_value.getresponse.return_value = mock.Mock(
+            status=200, reason='OK', will_close=False,
+            read=mock.Mock(return_value='{}'))
+        self.proxy = plugin.ServerProxy('localhost', 8899, False, None,
+                                        'quantum', 10, '/base', 'test')
+
+    def test_rest_call_reuses_connection(self):
+        self.assertEqual(self.proxy.rest_call('GET', '/res', '', None),
+                         (200, 'OK', '{}', {}))
+        self.proxy.rest_call('GET', '/res', '', None)
+        self.connection.assert_called_once_with('localhost', 8899,
+                                                timeout=10)
+        self.assertEqual(self.connection.return_value.request.call_count, 2)
+
+    def test_rest_call_discards_connection_of_parent_process(self):
+        with patch('os.getpid', return_value=1000):
+            self.proxy.rest_call('GET', '/res', '', None)
+        inherited_conn = self.connection.return_value
+        new_conn = mock.Mock()
+        new_conn.getresponse.return_value = (
+            inherited_conn.getresponse.return_value)
+        self.connection.return_value = new_conn
+        with patch('os.getpid', return_value=1001):
+            self.proxy.rest_call('GET', '/res', '', None)
+            self.proxy.rest_call('GET', '/res', '', None)
+        inherited_conn.close.assert_called_once_with()
+        self.assertEqual(inherited_conn.request.call_count, 1)
+        self.assertEqual(new_conn.request.call_count, 2)
+        self.assertEqual(self.connection.call_count, 2)
+
+    def test_rest_call_closed_by_server(self):
+        response = self.connection.return_value.getresponse.return_value
+        response.will_close = True
+        self.proxy.rest_call('GET', '/res', '', None)
+        self.proxy.rest_call('GET', '/res', '', None)
+        self.assertEqual(self.connection.call_count, 2)
+
+    def test_rest_call_reconnects_lost_connection(self):
+        self.proxy.rest_call('GET', '/res', '', None)
+        lost_conn = self.connection.return_value
+        lost_conn.request.side_effect = httplib.BadStatusLine('')
+        new_conn = mock.Mock()
+        new_conn.getresponse.return_value = lost_conn.getresponse.return_value
+        self.connection.return_value = new_conn
+        self.assertEqual(self.proxy.rest_call('GET', '/res', '', None)[0],
+                         200)
+        lost_conn.close.assert_called_once_with()
+        self.assertEqual(new_conn.request.call_count, 1)
+
+    def test_rest_call_reconnects_reset_connection(self):
+        self.proxy.rest_call('GET', '/res', '', None)
+        lost_conn = self.connection.return_value
+        lost_conn.getresponse.side_effect = socket.error(errno.ECONNRESET,
+                                                         'reset')
+        new_conn = mock.Mock()
+        new_conn.getresponse.return_value = (
+            self.connection.return_value.getresponse.return_value)
+        self.connection.return_value = new_conn
+        self.assertEqual(self.proxy.rest_call('GET', '/res', '', None)[0],
+                         200)
+        self.assertEqual(new_conn.request.call_count, 1)
+
+    def test_rest_call_timeout_not_retried(self):
+        self.proxy.rest_call('GET', '/res', '', None)
+        conn = self.connection.return_value
+        conn.getresponse.side_effect = socket.timeout('timed out')
+        self.assertEqual(self.proxy.rest_call('POST', '/res', '', None),
+                         (0, None, None, None))
+        self.assertEqual(self.connection.call_count, 1)
+        self.assertEqual(conn.request.call_count, 2)
+
+    def test_rest_call_reset_while_reading_not_retried(self):
+        self.proxy.rest_call('GET', '/res', '', None)
+        response = self.connection.return_value.getresponse.return_value
+        response.read.side_effect = socket.error(errno.ECONNRESET, 'reset')
+        self.assertEqual(self.proxy.rest_call('POST', '/res', '', None),
+                         (0, None, None, None))
+        self.assertEqual(self.connection.call_count, 1)
+
+    def test_rest_call_failure(self):
+        self.connection.return_value.request.side_effect = socket.error
+        self.assertEqual(self.proxy.rest_call('GET', '/res', '', None),
+                         (0, None, None, None))
+        self.assertFalse(self.proxy._idle_connections)
+
+
+class TestServerPool(base.BaseTestCase):
+
+    def test_rest_call_failover(self):
+        pool = plugin.ServerPool([('a', 1), ('b', 2), ('c', 3)], False, None,
+                                 'quantum')
+        servers = list(pool.servers)
+        responses = {'a': (0, None, None, None), 'b': (200, 'OK', '', ''),
+                     'c': (200, 'OK', '', '')}
+        for server in servers:
+            server.rest_call = mock.Mock(
+                return_value=responses[server.server])
+        self.assertEqual(pool.rest_call('GET', '/res', '', None)[0], 200)
+        self.assertEqual(pool.servers, [servers[1], servers[2], servers[0]])
+        # The working server is used first from now on
+        pool.rest_call('GET', '/res', '', None)
+        self.assertEqual(servers[0].rest_call.call_count, 1)
+
+    def test_rest_call_all_servers_failed(self):
+        pool = plugin.ServerPool([('a', 1), ('b', 2)], False, None, 'quantum')
+        servers = list(pool.servers)
+        for server in servers:
+            server.rest_call = mock.Mock(return_value=(0, None, None, None))
+        self.assertEqual(pool.rest_call('GET', '/res', '', None),
+                         (0, None, None, None))
+        self.assertEqual(pool.servers, servers)
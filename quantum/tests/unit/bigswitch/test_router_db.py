@@ -18,7 +18,9 @@
 # @author: Sumit Naiksatam, sumitnaiksatam@gmail.com
 #
 
+import contextlib
 import copy
+import hashlib
 import os
 
 from mock import patch
@@ -26,6 +28,7 @@ from oslo.config import cfg
 from webob import exc
 
 from quantum.common.test_lib import test_config
+from quantum import context
 from quantum.extensions import l3
 from quantum.manager import QuantumManager
 from quantum.openstack.common.notifier import api as notifier_api
@@ -56,6 +59,7 @@ origSetUp = test_l3_plugin.L3NatDBTestCase.setUp
 class HTTPResponseMock():
     status = 200
     reason = 'OK'
+    will_close = False
 
     def __init__(self, sock, debuglevel=0, strict=0, method=None,
                  buffering=False):
@@ -324,6 +328,82 @@ class RouterDBTestCase(test_l3_plugin.L3NatDBTestCase):
                         self._show('ports', r1_port_id,
                                    expected_code=exc.HTTPNotFound.code)
 
+    def _send_data_with_router_interface(self, times=1):
+        plugin_obj = QuantumManager.get_plugin()
+        ok = (200, 'OK', '', {})
+        puts = []
+        with contextlib.nested(
+            self.router(), self.subnet(cidr='10.0.10.0/24'),
+            self.subnet(cidr='10.0.20.0/24')
+        ) as (r, s, s1):
+            self._router_interface_action('add', r['router']['id'],
+                                          s['subnet']['id'], None)
+            hash_response = ok
+            for i in range(times):
+                with contextlib.nested(
+                    patch.object(plugin_obj.servers, 'put', return_value=ok),
+                    patch.object(plugin_obj.servers, 'get',
+                                 return_value=hash_response)
+                ) as (put, get):
+                    plugin_obj._send_all_data()
+                puts.append(put)
+                if put.called:
+                    topology_hash = put.call_args_list[-1][0][1]['hash']
+                    hash_response = (200, 'OK', '', {'hash': topology_hash})
+            self._router_interface_action('remove', r['router']['id'],
+                                          s['subnet']['id'], None)
+        return puts, s['subnet']['network_id']
+
+    def test_send_data_in_chunks(self):
+        cfg.CONF.set_override('sync_chunk_size', 1, 'RESTPROXY')
+        puts, net_id = self._send_data_with_router_interface()
+        put = puts[0]
+        chunks = [call[0][1] for call in put.call_args_list]
+        self.assertEqual([call[0][0] for call in put.call_args_list],
+                         ['/topology/chunks/%d' % i for i in range(3)])
+        self.assertEqual([len(chunk['networks']) for chunk in chunks],
+                         [1, 1, 0])
+        self.assertEqual([chunk['last'] for chunk in chunks],
+                         [False, False, True])
+        self.assertNotIn('hash', chunks[0])
+        self.assertIn('hash', chunks[2])
+        interfaces = chunks[2]['routers'][0]['interfaces']
+        self.assertEqual(interfaces[0]['id'], net_id)
+        self.assertEqual(interfaces[0]['network']['id'], net_id)
+        # The router interface port is sent along with its network
+        ports = [chunk['networks'][0]['ports'] for chunk in chunks[:2]
+                 if chunk['networks'][0]['id'] == net_id][0]
+        self.assertEqual(ports[0]['device_owner'],
+                         'network:router_interface')
+
+    def test_send_data_skipped_when_in_sync(self):
+        cfg.CONF.set_override('sync_chunk_size', 1, 'RESTPROXY')
+        puts, net_id = self._send_data_with_router_interface(times=2)
+        self.assertTrue(puts[0].called)
+        self.assertFalse(puts[1].called)
+
+    def test_send_data_unchunked_skipped_when_in_sync(self):
+        cfg.CONF.set_override('sync_chunk_size', 0, 'RESTPROXY')
+        puts, net_id = self._send_data_with_router_interface(times=2)
+        self.assertEqual([call[0][0] for call in puts[0].call_args_list],
+                         ['/topology'])
+        self.assertIn('hash', puts[0].call_args[0][1])
+        self.assertFalse(puts[1].called)
+
+    def test_topology_hash_independent_of_chunk_size(self):
+        plugin_obj = QuantumManager.get_plugin()
+        with self.subnet(cidr='10.0.10.0/24'):
+            with self.subnet(cidr='10.0.20.0/24'):
+                hashes = []
+                for chunk_size in (1, 2, None):
+                    topology_hash = hashlib.sha1()
+                    for chunk in plugin_obj._get_topology_chunks(
+                            context.get_admin_context(), chunk_size):
+                        plugin_obj._update_topology_hash(topology_hash,
+                                                         chunk)
+                    hashes.append(topology_hash.hexdigest())
+        self.assertEqual(len(set(hashes)), 1)
+
     def test_router_rules_update(self):
         with self.router() as r:
             r_id = r['router']['id']
@@ -22,6 +22,7 @@ import webob.exc as wexc
 
 from quantum.api.v2 import base
 from quantum.common import exceptions as q_exc
+from quantum.common import topics
 from quantum import context
 from quantum.db import db_base_plugin_v2 as base_plugin
 from quantum.db import l3_db
@@ -64,6 +65,23 @@ class CiscoNetworkPluginV2TestCase(test_db_plugin.QuantumDbPluginV2TestCase):
         return plugin_ref
 
 
+class TestCiscoRpcListener(CiscoNetworkPluginV2TestCase):
+
+    def test_start_rpc_listener(self):
+        # The topics of the vswitch plugin are consumed through the core
+        # plugin, by the server or its rpc workers
+        plugin = QuantumManager.get_plugin()
+        self.assertTrue(plugin.rpc_workers_supported())
+        with mock.patch('quantum.openstack.common.rpc.'
+                        'create_connection') as create_connection:
+            server = plugin.start_rpc_listener()
+        conn = create_connection.return_value
+        conn.create_consumer.assert_called_once_with(topics.PLUGIN,
+                                                     mock.ANY,
+                                                     fanout=False)
+        self.assertEqual(conn.consume_in_thread.return_value, server)
+
+
 class TestCiscoBasicGet(CiscoNetworkPluginV2TestCase,
                         test_db_plugin.TestBasicGet):
     pass
@@ -257,6 +275,38 @@ class TestCiscoPortsV2(CiscoNetworkPluginV2TestCase,
                     'ports',
                     wexc.HTTPInternalServerError.code)
 
+    def test_create_ports_bulk_duplicate_mac(self):
+        # The Nexus sub-plugin commits the port bindings in its own
+        # session, which commits the ports created before the failure
+        # when the test database shares a single connection.
+        with self.network() as net:
+            overrides = {0: {'mac_address': '00:11:22:33:44:55'},
+                         1: {'mac_address': '00:11:22:33:44:55'}}
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True, override=overrides)
+            self.assertEqual(res.status_int, 409)
+            req = self.new_list_request('ports')
+            ports = self.deserialize(self.fmt, req.get_response(self.api))
+            for p in ports['ports']:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_duplicate_ip(self):
+        # As for test_create_ports_bulk_duplicate_mac, the ports created
+        # before the failure may be left behind.
+        with self.subnet() as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.5'}]
+            overrides = {0: {'fixed_ips': fixed_ips},
+                         1: {'fixed_ips': fixed_ips}}
+            res = self._create_port_bulk(self.fmt, 2,
+                                         subnet['subnet']['network_id'],
+                                         'test', True, override=overrides)
+            self.assertEqual(res.status_int, 409)
+            req = self.new_list_request('ports')
+            ports = self.deserialize(self.fmt, req.get_response(self.api))
+            for p in ports['ports']:
+                self._delete('ports', p['id'])
+
     def test_nexus_enable_vlan_cmd(self):
         """Verify the syntax of the command to enable a vlan on an intf."""
         # First vlan should be configured without 'add' keyword
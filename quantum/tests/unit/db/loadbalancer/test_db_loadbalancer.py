@@ -964,6 +964,28 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             for k, v in stats_data.items():
                 self.assertEqual(pool_obj.stats.__dict__[k], v)
 
+    def test_update_pools_stats(self):
+        with contextlib.nested(self.pool(name='pool1'),
+                               self.pool(name='pool2')) as (pool1, pool2):
+            pool1_id = pool1['pool']['id']
+            pool2_id = pool2['pool']['id']
+            ctx = context.get_admin_context()
+            # the stats of a pool without any are created
+            self.plugin._delete_pool_stats(ctx, pool2_id)
+            stats_data = {
+                pool1_id: {"bytes_in": 1, "bytes_out": 2,
+                           "active_connections": 3, "total_connections": 4},
+                pool2_id: {"bytes_in": 5, "bytes_out": 6,
+                           "active_connections": 7, "total_connections": 8},
+                'deleted_pool_id': {"bytes_in": 9}
+            }
+            self.plugin._update_pools_stats(ctx, stats_data)
+            for pool_id in (pool1_id, pool2_id):
+                res = self.plugin.stats(ctx, pool_id)['stats']
+                self.assertEqual(stats_data[pool_id], res)
+            self.assertIsNone(ctx.session.query(ldb.PoolStatistics).filter_by(
+                pool_id='deleted_pool_id').first())
+
     def test_get_pool_stats(self):
         keys = [("bytes_in", 0),
                 ("bytes_out", 0),
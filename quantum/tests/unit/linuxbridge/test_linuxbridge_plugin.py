@@ -13,7 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from quantum import context
 from quantum.extensions import portbindings
+from quantum.plugins.linuxbridge import lb_quantum_plugin
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 from quantum.tests.unit import test_db_plugin as test_plugin
 from quantum.tests.unit import test_security_groups_rpc as test_sg_rpc
@@ -55,6 +57,11 @@ class TestLinuxBridgePortsV2(test_plugin.TestPortsV2,
             self.assertEqual(self.port_create_status, 'DOWN')
 
 
+class TestLinuxBridgeListQueryCount(test_plugin.ListQueryCountTestMixin,
+                                    LinuxBridgePluginV2TestCase):
+    pass
+
+
 class TestLinuxBridgePortBinding(LinuxBridgePluginV2TestCase,
                                  test_bindings.PortBindingsTestCase):
     VIF_TYPE = portbindings.VIF_TYPE_BRIDGE
@@ -75,3 +82,43 @@ class TestOpenvswitchPortBindingHost(
     LinuxBridgePluginV2TestCase,
     test_bindings.PortBindingsHostTestCaseMixin):
     pass
+
+
+class TestLinuxBridgeRpcCallbacks(LinuxBridgePluginV2TestCase):
+
+    def _device(self, port):
+        return 'tap' + port['port']['id'][:11]
+
+    def test_get_devices_details_list(self):
+        callbacks = lb_quantum_plugin.LinuxBridgeRpcCallbacks()
+        ctx = context.get_admin_context()
+        with self.port() as port1:
+            with self.port(subnet={'subnet': {'network_id':
+                           port1['port']['network_id']}}) as port2:
+                devices = [self._device(port1), 'tapunknown',
+                           self._device(port2)]
+                entries = callbacks.get_devices_details_list(
+                    ctx, devices=devices, agent_id='fake_agent')
+                self.assertEqual([entry['device'] for entry in entries],
+                                 devices)
+                self.assertEqual(entries[0]['port_id'], port1['port']['id'])
+                self.assertNotIn('port_id', entries[1])
+                self.assertEqual(entries[2]['port_id'], port2['port']['id'])
+                self.assertEqual(entries[2]['network_type'], 'local')
+                port = self._show('ports', port1['port']['id'])
+                self.assertEqual(port['port']['status'], 'ACTIVE')
+
+    def test_update_devices_down(self):
+        callbacks = lb_quantum_plugin.LinuxBridgeRpcCallbacks()
+        ctx = context.get_admin_context()
+        with self.port() as port:
+            devices = [self._device(port), 'tapunknown']
+            callbacks.get_devices_details_list(ctx, devices=devices,
+                                               agent_id='fake_agent')
+            entries = callbacks.update_devices_down(ctx, devices=devices,
+                                                    agent_id='fake_agent')
+            self.assertEqual(entries,
+                             [{'device': devices[0], 'exists': True},
+                              {'device': devices[1], 'exists': False}])
+            port = self._show('ports', port['port']['id'])
+            self.assertEqual(port['port']['status'], 'DOWN')
@@ -30,6 +30,7 @@ from quantum.openstack.common import uuidutils
 from quantum.plugins.metaplugin.meta_quantum_plugin import FlavorNotFound
 from quantum.plugins.metaplugin.meta_quantum_plugin import MetaPluginV2
 from quantum.tests import base
+from quantum.tests.unit.metaplugin import fake_plugin
 
 CONF_FILE = ""
 ROOTDIR = os.path.dirname(os.path.dirname(__file__))
@@ -305,6 +306,23 @@ class MetaQuantumPluginV2Test(base.BaseTestCase):
 
         self.fail("No Error is not raised")
 
+    def test_rpc_workers_not_supported(self):
+        self.assertFalse(self.plugin.rpc_workers_supported())
+
+    def test_start_rpc_listener(self):
+        # Fake2 inherits the method from Fake1
+        with mock.patch.object(fake_plugin.Fake1,
+                               'start_rpc_listener') as start_listener:
+            self.assertTrue(self.plugin.rpc_workers_supported())
+            server = self.plugin.start_rpc_listener()
+            # fake1 is both a core and a l3 plugin, fake2 a core plugin
+            self.assertEqual(2, start_listener.call_count)
+            self.assertEqual([start_listener.return_value] * 2,
+                             server.listeners)
+
+            server.kill()
+            self.assertEqual(2, start_listener.return_value.kill.call_count)
+
     def tearDown(self):
         self.mox.UnsetStubs()
         self.stubs.UnsetAll()
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from quantum import context
+from quantum.plugins.ml2 import rpc as ml2_rpc
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 from quantum.tests.unit import test_db_plugin as test_plugin
 
@@ -58,6 +60,51 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
 # TODO(rkukura) add TestMl2PortBindingNoSG
 
 
+class TestMl2ListQueryCount(test_plugin.ListQueryCountTestMixin,
+                            Ml2PluginV2TestCase):
+    pass
+
+
 class TestMl2PortBindingHost(Ml2PluginV2TestCase,
                              test_bindings.PortBindingsHostTestCaseMixin):
     pass
+
+
+class TestMl2RpcCallbacks(Ml2PluginV2TestCase):
+
+    def _device(self, port):
+        return 'tap' + port['port']['id'][:11]
+
+    def test_get_devices_details_list(self):
+        callbacks = ml2_rpc.RpcCallbacks(None)
+        ctx = context.get_admin_context()
+        with self.port() as port1:
+            with self.port(subnet={'subnet': {'network_id':
+                           port1['port']['network_id']}}) as port2:
+                devices = [self._device(port1), 'tapunknown',
+                           self._device(port2)]
+                entries = callbacks.get_devices_details_list(
+                    ctx, devices=devices, agent_id='fake_agent')
+                self.assertEqual([entry['device'] for entry in entries],
+                                 devices)
+                self.assertEqual(entries[0]['port_id'], port1['port']['id'])
+                self.assertNotIn('port_id', entries[1])
+                self.assertEqual(entries[2]['port_id'], port2['port']['id'])
+                self.assertEqual(entries[2]['network_type'], 'local')
+                port = self._show('ports', port1['port']['id'])
+                self.assertEqual(port['port']['status'], 'ACTIVE')
+
+    def test_update_devices_down(self):
+        callbacks = ml2_rpc.RpcCallbacks(None)
+        ctx = context.get_admin_context()
+        with self.port() as port:
+            devices = [self._device(port), 'tapunknown']
+            callbacks.get_devices_details_list(ctx, devices=devices,
+                                               agent_id='fake_agent')
+            entries = callbacks.update_devices_down(ctx, devices=devices,
+                                                    agent_id='fake_agent')
+            self.assertEqual(entries,
+                             [{'device': devices[0], 'exists': True},
+                              {'device': devices[1], 'exists': False}])
+            port = self._show('ports', port['port']['id'])
+            self.assertEqual(port['port']['status'], 'DOWN')
@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import contextlib
+import datetime
 import os
 
 import mock
@@ -29,6 +30,7 @@ from quantum.extensions import providernet as pnet
 from quantum.extensions import securitygroup as secgrp
 from quantum import manager
 import quantum.plugins.nicira as nvp_plugin
+from quantum.plugins.nicira.common import sync
 from quantum.plugins.nicira.extensions import nvp_networkgw
 from quantum.plugins.nicira.extensions import nvp_qos as ext_qos
 from quantum.plugins.nicira import nvplib
@@ -785,6 +787,10 @@ class TestNiciraQoSQueue(NiciraPluginV2TestCase):
 class NiciraQuantumNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
                                 NiciraPluginV2TestCase):
 
+    def _synchronize(self):
+        plugin = manager.QuantumManager.get_plugin()
+        plugin._synchronizer.synchronize(context.get_admin_context())
+
     def test_delete_network_not_in_nvp(self):
         res = self._create_network('json', 'net1', True)
         net1 = self.deserialize('json', res)
@@ -797,6 +803,7 @@ class NiciraQuantumNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         res = self._create_network('json', 'net1', True)
         self.deserialize('json', res)
         self.fc._fake_lswitch_dict.clear()
+        self._synchronize()
         req = self.new_list_request('networks')
         nets = self.deserialize('json', req.get_response(self.api))
         self.assertEqual(nets['networks'][0]['status'],
@@ -827,6 +834,7 @@ class NiciraQuantumNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         res = self._create_port('json', net1['network']['id'])
         self.deserialize('json', res)
         self.fc._fake_lswitch_lport_dict.clear()
+        self._synchronize()
         req = self.new_list_request('ports')
         nets = self.deserialize('json', req.get_response(self.api))
         self.assertEqual(nets['ports'][0]['status'],
@@ -889,6 +897,7 @@ class NiciraQuantumNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         res = self._create_router('json', 'tenant')
         self.deserialize('json', res)
         self.fc._fake_lrouter_dict.clear()
+        self._synchronize()
         req = self.new_list_request('routers')
         routers = self.deserialize('json', req.get_response(self.ext_api))
         self.assertEqual(routers['routers'][0]['status'],
@@ -903,6 +912,75 @@ class NiciraQuantumNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         self.assertEqual(router['router']['status'],
                          constants.NET_STATUS_ERROR)
 
+    def test_list_ports_does_not_query_nvp(self):
+        with self.port():
+            self._synchronize()
+            with mock.patch.object(nvplib, 'do_single_request') as request:
+                req = self.new_list_request('ports')
+                ports = self.deserialize('json', req.get_response(self.api))
+        self.assertEqual(1, len(ports['ports']))
+        self.assertFalse(request.called)
+
+    def test_list_status_read_from_nvp_when_not_synchronized(self):
+        with self.port():
+            self.fc._fake_lswitch_dict.clear()
+            self.fc._fake_lswitch_lport_dict.clear()
+            req = self.new_list_request('ports')
+            ports = self.deserialize('json', req.get_response(self.api))
+            self.assertEqual(ports['ports'][0]['status'],
+                             constants.PORT_STATUS_ERROR)
+            req = self.new_list_request('networks')
+            nets = self.deserialize('json', req.get_response(self.api))
+            self.assertEqual(nets['networks'][0]['status'],
+                             constants.NET_STATUS_ERROR)
+
+    def test_list_routers_status_read_from_nvp_when_sync_too_old(self):
+        with self.router():
+            self._synchronize()
+            self.fc._fake_lrouter_dict.clear()
+            plugin = manager.QuantumManager.get_plugin()
+            plugin._synchronizer._max_status_age = 0
+            plugin._synchronizer._synced_at -= datetime.timedelta(seconds=1)
+            req = self.new_list_request('routers')
+            routers = self.deserialize('json',
+                                       req.get_response(self.ext_api))
+            self.assertEqual(routers['routers'][0]['status'],
+                             constants.NET_STATUS_ERROR)
+
+    def test_synchronize_status(self):
+        with self.port() as port:
+            self._synchronize()
+            # The port status is down on the fake NVP
+            req = self.new_list_request('ports')
+            ports = self.deserialize('json', req.get_response(self.api))
+            self.assertEqual(ports['ports'][0]['status'],
+                             constants.PORT_STATUS_DOWN)
+            req = self.new_list_request('networks')
+            nets = self.deserialize('json', req.get_response(self.api))
+            self.assertEqual(nets['networks'][0]['status'],
+                             constants.NET_STATUS_ACTIVE)
+            # Recently synchronized ports are shown without going to NVP
+            self.fc._fake_lswitch_lport_dict.clear()
+            req = self.new_show_request('ports', port['port']['id'])
+            res = self.deserialize('json', req.get_response(self.api))
+            self.assertEqual(res['port']['status'],
+                             constants.PORT_STATUS_DOWN)
+            # Unless the last synchronization is too old
+            plugin = manager.QuantumManager.get_plugin()
+            plugin._synchronizer._max_status_age = 0
+            plugin._synchronizer._synced_at -= datetime.timedelta(seconds=1)
+            res = self.deserialize('json', req.get_response(self.api))
+            self.assertEqual(res['port']['status'],
+                             constants.PORT_STATUS_ERROR)
+
+
+    def test_status_fresh_when_synchronized_by_another_process(self):
+        plugin = manager.QuantumManager.get_plugin()
+        # The synchronizer of a forked API worker never runs itself
+        worker_sync = sync.NvpSynchronizer(plugin.cluster, 120, 300)
+        self.assertFalse(worker_sync.is_status_fresh())
+        self._synchronize()
+        self.assertTrue(worker_sync.is_status_fresh())
 
 class TestNiciraNetworkGateway(test_l2_gw.NetworkGatewayDbTestCase,
                                NiciraPluginV2TestCase):
@@ -972,6 +972,59 @@ class OvsDhcpAgentNotifierTestCase(test_l3_plugin.L3NatTestCaseMixin,
                     topic='dhcp_agent.' + DHCP_HOSTA)]
             self.assertEqual(mock_dhcp.call_args_list, expected_calls)
 
+    def _test_network_port_bulk_create_notification(self, rpc_api_version):
+        dhcp_hosta = {
+            'binary': 'quantum-dhcp-agent',
+            'host': DHCP_HOSTA,
+            'topic': 'dhcp_agent',
+            'configurations': {'dhcp_driver': 'dhcp_driver',
+                               'use_namespaces': True,
+                               },
+            'agent_type': constants.AGENT_TYPE_DHCP}
+        if rpc_api_version:
+            dhcp_hosta['configurations']['rpc_api_version'] = rpc_api_version
+        self._register_one_agent_state(dhcp_hosta)
+        with self.network(do_delete=False) as net1:
+            with self.subnet(network=net1, do_delete=False):
+                network_id = net1['network']['id']
+                with mock.patch.object(self.dhcp_notifier,
+                                       'cast') as mock_dhcp:
+                    res = self._create_port_bulk(self.fmt, 2, network_id,
+                                                 'test', True)
+                    ports = self.deserialize(self.fmt, res)['ports']
+        self.assertEqual(len(ports), 2)
+        self.assertEqual(
+            mock_dhcp.call_args_list[0],
+            mock.call(
+                mock.ANY,
+                self.dhcp_notifier.make_msg(
+                    'network_create_end',
+                    payload={'network': {'id': network_id}}),
+                topic='dhcp_agent.' + DHCP_HOSTA))
+        return ports, mock_dhcp.call_args_list[1:]
+
+    def test_network_port_bulk_create_notification(self):
+        ports, calls = self._test_network_port_bulk_create_notification('1.1')
+        self.assertEqual(calls, [
+            mock.call(
+                mock.ANY,
+                self.dhcp_notifier.make_msg(
+                    'port_create_end',
+                    payload={'ports': ports}),
+                topic='dhcp_agent.' + DHCP_HOSTA,
+                version='1.1')])
+
+    def test_network_port_bulk_create_notification_old_agent(self):
+        ports, calls = self._test_network_port_bulk_create_notification(None)
+        self.assertEqual(calls, [
+            mock.call(
+                mock.ANY,
+                self.dhcp_notifier.make_msg(
+                    'port_create_end',
+                    payload={'port': port}),
+                topic='dhcp_agent.' + DHCP_HOSTA)
+            for port in ports])
+
     def test_network_ha_port_create_notification(self):
         cfg.CONF.set_override('dhcp_agents_per_network', 2)
         dhcp_hosta = {
@@ -13,7 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
+
+from quantum import context
 from quantum.extensions import portbindings
+from quantum import manager
+from quantum.openstack.common import rpc
+from quantum.plugins.openvswitch import ovs_quantum_plugin
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 from quantum.tests.unit import test_db_plugin as test_plugin
 from quantum.tests.unit import test_security_groups_rpc as test_sg_rpc
@@ -53,6 +59,11 @@ class TestOpenvswitchNetworksV2(test_plugin.TestNetworksV2,
     pass
 
 
+class TestOpenvswitchListQueryCount(test_plugin.ListQueryCountTestMixin,
+                                    OpenvswitchPluginV2TestCase):
+    pass
+
+
 class TestOpenvswitchPortBinding(OpenvswitchPluginV2TestCase,
                                  test_bindings.PortBindingsTestCase):
     VIF_TYPE = portbindings.VIF_TYPE_OVS
@@ -73,3 +84,56 @@ class TestOpenvswitchPortBindingHost(
     OpenvswitchPluginV2TestCase,
     test_bindings.PortBindingsHostTestCaseMixin):
     pass
+
+
+class TestOpenvswitchRpcListener(OpenvswitchPluginV2TestCase):
+
+    def test_start_rpc_listener(self):
+        plugin = manager.QuantumManager.get_plugin()
+        self.assertTrue(plugin.rpc_workers_supported())
+        with mock.patch.object(rpc, 'create_connection') as create_conn:
+            conn = create_conn.return_value
+            server = plugin.start_rpc_listener()
+        conn.create_consumer.assert_called_once_with(
+            plugin.topic, plugin.dispatcher, fanout=False)
+        self.assertEqual(server, conn.consume_in_thread.return_value)
+
+
+class TestOpenvswitchRpcCallbacks(OpenvswitchPluginV2TestCase):
+
+    def _device(self, port):
+        return port['port']['id']
+
+    def test_get_devices_details_list(self):
+        callbacks = ovs_quantum_plugin.OVSRpcCallbacks(None)
+        ctx = context.get_admin_context()
+        with self.port() as port1:
+            with self.port(subnet={'subnet': {'network_id':
+                           port1['port']['network_id']}}) as port2:
+                devices = [self._device(port1), 'tapunknown',
+                           self._device(port2)]
+                entries = callbacks.get_devices_details_list(
+                    ctx, devices=devices, agent_id='fake_agent')
+                self.assertEqual([entry['device'] for entry in entries],
+                                 devices)
+                self.assertEqual(entries[0]['port_id'], port1['port']['id'])
+                self.assertNotIn('port_id', entries[1])
+                self.assertEqual(entries[2]['port_id'], port2['port']['id'])
+                self.assertEqual(entries[2]['network_type'], 'local')
+                port = self._show('ports', port1['port']['id'])
+                self.assertEqual(port['port']['status'], 'ACTIVE')
+
+    def test_update_devices_down(self):
+        callbacks = ovs_quantum_plugin.OVSRpcCallbacks(None)
+        ctx = context.get_admin_context()
+        with self.port() as port:
+            devices = [self._device(port), 'tapunknown']
+            callbacks.get_devices_details_list(ctx, devices=devices,
+                                               agent_id='fake_agent')
+            entries = callbacks.update_devices_down(ctx, devices=devices,
+                                                    agent_id='fake_agent')
+            self.assertEqual(entries,
+                             [{'device': devices[0], 'exists': True},
+                              {'device': devices[1], 'exists': False}])
+            port = self._show('ports', port['port']['id'])
+            self.assertEqual(port['port']['status'], 'DOWN')
@@ -186,18 +186,15 @@ class OVS_Lib_Test(base.BaseTestCase):
         ip = "9.9.9.9"
         ofport = "6"
 
-        utils.execute(["ovs-vsctl", self.TO, "add-port",
-                       self.BR_NAME, pname], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "type=gre"], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:remote_ip=" + ip],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:in_key=flow"],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:out_key=flow"],
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "add-port", self.BR_NAME, pname,
+                       "--", "set", "Interface", pname, "type=gre",
+                       "--", "set", "Interface", pname,
+                       "options:remote_ip=" + ip,
+                       "--", "set", "Interface", pname,
+                       "options:in_key=flow",
+                       "--", "set", "Interface", pname,
+                       "options:out_key=flow"],
                       root_helper=self.root_helper)
         utils.execute(["ovs-vsctl", self.TO, "get",
                        "Interface", pname, "ofport"],
@@ -212,12 +209,11 @@ class OVS_Lib_Test(base.BaseTestCase):
         peer = "bar10"
         ofport = "6"
 
-        utils.execute(["ovs-vsctl", self.TO, "add-port",
-                       self.BR_NAME, pname], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "type=patch"], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set",
-                       "Interface", pname, "options:peer=" + peer],
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "add-port", self.BR_NAME, pname,
+                       "--", "set", "Interface", pname, "type=patch",
+                       "--", "set", "Interface", pname,
+                       "options:peer=" + peer],
                       root_helper=self.root_helper)
         utils.execute(["ovs-vsctl", self.TO, "get",
                        "Interface", pname, "ofport"],
@@ -227,6 +223,125 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.assertEqual(self.br.add_patch_port(pname, peer), ofport)
         self.mox.VerifyAll()
 
+    def test_deferred_batches_flows(self):
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                      "priority=2,in_port=1,actions=drop\n"
+                      "hard_timeout=0,idle_timeout=0,"
+                      "priority=1,actions=normal\n",
+                      root_helper=self.root_helper)
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, "-"],
+                      process_input="in_port=1\n",
+                      root_helper=self.root_helper)
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                      "priority=3,actions=drop\n",
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        with self.br.deferred():
+            self.br.add_flow(priority=2, in_port=1, actions="drop")
+            self.br.add_flow(priority=1, actions="normal")
+            self.br.delete_flows(in_port=1)
+            self.br.add_flow(priority=3, actions="drop")
+        self.mox.VerifyAll()
+
+    def test_deferred_batches_ovsdb_changes(self):
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "set", "Port", "tap1", "tag=1",
+                       "--", "--if-exists", "del-port", self.BR_NAME, "tap2",
+                       "--", "clear", "Port", "tap3", "tag"],
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        with self.br.deferred():
+            with self.br.deferred():
+                self.br.set_db_attribute("Port", "tap1", "tag", "1")
+                self.br.delete_port("tap2")
+            self.br.clear_db_attribute("Port", "tap3", "tag")
+        self.mox.VerifyAll()
+
+    def test_deferred_ovsdb_changes_applied_one_by_one_on_failure(self):
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "set", "Port", "tap1", "tag=1",
+                       "--", "set", "Port", "tap2", "tag=2"],
+                      root_helper=self.root_helper).AndRaise(RuntimeError)
+        utils.execute(["ovs-vsctl", self.TO,
+                       "set", "Port", "tap1", "tag=1"],
+                      root_helper=self.root_helper)
+        utils.execute(["ovs-vsctl", self.TO,
+                       "set", "Port", "tap2", "tag=2"],
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        with self.br.deferred():
+            self.br.set_db_attribute("Port", "tap1", "tag", "1")
+            self.br.set_db_attribute("Port", "tap2", "tag", "2")
+        self.mox.VerifyAll()
+
+    def test_deferred_ovsdb_change_failure_raises(self):
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "set", "Port", "tap1", "tag=1",
+                       "--", "set", "Port", "tap2", "tag=2"],
+                      root_helper=self.root_helper).AndRaise(RuntimeError)
+        utils.execute(["ovs-vsctl", self.TO,
+                       "set", "Port", "tap1", "tag=1"],
+                      root_helper=self.root_helper).AndRaise(RuntimeError)
+        utils.execute(["ovs-vsctl", self.TO,
+                       "set", "Port", "tap2", "tag=2"],
+                      root_helper=self.root_helper)
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                      "priority=1,actions=normal\n",
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        def apply_changes():
+            with self.br.deferred():
+                self.br.set_db_attribute("Port", "tap1", "tag", "1")
+                self.br.set_db_attribute("Port", "tap2", "tag", "2")
+                self.br.add_flow(priority=1, actions="normal")
+
+        self.assertRaises(RuntimeError, apply_changes)
+        self.mox.VerifyAll()
+
+    def test_deferred_ovsdb_changes_timeout_scales(self):
+        count = ovs_lib.VSCTL_TIMEOUT_CHUNK + 1
+        args = []
+        for i in range(count):
+            args += ["--", "set", "Port", "tap%d" % i, "tag=1"]
+        timeout = "--timeout=%d" % (2 * ovs_lib.VSCTL_TIMEOUT)
+        utils.execute(["ovs-vsctl", timeout] + args,
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        with self.br.deferred():
+            for i in range(count):
+                self.br.set_db_attribute("Port", "tap%d" % i, "tag", "1")
+        self.mox.VerifyAll()
+
+    def test_deferred_applies_changes_before_other_commands(self):
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "set", "Port", "tap1", "tag=1"],
+                      root_helper=self.root_helper)
+        utils.execute(["ovs-vsctl", self.TO, "get", "Interface", "tap1",
+                       "ofport"],
+                      root_helper=self.root_helper).AndReturn("1")
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                      "priority=1,actions=normal\n",
+                      root_helper=self.root_helper)
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME],
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        with self.br.deferred():
+            self.br.set_db_attribute("Port", "tap1", "tag", "1")
+            self.br.add_flow(priority=1, actions="normal")
+            self.assertEqual(self.br.get_port_ofport("tap1"), "1")
+            self.br.remove_all_flows()
+        self.mox.VerifyAll()
+
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
         ofport = "6"
@@ -264,6 +379,34 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.assertEqual(ports[0].switch.br_name, self.BR_NAME)
         self.mox.VerifyAll()
 
+    def test_get_vif_ports_by_ids(self):
+        vif_id1 = uuidutils.generate_uuid()
+        vif_id2 = uuidutils.generate_uuid()
+        output = '\n\n'.join([
+            'external_ids        : {attached-mac="ca:fe:de:ad:be:ef", '
+            'iface-id="%s", iface-status=active}\n'
+            'name                : "tap1"\n'
+            'ofport              : 1' % vif_id1,
+            'external_ids        : {}\n'
+            'name                : "patch-tun"\n'
+            'ofport              : 2',
+            'external_ids        : {attached-mac="ca:fe:de:ad:be:ee", '
+            'iface-id="%s", iface-status=active}\n'
+            'name                : "tap3"\n'
+            'ofport              : 3' % vif_id2])
+        utils.execute(["ovs-vsctl", self.TO, "--",
+                       "--columns=external_ids,name,ofport",
+                       "find", "Interface"],
+                      root_helper=self.root_helper).AndReturn(output)
+        self.mox.ReplayAll()
+
+        ports = self.br.get_vif_ports_by_ids([vif_id1, 'unknown'])
+        self.assertEqual(ports.keys(), [vif_id1])
+        self.assertEqual(ports[vif_id1].port_name, 'tap1')
+        self.assertEqual(ports[vif_id1].ofport, 1)
+        self.assertEqual(ports[vif_id1].vif_mac, 'ca:fe:de:ad:be:ef')
+        self.mox.VerifyAll()
+
     def test_get_vif_ports_nonxen(self):
         self._test_get_vif_ports(False)
 
@@ -109,8 +109,62 @@ class TestOvsQuantumAgent(base.BaseTestCase):
         actual = self.mock_update_ports(vif_port_set, registered_ports)
         self.assertEqual(expected, actual)
 
+    def test_update_ports_from_events(self):
+        self.agent.interface_monitor = mock.Mock()
+        self.agent.interface_monitor.get_events.return_value = {
+            'added': set([1, 3]), 'removed': set([2, 4])}
+        expected = dict(current=set([1, 3]), added=set([3]),
+                        removed=set([2]))
+        actual = self.agent.update_ports_from_events(set([1, 2]))
+        self.assertEqual(expected, actual)
+
+    def test_update_ports_from_events_returns_none_without_changes(self):
+        self.agent.interface_monitor = mock.Mock()
+        self.agent.interface_monitor.get_events.return_value = {
+            'added': set([1]), 'removed': set([2])}
+        self.assertIsNone(self.agent.update_ports_from_events(set([1])))
+
+    def _run_rpc_loop(self, iterations, monitor_active=True):
+        """Run the agent loop for the given number of iterations.
+
+        :returns: the mocks of update_ports and update_ports_from_events
+        """
+        self.agent.interface_monitor = mock.Mock()
+        self.agent.interface_monitor.is_active = monitor_active
+        self.agent.full_scan_interval = 60
+        calls = []
+
+        def wait(timeout):
+            calls.append(timeout)
+            if len(calls) == iterations:
+                raise SystemExit()
+
+        self.agent.interface_monitor.wait_for_events.side_effect = wait
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'update_ports',
+                              return_value=None),
+            mock.patch.object(self.agent, 'update_ports_from_events',
+                              return_value=None),
+            mock.patch.object(ovs_quantum_agent.time, 'sleep',
+                              side_effect=wait)
+        ) as (update_ports, update_from_events, sleep):
+            self.assertRaises(SystemExit, self.agent.rpc_loop)
+        return update_ports, update_from_events
+
+    def test_rpc_loop_uses_monitor_events_after_full_scan(self):
+        update_ports, update_from_events = self._run_rpc_loop(3)
+        self.assertEqual(update_ports.call_count, 1)
+        self.assertEqual(update_from_events.call_count, 2)
+
+    def test_rpc_loop_polls_when_monitor_is_inactive(self):
+        update_ports, update_from_events = self._run_rpc_loop(
+            3, monitor_active=False)
+        self.assertEqual(update_ports.call_count, 3)
+        self.assertFalse(update_from_events.called)
+
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_added([{}]))
 
@@ -118,50 +172,73 @@ class TestOvsQuantumAgent(base.BaseTestCase):
         """Mock treat devices added.
 
         :param details: the details to return for the device
-        :param port: the port that get_vif_port_by_id should return
+        :param port: the port that get_vif_ports_by_ids should return
         :param func_name: the function that should be called
         :returns: whether the named function was called
         """
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=details),
-            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
-                              return_value=port),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
+            mock.patch.object(self.agent.int_br, 'get_vif_ports_by_ids',
+                              return_value={'abcd': port}),
             mock.patch.object(self.agent, func_name)
         ) as (get_dev_fn, get_vif_func, func):
-            self.assertFalse(self.agent.treat_devices_added([{}]))
+            self.assertFalse(self.agent.treat_devices_added(['abcd']))
+        get_dev_fn.assert_called_once_with(self.agent.context, ['abcd'],
+                                           self.agent.agent_id)
         return func.called
 
     def test_treat_devices_added_ignores_invalid_ofport(self):
         port = mock.Mock()
         port.ofport = -1
-        self.assertFalse(self._mock_treat_devices_added(mock.MagicMock(), port,
-                                                        'port_dead'))
+        self.assertFalse(self._mock_treat_devices_added({'device': 'abcd'},
+                                                        port, 'port_dead'))
 
     def test_treat_devices_added_marks_unknown_port_as_dead(self):
         port = mock.Mock()
         port.ofport = 1
-        self.assertTrue(self._mock_treat_devices_added(mock.MagicMock(), port,
-                                                       'port_dead'))
+        self.assertTrue(self._mock_treat_devices_added({'device': 'abcd'},
+                                                       port, 'port_dead'))
 
     def test_treat_devices_added_updates_known_port(self):
         details = mock.MagicMock()
         details.__contains__.side_effect = lambda x: True
+        details.__getitem__.side_effect = lambda x: 'abcd'
         self.assertTrue(self._mock_treat_devices_added(details,
                                                        mock.Mock(),
                                                        'treat_vif_port'))
 
+    def test_treat_devices_added_fetches_ports_in_bulk(self):
+        details_list = [{'device': 'abcd'}, {'device': 'efgh'}]
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=details_list),
+            mock.patch.object(self.agent.int_br, 'get_vif_ports_by_ids',
+                              return_value={}),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id'),
+        ) as (get_dev_fn, get_vifs_fn, get_vif_fn):
+            self.assertFalse(self.agent.treat_devices_added(['abcd',
+                                                             'efgh']))
+        self.assertEqual(get_dev_fn.call_count, 1)
+        self.assertEqual(list(get_vifs_fn.call_args[0][0]),
+                         ['abcd', 'efgh'])
+        self.assertFalse(get_vif_fn.called)
+
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_removed([{}]))
 
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        details = dict(device='abcd', exists=port_exists)
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
+                               return_value=[details]) as devices_down:
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
-                self.assertFalse(self.agent.treat_devices_removed([{}]))
+                self.assertFalse(self.agent.treat_devices_removed(['abcd']))
+        devices_down.assert_called_once_with(self.agent.context, ['abcd'],
+                                             self.agent.agent_id)
         self.assertEqual(port_unbound.called, not port_exists)
 
     def test_treat_devices_removed_unbinds_port(self):
@@ -170,6 +247,17 @@ class TestOvsQuantumAgent(base.BaseTestCase):
     def test_treat_devices_removed_ignores_missing_port(self):
         self._mock_treat_devices_removed(False)
 
+    def test_deferred_bridges(self):
+        self.agent.int_br = mock.MagicMock()
+        phys_br = mock.MagicMock()
+        self.agent.phys_brs = {'physnet1': phys_br}
+        with self.agent.deferred_bridges():
+            self.assertFalse(self.agent.int_br.deferred().__exit__.called)
+        for br in (self.agent.int_br, phys_br):
+            self.assertTrue(br.deferred().__enter__.called)
+            self.assertTrue(br.deferred().__exit__.called)
+        self.assertFalse(self.agent.tun_br.deferred.called)
+
     def test_process_network_ports(self):
         reply = {'current': set(['tap0']),
                  'removed': set(['eth0']),
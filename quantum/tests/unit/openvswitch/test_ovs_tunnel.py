@@ -16,6 +16,8 @@
 #
 # @author: Dave Lapsley, Nicira Networks, Inc.
 
+import contextlib
+
 import mox
 from oslo.config import cfg
 
@@ -396,6 +398,11 @@ class TunnelTest(base.BaseTestCase):
              'removed': set([]),
              'added': set([])}).AndRaise(
                  Exception('Fake exception to get out of the loop'))
+        # Ports are processed with the changes to the bridges deferred
+        for bridge in (self.mock_int_bridge, self.mock_map_tun_bridge,
+                       self.mock_tun_bridge):
+            for i in range(2):
+                bridge.deferred().AndReturn(contextlib.nested())
         self.mox.ReplayAll()
         q_agent = ovs_quantum_agent.OVSQuantumAgent(self.INT_BRIDGE,
                                                     self.TUN_BRIDGE,
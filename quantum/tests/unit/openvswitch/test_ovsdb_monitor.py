@@ -0,0 +1,119 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from quantum.agent.linux import ovsdb_monitor
+from quantum.openstack.common import jsonutils
+from quantum.tests import base
+
+
+HEADINGS = ['row', 'action', 'name', 'external_ids']
+
+
+def _update(*rows):
+    return jsonutils.dumps({'headings': HEADINGS, 'data': list(rows)})
+
+
+def _row(uuid, action, iface_id=None, mac='fa:16:3e:00:00:01'):
+    external_ids = []
+    if iface_id:
+        external_ids.append(['iface-id', iface_id])
+    if mac:
+        external_ids.append(['attached-mac', mac])
+    return [uuid, action, 'tap-%s' % uuid, ['map', external_ids]]
+
+
+class TestOvsdbMonitor(base.BaseTestCase):
+
+    def test___init__(self):
+        monitor = ovsdb_monitor.OvsdbMonitor('Interface',
+                                             columns=['name', 'ofport'],
+                                             format='json')
+        self.assertEqual(monitor.cmd,
+                         ['ovsdb-client', 'monitor', 'Interface',
+                          'name,ofport', '--format=json'])
+
+
+class TestSimpleInterfaceMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSimpleInterfaceMonitor, self).setUp()
+        self.monitor = ovsdb_monitor.SimpleInterfaceMonitor()
+
+    def _feed(self, *lines):
+        for line in lines:
+            self.monitor._stdout_lines.put(line)
+
+    def _assert_events(self, added=(), removed=()):
+        self.assertEqual(self.monitor.get_events(),
+                         {'added': set(added), 'removed': set(removed)})
+
+    def test_initial_dump_reports_vif_ports(self):
+        self._feed(_update(_row('r1', 'initial', 'port1'),
+                           _row('r2', 'initial', 'port2', mac=None),
+                           _row('r3', 'initial')))
+        self.assertTrue(self.monitor.has_updates)
+        self._assert_events(added=['port1'])
+        self.assertFalse(self.monitor.has_updates)
+
+    def test_insert_and_delete(self):
+        self._feed(_update(_row('r1', 'insert', 'port1')))
+        self._assert_events(added=['port1'])
+        self._feed(_update(['r1', 'delete', 'tap-r1', ['map', []]]))
+        self._assert_events(removed=['port1'])
+
+    def test_insert_then_delete_before_get_events(self):
+        self._feed(_update(_row('r1', 'insert', 'port1')),
+                   _update(_row('r1', 'delete', 'port1')))
+        self._assert_events(removed=['port1'])
+
+    def test_modify_sets_iface_id(self):
+        self._feed(_update(_row('r1', 'insert')))
+        self._assert_events()
+        self._feed(_update(['r1', 'old', '', ['map', []]],
+                           _row('r1', 'new', 'port1')))
+        self._assert_events(added=['port1'])
+
+    def test_modify_changes_iface_id(self):
+        self._feed(_update(_row('r1', 'insert', 'port1')),
+                   _update(_row('r1', 'old', 'port1'),
+                           _row('r1', 'new', 'port2')))
+        self._assert_events(added=['port2'], removed=['port1'])
+
+    def test_initial_dump_after_respawn_reports_missing_ports(self):
+        self._feed(_update(_row('r1', 'initial', 'port1'),
+                           _row('r2', 'initial', 'port2')))
+        self.monitor.get_events()
+        self._feed(_update(_row('r2', 'initial', 'port2')))
+        self._assert_events(removed=['port1'])
+
+    def test_unparsable_output_is_ignored(self):
+        self._feed('garbage', _update(_row('r1', 'insert', 'port1')))
+        self._assert_events(added=['port1'])
+
+    def test_wait_for_events(self):
+        with mock.patch.object(self.monitor, 'read_stdout',
+                               return_value=_update(
+                                   _row('r1', 'insert', 'port1'))) as read:
+            self.assertTrue(self.monitor.wait_for_events(1))
+        read.assert_called_once_with(timeout=1)
+
+    def test_wait_for_events_times_out(self):
+        with mock.patch.object(self.monitor, 'read_stdout',
+                               return_value=None):
+            self.assertFalse(self.monitor.wait_for_events(1))
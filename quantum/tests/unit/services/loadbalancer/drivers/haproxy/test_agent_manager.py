@@ -20,6 +20,7 @@ import contextlib
 
 import mock
 
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.services.loadbalancer.drivers.haproxy import (
     agent_manager as manager
 )
@@ -143,6 +144,7 @@ class TestManager(base.BaseTestCase):
         mock_conf.device_driver = 'devdriver'
         mock_conf.AGENT.root_helper = 'sudo'
         mock_conf.loadbalancer_state_path = '/the/path'
+        mock_conf.stats_workers = 4
 
         self.mock_importer = mock.patch.object(manager, 'importutils').start()
 
@@ -174,13 +176,93 @@ class TestManager(base.BaseTestCase):
             self.assertFalse(sync.called)
 
     def test_collect_stats(self):
-        with mock.patch.object(self.mgr, 'cache') as cache:
+        with contextlib.nested(
+            mock.patch.object(self.mgr, 'cache'),
+            mock.patch.object(self.mgr, 'driver')
+        ) as (cache, driver):
+            cache.get_pool_ids.return_value = ['1', '2']
+            driver.get_stats.side_effect = lambda pool_id: {'s': pool_id}
+            self.mgr.collect_stats(mock.Mock())
+            self.rpc_mock.update_pools_stats.assert_called_once_with(
+                {'1': {'s': '1'}, '2': {'s': '2'}})
+
+    def test_collect_stats_only_changed(self):
+        with contextlib.nested(
+            mock.patch.object(self.mgr, 'cache'),
+            mock.patch.object(self.mgr, 'driver')
+        ) as (cache, driver):
+            cache.get_pool_ids.return_value = ['1', '2', '3']
+            driver.get_stats.side_effect = lambda pool_id: {'s': pool_id}
+            self.mgr.reported_stats = {'1': {'s': '1'}, '2': {'s': 'old'},
+                                       'deleted': {'s': 'deleted'}}
+            self.mgr.collect_stats(mock.Mock())
+            self.rpc_mock.update_pools_stats.assert_called_once_with(
+                {'2': {'s': '2'}, '3': {'s': '3'}})
+            self.assertEqual(
+                {'1': {'s': '1'}, '2': {'s': '2'}, '3': {'s': '3'}},
+                self.mgr.reported_stats)
+
+            # nothing changed since the last report
+            self.rpc_mock.reset_mock()
+            self.mgr.collect_stats(mock.Mock())
+            self.assertFalse(self.rpc_mock.update_pools_stats.called)
+
+    def test_collect_stats_rpc_exception(self):
+        with contextlib.nested(
+            mock.patch.object(self.mgr, 'cache'),
+            mock.patch.object(self.mgr, 'driver')
+        ) as (cache, driver):
+            cache.get_pool_ids.return_value = ['1']
+            driver.get_stats.return_value = {'s': '1'}
+            self.rpc_mock.update_pools_stats.side_effect = Exception
+
+            self.mgr.collect_stats(mock.Mock())
+
+            self.assertEqual({}, self.mgr.reported_stats)
+            self.assertTrue(self.mgr.needs_resync)
+            self.assertTrue(self.log.exception.called)
+
+    def test_collect_stats_bulk_not_supported(self):
+        with contextlib.nested(
+            mock.patch.object(self.mgr, 'cache'),
+            mock.patch.object(self.mgr, 'driver')
+        ) as (cache, driver):
+            cache.get_pool_ids.return_value = ['1']
+            driver.get_stats.side_effect = lambda pool_id: {'s': pool_id}
+            self.rpc_mock.update_pools_stats.side_effect = (
+                rpc_common.RemoteError('UnsupportedRpcVersion'))
+
+            self.mgr.collect_stats(mock.Mock())
+
+            self.rpc_mock.update_pool_stats.assert_called_once_with(
+                '1', {'s': '1'})
+            self.assertEqual({'1': {'s': '1'}}, self.mgr.reported_stats)
+            self.assertFalse(self.mgr.bulk_stats_supported)
+            self.assertFalse(self.mgr.needs_resync)
+
+            # the pools of the next reports are updated one by one
+            self.rpc_mock.reset_mock()
             cache.get_pool_ids.return_value = ['1', '2']
             self.mgr.collect_stats(mock.Mock())
-            self.rpc_mock.update_pool_stats.assert_has_calls([
-                mock.call('1', mock.ANY),
-                mock.call('2', mock.ANY)
-            ])
+            self.assertFalse(self.rpc_mock.update_pools_stats.called)
+            self.rpc_mock.update_pool_stats.assert_called_once_with(
+                '2', {'s': '2'})
+
+    def test_collect_stats_rpc_remote_error(self):
+        with contextlib.nested(
+            mock.patch.object(self.mgr, 'cache'),
+            mock.patch.object(self.mgr, 'driver')
+        ) as (cache, driver):
+            cache.get_pool_ids.return_value = ['1']
+            driver.get_stats.return_value = {'s': '1'}
+            self.rpc_mock.update_pools_stats.side_effect = (
+                rpc_common.RemoteError('ValueError'))
+
+            self.mgr.collect_stats(mock.Mock())
+
+            self.assertFalse(self.rpc_mock.update_pool_stats.called)
+            self.assertTrue(self.mgr.bulk_stats_supported)
+            self.assertTrue(self.mgr.needs_resync)
 
     def test_collect_stats_exception(self):
         with mock.patch.object(self.mgr, 'cache') as cache:
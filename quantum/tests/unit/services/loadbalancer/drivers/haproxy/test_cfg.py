@@ -59,9 +59,11 @@ class TestHaproxyCfg(base.BaseTestCase):
                          '\tgroup test_group',
                          '\tlog /dev/log local0',
                          '\tlog /dev/log local1 notice',
-                         '\tstats socket test_path mode 0666 level user']
-        opts = cfg._build_global(mock.Mock(), 'test_path')
-        self.assertEqual(expected_opts, list(opts))
+                         '\tstats socket test_path mode 0600 uid 1000 '
+                         'level admin']
+        with mock.patch('os.geteuid', return_value=1000):
+            opts = cfg._build_global(mock.Mock(), 'test_path')
+            self.assertEqual(expected_opts, list(opts))
         config.CONF.reset()
 
     def test_build_defaults(self):
@@ -110,6 +112,18 @@ class TestHaproxyCfg(base.BaseTestCase):
                                     'id': 'member1_id',
                                     'address': '10.0.0.3',
                                     'protocol_port': 80,
+                                    'weight': 1},
+                                   {'status': 'ACTIVE',
+                                    'admin_state_up': False,
+                                    'id': 'member2_id',
+                                    'address': '10.0.0.4',
+                                    'protocol_port': 80,
+                                    'weight': 2},
+                                   {'status': 'PENDING_CREATE',
+                                    'admin_state_up': True,
+                                    'id': 'member3_id',
+                                    'address': '10.0.0.5',
+                                    'protocol_port': 80,
                                     'weight': 1}],
                        'healthmonitors': [{'status': 'ACTIVE',
                                            'admin_state_up': True,
@@ -125,10 +139,53 @@ class TestHaproxyCfg(base.BaseTestCase):
                          '\ttimeout check 2s',
                          '\tcookie SRV insert indirect nocache',
                          '\tserver member1_id 10.0.0.3:80 weight 1 '
-                         'check inter 3s fall 4 cookie 0']
+                         'check inter 3s fall 4 cookie 0',
+                         '\tserver member2_id 10.0.0.4:80 weight 2 '
+                         'check inter 3s fall 4 cookie 1 disabled']
         opts = cfg._build_backend(test_config)
         self.assertEqual(expected_opts, list(opts))
 
+    def test_get_runtime_commands(self):
+        old_conf = '\n'.join([
+            'global',
+            '\tdaemon',
+            'backend pool_id',
+            '\tmode http',
+            '\tserver member1_id 10.0.0.3:80 weight 1 check inter 3s',
+            '\tserver member2_id 10.0.0.4:80 weight 2 check inter 3s '
+            'disabled',
+            '\tserver member3_id 10.0.0.5:80 weight 3 check inter 3s'])
+        new_conf = '\n'.join([
+            'global',
+            '\tdaemon',
+            'backend pool_id',
+            '\tmode http',
+            '\tserver member1_id 10.0.0.3:80 weight 5 check inter 3s '
+            'disabled',
+            '\tserver member2_id 10.0.0.4:80 weight 2 check inter 3s',
+            '\tserver member3_id 10.0.0.5:80 weight 3 check inter 3s'])
+        self.assertEqual(['set weight pool_id/member1_id 5',
+                          'disable server pool_id/member1_id',
+                          'enable server pool_id/member2_id'],
+                         cfg.get_runtime_commands(old_conf, new_conf))
+        self.assertEqual([], cfg.get_runtime_commands(old_conf, old_conf))
+
+    def test_get_runtime_commands_structural_change(self):
+        old_conf = '\n'.join([
+            'backend pool_id',
+            '\tmode http',
+            '\tserver member1_id 10.0.0.3:80 weight 1 check inter 3s'])
+        # health check change
+        new_conf = old_conf.replace('inter 3s', 'inter 4s')
+        self.assertIsNone(cfg.get_runtime_commands(old_conf, new_conf))
+        # non server change
+        new_conf = old_conf.replace('http', 'tcp')
+        self.assertIsNone(cfg.get_runtime_commands(old_conf, new_conf))
+        # member added
+        new_conf = (old_conf +
+                    '\n\tserver member2_id 10.0.0.4:80 weight 1 check')
+        self.assertIsNone(cfg.get_runtime_commands(old_conf, new_conf))
+
     def test_get_server_health_option(self):
         test_config = {'healthmonitors': [{'status': 'ERROR',
                                            'admin_state_up': False,
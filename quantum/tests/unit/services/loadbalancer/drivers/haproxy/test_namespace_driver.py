@@ -54,19 +54,84 @@ class TestHaproxyNSDriver(base.BaseTestCase):
                     'qlbaas-pool_id', {'id': 'port_id'}
                 )
                 spawn.assert_called_once_with(self.fake_config)
+                self.assertEqual({'pool_id': 'port_id'},
+                                 self.driver.pool_to_port_id)
+
+    def _test_update(self, old_conf, commands=None, socket_output='',
+                     socket_error=False):
+        open_mocks = {'conf': mock.MagicMock(), 'pid': ['5']}
+        if old_conf is None:
+            open_mocks['conf'].__enter__.side_effect = IOError
+        else:
+            open_mocks['conf'].__enter__.return_value.read.return_value = (
+                old_conf)
 
-    def test_update(self):
         with contextlib.nested(
             mock.patch.object(self.driver, '_get_state_file_path'),
             mock.patch.object(self.driver, '_spawn'),
+            mock.patch.object(self.driver, '_run_socket_command'),
+            mock.patch.object(namespace_driver.hacfg, 'build_config'),
+            mock.patch.object(namespace_driver.hacfg,
+                              'get_runtime_commands'),
+            mock.patch.object(namespace_driver.utils, 'replace_file'),
             mock.patch('__builtin__.open')
-        ) as (gsp, spawn, mock_open):
-            mock_open.return_value = ['5']
+        ) as (gsp, spawn, run_command, build, get_commands, replace,
+              mock_open):
+            gsp.side_effect = lambda x, y: y
+            mock_open.side_effect = lambda path, mode: open_mocks[path]
+            build.return_value = 'new_conf'
+            get_commands.return_value = commands
+            if socket_error:
+                run_command.side_effect = namespace_driver.socket.error
+            else:
+                run_command.return_value = socket_output
 
             self.driver.update(self.fake_config)
 
-            mock_open.assert_called_once_with(gsp.return_value, 'r')
-            spawn.assert_called_once_with(self.fake_config, ['-sf', '5'])
+            build.assert_called_once_with(self.fake_config, 'sock')
+            self.assertEqual({'pool_id': 'port_id'},
+                             self.driver.pool_to_port_id)
+            if old_conf is not None and old_conf != 'new_conf':
+                get_commands.assert_called_once_with(old_conf, 'new_conf')
+            return spawn, run_command, replace
+
+    def test_update_unchanged(self):
+        spawn, run_command, replace = self._test_update('new_conf')
+        self.assertFalse(spawn.called)
+        self.assertFalse(run_command.called)
+        self.assertFalse(replace.called)
+
+    def test_update_at_runtime(self):
+        spawn, run_command, replace = self._test_update(
+            'old_conf', commands=['set weight b/s 2', 'disable server b/s'])
+        run_command.assert_called_once_with(
+            'sock', 'set weight b/s 2;disable server b/s')
+        replace.assert_called_once_with('conf', 'new_conf')
+        self.assertFalse(spawn.called)
+
+    def test_update_at_runtime_failure(self):
+        spawn, run_command, replace = self._test_update(
+            'old_conf', commands=['set weight b/s 2'],
+            socket_output='No such server.\n')
+        self.assertTrue(run_command.called)
+        self.assertFalse(replace.called)
+        spawn.assert_called_once_with(self.fake_config, ['-sf', '5'])
+
+    def test_update_at_runtime_socket_error(self):
+        spawn, run_command, replace = self._test_update(
+            'old_conf', commands=['set weight b/s 2'], socket_error=True)
+        self.assertFalse(replace.called)
+        spawn.assert_called_once_with(self.fake_config, ['-sf', '5'])
+
+    def test_update_structural_change(self):
+        spawn, run_command, replace = self._test_update('old_conf')
+        self.assertFalse(run_command.called)
+        spawn.assert_called_once_with(self.fake_config, ['-sf', '5'])
+
+    def test_update_no_config(self):
+        spawn, run_command, replace = self._test_update(None)
+        self.assertFalse(run_command.called)
+        spawn.assert_called_once_with(self.fake_config, ['-sf', '5'])
 
     def test_spawn(self):
         with contextlib.nested(
@@ -159,7 +224,7 @@ class TestHaproxyNSDriver(base.BaseTestCase):
             gsp.side_effect = lambda x, y: '/pool/' + y
             path_exists.return_value = True
             socket.return_value = socket
-            socket.recv.return_value = raw_stats
+            socket.recv.side_effect = [raw_stats, '']
 
             exp_stats = {'CONNECTION_ERRORS': '0',
                          'CURRENT_CONNECTIONS': '1',
@@ -172,8 +237,10 @@ class TestHaproxyNSDriver(base.BaseTestCase):
                          'TOTAL_SESSIONS': '10'}
             stats = self.driver.get_stats('pool_id')
             self.assertEqual(exp_stats, stats)
+            socket.sendall.assert_called_once_with('show stat -1 2 -1\n')
+            socket.close.assert_called_once_with()
 
-            socket.recv.return_value = raw_stats_empty
+            socket.recv.side_effect = [raw_stats_empty, '']
             self.assertEqual({}, self.driver.get_stats('pool_id'))
 
             path_exists.return_value = False
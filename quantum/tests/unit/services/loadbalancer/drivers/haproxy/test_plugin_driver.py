@@ -16,6 +16,8 @@
 #
 # @author: Mark McClain, DreamHost
 
+import contextlib
+
 import mock
 
 from quantum.common import exceptions
@@ -24,6 +26,7 @@ from quantum.db.loadbalancer import loadbalancer_db as ldb
 from quantum import manager
 from quantum.openstack.common import uuidutils
 from quantum.plugins.common import constants
+from quantum.services.loadbalancer import constants as lb_const
 from quantum.services.loadbalancer.drivers.haproxy import (
     plugin_driver
 )
@@ -229,6 +232,47 @@ class TestLoadBalancerCallbacks(TestLoadBalancerPluginBase):
             host='host'
         )
 
+    def test_update_pools_stats(self):
+        with contextlib.nested(
+            self.pool(name='pool1'),
+            self.pool(name='pool2')
+        ) as (pool1, pool2):
+            ctx = context.get_admin_context()
+            pool1_id = pool1['pool']['id']
+            pool2_id = pool2['pool']['id']
+            stats = {
+                pool1_id: {lb_const.STATS_IN_BYTES: '1',
+                           lb_const.STATS_OUT_BYTES: '2',
+                           lb_const.STATS_CURRENT_SESSIONS: '3',
+                           lb_const.STATS_TOTAL_SESSIONS: '4',
+                           lb_const.STATS_CONNECTION_ERRORS: '0'},
+                pool2_id: {lb_const.STATS_IN_BYTES: '5',
+                           lb_const.STATS_OUT_BYTES: '',
+                           lb_const.STATS_CURRENT_SESSIONS: '',
+                           lb_const.STATS_TOTAL_SESSIONS: '6'}
+            }
+            self.callbacks.update_pools_stats(ctx, stats=stats, host='host')
+
+            self.assertEqual(
+                {'bytes_in': 1, 'bytes_out': 2,
+                 'active_connections': 3, 'total_connections': 4},
+                self.plugin_instance.stats(ctx, pool1_id)['stats'])
+            self.assertEqual(
+                {'bytes_in': 5, 'bytes_out': 0,
+                 'active_connections': 0, 'total_connections': 6},
+                self.plugin_instance.stats(ctx, pool2_id)['stats'])
+
+    def test_update_pools_stats_invalid(self):
+        with self.pool() as pool:
+            ctx = context.get_admin_context()
+            pool_id = pool['pool']['id']
+            stats = {pool_id: {lb_const.STATS_IN_BYTES: 'invalid'}}
+            with mock.patch.object(plugin_driver, 'LOG') as log:
+                self.callbacks.update_pools_stats(ctx, stats=stats)
+                self.assertTrue(log.warn.called)
+            res = self.plugin_instance.stats(ctx, pool_id)
+            self.assertEqual(0, res['stats']['bytes_in'])
+
 
 class TestLoadBalancerAgentApi(base.BaseTestCase):
     def setUp(self):
@@ -16,8 +16,10 @@
 #    under the License.
 
 import copy
+import datetime
 import time
 
+import mock
 from oslo.config import cfg
 from webob import exc
 
@@ -29,6 +31,7 @@ from quantum import context
 from quantum.db import agents_db
 from quantum.db import db_base_plugin_v2
 from quantum.extensions import agent
+from quantum import manager
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import timeutils
 from quantum.openstack.common import uuidutils
@@ -45,6 +48,7 @@ DHCP_HOSTA = 'hosta'
 L3_HOSTB = 'hostb'
 DHCP_HOSTC = 'hostc'
 DHCP_HOST1 = 'host1'
+LOOPING_CALL = 'quantum.openstack.common.loopingcall.FixedIntervalLoopingCall'
 
 
 class AgentTestExtensionManager(object):
@@ -218,6 +222,117 @@ class AgentDBTestCase(AgentDBTestMixIn,
             query_string='binary=quantum-l3-agent&host=' + L3_HOSTB)
         self.assertFalse(agents['agents'][0]['alive'])
 
+    def _report_dhcp_state(self, configurations=None):
+        dhcp_host = {
+            'binary': 'quantum-dhcp-agent',
+            'host': DHCP_HOSTA,
+            'topic': 'DHCP_AGENT',
+            'configurations': configurations or {'use_namespaces': True},
+            'agent_type': constants.AGENT_TYPE_DHCP}
+        callback = agents_db.AgentExtRpcCallback()
+        callback.report_state(self.adminContext,
+                              agent_state={'agent_state': dhcp_host},
+                              time=timeutils.strtime())
+
+    def _get_dhcp_agent_db(self):
+        plugin = manager.QuantumManager.get_plugin()
+        return plugin._get_agent_by_type_and_host(
+            self.adminContext, constants.AGENT_TYPE_DHCP, DHCP_HOSTA)
+
+    def test_report_state_buffers_heartbeat(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.set_time_override(timeutils.utcnow())
+        with mock.patch(LOOPING_CALL) as looping_call:
+            self._report_dhcp_state()
+            heartbeat = self._get_dhcp_agent_db().heartbeat_timestamp
+            timeutils.advance_time_seconds(10)
+            self._report_dhcp_state()
+            timeutils.advance_time_seconds(10)
+            self._report_dhcp_state()
+        self.adminContext.session.expire_all()
+        self.assertEqual(heartbeat,
+                         self._get_dhcp_agent_db().heartbeat_timestamp)
+        # A single timer writes the buffered heartbeats, even when no
+        # other report is received
+        self.assertEqual(1, looping_call.call_count)
+        looping_call.return_value.start.assert_called_once_with(
+            interval=60, initial_delay=60)
+        flush = looping_call.call_args[0][0]
+        flush()
+        self.adminContext.session.expire_all()
+        self.assertEqual(timeutils.utcnow(),
+                         self._get_dhcp_agent_db().heartbeat_timestamp)
+        plugin = manager.QuantumManager.get_plugin()
+        self.assertFalse(plugin.heartbeat_buffer.pending)
+
+    def test_flush_keeps_newer_heartbeat_of_other_process(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.set_time_override(timeutils.utcnow())
+        # Two server processes receive the reports of the same agent, each
+        # buffering the heartbeats in its own plugin instance
+        plugin = manager.QuantumManager.get_plugin()
+        other_plugin = TestAgentPlugin()
+        with mock.patch(LOOPING_CALL):
+            self._report_dhcp_state()
+            agent_state = {
+                'binary': 'quantum-dhcp-agent',
+                'host': DHCP_HOSTA,
+                'topic': 'DHCP_AGENT',
+                'configurations': {'use_namespaces': True},
+                'agent_type': constants.AGENT_TYPE_DHCP}
+            other_plugin.report_agent_state(self.adminContext, agent_state)
+            timeutils.advance_time_seconds(10)
+            self._report_dhcp_state()
+            older = timeutils.utcnow()
+            timeutils.advance_time_seconds(10)
+            other_plugin.report_agent_state(self.adminContext, agent_state)
+            newer = timeutils.utcnow()
+        other_plugin.flush_agent_heartbeats(self.adminContext)
+        plugin.flush_agent_heartbeats(self.adminContext)
+        self.adminContext.session.expire_all()
+        heartbeat = self._get_dhcp_agent_db().heartbeat_timestamp
+        self.assertNotEqual(older, heartbeat)
+        self.assertEqual(newer, heartbeat)
+
+    def test_report_state_configurations_changed(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        self._report_dhcp_state()
+        self._report_dhcp_state({'use_namespaces': False})
+        self.adminContext.session.expire_all()
+        plugin = manager.QuantumManager.get_plugin()
+        agent_db = self._get_dhcp_agent_db()
+        self.assertEqual({'use_namespaces': False},
+                         plugin.get_configuration_dict(agent_db))
+        self.assertFalse(plugin.heartbeat_buffer.pending)
+
+    def test_flush_heartbeat_of_deleted_agent(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        with mock.patch(LOOPING_CALL):
+            self._report_dhcp_state()
+            self._report_dhcp_state()
+        agent_id = self._get_dhcp_agent_db()['id']
+        with self.adminContext.session.begin():
+            self.adminContext.session.query(agents_db.Agent).delete()
+        plugin = manager.QuantumManager.get_plugin()
+        plugin.flush_agent_heartbeats(self.adminContext)
+        self.assertFalse(plugin.heartbeat_buffer.pending)
+        self.assertNotIn(agent_id,
+                         [known[0] for known in
+                          plugin.heartbeat_buffer.agents.values()])
+        # The next report creates the agent again
+        self._report_dhcp_state()
+        self.assertTrue(self._get_dhcp_agent_db())
+
+    def test_is_agent_down_with_buffered_heartbeats(self):
+        cfg.CONF.set_override('agent_down_time', 5)
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 10)
+        heartbeat = timeutils.utcnow() - datetime.timedelta(seconds=12)
+        self.assertFalse(agents_db.AgentDbMixin.is_agent_down(heartbeat))
+        heartbeat -= datetime.timedelta(seconds=5)
+        self.assertTrue(agents_db.AgentDbMixin.is_agent_down(heartbeat))
+
 
 class AgentDBTestCaseXML(AgentDBTestCase):
     fmt = 'xml'
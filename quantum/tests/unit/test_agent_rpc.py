@@ -19,6 +19,7 @@ import mock
 
 from quantum.agent import rpc
 from quantum.openstack.common import context
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.tests import base
 
 
@@ -32,6 +33,9 @@ class AgentRPCPluginApi(base.BaseTestCase):
             func_obj = getattr(agent, method)
             if method == 'tunnel_sync':
                 actual_val = func_obj(ctxt, 'fake_tunnel_ip')
+            elif method in ('get_devices_details_list',
+                            'update_devices_down'):
+                actual_val = func_obj(ctxt, ['fake_device'], 'fake_agent_id')
             else:
                 actual_val = func_obj(ctxt, 'fake_device', 'fake_agent_id')
         self.assertEqual(actual_val, expect_val)
@@ -42,9 +46,57 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_update_device_down(self):
         self._test_rpc_call('update_device_down')
 
+    def test_get_devices_details_list(self):
+        self._test_rpc_call('get_devices_details_list')
+
+    def test_update_devices_down(self):
+        self._test_rpc_call('update_devices_down')
+
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
+    def _test_devices_list_not_supported(self, method, device_method):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch('quantum.openstack.common.rpc.call') as rpc_call:
+            rpc_call.side_effect = [
+                rpc_common.RemoteError('UnsupportedRpcVersion'), 'foo', 'bar']
+            actual_val = getattr(agent, method)(
+                ctxt, ['fake_device1', 'fake_device2'], 'fake_agent_id')
+            self.assertEqual(actual_val, ['foo', 'bar'])
+            self.assertFalse(agent.devices_list_supported)
+            messages = [c[0][2] for c in rpc_call.call_args_list]
+            self.assertEqual([m['method'] for m in messages],
+                             [method, device_method, device_method])
+            self.assertEqual([m['args'].get('device') for m in messages],
+                             [None, 'fake_device1', 'fake_device2'])
+
+            # the device list calls are not tried again
+            rpc_call.reset_mock()
+            rpc_call.side_effect = None
+            rpc_call.return_value = 'foo'
+            getattr(agent, method)(ctxt, ['fake_device'], 'fake_agent_id')
+            self.assertEqual(rpc_call.call_args[0][2]['method'],
+                             device_method)
+
+    def test_get_devices_details_list_not_supported(self):
+        self._test_devices_list_not_supported('get_devices_details_list',
+                                              'get_device_details')
+
+    def test_update_devices_down_not_supported(self):
+        self._test_devices_list_not_supported('update_devices_down',
+                                              'update_device_down')
+
+    def test_devices_list_remote_error(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch('quantum.openstack.common.rpc.call') as rpc_call:
+            rpc_call.side_effect = rpc_common.RemoteError('ValueError')
+            self.assertRaises(rpc_common.RemoteError,
+                              agent.get_devices_details_list,
+                              ctxt, ['fake_device'], 'fake_agent_id')
+            self.assertTrue(agent.devices_list_supported)
+
 
 class AgentPluginReportState(base.BaseTestCase):
     def test_plugin_report_state(self):
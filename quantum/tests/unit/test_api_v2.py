@@ -564,6 +564,83 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
         tenant_id = _uuid()
         self._test_list(tenant_id + "bad", tenant_id)
 
+    def test_list_admin_skips_item_policy_checks(self):
+        env = {'quantum.context': context.Context('', _uuid(),
+                                                  is_admin=True)}
+        instance = self.plugin.return_value
+        instance.get_ports.return_value = [{'id': _uuid(),
+                                            'tenant_id': _uuid()}]
+        with mock.patch('quantum.policy.check') as check:
+            res = self.api.get(_get_path('ports'), extra_environ=env).json
+        self.assertEqual(len(res['ports']), 1)
+        self.assertFalse(check.called)
+
+    def test_list_policy_filters_passed_to_plugin(self):
+        tenant_id = _uuid()
+        env = {'quantum.context': context.Context('', tenant_id)}
+        instance = self.plugin.return_value
+        instance.get_ports.return_value = []
+        self.api.get(_get_path('ports'), {'name': 'port1'},
+                     extra_environ=env)
+        filters = {'name': ['port1'], 'tenant_id': [tenant_id]}
+        instance.get_ports.assert_called_once_with(
+            mock.ANY, filters=filters, fields=mock.ANY, sorts=mock.ANY,
+            limit=mock.ANY, marker=mock.ANY, page_reverse=mock.ANY)
+
+    def test_list_policy_alternatives_passed_to_plugin(self):
+        tenant_id = _uuid()
+        env = {'quantum.context': context.Context('', tenant_id)}
+        instance = self.plugin.return_value
+        instance.get_subnets.return_value = []
+        self.api.get(_get_path('subnets'), extra_environ=env)
+        filters = {attributes.POLICY_FILTERS: [{'tenant_id': [tenant_id]},
+                                               {'shared': [True]}]}
+        instance.get_subnets.assert_called_once_with(
+            mock.ANY, filters=filters, fields=mock.ANY, sorts=mock.ANY,
+            limit=mock.ANY, marker=mock.ANY, page_reverse=mock.ANY)
+
+    def test_list_policy_filters_not_accepted_from_request(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = []
+        res = self.api.get(_get_path('networks'), {'policy_filters': 'x'})
+        self.assertEqual(res.status_int, exc.HTTPOk.code)
+        instance.get_networks.assert_called_once_with(
+            mock.ANY, filters={}, fields=mock.ANY, sorts=mock.ANY,
+            limit=mock.ANY, marker=mock.ANY, page_reverse=mock.ANY)
+
+    def test_list_view_failure(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = [{'id': _uuid(),
+                                               'tenant_id': _uuid()}]
+        with mock.patch.object(v2_base.Controller, '_view',
+                               side_effect=Exception):
+            res = self.api.get(_get_path('networks'), expect_errors=True)
+        self.assertEqual(res.status_int, exc.HTTPInternalServerError.code)
+
+    def test_list_policy_filters_conflict(self):
+        env = {'quantum.context': context.Context('', _uuid())}
+        instance = self.plugin.return_value
+        res = self.api.get(_get_path('ports'), {'tenant_id': _uuid()},
+                           extra_environ=env).json
+        self.assertEqual(res['ports'], [])
+        self.assertFalse(instance.get_ports.called)
+
+    def test_list_emulated_pagination_after_policy_check(self):
+        instance = self.plugin.return_value
+        instance._QuantumPluginBaseV2__native_pagination_support = False
+        instance._QuantumPluginBaseV2__native_sorting_support = False
+        api = webtest.TestApp(router.APIRouter())
+        tenant_id = _uuid()
+        env = {'quantum.context': context.Context('', tenant_id)}
+        instance.get_networks.return_value = [
+            {'id': str(_uuid()), 'name': 'net%d' % i, 'shared': False,
+             'tenant_id': i % 2 and tenant_id or _uuid()}
+            for i in range(4)]
+        res = api.get(_get_path('networks'), {'limit': 2},
+                      extra_environ=env).json
+        self.assertEqual([network['name'] for network in res['networks']],
+                         ['net1', 'net3'])
+
     def test_list_pagination(self):
         id1 = str(_uuid())
         id2 = str(_uuid())
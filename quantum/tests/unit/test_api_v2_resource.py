@@ -228,6 +228,30 @@ class ResourceTestCase(base.BaseTestCase):
         res = resource.get('', extra_environ=environ, expect_errors=True)
         self.assertEqual(res.status_int, 200)
 
+    def _test_streamed(self, fmt):
+        controller = mock.MagicMock()
+        controller.test = lambda request: {
+            'foos': (foo for foo in [{'id': 1}, {'id': 2}])}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'test',
+                                                   'format': fmt})}
+        res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        return res
+
+    def test_status_200_streamed_json(self):
+        with mock.patch.object(wsgi.JSONDictSerializer,
+                               'serialize') as serialize:
+            res = self._test_streamed('json')
+        self.assertFalse(serialize.called)
+        self.assertEqual(res.json, {'foos': [{'id': 1}, {'id': 2}]})
+
+    def test_status_200_streamed_xml(self):
+        res = self._test_streamed('xml')
+        self.assertEqual(res.body.count('<foo>'), 2)
+
     def test_status_204(self):
         controller = mock.MagicMock()
         controller.test = lambda request: {'foo': 'bar'}
@@ -45,3 +45,16 @@ class DBTestCase(base.BaseTestCase):
                 self.assertEqual(mock_log.call_count, 1)
                 args = mock_log.call_args
                 self.assertNotEqual(args.find('sql_connection'), -1)
+
+    def test_reset_engine(self):
+        with mock.patch.object(db, 'register_models'):
+            db.configure_db()
+        self.addCleanup(setattr, db, '_INHERITED_POOLS', [])
+        pool = db._ENGINE.pool
+        db.reset_engine()
+        self.assertIsNot(db._ENGINE.pool, pool)
+        self.assertEqual(db._INHERITED_POOLS, [pool])
+
+    def test_reset_engine_without_engine(self):
+        db.reset_engine()
+        self.assertEqual(db._INHERITED_POOLS, [])
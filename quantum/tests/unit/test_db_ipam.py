@@ -0,0 +1,399 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import netaddr
+from oslo.config import cfg
+
+from quantum.common import exceptions as q_exc
+from quantum import context
+from quantum.db import ipam
+from quantum.db import models_v2
+from quantum.tests import base
+from quantum.tests.unit import test_db_plugin
+
+
+OPTIMISTIC_BACKEND = 'quantum.db.ipam.OptimisticIpamBackend'
+
+
+class TestIPRangeSet(base.BaseTestCase):
+
+    def test_ranges_sorted(self):
+        ranges = ipam.IPRangeSet(4, [(20, 30), (1, 5)])
+        self.assertEqual(list(ranges), [(1, 5), (20, 30)])
+        self.assertEqual(ranges.first(), 1)
+
+    def test_find(self):
+        ranges = ipam.IPRangeSet(4, [(1, 5), (20, 30)])
+        self.assertEqual(ranges.find(5), (1, 5))
+        self.assertEqual(ranges.find(20), (20, 30))
+        self.assertIsNone(ranges.find(0))
+        self.assertIsNone(ranges.find(10))
+        self.assertIsNone(ranges.find(31))
+
+    def test_remove_first(self):
+        ranges = ipam.IPRangeSet(4, [(1, 5)])
+        self.assertEqual(ranges.remove(1), ((1, 5), [(2, 5)]))
+        self.assertEqual(list(ranges), [(2, 5)])
+
+    def test_remove_last(self):
+        ranges = ipam.IPRangeSet(4, [(1, 5)])
+        self.assertEqual(ranges.remove(5), ((1, 5), [(1, 4)]))
+        self.assertEqual(list(ranges), [(1, 4)])
+
+    def test_remove_splits_range(self):
+        ranges = ipam.IPRangeSet(4, [(1, 5), (10, 10)])
+        self.assertEqual(ranges.remove(3), ((1, 5), [(1, 2), (4, 5)]))
+        self.assertEqual(list(ranges), [(1, 2), (4, 5), (10, 10)])
+
+    def test_remove_single_address_range(self):
+        ranges = ipam.IPRangeSet(4, [(1, 5), (10, 10)])
+        self.assertEqual(ranges.remove(10), ((10, 10), []))
+        self.assertEqual(list(ranges), [(1, 5)])
+
+    def test_remove_missing(self):
+        ranges = ipam.IPRangeSet(4, [(1, 5)])
+        self.assertIsNone(ranges.remove(7))
+        self.assertEqual(list(ranges), [(1, 5)])
+
+    def test_add_merges_both_neighbours(self):
+        ranges = ipam.IPRangeSet(4, [(1, 2), (4, 5)])
+        self.assertEqual(ranges.add(3), ([(1, 2), (4, 5)], (1, 5)))
+        self.assertEqual(list(ranges), [(1, 5)])
+
+    def test_add_merges_lower_neighbour(self):
+        ranges = ipam.IPRangeSet(4, [(1, 2), (10, 12)])
+        self.assertEqual(ranges.add(3), ([(1, 2)], (1, 3)))
+        self.assertEqual(list(ranges), [(1, 3), (10, 12)])
+
+    def test_add_merges_upper_neighbour(self):
+        ranges = ipam.IPRangeSet(4, [(1, 2), (10, 12)])
+        self.assertEqual(ranges.add(9), ([(10, 12)], (9, 12)))
+        self.assertEqual(list(ranges), [(1, 2), (9, 12)])
+
+    def test_add_isolated(self):
+        ranges = ipam.IPRangeSet(4, [(1, 2), (10, 12)])
+        self.assertEqual(ranges.add(6), ([], (6, 6)))
+        self.assertEqual(list(ranges), [(1, 2), (6, 6), (10, 12)])
+
+    def test_add_already_held(self):
+        ranges = ipam.IPRangeSet(4, [(1, 2)])
+        self.assertIsNone(ranges.add(2))
+
+    def test_to_str(self):
+        self.assertEqual(ipam.IPRangeSet(4).to_str(167772161), '10.0.0.1')
+        self.assertEqual(ipam.IPRangeSet(6).to_str(1), '::1')
+
+
+def _get_ranges(ctx, subnet_id):
+    range_qry = ctx.session.query(models_v2.IPAvailabilityRange)
+    range_qry = range_qry.join(models_v2.IPAllocationPool)
+    return sorted((r.first_ip, r.last_ip) for r in
+                  range_qry.filter_by(subnet_id=subnet_id))
+
+
+class TestLockingIpamBackend(test_db_plugin.QuantumDbPluginV2TestCase):
+
+    def test_generate_ips_spans_ranges(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            backend.allocate_specific_ip(ctx, subnet_id, '10.0.0.4')
+            results = backend.generate_ips(ctx, [subnet['subnet']], 3)
+            self.assertEqual([r['ip_address'] for r in results],
+                             ['10.0.0.2', '10.0.0.3', '10.0.0.5'])
+            self.assertEqual(_get_ranges(ctx, subnet_id),
+                             [('10.0.0.6', '10.0.0.6')])
+
+    def test_generate_ips_exhausted(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            self.assertRaises(q_exc.IpAddressGenerationFailure,
+                              backend.generate_ips,
+                              ctx, [subnet['subnet']], 6)
+            self.assertEqual(_get_ranges(ctx, subnet['subnet']['id']),
+                             [('10.0.0.2', '10.0.0.6')])
+
+
+class OptimisticIpamTestCase(test_db_plugin.QuantumDbPluginV2TestCase):
+
+    def setUp(self):
+        super(OptimisticIpamTestCase, self).setUp()
+        cfg.CONF.set_override('ipam_driver', OPTIMISTIC_BACKEND)
+
+
+def _pick_lowest_range(backend, context, subnet_id, lock=False):
+    pools = backend._get_pools(context, subnet_id)
+    range_sets = backend._get_range_sets(context, [p.id for p in pools], lock)
+    if range_sets:
+        pool_id, range_set = min(range_sets.iteritems(),
+                                 key=lambda x: x[1].first())
+        return pool_id, ipam.IPRangeSet(
+            range_set.version, [range_set.find(range_set.first())])
+
+
+class OptimisticIpamInOrderTestCase(OptimisticIpamTestCase):
+    """Allocate the lowest free address first, as the generic suites
+    expect, rather than one from a random range.
+    """
+
+    def setUp(self):
+        super(OptimisticIpamInOrderTestCase, self).setUp()
+        pick_range_patcher = mock.patch.object(ipam.OptimisticIpamBackend,
+                                               '_pick_range',
+                                               _pick_lowest_range)
+        pick_range_patcher.start()
+        self.addCleanup(pick_range_patcher.stop)
+
+
+class TestOptimisticIpamPortsV2(OptimisticIpamInOrderTestCase,
+                                test_db_plugin.TestPortsV2):
+    pass
+
+
+class TestOptimisticIpamSubnetsV2(OptimisticIpamInOrderTestCase,
+                                  test_db_plugin.TestSubnetsV2):
+    pass
+
+
+class TestOptimisticIpamBackend(OptimisticIpamTestCase):
+
+    def _get_ranges(self, ctx, subnet_id):
+        return _get_ranges(ctx, subnet_id)
+
+    def test_generate_retries_on_conflict(self):
+        backend = ipam.get_backend()
+        real_swap = backend._swap
+        attempts = []
+
+        def _swap(*args):
+            attempts.append(args)
+            if len(attempts) == 1:
+                return False
+            return real_swap(*args)
+
+        with self.subnet() as subnet:
+            ctx = context.get_admin_context()
+            with mock.patch.object(backend, '_swap', side_effect=_swap):
+                result = backend.generate_ip(ctx, [subnet['subnet']])
+            self.assertEqual(len(attempts), 2)
+            self.assertEqual(result['subnet_id'], subnet['subnet']['id'])
+            ranges = self._get_ranges(ctx, subnet['subnet']['id'])
+            self.assertEqual(len(ranges), 1)
+            self.assertNotEqual(ranges[0][0], result['ip_address'])
+
+    def test_generate_retries_with_locking_read(self):
+        backend = ipam.get_backend()
+        real_swap = backend._swap
+        attempts = []
+
+        def _swap(*args):
+            attempts.append(args)
+            if len(attempts) == 1:
+                return False
+            return real_swap(*args)
+
+        with self.subnet() as subnet:
+            ctx = context.get_admin_context()
+            with mock.patch.object(backend, '_swap', side_effect=_swap):
+                with mock.patch.object(backend, '_pick_range',
+                                       wraps=backend._pick_range) as pick:
+                    backend.generate_ip(ctx, [subnet['subnet']])
+            subnet_id = subnet['subnet']['id']
+            self.assertEqual(pick.call_args_list,
+                             [mock.call(ctx, subnet_id, lock=False),
+                              mock.call(ctx, subnet_id, lock=True)])
+
+    def test_generate_picks_random_range(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            backend.allocate_specific_ip(ctx, subnet_id, '10.0.0.4')
+            with mock.patch.object(ipam.random, 'randrange',
+                                   return_value=1) as randrange:
+                result = backend.generate_ip(ctx, [subnet['subnet']])
+            randrange.assert_called_once_with(2)
+            # Without an ORDER BY, the row at offset 1 may be either range
+            ranges = self._get_ranges(ctx, subnet_id)
+            self.assertIn(result['ip_address'], ('10.0.0.2', '10.0.0.5'))
+            self.assertEqual(len(ranges), 2)
+
+    def test_generate_gives_up_after_retries(self):
+        cfg.CONF.set_override('ipam_cas_retries', 3)
+        backend = ipam.get_backend()
+        with self.subnet() as subnet:
+            ctx = context.get_admin_context()
+            with mock.patch.object(backend, '_swap',
+                                   return_value=False) as swap:
+                self.assertRaises(q_exc.IpAllocationConflict,
+                                  backend.generate_ip,
+                                  ctx, [subnet['subnet']])
+            self.assertEqual(swap.call_count, 3)
+
+    def test_generate_ips_single_swap(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            backend.allocate_specific_ip(ctx, subnet_id, '10.0.0.4')
+            with mock.patch.object(backend, '_swap',
+                                   wraps=backend._swap) as swap:
+                results = backend.generate_ips(ctx, [subnet['subnet']], 3)
+            self.assertEqual(swap.call_count, 1)
+            ips = set(r['ip_address'] for r in results)
+            self.assertEqual(len(ips), 3)
+            ranges = self._get_ranges(ctx, subnet_id)
+            self.assertEqual(len(ranges), 1)
+            self.assertEqual(ips | set([ranges[0][0]]),
+                             set(['10.0.0.2', '10.0.0.3', '10.0.0.5',
+                                  '10.0.0.6']))
+
+    def test_generate_ips_keeps_swapped_on_conflict(self):
+        backend = ipam.get_backend()
+        real_swap = backend._swap
+        attempts = []
+
+        def _swap(*args):
+            attempts.append(args)
+            if len(attempts) == 1:
+                return False
+            return real_swap(*args)
+
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            with mock.patch.object(backend, '_swap', side_effect=_swap):
+                results = backend.generate_ips(ctx, [subnet['subnet']], 5)
+            self.assertEqual(len(attempts), 2)
+            self.assertEqual(sorted(r['ip_address'] for r in results),
+                             ['10.0.0.2', '10.0.0.3', '10.0.0.4',
+                              '10.0.0.5', '10.0.0.6'])
+            self.assertEqual(self._get_ranges(ctx, subnet['subnet']['id']),
+                             [])
+
+    def test_generate_ips_exhausted(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            self.assertRaises(q_exc.IpAddressGenerationFailure,
+                              backend.generate_ips,
+                              ctx, [subnet['subnet']], 6)
+            self.assertEqual(self._get_ranges(ctx, subnet['subnet']['id']),
+                             [('10.0.0.2', '10.0.0.6')])
+
+    def test_swap_detects_concurrent_change(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            pool_id = backend._get_pools(ctx, subnet_id)[0].id
+            range_set = backend._get_range_sets(ctx, [pool_id])[pool_id]
+            # 10.0.0.2 - 10.0.0.6 is the only free range; pretend another
+            # request already took 10.0.0.2 from it
+            stale = ipam.IPRangeSet(4, list(range_set))
+            backend.allocate_specific_ip(ctx, subnet_id, '10.0.0.2')
+            old, new = stale.remove(stale.first())
+            self.assertFalse(backend._swap(ctx, pool_id, stale, [old], new))
+            self.assertEqual(self._get_ranges(ctx, subnet_id),
+                             [('10.0.0.3', '10.0.0.6')])
+
+    def test_release_merges_ranges(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            backend.allocate_specific_ip(ctx, subnet_id, '10.0.0.4')
+            self.assertEqual(self._get_ranges(ctx, subnet_id),
+                             [('10.0.0.2', '10.0.0.3'),
+                              ('10.0.0.5', '10.0.0.6')])
+            backend.release_ip(ctx, subnet_id, '10.0.0.4')
+            self.assertEqual(self._get_ranges(ctx, subnet_id),
+                             [('10.0.0.2', '10.0.0.6')])
+
+    def test_release_ips_single_swap(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            for ip_address in ('10.0.0.3', '10.0.0.4', '10.0.0.6'):
+                backend.allocate_specific_ip(ctx, subnet_id, ip_address)
+            with mock.patch.object(backend, '_swap',
+                                   wraps=backend._swap) as swap:
+                backend.release_ips(ctx, subnet_id,
+                                    ['10.0.0.3', '10.0.0.6', '10.0.0.1'])
+            self.assertEqual(swap.call_count, 1)
+            self.assertEqual(self._get_ranges(ctx, subnet_id),
+                             [('10.0.0.2', '10.0.0.3'),
+                              ('10.0.0.5', '10.0.0.6')])
+
+    def test_release_reads_neighbours_only(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/28') as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            for ip_address in ('10.0.0.4', '10.0.0.8', '10.0.0.10'):
+                backend.allocate_specific_ip(ctx, subnet_id, ip_address)
+            pool_id = backend._get_pools(ctx, subnet_id)[0].id
+            ip = netaddr.IPAddress('10.0.0.8')
+            range_set = backend._get_neighbours(ctx, pool_id, [ip])
+            self.assertEqual([(range_set.to_str(first), range_set.to_str(last))
+                              for first, last in range_set],
+                             [('10.0.0.5', '10.0.0.7'),
+                              ('10.0.0.9', '10.0.0.9')])
+            backend.release_ip(ctx, subnet_id, '10.0.0.8')
+            self.assertEqual(self._get_ranges(ctx, subnet_id),
+                             [('10.0.0.11', '10.0.0.14'),
+                              ('10.0.0.2', '10.0.0.3'),
+                              ('10.0.0.5', '10.0.0.9')])
+
+    def test_allocate_specific_retry_locks_holding_range(self):
+        backend = ipam.get_backend()
+        real_swap = backend._swap
+        attempts = []
+
+        def _swap(*args):
+            attempts.append(args)
+            if len(attempts) == 1:
+                return False
+            return real_swap(*args)
+
+        with self.subnet(cidr='10.0.0.0/28') as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            backend.allocate_specific_ip(ctx, subnet_id, '10.0.0.4')
+            with mock.patch.object(backend, '_swap', side_effect=_swap):
+                with mock.patch.object(backend, '_get_range_sets',
+                                       wraps=backend._get_range_sets) as get:
+                    backend.allocate_specific_ip(ctx, subnet_id, '10.0.0.8')
+            self.assertEqual(len(attempts), 2)
+            locked = [kwargs for args, kwargs in get.call_args_list
+                      if kwargs.get('lock')]
+            self.assertEqual(len(locked), 1)
+            self.assertIsNotNone(locked[0]['criterion'])
+            self.assertEqual(self._get_ranges(ctx, subnet_id),
+                             [('10.0.0.2', '10.0.0.3'),
+                              ('10.0.0.5', '10.0.0.7'),
+                              ('10.0.0.9', '10.0.0.14')])
+
+    def test_release_outside_pools(self):
+        backend = ipam.get_backend()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            self.assertRaises(q_exc.InvalidInput, backend.release_ip,
+                              ctx, subnet['subnet']['id'], '10.0.0.1')
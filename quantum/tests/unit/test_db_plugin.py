@@ -23,6 +23,7 @@ import random
 
 import mock
 from oslo.config import cfg
+import sqlalchemy
 from testtools import matchers
 import webob.exc
 
@@ -836,6 +837,53 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
             for p in self.deserialize(self.fmt, res)['ports']:
                 self._delete('ports', p['id'])
 
+    def test_create_ports_bulk_native_batched(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        if not self._is_native_bulk_port_create():
+            self.skipTest("Plugin creates bulk ports one by one")
+        with self.subnet() as subnet:
+            net_id = subnet['subnet']['network_id']
+            with mock.patch.object(db_base_plugin_v2.QuantumDbPluginV2,
+                                   '_generate_mac') as generate_mac:
+                res = self._create_port_bulk(self.fmt, 2, net_id,
+                                             'test', True)
+            self.assertFalse(generate_mac.called)
+            self._validate_behavior_on_bulk_success(res, 'ports')
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertNotEqual(ports[0]['mac_address'],
+                                ports[1]['mac_address'])
+            self.assertEqual(sorted(p['fixed_ips'][0]['ip_address']
+                                    for p in ports),
+                             ['10.0.0.2', '10.0.0.3'])
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_duplicate_mac(self):
+        with self.network() as net:
+            overrides = {0: {'mac_address': '00:11:22:33:44:55'},
+                         1: {'mac_address': '00:11:22:33:44:55'}}
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True, override=overrides)
+            self.assertEqual(res.status_int, 409)
+            req = self.new_list_request('ports')
+            ports = self.deserialize(self.fmt, req.get_response(self.api))
+            self.assertEqual(len(ports['ports']), 0)
+
+    def test_create_ports_bulk_duplicate_ip(self):
+        with self.subnet() as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.5'}]
+            overrides = {0: {'fixed_ips': fixed_ips},
+                         1: {'fixed_ips': fixed_ips}}
+            res = self._create_port_bulk(self.fmt, 2,
+                                         subnet['subnet']['network_id'],
+                                         'test', True, override=overrides)
+            self.assertEqual(res.status_int, 409)
+            req = self.new_list_request('ports')
+            ports = self.deserialize(self.fmt, req.get_response(self.api))
+            self.assertEqual(len(ports['ports']), 0)
+
     def test_create_ports_bulk_emulated(self):
         real_has_attr = hasattr
 
@@ -867,6 +915,26 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
             ports = self.deserialize(self.fmt, res)
             self.assertEqual(len(ports['ports']), 0)
 
+    def _is_native_bulk_port_create(self):
+        """Return whether the plugin creates bulk ports in one batch."""
+        plugin = QuantumManager.get_plugin()
+        with mock.patch.object(plugin, '_create_bulk', return_value=[]):
+            with mock.patch.object(plugin, '_create_ports',
+                                   return_value=[]) as create_ports:
+                plugin.create_port_bulk(context.get_admin_context(),
+                                        {'ports': []})
+        return create_ports.called
+
+    def _get_bulk_port_create_method(self):
+        """Return the name of the plugin method called for each bulk port.
+
+        Plugins creating the ports of a bulk request at once only call their
+        _process_port_create hook for each of them.
+        """
+        if self._is_native_bulk_port_create():
+            return '_process_port_create'
+        return 'create_port'
+
     def test_create_ports_bulk_emulated_plugin_failure(self):
         real_has_attr = hasattr
 
@@ -876,11 +944,12 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
                 return False
             return real_has_attr(item, attr)
 
+        method = self._get_bulk_port_create_method()
         with mock.patch('__builtin__.hasattr',
                         new=fakehasattr):
-            orig = QuantumManager.get_plugin().create_port
+            orig = getattr(QuantumManager.get_plugin(), method)
             with mock.patch.object(QuantumManager.get_plugin(),
-                                   'create_port') as patched_plugin:
+                                   method) as patched_plugin:
 
                 def side_effect(*args, **kwargs):
                     return self._do_side_effect(patched_plugin, orig,
@@ -899,10 +968,11 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
         if self._skip_native_bulk:
             self.skipTest("Plugin does not support native bulk port create")
         ctx = context.get_admin_context()
+        method = self._get_bulk_port_create_method()
         with self.network() as net:
-            orig = QuantumManager._instance.plugin.create_port
+            orig = getattr(QuantumManager._instance.plugin, method)
             with mock.patch.object(QuantumManager._instance.plugin,
-                                   'create_port') as patched_plugin:
+                                   method) as patched_plugin:
 
                 def side_effect(*args, **kwargs):
                     return self._do_side_effect(patched_plugin, orig,
@@ -1577,6 +1647,7 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
         # set expirations to past so that recycling is checked
         reference = datetime.datetime(2012, 8, 13, 23, 11, 0)
         cfg.CONF.set_override('dhcp_lease_duration', 0)
+        cfg.CONF.set_override('ip_recycle_interval', 0)
 
         with self.subnet(cidr='10.0.1.0/24') as subnet:
             with self.port(subnet=subnet) as port:
@@ -1606,6 +1677,69 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                                      subnet['subnet']['id'])
                     self._delete('ports', port['port']['id'])
 
+    def test_recycle_expired_ip_allocations(self):
+        cfg.CONF.set_override('ip_recycle_batch_size', 2)
+        plugin = QuantumManager.get_plugin()
+        with self.subnet(cidr='10.0.1.0/24') as subnet:
+            net_id = subnet['subnet']['network_id']
+            for i in range(3):
+                with self.port(subnet=subnet):
+                    pass
+            # The sweeper did not run, the addresses are still held
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual(ips[0]['ip_address'], '10.0.1.5')
+            ctx = context.get_admin_context()
+            self.assertEqual(plugin.recycle_expired_ip_allocations(ctx), 0)
+            with mock.patch.object(timeutils, 'utcnow') as mock_utcnow:
+                mock_utcnow.return_value = (datetime.datetime.utcnow() +
+                                            datetime.timedelta(hours=1))
+                self.assertEqual(plugin.recycle_expired_ip_allocations(ctx),
+                                 4)
+            q = ctx.session.query(models_v2.IPAllocation)
+            self.assertEqual(q.filter_by(network_id=net_id).count(), 0)
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual(ips[0]['ip_address'], '10.0.1.2')
+
+    def test_recycle_on_exhausted_subnet(self):
+        with self.subnet(cidr='10.0.1.0/30') as subnet:
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual(ips[0]['ip_address'], '10.0.1.2')
+            net_id = subnet['subnet']['network_id']
+            res = self._create_port(self.fmt, net_id=net_id)
+            self.assertEqual(res.status_int, 409)
+            with mock.patch.object(timeutils, 'utcnow') as mock_utcnow:
+                mock_utcnow.return_value = (datetime.datetime.utcnow() +
+                                            datetime.timedelta(hours=1))
+                with self.port(subnet=subnet) as port:
+                    ips = port['port']['fixed_ips']
+                    self.assertEqual(ips[0]['ip_address'], '10.0.1.2')
+
+    def test_recycle_on_exhausted_subnet_bulk(self):
+        allocation_pools = [{'start': '10.0.1.2', 'end': '10.0.1.3'}]
+        with self.subnet(cidr='10.0.1.0/29',
+                         allocation_pools=allocation_pools) as subnet:
+            net_id = subnet['subnet']['network_id']
+            res = self._create_port_bulk(self.fmt, 2, net_id, 'test', True)
+            for port in self.deserialize(self.fmt, res)['ports']:
+                self._delete('ports', port['id'])
+            res = self._create_port_bulk(self.fmt, 2, net_id, 'test', True)
+            self.assertEqual(res.status_int, 409)
+            with mock.patch.object(timeutils, 'utcnow') as mock_utcnow:
+                mock_utcnow.return_value = (datetime.datetime.utcnow() +
+                                            datetime.timedelta(hours=1))
+                res = self._create_port_bulk(self.fmt, 2, net_id,
+                                             'test', True)
+                self.assertEqual(res.status_int, 201)
+                ports = self.deserialize(self.fmt, res)['ports']
+                self.assertEqual(sorted(p['fixed_ips'][0]['ip_address']
+                                        for p in ports),
+                                 ['10.0.1.2', '10.0.1.3'])
+                for port in ports:
+                    self._delete('ports', port['id'])
+
     def test_invalid_admin_state(self):
         with self.network() as network:
             data = {'port': {'network_id': network['network']['id'],
@@ -1662,6 +1796,41 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                     ip_allocation.expiration - timeutils.utcnow(),
                     matchers.GreaterThan(datetime.timedelta(seconds=10)))
 
+    def test_update_fixed_ip_lease_expirations(self):
+        cfg.CONF.set_override('dhcp_lease_duration', 10)
+        plugin = QuantumManager.get_plugin()
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as ports:
+                network_id = subnet['subnet']['network_id']
+                ip_addresses = [p['port']['fixed_ips'][0]['ip_address']
+                                for p in ports]
+                update_context = context.Context('', ports[0]['port'][
+                    'tenant_id'])
+                with mock.patch.object(db_base_plugin_v2, 'LOG') as log:
+                    plugin.update_fixed_ip_lease_expirations(
+                        update_context,
+                        [{'network_id': network_id,
+                          'ip_address': ip_addresses[0],
+                          'lease_remaining': 500},
+                         {'network_id': network_id,
+                          'ip_address': ip_addresses[1],
+                          'lease_remaining': 1000},
+                         {'network_id': network_id,
+                          'ip_address': '255.255.255.0',
+                          'lease_remaining': 120}])
+                    self.assertEqual(log.debug.call_count, 1)
+
+                q = update_context.session.query(models_v2.IPAllocation)
+                q = q.filter_by(network_id=network_id)
+                expirations = dict((a.ip_address, a.expiration) for a in q)
+                self.assertThat(
+                    expirations[ip_addresses[0]] - timeutils.utcnow(),
+                    matchers.GreaterThan(datetime.timedelta(seconds=400)))
+                self.assertThat(
+                    expirations[ip_addresses[1]] - timeutils.utcnow(),
+                    matchers.GreaterThan(datetime.timedelta(seconds=900)))
+
     def test_port_delete_holds_ip(self):
         base_class = db_base_plugin_v2.QuantumDbPluginV2
         with mock.patch.object(base_class, '_hold_ip') as hold_ip:
@@ -3492,6 +3661,81 @@ class TestSubnetsV2(QuantumDbPluginV2TestCase):
         self.assertEqual(res.status_int, 204)
 
 
+class ListQueryCountTestMixin(object):
+    """Checks that listing resources does not issue queries per item."""
+
+    def _count_list_queries(self, resource):
+        statements = []
+
+        def _record(conn, cursor, statement, *args):
+            if self._statements is not None:
+                self._statements.append(statement)
+
+        if not getattr(db._ENGINE, '_query_count_listener', False):
+            sqlalchemy.event.listen(db._ENGINE, 'before_cursor_execute',
+                                    _record)
+            db._ENGINE._query_count_listener = True
+        self._statements = statements
+        try:
+            self._list(resource)
+        finally:
+            self._statements = None
+        return len(statements)
+
+    def _assert_list_query_count_constant(self, resource, make_item):
+        with make_item():
+            count = self._count_list_queries(resource)
+            with contextlib.nested(make_item(), make_item(), make_item()):
+                self.assertEqual(self._count_list_queries(resource), count)
+
+    def test_list_networks_query_count(self):
+        self._assert_list_query_count_constant('networks', self.network)
+
+    def test_list_ports_query_count(self):
+        with self.subnet() as subnet:
+            self._assert_list_query_count_constant(
+                'ports', lambda: self.port(subnet=subnet))
+
+
+class TestListQueryCount(ListQueryCountTestMixin, QuantumDbPluginV2TestCase):
+    pass
+
+
+class TestPolicyFilters(QuantumDbPluginV2TestCase):
+
+    def _list_network_names(self, filters):
+        plugin = QuantumManager.get_plugin()
+        networks = plugin.get_networks(context.get_admin_context(),
+                                       filters=filters)
+        return sorted(network['name'] for network in networks)
+
+    def test_list_networks_with_alternative_filters(self):
+        with contextlib.nested(self.network(shared=False,
+                                            name='net1',
+                                            tenant_id='tenant1'),
+                               self.network(shared=True,
+                                            name='net2',
+                                            tenant_id='another_tenant'),
+                               self.network(shared=False,
+                                            name='net3',
+                                            tenant_id='another_tenant')):
+            filters = {attributes.POLICY_FILTERS: [{'tenant_id': ['tenant1']},
+                                                   {'shared': [True]}]}
+            self.assertEqual(self._list_network_names(filters),
+                             ['net1', 'net2'])
+            filters['name'] = ['net1', 'net3']
+            self.assertEqual(self._list_network_names(filters), ['net1'])
+
+    def test_list_networks_with_alternative_filters_not_columns(self):
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2')):
+            filters = {attributes.POLICY_FILTERS: [{'name': ['net1']},
+                                                   {'router:external':
+                                                    [True]}]}
+            self.assertEqual(self._list_network_names(filters),
+                             ['net1', 'net2'])
+
+
 class DbModelTestCase(base.BaseTestCase):
     """DB model tests."""
     def test_repr(self):
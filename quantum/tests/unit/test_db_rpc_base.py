@@ -148,3 +148,11 @@ class TestDhcpRpcCallackMixin(base.BaseTestCase):
                                                        device_id=['devid'])),
             mock.call.update_port(mock.ANY, 'port_id',
                                   dict(port=port_update))])
+
+    def test_update_leases_expiration(self):
+        leases = [dict(network_id='netid', ip_address='10.0.0.2',
+                       lease_remaining=120)]
+        self.callbacks.update_leases_expiration(mock.ANY, leases=leases,
+                                                host='foo')
+        self.plugin.assert_has_calls([
+            mock.call.update_fixed_ip_lease_expirations(mock.ANY, leases)])
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 import socket
 import sys
@@ -33,6 +34,7 @@ from quantum.agent.linux import interface
 from quantum.common import constants
 from quantum.common import exceptions
 from quantum.openstack.common import jsonutils
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.tests import base
 
 
@@ -238,6 +240,7 @@ class TestDhcpAgent(base.BaseTestCase):
                 self.assertTrue(dhcp.needs_resync)
 
     def test_update_lease(self):
+        cfg.CONF.set_override('lease_update_delay', 0)
         with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
             dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
             dhcp.update_lease('net_id', '192.168.1.1', 120)
@@ -246,6 +249,7 @@ class TestDhcpAgent(base.BaseTestCase):
                     'net_id', '192.168.1.1', 120)])
 
     def test_update_lease_failure(self):
+        cfg.CONF.set_override('lease_update_delay', 0)
         with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
             plug.return_value.update_lease_expiration.side_effect = Exception
 
@@ -259,6 +263,84 @@ class TestDhcpAgent(base.BaseTestCase):
                 self.assertTrue(log.called)
                 self.assertTrue(dhcp.needs_resync)
 
+    def test_update_lease_batched(self):
+        cfg.CONF.set_override('lease_update_delay', 0.5)
+        with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with contextlib.nested(
+                mock.patch('eventlet.spawn_after'),
+                mock.patch('time.time')) as (spawn_after, time):
+                time.return_value = 100
+                dhcp.update_lease('net_id', '192.168.1.1', 120)
+                dhcp.update_lease('net_id', '192.168.1.2', 120)
+                dhcp.update_lease('net_id', '192.168.1.1', 60)
+                spawn_after.assert_called_once_with(0.5, dhcp._send_leases)
+                self.assertFalse(
+                    plug.return_value.update_leases_expiration.called)
+
+                time.return_value = 110
+                dhcp._send_leases()
+            leases = plug.return_value.update_leases_expiration.call_args[0][0]
+            self.assertEqual(
+                sorted(leases),
+                sorted([dict(network_id='net_id', ip_address='192.168.1.1',
+                             lease_remaining=50),
+                        dict(network_id='net_id', ip_address='192.168.1.2',
+                             lease_remaining=110)]))
+            self.assertFalse(plug.return_value.update_lease_expiration.called)
+            self.assertEqual(dhcp._pending_leases, {})
+
+    def test_send_leases_failure(self):
+        with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
+            plug.return_value.update_leases_expiration.side_effect = Exception
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch('eventlet.spawn_after'):
+                dhcp.update_lease('net_id', '192.168.1.1', 120)
+            with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
+                dhcp._send_leases()
+            self.assertTrue(log.called)
+            self.assertTrue(dhcp.needs_resync)
+
+    def test_send_leases_unsupported_by_plugin(self):
+        cfg.CONF.set_override('lease_update_delay', 0.5)
+        with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
+            plugin_rpc = plug.return_value
+            plugin_rpc.update_leases_expiration.side_effect = (
+                rpc_common.RemoteError('UnsupportedRpcVersion'))
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with contextlib.nested(
+                mock.patch('eventlet.spawn_after'),
+                mock.patch('time.time')) as (spawn_after, time):
+                time.return_value = 100
+                dhcp.update_lease('net_id', '192.168.1.1', 120)
+                dhcp._send_leases()
+                plugin_rpc.update_lease_expiration.assert_called_once_with(
+                    'net_id', '192.168.1.1', 120)
+                self.assertFalse(dhcp.needs_resync)
+
+                # later updates are no longer batched
+                spawn_after.reset_mock()
+                dhcp.update_lease('net_id', '192.168.1.2', 60)
+                self.assertFalse(spawn_after.called)
+                plugin_rpc.update_lease_expiration.assert_called_with(
+                    'net_id', '192.168.1.2', 60)
+            self.assertEqual(plugin_rpc.update_leases_expiration.call_count,
+                             1)
+
+    def test_send_leases_remote_failure(self):
+        with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
+            plugin_rpc = plug.return_value
+            plugin_rpc.update_leases_expiration.side_effect = (
+                rpc_common.RemoteError('ValueError'))
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch('eventlet.spawn_after'):
+                dhcp.update_lease('net_id', '192.168.1.1', 120)
+            with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
+                dhcp._send_leases()
+            self.assertTrue(log.called)
+            self.assertTrue(dhcp.needs_resync)
+            self.assertFalse(plugin_rpc.update_lease_expiration.called)
+
     def _test_sync_state_helper(self, known_networks, active_networks):
         with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
             mock_plugin = mock.Mock()
@@ -413,6 +495,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                               'quantum.agent.linux.interface.NullDriver')
         config.register_root_helper(cfg.CONF)
         cfg.CONF.register_opts(dhcp_agent.DhcpAgent.OPTS)
+        cfg.CONF.set_override('reload_allocations_delay', 0)
 
         self.plugin_p = mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi')
         plugin_cls = self.plugin_p.start()
@@ -740,6 +823,17 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_called_once_with('reload_allocations',
                                                  fake_network)
 
+    def test_port_create_end_bulk(self):
+        payload = dict(ports=[vars(fake_port1), vars(fake_port2)])
+        self.cache.get_network_by_id.return_value = fake_network
+        self.dhcp.port_create_end(None, payload)
+        self.cache.assert_has_calls(
+            [mock.call.get_network_by_id(fake_port1.network_id),
+             mock.call.put_port(mock.ANY),
+             mock.call.put_port(mock.ANY)])
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
     def test_port_delete_end(self):
         payload = dict(port_id=fake_port2.id)
         self.cache.get_network_by_id.return_value = fake_network
@@ -763,6 +857,32 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
 
+    def test_port_events_coalesced(self):
+        cfg.CONF.set_override('reload_allocations_delay', 0.5)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        with mock.patch('eventlet.spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, dict(port=vars(fake_port1)))
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+            spawn_after.assert_called_once_with(
+                0.5, self.dhcp._reload_allocations, fake_network.id)
+            self.assertFalse(self.call_driver.called)
+
+            self.dhcp._reload_allocations(fake_network.id)
+            self.call_driver.assert_called_once_with('reload_allocations',
+                                                     fake_network)
+
+            # Once reloaded, a new event schedules a new reload
+            self.dhcp.port_update_end(None, dict(port=vars(fake_port1)))
+            self.assertEqual(spawn_after.call_count, 2)
+
+    def test_reload_allocations_disabled_network(self):
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp._pending_reloads.add(fake_network.id)
+        self.dhcp._reload_allocations(fake_network.id)
+        self.assertFalse(self.call_driver.called)
+        self.assertEqual(self.dhcp._pending_reloads, set())
+
 
 class TestDhcpPluginApiProxy(base.BaseTestCase):
     def setUp(self):
@@ -832,6 +952,17 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
                                               lease_remaining=1,
                                               host='foo')
 
+    def test_update_leases_expiration(self):
+        leases = [dict(network_id='netid', ip_address='ipaddr',
+                       lease_remaining=1)]
+        self.proxy.update_leases_expiration(leases)
+        self.assertTrue(self.call.called)
+        self.assertEqual(self.call.call_args[1]['version'],
+                         dhcp_agent.DhcpPluginApi.BULK_LEASES_VERSION)
+        self.make_msg.assert_called_once_with('update_leases_expiration',
+                                              leases=leases,
+                                              host='foo')
+
 
 class TestNetworkCache(base.BaseTestCase):
     def test_put_network(self):
@@ -0,0 +1,80 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from quantum.agent.linux import ipset_manager
+from quantum.tests import base
+
+
+class IpsetManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(_execute=self.execute,
+                                                root_helper='sudo')
+
+    def _call(self, *args, **kwargs):
+        return mock.call(['ipset'] + list(args), root_helper='sudo',
+                         check_exit_code=True,
+                         process_input=kwargs.get('process_input'))
+
+    def _restore(self, *commands):
+        return self._call('restore', '-exist',
+                          process_input='\n'.join(commands) + '\n')
+
+    def test_get_set_name(self):
+        name = ipset_manager.get_set_name('0123456789' * 4, 'IPv6')
+        self.assertEqual(name, 'IPv6' + ('0123456789' * 3)[:27])
+
+    def test_set_members_creates_set(self):
+        self.ipset.set_members('IPv4sg', 'IPv4', ['10.0.0.2'])
+        self.assertEqual(self.execute.call_args_list,
+                         [self._restore('create IPv4sg hash:ip family inet',
+                                        'flush IPv4sg',
+                                        'add IPv4sg 10.0.0.2')])
+        self.assertTrue(self.ipset.set_exists('IPv4sg'))
+
+    def test_set_members_only_applies_changes(self):
+        self.ipset.set_members('IPv6sg', 'IPv6', ['fe80::1', 'fe80::2'])
+        self.execute.reset_mock()
+        self.ipset.set_members('IPv6sg', 'IPv6', ['fe80::2', 'fe80::3'])
+        self.assertEqual(self.execute.call_args_list,
+                         [self._restore('add IPv6sg fe80::3',
+                                        'del IPv6sg fe80::1')])
+
+    def test_set_members_unchanged(self):
+        self.ipset.set_members('IPv4sg', 'IPv4', ['10.0.0.2'])
+        self.execute.reset_mock()
+        self.ipset.set_members('IPv4sg', 'IPv4', ['10.0.0.2'])
+        self.assertFalse(self.execute.called)
+
+    def test_destroy_set(self):
+        self.ipset.set_members('IPv4sg', 'IPv4', [])
+        self.execute.reset_mock()
+        self.ipset.destroy_set('IPv4sg')
+        self.ipset.destroy_set('IPv4sg')
+        self.assertEqual(self.execute.call_args_list,
+                         [self._call('destroy', 'IPv4sg')])
+        self.assertFalse(self.ipset.set_exists('IPv4sg'))
+
+    def test_destroy_set_failure(self):
+        self.ipset.set_members('IPv4sg', 'IPv4', [])
+        self.execute.side_effect = RuntimeError()
+        self.ipset.destroy_set('IPv4sg')
+        self.assertFalse(self.ipset.set_exists('IPv4sg'))
@@ -975,3 +975,86 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                  call.add_rule('ofake_dev', '-j $sg-fallback'),
                  call.add_rule('sg-chain', '-j ACCEPT')]
         self.v4filter_inst.assert_has_calls(calls)
+
+
+class IptablesFirewallIpsetTestCase(IptablesFirewallTestCase):
+    def setUp(self):
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        super(IptablesFirewallIpsetTestCase, self).setUp()
+        self.ipset = mock.Mock()
+        self.ipset.set_exists.return_value = True
+        self.firewall.ipset = self.ipset
+        self.sg_id = _uuid()
+        self.set_name = ('IPv4' + self.sg_id)[:31]
+
+    def _remote_group_port(self):
+        port = self._fake_port()
+        port['security_group_rules'] = [{'ethertype': 'IPv4',
+                                         'direction': 'ingress',
+                                         'protocol': 'tcp',
+                                         'remote_group_id': self.sg_id}]
+        return port
+
+    def test_handles_remote_groups(self):
+        self.assertTrue(self.firewall.handles_remote_groups)
+
+    def test_filter_ipv4_ingress_remote_group(self):
+        rule = {'ethertype': 'IPv4',
+                'direction': 'ingress',
+                'remote_group_id': self.sg_id}
+        ingress = call.add_rule(
+            'ifake_dev',
+            '-j RETURN -m set --match-set %s src' % self.set_name)
+        self._test_prepare_port_filter(rule, ingress, None)
+
+    def test_filter_ipv4_egress_remote_group(self):
+        rule = {'ethertype': 'IPv4',
+                'direction': 'egress',
+                'protocol': 'udp',
+                'remote_group_id': self.sg_id}
+        egress = call.add_rule(
+            'ofake_dev',
+            '-j RETURN -p udp -m set --match-set %s dst' % self.set_name)
+        self._test_prepare_port_filter(rule, None, egress)
+
+    def test_filter_expanded_remote_group(self):
+        prefix = FAKE_PREFIX['IPv4']
+        rule = {'ethertype': 'IPv4',
+                'direction': 'ingress',
+                'source_ip_prefix': prefix,
+                'remote_group_id': self.sg_id}
+        ingress = call.add_rule('ifake_dev', '-j RETURN -s %s' % prefix)
+        self._test_prepare_port_filter(rule, ingress, None)
+
+    def test_update_security_group_members(self):
+        member_ips = {'IPv4': ['10.0.0.2'], 'IPv6': []}
+        self.firewall.update_security_group_members(self.sg_id, member_ips)
+        self.ipset.assert_has_calls(
+            [call.set_members(self.set_name, 'IPv4', ['10.0.0.2']),
+             call.set_members(('IPv6' + self.sg_id)[:31], 'IPv6', [])],
+            any_order=True)
+
+    def test_missing_set_created_before_apply(self):
+        self.ipset.set_exists.return_value = False
+        self.firewall.prepare_port_filter(self._remote_group_port())
+        self.ipset.set_members.assert_called_once_with(
+            self.set_name, 'IPv4', [])
+
+    def test_unused_sets_destroyed(self):
+        member_ips = {'IPv4': ['10.0.0.2'], 'IPv6': []}
+        self.firewall.update_security_group_members(self.sg_id, member_ips)
+        port = self._remote_group_port()
+        self.firewall.prepare_port_filter(port)
+        self.assertFalse(self.ipset.destroy_set.called)
+        self.firewall.remove_port_filter(port)
+        self.ipset.destroy_set.assert_has_calls(
+            [call(self.set_name), call(('IPv6' + self.sg_id)[:31])],
+            any_order=True)
+
+    def test_unused_sets_destroyed_after_deferred_apply(self):
+        member_ips = {'IPv4': ['10.0.0.2']}
+        self.firewall.update_security_group_members(self.sg_id, member_ips)
+        with self.firewall.defer_apply():
+            self.firewall.prepare_port_filter(self._fake_port())
+            self.assertFalse(self.ipset.destroy_set.called)
+        self.ipset.destroy_set.assert_called_once_with(self.set_name)
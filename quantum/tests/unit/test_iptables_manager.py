@@ -20,6 +20,7 @@
 import inspect
 import os
 
+import mock
 import mox
 
 from quantum.agent.linux import iptables_manager
@@ -302,3 +303,115 @@ class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def test_nat_not_found(self):
         self.assertFalse('nat' in self.iptables.ipv4)
+
+
+class IptablesManagerIncrementalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalTestCase, self).setUp()
+        self.root_helper = 'sudo'
+        self.iptables = iptables_manager.IptablesManager(
+            root_helper=self.root_helper, incremental=True)
+        self.execute = mock.Mock(return_value='')
+        self.iptables.execute = self.execute
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _noflush_call(self, lines):
+        return mock.call(['iptables-restore', '--noflush'],
+                         process_input='\n'.join(lines + ['COMMIT', '']),
+                         root_helper=self.root_helper)
+
+    def test_first_apply_is_full(self):
+        iptables = iptables_manager.IptablesManager(
+            root_helper=self.root_helper, incremental=True)
+        iptables.execute = mock.Mock(return_value='')
+        iptables.apply()
+        args = [c[0][0] for c in iptables.execute.call_args_list]
+        self.assertEqual(args, [['iptables-save', '-t', 'filter'],
+                                ['iptables-restore'],
+                                ['iptables-save', '-t', 'nat'],
+                                ['iptables-restore']])
+
+    def test_apply_without_changes(self):
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_add_chain_and_rules(self):
+        bn = iptables_manager.binary_name
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('INPUT',
+                                              '-s 0/0 -d 192.168.0.2 -j '
+                                              '$filter')
+        self.iptables.apply()
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '--noflush'],
+            process_input=('*filter\n'
+                           ':%(bn)s-INPUT - [0:0]\n'
+                           ':%(bn)s-filter - [0:0]\n'
+                           '-A %(bn)s-INPUT -s 0/0 -d 192.168.0.2 -j '
+                           '%(bn)s-filter\n'
+                           '-A %(bn)s-filter -j DROP\n'
+                           'COMMIT\n' % {'bn': bn}),
+            root_helper=self.root_helper)
+
+    def test_remove_chain(self):
+        bn = iptables_manager.binary_name
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j $filter')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.apply()
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '--noflush'],
+            process_input=('*filter\n'
+                           ':%(bn)s-INPUT - [0:0]\n'
+                           ':%(bn)s-filter - [0:0]\n'
+                           '-X %(bn)s-filter\n'
+                           'COMMIT\n' % {'bn': bn}),
+            root_helper=self.root_helper)
+
+    def test_recreated_chain_is_not_applied(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_unwrapped_chain_change_applies_full_table(self):
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self.iptables.apply()
+        args = [c[0][0] for c in self.execute.call_args_list]
+        self.assertEqual(args, [['iptables-save', '-t', 'filter'],
+                                ['iptables-restore']])
+
+    def test_rejected_update_applies_full_table(self):
+        def _execute(args, **kwargs):
+            if '--noflush' in args:
+                raise RuntimeError()
+            return ''
+
+        self.execute.side_effect = _execute
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.apply()
+        args = [c[0][0] for c in self.execute.call_args_list]
+        self.assertEqual(args, [['iptables-restore', '--noflush'],
+                                ['iptables-save', '-t', 'filter'],
+                                ['iptables-restore']])
+
+    def test_namespace(self):
+        self.iptables.namespace = 'ns'
+        self.iptables.ipv4['nat'].add_chain('nat')
+        self.iptables.apply()
+        self.assertEqual(self.execute.call_args[0][0],
+                         ['ip', 'netns', 'exec', 'ns',
+                          'iptables-restore', '--noflush'])
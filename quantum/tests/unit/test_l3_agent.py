@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 
 import mock
@@ -442,6 +443,128 @@ class TestBasicRouterOperations(base.BaseTestCase):
         self.assertEqual(len(nat_rules_delta), 2)
         self._verify_snat_rules(nat_rules_delta, router)
 
+    def _process_router_updates(self, agent):
+        while len(agent._queue):
+            agent._process_router_update(agent._queue.get(block=False))
+
+    def test_process_routers_priority(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = None
+        routers = [{'id': _uuid(), 'admin_state_up': True, 'routes': [],
+                    'external_gateway_info': {}} for i in range(3)]
+        agent._process_routers(routers[:2], all_routers=True)
+        agent._process_routers([routers[1], routers[2]])
+        updates = [agent._queue.get(block=False) for i in range(3)]
+        self.assertEqual([u.router_id for u in updates],
+                         [routers[1]['id'], routers[2]['id'],
+                          routers[0]['id']])
+        self.assertEqual(len(agent._queue), 0)
+
+    def test_process_router_update_failure_triggers_fullsync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        router = {'id': _uuid(), 'admin_state_up': True, 'routes': [],
+                  'external_gateway_info': {}}
+        agent._queue.put(l3_agent.RouterUpdate(router['id'],
+                                               l3_agent.PRIORITY_RPC,
+                                               router=router))
+        with mock.patch.object(agent, 'process_router',
+                               side_effect=RuntimeError):
+            agent._process_router_update(agent._queue.get(block=False))
+        self.assertTrue(agent.fullsync)
+        self.assertEqual(agent._queue._in_progress, set())
+
+    def _router_with_fip(self, agent, revision=1):
+        router = {'id': _uuid(), 'admin_state_up': True, 'routes': [],
+                  'external_gateway_info': {}, 'revision': revision,
+                  l3_constants.FLOATINGIP_KEY: [{'id': 'fip1'},
+                                                {'id': 'fip2'}]}
+        agent.router_info[router['id']] = l3_agent.RouterInfo(
+            router['id'], self.conf.root_helper, self.conf.use_namespaces,
+            router)
+        return router
+
+    def test_router_delta(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._router_with_fip(agent)
+        delta = {'revision': 2,
+                 'updated': {l3_constants.FLOATINGIP_KEY: [{'id': 'fip3'}]},
+                 'removed': {l3_constants.FLOATINGIP_KEY: ['fip1']}}
+        agent.router_delta(None, router['id'], delta)
+        update = agent._queue.pending(router['id'])
+        self.assertEqual(update.delta_keys,
+                         set([l3_constants.FLOATINGIP_KEY]))
+        self.assertEqual(update.router['revision'], 2)
+        self.assertEqual(update.router[l3_constants.FLOATINGIP_KEY],
+                         [{'id': 'fip2'}, {'id': 'fip3'}])
+        # the known router data is left untouched
+        self.assertEqual(len(router[l3_constants.FLOATINGIP_KEY]), 2)
+
+        delta = {'revision': 3, 'updated': {},
+                 'removed': {l3_constants.INTERFACE_KEY: ['port1']}}
+        agent.router_delta(None, router['id'], delta)
+        update = agent._queue.pending(router['id'])
+        self.assertEqual(update.delta_keys,
+                         set([l3_constants.FLOATINGIP_KEY,
+                              l3_constants.INTERFACE_KEY]))
+        self.assertEqual(update.router['revision'], 3)
+
+    def test_router_delta_outdated(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._router_with_fip(agent, revision=3)
+        agent.router_delta(None, router['id'],
+                           {'revision': 3, 'updated': {}, 'removed': {}})
+        self.assertEqual(len(agent._queue), 0)
+
+    def test_router_delta_missed_revision_resyncs(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._router_with_fip(agent)
+        agent.router_delta(None, router['id'],
+                           {'revision': 3, 'updated': {}, 'removed': {}})
+        self.assertTrue(agent._queue.pending(router['id']).resync)
+
+    def test_router_delta_unknown_router_resyncs(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.router_delta(None, 'foo',
+                           {'revision': 1, 'updated': {}, 'removed': {}})
+        self.assertTrue(agent._queue.pending('foo').resync)
+
+    def test_process_router_update_floating_ips_only(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._router_with_fip(agent)
+        ri = agent.router_info[router['id']]
+        ri.ex_gw_port = {'id': _uuid()}
+        update = l3_agent.RouterUpdate(
+            router['id'], l3_agent.PRIORITY_RPC, router=router,
+            delta_keys=set([l3_constants.FLOATINGIP_KEY]))
+        with contextlib.nested(
+            mock.patch.object(agent, 'process_router'),
+            mock.patch.object(agent, 'process_router_floating_ips')
+        ) as (process_router, process_fips):
+            agent._process_router_update(update)
+        self.assertFalse(process_router.called)
+        process_fips.assert_called_once_with(ri, ri.ex_gw_port)
+
+    def test_process_router_update_resync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_routers.return_value = ['router']
+        update = l3_agent.RouterUpdate('foo', l3_agent.PRIORITY_RPC,
+                                       resync=True)
+        with mock.patch.object(agent, 'routers_updated') as routers_updated:
+            agent._process_router_update(update)
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, router_id='foo')
+        routers_updated.assert_called_once_with(agent.context, ['router'])
+
+    def test_process_router_update_resync_deleted_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_routers.return_value = []
+        update = l3_agent.RouterUpdate('foo', l3_agent.PRIORITY_RPC,
+                                       resync=True)
+        with mock.patch.object(agent, 'router_deleted') as router_deleted:
+            agent._process_router_update(update)
+        router_deleted.assert_called_once_with(agent.context, 'foo')
+
     def testRoutersWithAdminStateDown(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         self.plugin_api.get_external_network_id.return_value = None
@@ -451,6 +574,7 @@ class TestBasicRouterOperations(base.BaseTestCase):
              'admin_state_up': False,
              'external_gateway_info': {}}]
         agent._process_routers(routers)
+        self._process_router_updates(agent)
         self.assertNotIn(routers[0]['id'], agent.router_info)
 
     def testSingleLoopRouterRemoval(self):
@@ -462,8 +586,12 @@ class TestBasicRouterOperations(base.BaseTestCase):
              'routes': [],
              'external_gateway_info': {}}]
         agent._process_routers(routers)
+        self._process_router_updates(agent)
+        self.assertIn(routers[0]['id'], agent.router_info)
 
         agent.router_deleted(None, routers[0]['id'])
+        self._process_router_updates(agent)
+        self.assertNotIn(routers[0]['id'], agent.router_info)
         # verify that remove is called
         self.assertEqual(self.mock_ip.get_devices.call_count, 1)
 
@@ -539,6 +667,50 @@ class TestBasicRouterOperations(base.BaseTestCase):
         self._configure_metadata_proxy(enableflag=False)
 
 
+class TestRouterUpdateQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRouterUpdateQueue, self).setUp()
+        self.queue = l3_agent.RouterUpdateQueue()
+
+    def _put(self, router_id, priority, router=None):
+        update = l3_agent.RouterUpdate(router_id, priority, router=router)
+        self.queue.put(update)
+        return update
+
+    def test_get_by_priority(self):
+        self._put('r1', l3_agent.PRIORITY_SYNC)
+        self._put('r2', l3_agent.PRIORITY_RPC)
+        self.assertEqual(self.queue.get(block=False).router_id, 'r2')
+        self.assertEqual(self.queue.get(block=False).router_id, 'r1')
+        self.assertRaises(l3_agent.queue.Empty, self.queue.get, block=False)
+
+    def test_latest_update_kept(self):
+        self._put('r1', l3_agent.PRIORITY_RPC, router={'rev': 1})
+        latest = self._put('r1', l3_agent.PRIORITY_SYNC, router={'rev': 2})
+        self.assertEqual(len(self.queue), 1)
+        update = self.queue.get(block=False)
+        self.assertIs(update, latest)
+        self.assertEqual(update.priority, l3_agent.PRIORITY_RPC)
+        self.assertRaises(l3_agent.queue.Empty, self.queue.get, block=False)
+
+    def test_priority_raised(self):
+        self._put('r1', l3_agent.PRIORITY_SYNC)
+        self._put('r2', l3_agent.PRIORITY_SYNC)
+        self._put('r2', l3_agent.PRIORITY_RPC)
+        self.assertEqual(self.queue.get(block=False).router_id, 'r2')
+        self.assertEqual(self.queue.get(block=False).router_id, 'r1')
+        self.assertRaises(l3_agent.queue.Empty, self.queue.get, block=False)
+
+    def test_router_in_progress_held_until_done(self):
+        self._put('r1', l3_agent.PRIORITY_RPC)
+        self.queue.get(block=False)
+        latest = self._put('r1', l3_agent.PRIORITY_RPC)
+        self.assertRaises(l3_agent.queue.Empty, self.queue.get, block=False)
+        self.queue.done('r1')
+        self.assertIs(self.queue.get(block=False), latest)
+
+
 class TestL3AgentEventHandler(base.BaseTestCase):
 
     def setUp(self):
@@ -1633,7 +1633,8 @@ class L3NatDBTestCase(L3NatTestCaseBase):
                                           r['router']['id'],
                                           None,
                                           p['port']['id'])
-        self.assertEqual(2, notifyApi.routers_updated.call_count)
+        self.assertEqual(2, notifyApi.router_delta.call_count)
+        self.assertEqual(0, notifyApi.routers_updated.call_count)
 
     def test_interfaces_op_agent(self):
         with self.router() as r:
@@ -1643,13 +1644,55 @@ class L3NatDBTestCase(L3NatTestCaseBase):
     def _test_floatingips_op_agent(self, notifyApi):
         with self.floatingip_with_assoc():
             pass
-        # add gateway, add interface, associate, deletion of floatingip,
-        # delete gateway, delete interface
-        self.assertEqual(6, notifyApi.routers_updated.call_count)
+        # add gateway, delete gateway
+        self.assertEqual(2, notifyApi.routers_updated.call_count)
+        # add interface, associate, deletion of floatingip, delete interface
+        self.assertEqual(4, notifyApi.router_delta.call_count)
 
     def test_floatingips_op_agent(self):
         self._test_notify_op_agent(self._test_floatingips_op_agent)
 
+    def _test_floatingip_delta_op_agent(self, notifyApi):
+        with self.floatingip_with_assoc() as fip:
+            fip_id = fip['floatingip']['id']
+            router_id = fip['floatingip']['router_id']
+            # add interface, associate
+            self.assertEqual(2, notifyApi.router_delta.call_count)
+            args = notifyApi.router_delta.call_args[0]
+            self.assertEqual(router_id, args[1])
+            delta = args[2]
+            self.assertEqual(
+                [fip_id],
+                [f['id'] for f in
+                 delta['updated'][l3_constants.FLOATINGIP_KEY]])
+            self.assertEqual({}, delta['removed'])
+            routers = TestL3NatPlugin().get_sync_data(
+                context.get_admin_context(), [router_id])
+            self.assertEqual(delta['revision'], routers[0]['revision'])
+
+    def test_floatingip_delta_op_agent(self):
+        self._test_notify_op_agent(self._test_floatingip_delta_op_agent)
+
+    def _test_interfaces_unhosted_router_op_agent(self, r, notifyApi):
+        notifyApi.router_delta.return_value = False
+        with self.port(no_delete=True) as p:
+            self._router_interface_action('add',
+                                          r['router']['id'],
+                                          None,
+                                          p['port']['id'])
+            # clean-up
+            self._router_interface_action('remove',
+                                          r['router']['id'],
+                                          None,
+                                          p['port']['id'])
+        self.assertEqual(2, notifyApi.router_delta.call_count)
+        self.assertEqual(2, notifyApi.routers_updated.call_count)
+
+    def test_interfaces_unhosted_router_op_agent(self):
+        with self.router() as r:
+            self._test_notify_op_agent(
+                self._test_interfaces_unhosted_router_op_agent, r)
+
     def test_l3_agent_routers_query_interfaces(self):
         with self.router() as r:
             with self.port(no_delete=True) as p:
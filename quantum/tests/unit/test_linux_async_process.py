@@ -0,0 +1,91 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+
+from quantum.agent.linux import async_process
+from quantum.tests import base
+
+
+class TestAsyncProcess(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestAsyncProcess, self).setUp()
+        self.proc = async_process.AsyncProcess(['cat'])
+
+    def _wait_for(self, predicate, timeout=5):
+        with eventlet.timeout.Timeout(timeout):
+            while not predicate():
+                eventlet.sleep(0.01)
+
+    def test_construtor_raises_exception_for_negative_respawn_interval(self):
+        self.assertRaises(ValueError, async_process.AsyncProcess, ['cat'],
+                          respawn_interval=-1)
+
+    def test_start_raises_exception_if_process_already_started(self):
+        self.proc._kill_event = True
+        self.assertRaises(async_process.AsyncProcessException,
+                          self.proc.start)
+
+    def test_stop_raises_exception_if_already_stopped(self):
+        self.assertRaises(async_process.AsyncProcessException,
+                          self.proc.stop)
+
+    def test_start_prefixes_root_helper(self):
+        proc = async_process.AsyncProcess(['cat'], root_helper='sudo -n')
+        with mock.patch('quantum.common.utils.subprocess_popen') as popen:
+            with mock.patch('eventlet.spawn'):
+                proc.start()
+        self.assertEqual(popen.call_args[0][0], ['sudo', '-n', 'cat'])
+
+    def test_reads_stdout_lines(self):
+        self.proc.start()
+        self.addCleanup(self.proc.stop)
+        self.assertTrue(self.proc.is_active)
+        self.proc._process.stdin.write('foo\nbar\n')
+        self.proc._process.stdin.flush()
+        self.assertEqual(self.proc.read_stdout(timeout=5), 'foo')
+        self._wait_for(lambda: list(self.proc.iter_stdout()) == ['bar'])
+
+    def test_read_stdout_times_out(self):
+        self.assertIsNone(self.proc.read_stdout(timeout=0.01))
+
+    def test_iter_stdout_does_not_block(self):
+        self.assertEqual(list(self.proc.iter_stdout()), [])
+
+    def test_stop_kills_process(self):
+        self.proc.start()
+        process = self.proc._process
+        self.proc.stop()
+        self.assertFalse(self.proc.is_active)
+        self._wait_for(lambda: process.poll() is not None)
+
+    def test_process_exit_without_respawn(self):
+        proc = async_process.AsyncProcess(['true'])
+        proc.start()
+        self._wait_for(lambda: not proc.is_active)
+        self.assertIsNone(proc._process)
+
+    def test_process_exit_with_respawn(self):
+        proc = async_process.AsyncProcess(['echo', 'foo'],
+                                          respawn_interval=0)
+        proc.start()
+        self.addCleanup(proc.stop)
+        self.assertEqual(proc.read_stdout(timeout=5), 'foo')
+        # The process was respawned and printed its output again
+        self.assertEqual(proc.read_stdout(timeout=5), 'foo')
@@ -16,7 +16,9 @@
 #    under the License.
 
 import os
+import shutil
 import socket
+import tempfile
 
 import mock
 from oslo.config import cfg
@@ -620,6 +622,57 @@ tag:tag1,option:classless-static-route,%s,%s""".lstrip() % (fake_v6,
                                     mock.call(exp_opt_name, exp_opt_data)])
         self.execute.assert_called_once_with(exp_args, 'sudo')
 
+    def _test_reload_allocations_existing_files(self, host_data, opts_data):
+        confs_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, confs_dir)
+        self.conf.set_override('dhcp_confs', confs_dir)
+        dm = dhcp.Dnsmasq(self.conf, FakeV4Network(), version=float(2.59))
+        for kind, data in (('host', host_data), ('opts', opts_data)):
+            with open(dm.get_conf_file_name(kind, True), 'w') as f:
+                f.write(data)
+
+        with mock.patch.object(dhcp.Dnsmasq, 'active') as active:
+            active.__get__ = mock.Mock(return_value=True)
+            with mock.patch.object(dhcp.Dnsmasq, 'pid') as pid:
+                pid.__get__ = mock.Mock(return_value=5)
+                dm.reload_allocations()
+        return dm
+
+    def test_reload_allocations_unchanged(self):
+        self.conf.set_override('enable_isolated_metadata', False)
+        dm = dhcp.Dnsmasq(self.conf, FakeV4Network(), version=float(2.59))
+        self._test_reload_allocations_existing_files(
+            dm._build_hosts_file(), dm._build_opts_file())
+        self.assertFalse(self.safe.called)
+        self.assertFalse(self.execute.called)
+
+    def test_reload_allocations_hosts_changed(self):
+        self.conf.set_override('enable_isolated_metadata', False)
+        dm = dhcp.Dnsmasq(self.conf, FakeV4Network(), version=float(2.59))
+        dm = self._test_reload_allocations_existing_files(
+            '', dm._build_opts_file())
+        self.safe.assert_called_once_with(dm.get_conf_file_name('host'),
+                                          dm._build_hosts_file())
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+    def test_build_hosts_file_only_formats_changed_ports(self):
+        network = FakeDualNetwork()
+        network.ports = list(network.ports)
+        dm = dhcp.Dnsmasq(self.conf, network, version=float(2.59))
+        hosts = dm._build_hosts_file()
+        updated_port = FakePort3()
+        updated_port.fixed_ips = [FakeIPAllocation('192.168.0.4')]
+        network.ports[2] = updated_port
+        del network.ports[1]
+        dm = dhcp.Dnsmasq(self.conf, network, version=float(2.59))
+        with mock.patch.object(dm, '_build_port_hosts',
+                               wraps=dm._build_port_hosts) as build:
+            new_hosts = dm._build_hosts_file()
+        build.assert_called_once_with(updated_port)
+        self.assertEqual(new_hosts, hosts.splitlines(True)[0] +
+                         '00:00:0f:aa:bb:cc,192-168-0-4.openstacklocal,'
+                         '192.168.0.4\n')
+
     def test_make_subnet_interface_ip_map(self):
         with mock.patch('quantum.agent.linux.ip_lib.IPDevice') as ip_dev:
             ip_dev.return_value.addr.list.return_value = [
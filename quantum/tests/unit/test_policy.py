@@ -399,6 +399,95 @@ class QuantumPolicyTestCase(base.BaseTestCase):
     def test_enforce_tenant_id_check_invalid_parent_resource_raises(self):
         self._test_enforce_tenant_id_raises('tenant_id:%(foobaz_tenant_id)s')
 
+    def test_match_rule_built_once(self):
+        rule = policy._build_match_rule('create_network', {'shared': True})
+        self.assertIs(policy._build_match_rule('create_network',
+                                               {'shared': True,
+                                                'name': 'net1'}),
+                      rule)
+        self.assertIsNot(policy._build_match_rule('create_network', {}),
+                         rule)
+        policy.reset()
+        self.assertIsNot(policy._build_match_rule('create_network',
+                                                  {'shared': True}),
+                         rule)
+
+    def test_collect_target_fields(self):
+        fields = set()
+        rule = policy._build_match_rule('get_network', {})
+        self.assertTrue(policy._collect_target_fields(rule, fields, set()))
+        self.assertEqual(fields, set(['tenant_id', 'shared',
+                                      'router:external']))
+        rule = common_policy.parse_rule('http:http://www.example.com')
+        self.assertFalse(policy._collect_target_fields(rule, set(), set()))
+
+    def test_collect_target_fields_default_rule(self):
+        self.rules['default'] = common_policy.parse_rule(
+            'rule:admin_or_owner')
+        common_policy.set_rules(common_policy.Rules(self.rules, 'default'))
+        fields = set()
+        rule = policy._build_match_rule('get_port', {})
+        self.assertTrue(policy._collect_target_fields(rule, fields, set()))
+        self.assertEqual(fields, set(['tenant_id']))
+
+    def test_check_result_depends_on_target_fields(self):
+        action = 'get_network'
+        self.assertTrue(policy.check(self.context, action,
+                                     {'tenant_id': 'fake',
+                                      'shared': False}))
+        self.assertFalse(policy.check(self.context, action,
+                                      {'tenant_id': 'somebody_else',
+                                       'shared': False}))
+        self.assertTrue(policy.check(self.context, action,
+                                     {'tenant_id': 'somebody_else',
+                                      'shared': True}))
+
+    def test_check_result_depends_on_credentials(self):
+        target = {'tenant_id': 'somebody_else', 'shared': False}
+        self.assertFalse(policy.check(self.context, 'get_network', target))
+        self.assertTrue(policy.check(self.context.elevated(), 'get_network',
+                                     target))
+
+    def test_check_reuses_parent_resource_owner(self):
+        networks = []
+
+        def fakegetnetwork(context, id, **kwargs):
+            networks.append(id)
+            return {'tenant_id': 'fake'}
+
+        action = "create_port:mac"
+        with mock.patch.object(manager.QuantumManager.get_instance().plugin,
+                               'get_network', new=fakegetnetwork):
+            for network_id in ('net1', 'net1', 'net2', 'net1'):
+                self.assertTrue(policy.check(self.context, action,
+                                             {'network_id': network_id}))
+        self.assertEqual(networks, ['net1', 'net2'])
+
+    def test_get_query_filters(self):
+        self.rules.update((k, common_policy.parse_rule(v)) for k, v in {
+            "get_port": "rule:admin_or_owner",
+            "get_subnet": "rule:admin_or_owner or rule:shared",
+            "get_port:mac": "rule:admin_or_network_owner",
+            "get_port:name": "not rule:regular_user",
+            "get_port:status": "field:ports:name=a and field:ports:name=b",
+        }.items())
+        self.assertEqual(policy.get_query_filters(self.context, 'get_port'),
+                         [{'tenant_id': 'fake'}])
+        admin_context = context.Context('fake', 'fake', roles=['admin'])
+        self.assertEqual(policy.get_query_filters(admin_context, 'get_port'),
+                         [{}])
+        self.assertEqual(policy.get_query_filters(self.context,
+                                                  'get_subnet'),
+                         [{'tenant_id': 'fake'}, {'shared': True}])
+        self.assertEqual(policy.get_query_filters(self.context,
+                                                  'get_port:name'),
+                         [])
+        self.assertEqual(policy.get_query_filters(self.context,
+                                                  'get_port:status'),
+                         [])
+        self.assertIsNone(policy.get_query_filters(self.context,
+                                                   'get_port:mac'))
+
     def test_get_roles_context_is_admin_rule_missing(self):
         rules = dict((k, common_policy.parse_rule(v)) for k, v in {
             "some_other_rule": "role:admin",
@@ -9,12 +9,15 @@ from quantum.common import config
 from quantum.common import exceptions
 from quantum import context
 from quantum.db import api as db
+from quantum.db import models_v2
 from quantum.db import quota_db
 from quantum import manager
 from quantum.plugins.linuxbridge.db import l2network_db_v2
 from quantum import quota
 from quantum.tests import base
+from quantum.openstack.common import timeutils
 from quantum.tests.unit import test_api_v2
+from quantum.tests.unit import test_db_plugin
 from quantum.tests.unit import test_extensions
 from quantum.tests.unit import testlib_api
 
@@ -387,3 +390,114 @@ class TestDbQuotaDriver(base.BaseTestCase):
             get_tenant_quotas.assert_called_once_with(ctx,
                                                       default_quotas,
                                                       target_tenant)
+
+
+class TestQuotaUsageTracking(test_db_plugin.QuantumDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestQuotaUsageTracking, self).setUp()
+        self.context = context.get_admin_context()
+        self.plugin = manager.QuantumManager.get_plugin()
+
+    def _count(self, resource):
+        return quota.QUOTAS.count(self.context, resource, self.plugin,
+                                  resource + 's', self._tenant_id)
+
+    def _get_usage(self, resource):
+        query = self.context.session.query(quota_db.QuotaUsage).filter_by(
+            tenant_id=self._tenant_id, resource=resource)
+        return query.populate_existing().one()
+
+    def test_usage_tracked_on_create_and_delete(self):
+        self.assertEqual(self._count('network'), 0)
+        with self.network():
+            self.assertEqual(self._get_usage('network').in_use, 1)
+            with mock.patch.object(quota, '_count_resource') as count:
+                self.assertEqual(self._count('network'), 1)
+            self.assertFalse(count.called)
+        self.assertEqual(self._count('network'), 0)
+
+    def test_network_delete_maintains_subnet_usage(self):
+        with self.network(do_delete=False) as network:
+            with self.subnet(network=network, do_delete=False):
+                self.assertEqual(self._count('subnet'), 1)
+            self._delete('networks', network['network']['id'])
+        usage = self._get_usage('subnet')
+        self.assertFalse(usage.dirty)
+        self.assertEqual(usage.in_use, 0)
+
+    def test_bulk_delete_marks_usage_dirty(self):
+        with self.network() as network:
+            with self.subnet(network=network, do_delete=False):
+                self.assertEqual(self._count('subnet'), 1)
+                with self.context.session.begin():
+                    self.context.session.query(models_v2.Subnet).filter_by(
+                        network_id=network['network']['id']).delete()
+        self.assertTrue(self._get_usage('subnet').dirty)
+        self.assertEqual(self._count('subnet'), 0)
+        self.assertFalse(self._get_usage('subnet').dirty)
+
+    def test_usage_counted_for_other_plugins(self):
+        with self.network():
+            plugin = mock.Mock()
+            plugin.get_networks_count.return_value = 3
+            self.assertEqual(
+                quota.QUOTAS.count(self.context, 'network', plugin,
+                                   'networks', self._tenant_id), 3)
+
+    def test_usage_updated_when_transaction_commits(self):
+        self.assertEqual(self._count('network'), 0)
+        session = self.context.session
+        with session.begin():
+            self.plugin.create_network(
+                self.context,
+                {'network': {'name': 'net', 'admin_state_up': True,
+                             'shared': False, 'tenant_id': self._tenant_id}})
+            session.flush()
+            # The usage row is not locked until the commit
+            session.expire_all()
+            self.assertEqual(self._get_usage('network').in_use, 0)
+        session.expire_all()
+        self.assertEqual(self._get_usage('network').in_use, 1)
+
+    def test_usage_unchanged_when_transaction_rolls_back(self):
+        self.assertEqual(self._count('network'), 0)
+        session = self.context.session
+        try:
+            with session.begin():
+                self.plugin.create_network(
+                    self.context,
+                    {'network': {'name': 'net', 'admin_state_up': True,
+                                 'shared': False,
+                                 'tenant_id': self._tenant_id}})
+                session.flush()
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(self._get_usage('network').in_use, 0)
+        self.assertFalse(quota_db._USAGE_DELTAS.get(session))
+        # The usage is marked dirty by the next commit of the session, as
+        # the rollback might have been the one of a savepoint
+        self.plugin.create_network(
+            self.context,
+            {'network': {'name': 'net', 'admin_state_up': True,
+                         'shared': False, 'tenant_id': self._tenant_id}})
+        self.assertTrue(self._get_usage('network').dirty)
+        self.assertEqual(self._count('network'), 1)
+
+    def test_usage_counted_again_after_resync_interval(self):
+        cfg.CONF.set_override('quota_usage_resync_interval', 10,
+                              group='QUOTAS')
+        self._count('network')
+        with self.context.session.begin():
+            self._get_usage('network').update(
+                {'in_use': 5,
+                 'synced_at': timeutils.utcnow().replace(year=2000)})
+        self.assertEqual(self._count('network'), 0)
+
+    def test_usage_not_tracked(self):
+        cfg.CONF.set_override('track_quota_usage', False, group='QUOTAS')
+        with self.network():
+            self.assertEqual(self._count('network'), 1)
+        self.assertEqual(
+            self.context.session.query(quota_db.QuotaUsage).count(), 0)
@@ -29,6 +29,7 @@ from quantum.agent import securitygroups_rpc as sg_rpc
 from quantum import context
 from quantum.db import securitygroups_rpc_base as sg_db_rpc
 from quantum.extensions import securitygroup as ext_sg
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.openstack.common.rpc import proxy
 from quantum.tests import base
 from quantum.tests.unit import test_extension_security_group as test_sg
@@ -39,6 +40,7 @@ class FakeSGCallback(sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
     def get_port_from_device(self, device):
         device = self.devices.get(device)
         if device:
+            device = dict(device)
             device['security_group_rules'] = []
             device['security_group_source_groups'] = []
             device['fixed_ips'] = [ip['ip_address']
@@ -393,6 +395,102 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def test_security_group_info_for_devices(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', 'tcp', '24',
+                    '25', remote_group_id=sg2_id)
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, 201)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id, sg2_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+
+                ctx = context.get_admin_context()
+                info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=[port_id1, 'no_exist_device'])
+                self.assertEqual(info['devices'].keys(), [port_id1])
+                port_rpc = info['devices'][port_id1]
+                self.assertEqual(port_rpc['security_group_source_groups'],
+                                 [sg2_id])
+                self.assertEqual(port_rpc['security_group_rules'], [])
+                self.assertEqual(sorted(info['security_groups']),
+                                 sorted([sg1_id, sg2_id]))
+                self.assertIn({'direction': u'ingress',
+                               'protocol': u'tcp', 'ethertype': u'IPv4',
+                               'port_range_max': 25, 'port_range_min': 24,
+                               'remote_group_id': sg2_id,
+                               'security_group_id': sg1_id},
+                              info['security_groups'][sg1_id])
+                self.assertEqual(len(info['security_groups'][sg2_id]), 2)
+                self.assertEqual(info['sg_member_ips'].keys(), [sg2_id])
+                member_ips = [port['port']['fixed_ips'][0]['ip_address']
+                              for port in (ports_rest1, ports_rest2)]
+                self.assertEqual(
+                    sorted(info['sg_member_ips'][sg2_id]['IPv4']),
+                    sorted(member_ips))
+                self.assertEqual(info['sg_member_ips'][sg2_id]['IPv6'], [])
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
+    def test_security_group_info_for_devices_rules_cached(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group()) as (subnet_v4, sg1):
+                sg1_id = sg1['security_group']['id']
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                ctx = context.get_admin_context()
+                make_rule_dict = self.rpc._make_rule_dict
+                with mock.patch.object(self.rpc, '_make_rule_dict',
+                                       side_effect=make_rule_dict) as make:
+                    self.rpc.security_group_info_for_devices(
+                        ctx, devices=[port_id1])
+                    self.assertEqual(make.call_count, 2)
+                    make.reset_mock()
+                    info = self.rpc.security_group_info_for_devices(
+                        ctx, devices=[port_id1])
+                    self.assertFalse(make.called)
+                    self.assertEqual(len(info['security_groups'][sg1_id]),
+                                     2)
+
+                    # The test plugin does not invalidate the cache, as
+                    # for rules added by another server process
+                    rule1 = self._build_security_group_rule(
+                        sg1_id, 'ingress', 'tcp', '22', '22')
+                    res = self._create_security_group_rule(self.fmt, rule1)
+                    self.assertEqual(res.status_int, 201)
+                    info = self.rpc.security_group_info_for_devices(
+                        ctx, devices=[port_id1])
+                    self.assertEqual(make.call_count, 3)
+                    self.assertEqual(len(info['security_groups'][sg1_id]),
+                                     3)
+                self._delete('ports', port_id1)
+
 
 class SGServerRpcCallBackMixinTestCaseXML(SGServerRpcCallBackMixinTestCase):
     fmt = 'xml'
@@ -434,9 +532,11 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.firewall = mock.Mock()
         firewall_object = firewall_base.FirewallDriver()
         self.firewall.defer_apply.side_effect = firewall_object.defer_apply
+        self.firewall.handles_remote_groups = False
         self.agent.firewall = self.firewall
         rpc = mock.Mock()
         self.agent.plugin_rpc = rpc
+        self.agent.use_security_group_info = False
         self.fake_device = {'device': 'fake_device',
                             'security_groups': ['fake_sgid1', 'fake_sgid2'],
                             'security_group_source_groups': ['fake_sgid2'],
@@ -501,6 +601,126 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
                  call.update_port_filter(self.fake_device)]
         self.firewall.assert_has_calls(calls)
 
+    def _fake_security_group_info(self):
+        rules = [{'security_group_id': 'fake_sgid1',
+                  'direction': 'ingress',
+                  'ethertype': 'IPv4',
+                  'protocol': 'tcp',
+                  'remote_group_id': 'fake_sgid2'},
+                 {'security_group_id': 'fake_sgid1',
+                  'direction': 'egress',
+                  'ethertype': 'IPv6',
+                  'remote_group_id': 'fake_sgid2'}]
+        egress = {'security_group_id': 'fake_sgid2',
+                  'direction': 'egress',
+                  'ethertype': 'IPv4'}
+        dhcp_rule = {'direction': 'ingress',
+                     'ethertype': 'IPv4',
+                     'source_ip_prefix': '10.0.0.2/32'}
+        device = {'device': 'fake_device',
+                  'fixed_ips': ['10.0.0.3'],
+                  'security_groups': ['fake_sgid1', 'fake_sgid2'],
+                  'security_group_source_groups': ['fake_sgid2'],
+                  'security_group_rules': [dhcp_rule]}
+        member_ips = {'IPv4': ['10.0.0.3', '10.0.0.4'],
+                      'IPv6': ['fe80::1']}
+        return {'devices': {'fake_device': device},
+                'security_groups': {'fake_sgid1': rules,
+                                    'fake_sgid2': [egress]},
+                'sg_member_ips': {'fake_sgid2': member_ips}}
+
+    def test_prepare_devices_filter_with_security_group_info(self):
+        self.agent.use_security_group_info = True
+        self.agent.plugin_rpc.security_group_info_for_devices.return_value = (
+            self._fake_security_group_info())
+        self.agent.prepare_devices_filter(['fake_device'])
+        expected_rules = [{'security_group_id': 'fake_sgid1',
+                           'direction': 'ingress',
+                           'ethertype': 'IPv4',
+                           'protocol': 'tcp',
+                           'remote_group_id': 'fake_sgid2',
+                           'source_ip_prefix': '10.0.0.4/32'},
+                          {'security_group_id': 'fake_sgid1',
+                           'direction': 'egress',
+                           'ethertype': 'IPv6',
+                           'remote_group_id': 'fake_sgid2',
+                           'dest_ip_prefix': 'fe80::1/128'},
+                          {'security_group_id': 'fake_sgid2',
+                           'direction': 'egress',
+                           'ethertype': 'IPv4'},
+                          {'direction': 'ingress',
+                           'ethertype': 'IPv4',
+                           'source_ip_prefix': '10.0.0.2/32'}]
+        device = self.firewall.prepare_port_filter.call_args[0][0]
+        self.assertEqual(device['security_group_rules'], expected_rules)
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_rules_for_devices.called)
+
+    def test_prepare_devices_filter_with_remote_group_members(self):
+        self.agent.use_security_group_info = True
+        self.firewall.handles_remote_groups = True
+        info = self._fake_security_group_info()
+        self.agent.plugin_rpc.security_group_info_for_devices.return_value = (
+            info)
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', info['sg_member_ips']['fake_sgid2'])
+        device = self.firewall.prepare_port_filter.call_args[0][0]
+        self.assertEqual(device['security_group_rules'],
+                         info['security_groups']['fake_sgid1'] +
+                         info['security_groups']['fake_sgid2'] +
+                         [{'direction': 'ingress',
+                           'ethertype': 'IPv4',
+                           'source_ip_prefix': '10.0.0.2/32'}])
+
+    def test_refresh_firewall_with_remote_group_members(self):
+        self.agent.use_security_group_info = True
+        self.firewall.handles_remote_groups = True
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.return_value = (
+            self._fake_security_group_info())
+        self.agent.prepare_devices_filter(['fake_device'])
+        device = self.firewall.prepare_port_filter.call_args[0][0]
+        self.firewall.ports = {'fake_device': device}
+
+        # Only the members of the remote group changed
+        info = self._fake_security_group_info()
+        info['sg_member_ips']['fake_sgid2']['IPv4'].append('10.0.0.5')
+        rpc.security_group_info_for_devices.return_value = info
+        self.agent.refresh_firewall()
+        self.firewall.update_security_group_members.assert_called_with(
+            'fake_sgid2', info['sg_member_ips']['fake_sgid2'])
+        self.assertFalse(self.firewall.update_port_filter.called)
+
+        info = self._fake_security_group_info()
+        info['security_groups']['fake_sgid2'] = []
+        rpc.security_group_info_for_devices.return_value = info
+        self.agent.refresh_firewall()
+        self.assertEqual(self.firewall.update_port_filter.call_count, 1)
+
+    def test_prepare_devices_filter_falls_back_to_rules_for_devices(self):
+        self.agent.use_security_group_info = True
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.side_effect = (
+            rpc_common.RemoteError('UnsupportedRpcVersion'))
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.refresh_firewall()
+        self.assertEqual(rpc.security_group_info_for_devices.call_count, 1)
+        self.assertEqual(rpc.security_group_rules_for_devices.call_count, 2)
+        self.assertFalse(self.agent.use_security_group_info)
+        self.firewall.prepare_port_filter.assert_called_once_with(
+            self.fake_device)
+
+    def test_prepare_devices_filter_reraises_remote_errors(self):
+        self.agent.use_security_group_info = True
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.side_effect = (
+            rpc_common.RemoteError('DBError'))
+        self.assertRaises(rpc_common.RemoteError,
+                          self.agent.prepare_devices_filter, ['fake_device'])
+        self.assertTrue(self.agent.use_security_group_info)
+        self.assertFalse(rpc.security_group_rules_for_devices.called)
+
 
 class FakeSGRpcApi(agent_rpc.PluginApi,
                    sg_rpc.SecurityGroupServerRpcApiMixin):
@@ -524,6 +744,17 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
              version=sg_rpc.SG_RPC_VERSION,
              topic='fake_topic')])
 
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_has_calls(
+            [call(None,
+             {'args':
+                 {'devices': ['fake_device']},
+             'method': 'security_group_info_for_devices',
+             'namespace': None},
+             version=sg_rpc.SG_INFO_RPC_VERSION,
+             topic='fake_topic')])
+
 
 class FakeSGNotifierAPI(proxy.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
@@ -1016,6 +1247,7 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
 
         self.rpc = mock.Mock()
         self.agent.plugin_rpc = self.rpc
+        self.agent.use_security_group_info = False
         rule1 = [{'direction': 'ingress',
                   'protocol': 'udp',
                   'ethertype': 'IPv4',
@@ -1207,6 +1439,27 @@ class SGNotificationTestMixin():
                          call.security_groups_member_updated(
                              mock.ANY, [security_group_id])])
 
+    def test_security_group_member_updated_bulk(self):
+        with self.network() as n:
+            with self.subnet(n):
+                with self.security_group() as sg:
+                    security_group_id = sg['security_group']['id']
+                    override = {ext_sg.SECURITYGROUPS: [security_group_id]}
+                    res = self._create_port_bulk(self.fmt, 2,
+                                                 n['network']['id'],
+                                                 'test', True,
+                                                 override={0: override,
+                                                           1: override})
+                    ports = self.deserialize(self.fmt, res)['ports']
+                    for port in ports:
+                        self.assertEqual([security_group_id],
+                                         port[ext_sg.SECURITYGROUPS])
+                    self.notifier.assert_has_calls(
+                        [call.security_groups_member_updated(
+                            mock.ANY, [security_group_id])])
+                    for port in ports:
+                        self._delete('ports', port['id'])
+
 
 class TestSecurityGroupAgentWithOVSIptables(
         TestSecurityGroupAgentWithIptables):
@@ -0,0 +1,160 @@
+# Copyright (c) 2013 OpenStack Foundation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+
+import mock
+from oslo.config import cfg
+
+from quantum.common import rpc as q_rpc
+from quantum import manager
+from quantum.openstack.common import rpc
+from quantum import service
+from quantum.tests import base
+
+
+class RpcWorkersTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(RpcWorkersTestCase, self).setUp()
+        self.plugin = mock.Mock()
+        self.plugin.rpc_workers_supported.return_value = True
+        get_plugin = mock.patch.object(manager.QuantumManager, 'get_plugin',
+                                       return_value=self.plugin)
+        get_plugin.start()
+        self.addCleanup(get_plugin.stop)
+        launcher_cls = mock.patch('quantum.openstack.common.service.'
+                                  'ProcessLauncher')
+        self.launcher_cls = launcher_cls.start()
+        self.addCleanup(launcher_cls.stop)
+
+    def test_serve_rpc_in_process(self):
+        self.assertIsNone(service.serve_rpc())
+        self.plugin.start_rpc_listener.assert_called_once_with()
+        self.assertFalse(self.launcher_cls.called)
+
+    def test_serve_rpc_workers(self):
+        cfg.CONF.set_override('rpc_workers', 2)
+        launcher = service.serve_rpc()
+        self.assertEqual(launcher, self.launcher_cls.return_value)
+        self.assertEqual(launcher.launch_service.call_count, 1)
+        worker = launcher.launch_service.call_args[0][0]
+        self.assertIsInstance(worker, service.RpcWorker)
+        self.assertEqual(launcher.launch_service.call_args[1],
+                         {'workers': 2})
+        self.assertFalse(self.plugin.start_rpc_listener.called)
+
+    def test_serve_rpc_workers_with_api_launcher(self):
+        cfg.CONF.set_override('rpc_workers', 2)
+        api_launcher = mock.Mock()
+        self.assertIsNone(service.serve_rpc(api_launcher))
+        self.assertFalse(self.launcher_cls.called)
+        self.assertEqual(api_launcher.launch_service.call_count, 1)
+
+    def test_serve_rpc_unsupported(self):
+        cfg.CONF.set_override('rpc_workers', 2)
+        self.plugin.rpc_workers_supported.return_value = False
+        with mock.patch.object(service.LOG, 'error') as log:
+            self.assertIsNone(service.serve_rpc())
+        self.assertEqual(log.call_count, 1)
+        self.assertFalse(self.plugin.start_rpc_listener.called)
+        self.assertFalse(self.launcher_cls.called)
+
+    def test_rpc_worker_start(self):
+        worker = service.RpcWorker(self.plugin)
+        with mock.patch.object(service.db_api, 'reset_engine') as reset_db:
+            with mock.patch.object(q_rpc,
+                                   'reset_connection_pool') as reset_rpc:
+                worker.start()
+        reset_db.assert_called_once_with()
+        reset_rpc.assert_called_once_with()
+        self.plugin.start_rpc_listener.assert_called_once_with()
+        worker.stop()
+        server = self.plugin.start_rpc_listener.return_value
+        server.kill.assert_called_once_with()
+
+
+class RunWsgiTestCase(base.BaseTestCase):
+
+    def test_run_wsgi_api_workers(self):
+        cfg.CONF.set_override('api_workers', 2)
+        with contextlib.nested(
+            mock.patch.object(service.config, 'load_paste_app'),
+            mock.patch.object(service.wsgi, 'Server'),
+            # The configuration files are not parsed by the tests
+            mock.patch.object(cfg.CONF, 'log_opt_values')
+        ) as (load_app, server_cls, log_opt_values):
+            server = service._run_wsgi('quantum')
+        self.assertEqual(server, server_cls.return_value)
+        server.start.assert_called_once_with(
+            load_app.return_value, cfg.CONF.bind_port, cfg.CONF.bind_host,
+            workers=2, on_worker_start=service._reset_worker_connections)
+
+    def test_reset_worker_connections(self):
+        with mock.patch.object(service.db_api, 'reset_engine') as reset_db:
+            with mock.patch.object(q_rpc,
+                                   'reset_connection_pool') as reset_rpc:
+                service._reset_worker_connections()
+        reset_db.assert_called_once_with()
+        reset_rpc.assert_called_once_with()
+
+
+class IpRecyclerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpRecyclerTestCase, self).setUp()
+        self.plugin = mock.Mock()
+        get_plugin = mock.patch.object(manager.QuantumManager, 'get_plugin',
+                                       return_value=self.plugin)
+        get_plugin.start()
+        self.addCleanup(get_plugin.stop)
+        looping_call = mock.patch.object(service.loopingcall,
+                                         'FixedIntervalLoopingCall')
+        self.looping_call = looping_call.start()
+        self.addCleanup(looping_call.stop)
+
+    def test_serve_ip_recycler(self):
+        cfg.CONF.set_override('ip_recycle_interval', 10)
+        recycler = service.serve_ip_recycler()
+        self.assertEqual(recycler, self.looping_call.return_value)
+        self.looping_call.assert_called_once_with(
+            service._recycle_ip_allocations, self.plugin)
+        recycler.start.assert_called_once_with(interval=10,
+                                               initial_delay=10)
+
+    def test_serve_ip_recycler_disabled(self):
+        cfg.CONF.set_override('ip_recycle_interval', 0)
+        self.assertIsNone(service.serve_ip_recycler())
+        self.assertFalse(self.looping_call.called)
+
+    def test_recycle_ip_allocations_failure(self):
+        self.plugin.recycle_expired_ip_allocations.side_effect = Exception
+        with mock.patch.object(service.LOG, 'exception') as log:
+            service._recycle_ip_allocations(self.plugin)
+        self.assertEqual(log.call_count, 1)
+
+
+class ResetConnectionPoolTestCase(base.BaseTestCase):
+
+    def test_reset_connection_pool(self):
+        self.addCleanup(setattr, q_rpc, '_INHERITED_POOLS', [])
+        pool = mock.Mock()
+        connection_cls = mock.Mock(pool=pool)
+        impl = mock.Mock(Connection=connection_cls)
+        with mock.patch.object(rpc, '_get_impl', return_value=impl):
+            q_rpc.reset_connection_pool()
+        self.assertIsNone(connection_cls.pool)
+        self.assertEqual(q_rpc._INHERITED_POOLS, [pool])
+        self.assertFalse(pool.method_calls)
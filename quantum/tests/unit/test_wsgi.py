@@ -15,7 +15,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
+import signal
 import socket
 import urllib2
 
@@ -92,6 +94,53 @@ class TestWSGIServer(base.BaseTestCase):
                             mock_listen.return_value)
                     ])
 
+    @mock.patch('quantum.wsgi.WorkerLauncher')
+    def test_start_multiple_workers(self, launcher_cls):
+        launcher = launcher_cls.return_value
+        server = wsgi.Server("test_multiple_processes")
+        server.start(None, 0, host="127.0.0.1", workers=2)
+        launcher.launch_service.assert_called_once_with(mock.ANY, workers=2)
+        worker = launcher.launch_service.call_args[0][0]
+        self.assertIsInstance(worker, wsgi.WorkerService)
+
+        server.wait()
+        launcher.wait.assert_called_once_with()
+        server.stop()
+        launcher.stop.assert_called_once_with()
+
+    def test_worker_launcher_stop(self):
+        with mock.patch.object(wsgi.common_service.ProcessLauncher,
+                               '__init__', return_value=None):
+            launcher = wsgi.WorkerLauncher()
+        launcher.running = True
+        launcher.children = {123: mock.Mock(), 456: mock.Mock()}
+        with contextlib.nested(
+            mock.patch.object(wsgi.os, 'kill'),
+            mock.patch.object(launcher, '_wait_child',
+                              side_effect=launcher.children.popitem)
+        ) as (kill, wait_child):
+            launcher.stop()
+        self.assertFalse(launcher.running)
+        self.assertEqual(sorted(call[0] for call in kill.call_args_list),
+                         [(123, signal.SIGTERM), (456, signal.SIGTERM)])
+        self.assertEqual(wait_child.call_count, 2)
+        self.assertEqual(launcher.children, {})
+
+    def test_worker_service(self):
+        server = wsgi.Server("test_worker_service")
+        server._socket = mock.Mock()
+        on_worker_start = mock.Mock()
+        worker = wsgi.WorkerService(server, 'fake_app', on_worker_start)
+        with mock.patch.object(wsgi.eventlet, 'spawn') as spawn:
+            worker.start()
+            on_worker_start.assert_called_once_with()
+            spawn.assert_called_once_with(server._run, 'fake_app',
+                                          server._socket)
+            worker.wait()
+            spawn.return_value.wait.assert_called_once_with()
+            worker.stop()
+            spawn.return_value.kill.assert_called_once_with()
+
     def test_app(self):
         greetings = 'Hello, World!!!'
 
@@ -588,6 +637,33 @@ class JSONDictSerializerTest(base.BaseTestCase):
 
         self.assertEqual(result, expected_json)
 
+    def test_serialize_iter(self):
+        input_dict = {'servers': (server for server in [{'id': 1},
+                                                        {'id': 2}]),
+                      'servers_links': [{'rel': 'next'}]}
+        expected_json = wsgi.JSONDictSerializer().serialize(
+            {'servers': [{'id': 1}, {'id': 2}],
+             'servers_links': [{'rel': 'next'}]})
+        serializer = wsgi.JSONDictSerializer()
+        serializer.chunk_size = 10
+        chunks = list(serializer.serialize_iter(input_dict))
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), expected_json)
+
+    def test_serialize_iter_empty_collection(self):
+        serializer = wsgi.JSONDictSerializer()
+        chunks = serializer.serialize_iter({'servers': (x for x in [])})
+
+        self.assertEqual(list(chunks), ['{"servers": []}'])
+
+    def test_serialize_streamed(self):
+        input_dict = {'servers': (server for server in [{'id': 1}])}
+        serializer = wsgi.JSONDictSerializer()
+        result = serializer.serialize(input_dict)
+
+        self.assertEqual(result, '{"servers": [{"id": 1}]}')
+
 
 class TextDeserializerTest(base.BaseTestCase):
 
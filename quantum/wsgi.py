@@ -20,10 +20,12 @@ Utility methods for working with WSGI servers
 """
 import errno
 import os
+import signal
 import socket
 import ssl
 import sys
 import time
+import types
 from xml.etree import ElementTree as etree
 from xml.parsers import expat
 
@@ -37,8 +39,10 @@ import webob.exc
 from quantum.common import constants
 from quantum.common import exceptions as exception
 from quantum import context
+from quantum.openstack.common import excutils
 from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
+from quantum.openstack.common import service as common_service
 
 socket_opts = [
     cfg.IntOpt('backlog',
@@ -81,12 +85,59 @@ def run_server(application, port):
     eventlet.wsgi.server(sock, application)
 
 
+class WorkerService(object):
+    """Runs a WSGI server in a worker process forked by ProcessLauncher."""
+
+    def __init__(self, service, application, on_worker_start=None):
+        self._service = service
+        self._application = application
+        self._on_worker_start = on_worker_start
+        self._server = None
+
+    def start(self):
+        # The worker was just forked from the parent process, let the
+        # server drop the connections it must not share with it
+        if self._on_worker_start:
+            self._on_worker_start()
+        # Not spawned in the pool of the server, so that the requests in
+        # progress are waited for when the worker is stopped
+        self._server = eventlet.spawn(self._service._run,
+                                      self._application,
+                                      self._service._socket)
+
+    def wait(self):
+        if self._server is not None:
+            self._server.wait()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.kill()
+            self._server = None
+
+
+class WorkerLauncher(common_service.ProcessLauncher):
+    """Launches the worker processes of a Server, which can stop them."""
+
+    def stop(self):
+        """Terminate the worker processes and wait on each."""
+        self.running = False
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError as exc:
+                if exc.errno != errno.ESRCH:
+                    raise
+        while self.children:
+            self._wait_child()
+
+
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications."""
 
     def __init__(self, name, threads=1000):
         self.pool = eventlet.GreenPool(threads)
         self.name = name
+        self._launcher = None
 
     def _get_socket(self, host, port, backlog):
         bind_addr = (host, port)
@@ -165,8 +216,17 @@ class Server(object):
 
         return sock
 
-    def start(self, application, port, host='0.0.0.0'):
-        """Run a WSGI server with the given application."""
+    def start(self, application, port, host='0.0.0.0', workers=0,
+              on_worker_start=None):
+        """Run a WSGI server with the given application.
+
+        If workers is greater than 0, the server is run by that many worker
+        processes sharing the listening socket, which are restarted if they
+        die. Otherwise it runs in a green thread of the current process.
+
+        :param on_worker_start: called without arguments in each worker
+                                process, before it serves any request.
+        """
         self._host = host
         self._port = port
         backlog = CONF.backlog
@@ -174,7 +234,19 @@ class Server(object):
         self._socket = self._get_socket(self._host,
                                         self._port,
                                         backlog=backlog)
-        self._server = self.pool.spawn(self._run, application, self._socket)
+        if workers < 1:
+            self._server = self.pool.spawn(self._run, application,
+                                           self._socket)
+        else:
+            self._server = WorkerService(self, application,
+                                         on_worker_start)
+            self._launcher = WorkerLauncher()
+            self._launcher.launch_service(self._server, workers=workers)
+
+    @property
+    def launcher(self):
+        """The ProcessLauncher of the worker processes, if any."""
+        return self._launcher
 
     @property
     def host(self):
@@ -185,12 +257,18 @@ class Server(object):
         return self._socket.getsockname()[1] if self._socket else self._port
 
     def stop(self):
-        self._server.kill()
+        if self._launcher:
+            self._launcher.stop()
+        else:
+            self._server.kill()
 
     def wait(self):
         """Wait until all servers have completed running."""
         try:
-            self.pool.waitall()
+            if self._launcher:
+                self._launcher.wait()
+            else:
+                self.pool.waitall()
         except KeyboardInterrupt:
             pass
 
@@ -319,10 +397,25 @@ class ActionDispatcher(object):
         raise NotImplementedError()
 
 
+def is_streamed(data):
+    """Whether data has collections given as generators.
+
+    Such collections, in the values of the data dict, can be serialized
+    item by item while the response is sent.
+    """
+    return isinstance(data, dict) and any(
+        isinstance(value, types.GeneratorType) for value in data.itervalues())
+
+
 class DictSerializer(ActionDispatcher):
     """Default request body serialization."""
 
     def serialize(self, data, action='default'):
+        if is_streamed(data):
+            data = dict(data)
+            for key, value in data.iteritems():
+                if isinstance(value, types.GeneratorType):
+                    data[key] = list(value)
         return self.dispatch(data, action=action)
 
     def default(self, data):
@@ -332,11 +425,56 @@ class DictSerializer(ActionDispatcher):
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
+    # Minimum size of the chunks of streamed responses
+    chunk_size = 65536
+
     def default(self, data):
         def sanitizer(obj):
             return unicode(obj)
         return jsonutils.dumps(data, default=sanitizer)
 
+    def serialize_iter(self, data):
+        """Serialize data to JSON chunks, see is_streamed.
+
+        The collections given as generators are consumed as the chunks are
+        iterated, so that the whole response is never held in memory.
+        """
+        chunk = []
+        size = 0
+        try:
+            for part in self._iterencode(data):
+                chunk.append(part)
+                size += len(part)
+                if size >= self.chunk_size:
+                    yield ''.join(chunk)
+                    chunk = []
+                    size = 0
+        except Exception:
+            # The response status has already been sent
+            with excutils.save_and_reraise_exception():
+                LOG.exception(_("Unable to serialize streamed response"))
+        if chunk:
+            yield ''.join(chunk)
+
+    def _iterencode(self, data):
+        # Encodes like default, with the same separators
+        yield '{'
+        for i, (key, value) in enumerate(data.iteritems()):
+            if i:
+                yield ', '
+            yield self.default(key)
+            yield ': '
+            if isinstance(value, types.GeneratorType):
+                yield '['
+                for j, item in enumerate(value):
+                    if j:
+                        yield ', '
+                    yield self.default(item)
+                yield ']'
+            else:
+                yield self.default(value)
+        yield '}'
+
 
 class XMLDictSerializer(DictSerializer):
 